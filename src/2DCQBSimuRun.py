@@ -19,12 +19,19 @@ Program Design:
     search path for simulating Close-quarters battle (CQB) robot's enemy searching strategy 
     planning and prediction scenario.
 """
+import os
+import sys
 import time
+import threading
 import wx
+from datetime import datetime
 import cqbSimuGlobal as gv
 import cqbSimuMapPanel as plMap
 import cqbSimuMapMgr as mapMgr
 import cqbSimuPanel as plFunc
+from cqbSimuExporter import FrameExporter
+from cqbSimuScenarioLib import ScenarioLibrary
+from cqbSimuProfiler import SimuProfiler, makeOutDir
 
 FRAME_SIZE = (1860, 950)
 PERIODIC = 500      # update in every 500ms
@@ -57,10 +64,12 @@ class UIFrame(wx.Frame):
         self.SetSizer(self._buildUISizer())
         # Set the periodic call back
         self.updateLock = False # flag to identify whether lock the periodic update
+        self.exporter = None    # background simulation frames exporter.
+        self.profiler = None    # simulation tick and paint profiler.
         self.lastPeriodicTime = time.time()
         self.timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.periodic)
-        self.timer.Start(PERIODIC)  # every 500 ms
+        self.timer.Start(int(min(PERIODIC, gv.gUpdateRate*1000)))  # every 500 ms
         # bind the UI windows close event handler.
         self.Bind(wx.EVT_CLOSE, self.onClose)
         gv.gDebugPrint("%s main frame inited." %str(gv.UI_TITLE), logType=gv.LOG_INFO)
@@ -68,6 +77,9 @@ class UIFrame(wx.Frame):
     def _initGlobals(self):
         """ Init the global parameters. """
         gv.iMapMgr = mapMgr.MapMgr()
+        gv.iScenarioLib = ScenarioLibrary(gv.gScenarioDir, gv.gBluePrintDir)
+        # update the changed scenario entries without blocking the UI start.
+        threading.Thread(target=gv.iScenarioLib.scan, daemon=True).start()
 
     #--UIFrame---------------------------------------------------------------------
     def _buildMenuBar(self):
@@ -79,6 +91,12 @@ class UIFrame(wx.Frame):
         blueprintItem = wx.MenuItem(configMenu, 100, text="Load Building BluePrint", kind=wx.ITEM_NORMAL)
         configMenu.Append(blueprintItem)
         self.Bind(wx.EVT_MENU, self.onLoadBlueprint, blueprintItem)
+        recordItem = wx.MenuItem(configMenu, 101, text="Load Simulation Record", kind=wx.ITEM_NORMAL)
+        configMenu.Append(recordItem)
+        self.Bind(wx.EVT_MENU, self.onLoadRecord, recordItem)
+        exportItem = wx.MenuItem(configMenu, 102, text="Export Simulation Frames", kind=wx.ITEM_NORMAL)
+        configMenu.Append(exportItem)
+        self.Bind(wx.EVT_MENU, self.onExportFrames, exportItem)
         menubar.Append(configMenu, '&Config')
         # Add the about menu.
         helpMenu = wx.Menu()
@@ -154,12 +172,73 @@ class UIFrame(wx.Frame):
     def periodic(self, event):
         """ Call back every periodic time."""
         now = time.time()
+        configDict = gv.checkConfigUpdate()
+        if configDict: self._applyLiveConfig(configDict)
         if (not self.updateLock) and now - self.lastPeriodicTime >= gv.gUpdateRate:
-            print("main frame update at %s" % str(now))
+            gv.gDebugPrint(lambda: "main frame update at %s, log queue: %s" %(str(now), str(gv.Log.getQueueStats())),
+                           rateKey='periodic')
             self.lastPeriodicTime = now
             gv.iMapMgr.periodic()
+            gv.iRWCtrlPanel.updateTimeline(gv.iMapMgr.getTimelineTickNum())
             gv.iRWMapPnl.updateDisplay()
             gv.iDetectPanel.updateDisplay()
+            if self.exporter: self._updateExportState()
+
+    #--UIFrame---------------------------------------------------------------------
+    def setProfiling(self, profileFlg, mode='sample'):
+        """ Start/stop profiling the simulation tick and the map panels paint 
+            handlers, the result is saved in the <profile> folder.
+        """
+        paintPanels = {'viewerPaint': gv.iRWMapPnl, 'editorPaint': gv.iEDMapPnl,
+                       'detectPaint': gv.iDetectPanel}
+        if profileFlg and self.profiler is None:
+            outDir = makeOutDir(os.path.join(gv.dirpath, 'profile'))
+            self.profiler = SimuProfiler(outDir, mode=mode)
+            gv.iMapMgr.startProfile(self.profiler)
+            for secName, panel in paintPanels.items():
+                panel.Unbind(wx.EVT_PAINT)
+                panel.Bind(wx.EVT_PAINT, self.profiler.wrap(secName, panel.onPaint))
+            self.profiler.start()
+            gv.gDebugPrint("Start profiling, result folder: %s" %outDir, logType=gv.LOG_INFO)
+        elif not profileFlg and self.profiler:
+            self.profiler.stop()
+            gv.iMapMgr.stopProfile()
+            for panel in paintPanels.values():
+                panel.Unbind(wx.EVT_PAINT)
+                panel.Bind(wx.EVT_PAINT, panel.onPaint)
+            gv.gDebugPrint("Stop profiling, result folder: %s" %self.profiler.getOutDir(), 
+                           logType=gv.LOG_INFO)
+            self.profiler = None
+
+    #--UIFrame---------------------------------------------------------------------
+    def _applyLiveConfig(self, configDict):
+        """ Apply the changed config values to the running simulation."""
+        keyMap = {'CAM_ANGLE': 'camAngle', 'MOVE_SPEED': 'moveSpeed', 'TRA_SIZE': 'traMaxSize'}
+        params = {keyMap[key]: val for key, val in configDict.items() if key in keyMap}
+        if params: gv.iMapMgr.setScenarioParams(params)
+        noiseKeys = [key for key in ('NOISE_ON', 'NOISE_SEED', 'NOISE_SCALE') if key in configDict]
+        if noiseKeys:
+            seed = gv.gNoiseSeed if 'NOISE_SEED' in noiseKeys else None
+            gv.iMapMgr.setNoise(gv.gNoiseOnFlg, seed=seed, scale=gv.gNoiseScale)
+        if 'UPDATE_RATE' in configDict:
+            # the timer interval can not be longer than the update rate.
+            self.timer.Start(int(min(PERIODIC, gv.gUpdateRate*1000)))
+        self.statusbar.SetStatusText('Config updated: %s' %str(configDict))
+
+    #--UIFrame---------------------------------------------------------------------
+    def _updateExportState(self):
+        """ Show the background frames export progress in the status bar."""
+        doneNum, totalNum = self.exporter.getProgress()
+        if self.exporter.isFinished():
+            if self.exporter.getError():
+                msg = 'Export error: %s' %str(self.exporter.getError())
+            else:
+                msg = 'Exported %s frames to %s' %(str(doneNum), str(self.exporter.getOutput()))
+            gv.gDebugPrint(msg, logType=gv.LOG_INFO)
+            self.exporter = None
+        else:
+            msg = 'Exporting frames: %s/%s' %(str(doneNum), str(totalNum))
+        self.statusbar.SetStatusText(msg)
 
     #--UIFrame---------------------------------------------------------------------
     def onLoadBlueprint(self, event):
@@ -168,20 +247,62 @@ class UIFrame(wx.Frame):
             "Packet Capture Files (*.jpg;*.png;*.bmp)|*.jpg;*.png;*.bmp", 
             wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
         openFileDialog.ShowModal()
-        gv.gBluePrintFilePath = str(openFileDialog.GetPath())
+        bpPath = str(openFileDialog.GetPath())
         filename = str(openFileDialog.GetFilename())
         openFileDialog.Destroy()
         if filename == "": return
-        if gv.iEDCtrlPanel: gv.iEDCtrlPanel.setBPInfo(filename)
-        gv.gBluePrintBM = wx.Bitmap(gv.gBluePrintFilePath, wx.BITMAP_TYPE_ANY)
-        # Update the viewer background 
-        if gv.iRWMapPnl: 
-            gv.iRWMapPnl.updateBitmap(gv.gBluePrintBM)
+        # Decode the image and build the map matrix in the background, the editor 
+        # control panel will swap the viewer and editor background when finished.
+        if gv.iEDCtrlPanel: gv.iEDCtrlPanel.startMapLoad(bpPath=bpPath, displayName=filename)
+
+    #--UIFrame---------------------------------------------------------------------
+    def onLoadRecord(self, event):
+        """ Handle load a simulation record file to replay with the step through 
+            control buttons.
+        """
+        openFileDialog = wx.FileDialog(self, "Open Simulation Record File", gv.gRecordDir, "", 
+            "Simulation Record Files (*.rcd)|*.rcd", 
+            wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        openFileDialog.ShowModal()
+        recordPath = str(openFileDialog.GetPath())
+        openFileDialog.Destroy()
+        if recordPath == "": return
+        if gv.iMapMgr.loadReplay(recordPath) and gv.iRWMapPnl: 
             gv.iRWMapPnl.updateDisplay()
-        # Update the editor background 
-        if gv.iEDMapPnl:
-            gv.iEDMapPnl.updateBitmap(gv.gBluePrintBM)
-            gv.iEDMapPnl.updateDisplay()
+
+    #--UIFrame---------------------------------------------------------------------
+    def onExportFrames(self, event):
+        """ Export the simulation timeline frames to a PNG sequence or a GIF file 
+            in the background worker pool.
+        """
+        if self.exporter:
+            wx.MessageBox('The frames export is running.', 'Export', wx.OK)
+            return
+        tickNum = gv.iMapMgr.getTimelineTickNum()
+        robotObj = gv.iMapMgr.getRobot()
+        if tickNum == 0 or robotObj is None:
+            wx.MessageBox('No simulation frames to export.', 'Export', wx.OK)
+            return
+        dlg = wx.SingleChoiceDialog(self, 'Select the export format', 'Export', 
+                                    ['PNG Sequence', 'Animated GIF'])
+        if dlg.ShowModal() != wx.ID_OK: 
+            dlg.Destroy()
+            return
+        gifFlg = dlg.GetSelection() == 1
+        dlg.Destroy()
+        scene = {
+            'bluePrint': gv.gBluePrintFilePath,
+            'route': robotObj.getRoutePts(),
+            'enemies': [(enemyObj.getID(), enemyObj.getOrgPos()) for enemyObj in gv.iMapMgr.getEnemy()],
+            'flags': gv.iRWMapPnl.getDisplayFlags()
+        }
+        date_time = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
+        outDir = os.path.join(gv.gExportDir, "Export_%s" %str(date_time))
+        # decode the ticks in the UI thread, the simulation keeps adding ticks to
+        # the timeline while the feeder thread is exporting.
+        tickStates = list(gv.iMapMgr.timeline.iterTicks(0, tickNum))
+        self.exporter = FrameExporter(scene, outDir, scaleImgFlg=gv.gScaleImgFlg)
+        self.exporter.startExport(tickStates, tickNum, gifFlg=gifFlg)
 
     #-----------------------------------------------------------------------------
     def onHelp(self, event):
@@ -200,6 +321,9 @@ class UIFrame(wx.Frame):
                     evt.Veto(True)
                     return
                 self.timer.Stop()
+                gv.iMapMgr.stopRecord()
+                gv.iMapMgr.stopTelemetry(wait=True)
+                self.setProfiling(False)
                 self.Destroy()
         except Exception as err:
             gv.gDebugPrint("Error to close the UI: %s" %str(err), logType=gv.LOG_ERR)
@@ -210,9 +334,18 @@ class MyApp(wx.App):
     def OnInit(self):
         gv.iMainFrame = UIFrame(None, -1, gv.UI_TITLE)
         gv.iMainFrame.Show(True)
+        # command line option: --profile [sample|deterministic]
+        if '--profile' in sys.argv:
+            argIdx = sys.argv.index('--profile') + 1
+            mode = sys.argv[argIdx] if argIdx < len(sys.argv) else 'sample'
+            gv.iMainFrame.setProfiling(True, mode=mode)
+            gv.iRWCtrlPanel.profileCB.SetValue(True)
         return True
 
 #-----------------------------------------------------------------------------
 if __name__ == '__main__':
+    if not gv.bootstrap():
+        print("Program exit!")
+        exit()
     app = MyApp(0)
     app.MainLoop()
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuAvoidance.py
+#
+# Purpose:     This module provides the reactive obstacle avoidance controller of
+#              the robots: a vector field histogram (VFH) built from a 360 degree
+#              multi-beam lidar scan steers the robot around the obstacles while it
+#              still heads to its next route way point. All the robots are steered
+#              together with numpy array operations.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/06
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - Scan: SCAN_BEAMS beams in fixed map degrees (beam k is k*360/SCAN_BEAMS), each
+      beam range is limited to SCAN_RANGE (cast by the map manager <castBeams()>).
+    - Polar histogram: the obstacle density of a sector is ((SCAN_RANGE - dis) /
+      (SCAN_RANGE - SAFE_DIS))^2 clipped to 0~1 (1 if the obstacle is closer than
+      SAFE_DIS), the obstacles are enlarged by the robot size as the max of the
+      neighbour sectors (ENLARGE_NUM each side).
+    - Steer: if the way point is closer than the nearest obstacle in its direction
+      (or no obstacle is scanned in its direction) the robot heads to it directly
+      (same step as no avoidance), else the sectors whose density is lower than
+      BLOCK_DENSITY are the candidates and the one with the lowest cost (way point
+      deviation + TURN_WEIGHT * heading change + DENSITY_WEIGHT * density) is
+      selected, the robot is blocked if there is no candidate. The obstacles closer
+      than REPULSE_DIS also push the steer direction away (REPULSE_GAIN), so the
+      robot planted near a wall leaves the wall instead of sliding on it.
+    - Speed: the step is slowed down (SLOW_DIS, not less than MIN_SPEED_RATIO) when
+      the obstacle in the steer direction is close.
+"""
+
+import numpy as np
+
+SCAN_BEAMS = 36         # scan beams number (360 degree).
+SCAN_RANGE = 80         # scan beam max range (pixel).
+SAFE_DIS = 14           # obstacle closer than this blocks the sector (pixel).
+ENLARGE_NUM = 1         # obstacle enlarge neighbour sectors number each side.
+BLOCK_DENSITY = 0.6     # sectors with higher density are blocked.
+TURN_WEIGHT = 0.3       # heading change cost weight.
+DENSITY_WEIGHT = 60     # density cost weight (degree per density).
+REPULSE_DIS = 20        # obstacles closer than this push the robot away (pixel).
+REPULSE_GAIN = 1.0      # repulse push weight (steer direction is 1).
+SLOW_DIS = 40           # slow down when the steer direction obstacle is closer.
+MIN_SPEED_RATIO = 0.3   # min speed ratio when slowing down.
+
+#-----------------------------------------------------------------------------
+def _angleDiff(degA, degB):
+    """ Return the absolute difference (0~180) of the degree arrays."""
+    return np.abs((degA - degB + 180) % 360 - 180)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class AvoidController(object):
+    """ Vector field histogram obstacle avoidance controller of the robots."""
+    def __init__(self, beamNum=SCAN_BEAMS, scanRange=SCAN_RANGE, safeDis=SAFE_DIS):
+        """ Init example : avoider = AvoidController()
+            Args:
+                beamNum (int, optional): scan beams number. Defaults to SCAN_BEAMS.
+                scanRange (int, optional): scan beam max range. Defaults to SCAN_RANGE.
+                safeDis (int, optional): sector blocking distance. Defaults to SAFE_DIS.
+        """
+        self.beamNum = beamNum
+        self.scanRange = scanRange
+        self.safeDis = safeDis
+        self.beamStep = 360.0 / beamNum
+        self.beamDegs = np.arange(beamNum) * self.beamStep
+        beamRad = np.radians(self.beamDegs)
+        self.beamVec = np.stack((np.sin(beamRad), -np.cos(beamRad)), axis=1)
+
+    #-----------------------------------------------------------------------------
+    def getScanBeams(self, robotNum):
+        """ Return the scan beams degree list and the (robotNum*beamNum, ) beams max
+            range array of all the robots (robot by robot).
+        """
+        degList = [int(round(deg)) for deg in self.beamDegs] * robotNum
+        return degList, np.full(robotNum * self.beamNum, self.scanRange, dtype=np.int64)
+
+    def _enlarge(self, valArr, func):
+        """ Apply <func> (np.maximum or np.minimum) over the neighbour sectors."""
+        resultArr = valArr
+        for shift in range(1, ENLARGE_NUM + 1):
+            resultArr = func(resultArr, func(np.roll(valArr, shift, axis=1), np.roll(valArr, -shift, axis=1)))
+        return resultArr
+
+    def buildHistogram(self, scanArr):
+        """ Build the polar obstacle histogram.
+            Args:
+                scanArr (numpy.ndarray): (n, beamNum) scan range, 0 is no reading.
+            Returns:
+                tuple: ((n, beamNum) enlarged obstacle density, (n, beamNum) enlarged
+                    nearest obstacle distance)
+        """
+        disArr = np.where(scanArr > 0, scanArr, self.scanRange).astype(np.float64)
+        densArr = np.clip((self.scanRange - disArr) / (self.scanRange - self.safeDis), 0, 1)**2
+        densArr[disArr < self.safeDis] = 1
+        return self._enlarge(densArr, np.maximum), self._enlarge(disArr, np.minimum)
+
+    #-----------------------------------------------------------------------------
+    def steer(self, scanArr, posArr, tgtArr, headDegArr):
+        """ Calculate the steer direction of all the robots.
+            Args:
+                scanArr (numpy.ndarray): (n, beamNum) scan range, 0 is no reading.
+                posArr (numpy.ndarray): (n, 2) robots' position.
+                tgtArr (numpy.ndarray): (n, 2) robots' target way point.
+                headDegArr (numpy.ndarray): (n, ) robots' head direction degree.
+            Returns:
+                tuple: ((n, 2) float unit steer direction, (n, ) speed ratio 0~1, (n, )
+                    bool blocked flag)
+        """
+        robotNum = len(posArr)
+        rowIdx = np.arange(robotNum)
+        densArr, nearArr = self.buildHistogram(np.asarray(scanArr).reshape(robotNum, self.beamNum))
+        diffArr = np.asarray(tgtArr, dtype=np.float64) - np.asarray(posArr, dtype=np.float64)
+        goalDis = np.hypot(diffArr[:, 0], diffArr[:, 1])
+        goalDeg = (180 - np.degrees(np.arctan2(diffArr[:, 0], diffArr[:, 1]))) % 360
+        # candidate sectors cost.
+        costArr = _angleDiff(self.beamDegs[None, :], goalDeg[:, None]) \
+            + TURN_WEIGHT * _angleDiff(self.beamDegs[None, :], np.asarray(headDegArr)[:, None]) \
+            + DENSITY_WEIGHT * densArr
+        costArr[densArr >= BLOCK_DENSITY] = np.inf
+        bestIdx = costArr.argmin(axis=1)
+        blockArr = np.isinf(costArr[rowIdx, bestIdx])
+        # the way point is reached before the obstacle in its direction (or there is
+        # no obstacle in the scan range of its direction).
+        goalIdx = np.rint(goalDeg / self.beamStep).astype(np.int64) % self.beamNum
+        goalNear = nearArr[rowIdx, goalIdx]
+        directArr = (goalDis < goalNear) | (goalNear >= self.scanRange)
+        steerDeg = np.where(directArr, goalDeg, self.beamDegs[bestIdx])
+        steerIdx = np.where(directArr, goalIdx, bestIdx)
+        radArr = np.radians(steerDeg)
+        dirArr = np.stack((np.sin(radArr), -np.cos(radArr)), axis=1)
+        # push away from the close obstacles.
+        scanArr = np.asarray(scanArr, dtype=np.float64).reshape(robotNum, self.beamNum)
+        pushArr = np.where(scanArr > 0, np.clip(1 - scanArr / REPULSE_DIS, 0, 1), 0) * REPULSE_GAIN
+        pushVec = -pushArr @ self.beamVec
+        dirArr = np.where(directArr[:, None], dirArr, dirArr + pushVec)
+        dirArr /= np.maximum(np.hypot(dirArr[:, 0], dirArr[:, 1]), 1e-6)[:, None]
+        speedArr = np.where(directArr, 1.0, np.clip(nearArr[rowIdx, steerIdx] / SLOW_DIS, MIN_SPEED_RATIO, 1))
+        blockArr &= ~directArr
+        return dirArr, np.where(blockArr, 0.0, speedArr), blockArr
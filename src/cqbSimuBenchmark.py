@@ -0,0 +1,381 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuBenchmark.py
+#
+# Purpose:     This module provides the benchmark functions to track the
+#              performance regressions of the simulator modules: the module import
+#              time (and the import side effects) and the map / sensor hot paths,
+#              the results are compared with the stored baseline.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/27
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    Every module import is measured in a new python process (so the result does
+    not depend on the modules already imported), the child process also reports
+    the import side effects: the printed text, the sys.path change and the files
+    created in the source folder.
+    The hot path benchmarks run headless with fixed inputs (bundled blue print,
+    fixed robot position, seeded enemy positions), every case reports the min and
+    median time per call in micro seconds. A case fails if its min time is slower
+    than the baseline by more than the tolerance ratio.
+    Usage: python cqbSimuBenchmark.py [import|hotpath|all] [save|saveall]
+        - save: add the new hot path cases to the baseline, the existing cases
+          keep their baseline values (a slower case is not hidden).
+        - saveall: save the whole hot path result as the new baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+from statistics import median
+
+dirpath = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(dirpath, 'benchmark', 'hotpathBaseline.json')
+TOLERANCE = 0.5     # fail if the case is 50% slower than the baseline.
+BENCH_TIME = 0.05   # min measure time (sec) of one repeat.
+ROBOT_POS = (450, 300)
+BP_NAMES = ('BluePrintImge1.jpg', 'BluePrintImge2.png')
+SYN_SIZES = ((450, 300), (900, 600), (1800, 1200), (3600, 2400))
+ENEMY_NUMS = (1, 10, 100, 1000, 10000)
+SQUAD_NUMS = (1, 8, 64)     # robot number of the squad tick cases.
+MOVE_ENEMY_NUMS = (100, 1000, 10000)
+SWEEP_NUMS = (1, 64, 1024)     # robot step number of the collision sweep cases.
+
+# max import time (ms) of the simulator core modules, the third party libs
+# (numpy, PIL) import time is included.
+IMPORT_LIMITS = {
+    'cqbSimuGlobal': 20,
+    'cqbSimuTimeline': 20,
+    'cqbSimuRecorder': 20,
+    'cqbSimuScenario': 300,
+    'cqbSimuTelemetry': 300,
+    'cqbSimuMapMgr': 500,
+}
+
+IMPORT_SCRIPT = """
+import os, sys, io, time, json
+sys.path.insert(0, %r)
+pathBefore = list(sys.path)
+filesBefore = set(os.listdir(%r))
+out, sys.stdout = sys.stdout, io.StringIO()
+startT = time.perf_counter()
+import %s
+useT = time.perf_counter() - startT
+printed, sys.stdout = sys.stdout.getvalue(), out
+result = {
+    'timeMs': useT * 1000,
+    'printed': printed,
+    'pathChanged': sys.path != pathBefore,
+    'newFiles': sorted(set(os.listdir(%r)) - filesBefore - {'__pycache__'})
+}
+print(json.dumps(result))
+"""
+
+#-----------------------------------------------------------------------------
+def benchImport(moduleName, repeat=5):
+    """ Measure the import time of a module in <repeat> new processes.
+        Returns:
+            dict: {'module', 'minMs', 'medianMs', 'sideEffects': list of str}
+    """
+    script = IMPORT_SCRIPT %(dirpath, dirpath, moduleName, dirpath)
+    times, sideEffects = [], []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', script], cwd=dirpath,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError("Import %s failed: %s" %(moduleName, proc.stderr.strip()))
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(result['timeMs'])
+        if result['printed']: sideEffects.append('print: %s' %result['printed'].strip()[:80])
+        if result['pathChanged']: sideEffects.append('sys.path changed')
+        if result['newFiles']: sideEffects.append('files created: %s' %str(result['newFiles']))
+    return {
+        'module': moduleName,
+        'minMs': round(min(times), 2),
+        'medianMs': round(median(times), 2),
+        'sideEffects': sorted(set(sideEffects))
+    }
+
+#-----------------------------------------------------------------------------
+def runImportBench(repeat=5):
+    """ Run the import benchmark of all the modules in IMPORT_LIMITS, return the
+        result list and the list of the failed check messages.
+    """
+    results, failures = [], []
+    for moduleName, limit in IMPORT_LIMITS.items():
+        result = benchImport(moduleName, repeat=repeat)
+        results.append(result)
+        if result['minMs'] > limit:
+            failures.append("%s import %sms > limit %sms" %(moduleName, result['minMs'], limit))
+        if result['sideEffects']:
+            failures.append("%s import side effects: %s" %(moduleName, result['sideEffects']))
+    return results, failures
+
+#-----------------------------------------------------------------------------
+def timeCall(func, repeat=5):
+    """ Measure the time of one func() call, the loop number of every repeat is
+        calibrated to run at least BENCH_TIME sec.
+        Returns:
+            dict: {'minUs', 'medianUs', 'loops'}
+    """
+    startT = time.perf_counter()
+    func()  # warm up and calibrate.
+    oneT = max(time.perf_counter() - startT, 1e-7)
+    loops = max(1, int(BENCH_TIME / oneT))
+    times = []
+    for _ in range(repeat):
+        startT = time.perf_counter()
+        for _ in range(loops): func()
+        times.append((time.perf_counter() - startT) / loops)
+    return {
+        'minUs': round(min(times)*1e6, 2),
+        'medianUs': round(median(times)*1e6, 2),
+        'loops': loops
+    }
+
+#-----------------------------------------------------------------------------
+def _drawSynBluePrint(filePath, size):
+    """ Draw a synthetic blue print: rooms grid with door gaps on the walls."""
+    from PIL import Image, ImageDraw
+    w, h = size
+    img = Image.new('RGB', size, (255, 255, 255))
+    dc = ImageDraw.Draw(img)
+    roomSize, door = 100, 30
+    for x in range(0, w, roomSize):
+        for y in range(0, h, roomSize):
+            dc.line((x, y, x, y + (roomSize - door)//2), fill=(0, 0, 0), width=3)
+            dc.line((x, y + (roomSize + door)//2, x, y + roomSize), fill=(0, 0, 0), width=3)
+            dc.line((x, y, x + roomSize, y), fill=(0, 0, 0), width=3)
+    img.save(filePath)
+
+#-----------------------------------------------------------------------------
+def _buildMapMgr(enemyNum=3, robotNum=1):
+    """ Build a headless map manager with the bundled blue print, the robot at
+        ROBOT_POS, <robotNum>-1 more robots with seeded random routes and 
+        <enemyNum> seeded random enemies.
+    """
+    import cqbSimuGlobal as gv
+    from cqbSimuMapMgr import MapMgr
+    gv.gBluePrintFilePath = os.path.join(gv.gBluePrintDir, BP_NAMES[1])
+    mapMgr = MapMgr()
+    mapMgr.initMapMatix()
+    mapMgr.initRobot(list(ROBOT_POS))
+    for pt in ((300, 200), (600, 250), (500, 450), (300, 400)):
+        mapMgr.robot.addWayPt(list(pt))
+    rand = random.Random(0)
+    for _ in range(robotNum-1):
+        robotObj = mapMgr.addRobot([rand.randint(100, 800), rand.randint(100, 500)])
+        for _ in range(4): robotObj.addWayPt([rand.randint(100, 800), rand.randint(100, 500)])
+    mapMgr.robot = mapMgr.robots[0]
+    for _ in range(enemyNum):
+        mapMgr.addEnemy([rand.randint(10, 890), rand.randint(10, 590)])
+    for flgFun in (mapMgr.enableSonar, mapMgr.setLidarOn, mapMgr.setCamOn, 
+                   mapMgr.setCamDetectionOn):
+        flgFun(True)
+    mapMgr.getClearMap()    # build the collision clearance map before the timing.
+    return mapMgr
+
+#-----------------------------------------------------------------------------
+def benchPaint(mapMgr, results, repeat=5):
+    """ Measure the viewer and editor map panels paint cost in an offscreen
+        memory DC, skipped if wxPython (or the display) is not available.
+    """
+    try:
+        import wx
+        app = wx.App(False)
+    except Exception as err:
+        results['paint'] = {'skipped': str(err)}
+        return
+    import cqbSimuGlobal as gv
+    import cqbSimuMapPanel as plMap
+    gv.iMapMgr = mapMgr
+    frame = wx.Frame(None)
+    bitmap = wx.Bitmap(900, 600)
+    bgBmp = wx.Bitmap(gv.gBluePrintFilePath, wx.BITMAP_TYPE_ANY)
+    dc = wx.MemoryDC(bitmap)
+    for name, panel, drawFuns in (
+            ('paintViewer', plMap.PanelRealworldMap(frame), ('_drawBackground', '_drawItems')),
+            ('paintEditor', plMap.PanelEditorMap(frame), ('_drawBG', '_drawItems'))):
+        panel.updateBitmap(bgBmp)
+        panel.defaultPen = dc.GetPen()
+        funs = [getattr(panel, funName) for funName in drawFuns]
+        def paint(): 
+            for fun in funs: fun(dc)
+        results[name] = timeCall(paint, repeat=repeat)
+    dc.SelectObject(wx.NullBitmap)
+    frame.Destroy()
+    app.Destroy()
+
+#-----------------------------------------------------------------------------
+def runHotpathBench(repeat=5, paintFlg=True):
+    """ Run the map and sensor hot path benchmarks, return the result dict
+        {case name: {'minUs', 'medianUs', 'loops'}}.
+    """
+    import cqbSimuGlobal as gv
+    results = {}
+    mapMgr = _buildMapMgr()
+    # map matrix build: bundled and synthetic blue prints.
+    for bpName in BP_NAMES:
+        gv.gBluePrintFilePath = os.path.join(gv.gBluePrintDir, bpName)
+        results['initMapMatix_%s' %bpName] = timeCall(mapMgr.initMapMatix, repeat=repeat)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for w, h in SYN_SIZES:
+            gv.gBluePrintFilePath = os.path.join(tmpDir, 'syn_%dx%d.png' %(w, h))
+            _drawSynBluePrint(gv.gBluePrintFilePath, (w, h))
+            results['initMapMatix_syn%dx%d' %(w, h)] = timeCall(mapMgr.initMapMatix, repeat=repeat)
+    mapMgr = _buildMapMgr()
+    # beam cast at 360 angles.
+    def beams():
+        for degree in range(0, 360, 1): mapMgr._calculateBeamTouch(ROBOT_POS, degree)
+    results['calculateBeamTouch_x360'] = timeCall(beams, repeat=repeat)
+    results['calsonarData'] = timeCall(mapMgr.calsonarData, repeat=repeat)
+    # camera enemy detection with different enemy number.
+    for enemyNum in ENEMY_NUMS:
+        detMgr = _buildMapMgr(enemyNum=enemyNum)
+        detMgr.calLidarDetect()
+        detMgr.calCameDetect()
+        results['checkCamEnemyDetect_%d' %enemyNum] = timeCall(detMgr.checkCamEnemyDetect, repeat=repeat)
+    # full simulation tick, the robot is reset to the start position every time.
+    def tick():
+        mapMgr.robot.crtPos = list(ROBOT_POS)
+        mapMgr.periodic()
+    mapMgr.startMove(True)
+    results['periodic'] = timeCall(tick, repeat=repeat)
+    # same tick with the sensors noise models.
+    mapMgr.setNoise(True, seed=0)
+    results['periodic_noise'] = timeCall(tick, repeat=repeat)
+    mapMgr.setNoise(False)
+    mapMgr.startMove(False)
+    # moving enemies, the motion models are assigned in turn.
+    from cqbSimuEnemyMotion import MOTION_TYPES
+    for enemyNum in MOVE_ENEMY_NUMS:
+        moveMgr = _buildMapMgr(enemyNum=enemyNum)
+        for i, enemyObj in enumerate(moveMgr.getEnemy()):
+            enemyObj.setMotion(MOTION_TYPES[i % len(MOTION_TYPES)], patrolPts=[list(ROBOT_POS)])
+        results['moveEnemies_%d' %enemyNum] = timeCall(moveMgr.moveEnemies, repeat=repeat)
+    # squad tick, all the robots are reset to the start position every time.
+    for robotNum in SQUAD_NUMS:
+        squadMgr = _buildMapMgr(enemyNum=10, robotNum=robotNum)
+        # build all the enemies' sound fields, the tick only builds two of them.
+        squadMgr.getSoundModel().updateSources(squadMgr.getEnemyPosArr(), buildMax=10)
+        def squadTick():
+            for robotObj in squadMgr.robots: robotObj.resetCrtPos()
+            squadMgr.startMove(True)
+            squadMgr.periodic()
+        results['periodic_squad_%d' %robotNum] = timeCall(squadTick, repeat=repeat)
+    # robot wall collision: clearance map build and the robot steps sweep.
+    from cqbSimuCollision import buildClearanceMap, sweepMove
+    results['buildClearanceMap'] = timeCall(lambda: buildClearanceMap(mapMgr.mapMatrix), repeat=repeat)
+    clearMap = mapMgr.getClearMap()
+    rand = random.Random(0)
+    for stepNum in SWEEP_NUMS:
+        startList = [[rand.randint(100, 800), rand.randint(100, 500)] for _ in range(stepNum)]
+        endList = [[x + rand.randint(-10, 10), y + rand.randint(-10, 10)] for x, y in startList]
+        results['sweepMove_%d' %stepNum] = timeCall(lambda: sweepMove(clearMap, startList, endList), 
+                                                    repeat=repeat)
+    # route planner: grid build and the default robot route replanning.
+    from cqbSimuPlanner import RoutePlanner
+    results['initRoutePlanner'] = timeCall(lambda: RoutePlanner(clearMap), repeat=repeat)
+    planner = mapMgr.getPlanner()
+    wayPts = mapMgr.robot.getRoutePts()
+    results['planRoute'] = timeCall(lambda: planner.planRoute(wayPts), repeat=repeat)
+    # navigation graph route query (the graph is not saved to the cache folder).
+    from cqbSimuNavGraph import getNavGraph
+    navGraph = getNavGraph(mapMgr.mapMatrix, planner)
+    results['planRoute_navGraph'] = timeCall(lambda: planner.planRoute(wayPts, navGraph=navGraph), 
+                                             repeat=repeat)
+    # explored area update, the pose check is reset so the beams are cast every time.
+    exploredMap = mapMgr.getExploredMap()
+    def explored():
+        exploredMap.lastKey = None
+        mapMgr.updateExplored()
+    results['updateExplored'] = timeCall(explored, repeat=repeat)
+    # wall aware sound: one distance field build and the cached fields query.
+    from cqbSimuSound import buildDistField
+    soundModel = mapMgr.getSoundModel()
+    srcIdx = int(soundModel._toCells(mapMgr.getEnemyPosArr()[:1])[0])
+    results['buildDistField'] = timeCall(lambda: buildDistField(soundModel.passFlat, soundModel.width, 
+                                                                srcIdx), repeat=repeat)
+    results['calSoundDir'] = timeCall(mapMgr.calSoundDir, repeat=repeat)
+    # obstacle avoidance: the multi-beam scan and the steer of a squad.
+    avoidMgr = _buildMapMgr(enemyNum=1, robotNum=8)
+    avoidMgr.checkObstacle()
+    results['checkObstacle_8'] = timeCall(avoidMgr.checkObstacle, repeat=repeat)
+    posArr, degList = avoidMgr._getSquadPose()
+    scanArr = avoidMgr.getSquadData()['scan']
+    results['avoidSteer_8'] = timeCall(lambda: avoidMgr.avoider.steer(scanArr, posArr, posArr + 50, degList), 
+                                       repeat=repeat)
+    if paintFlg: benchPaint(mapMgr, results, repeat=repeat)
+    return results
+
+#-----------------------------------------------------------------------------
+def compareBaseline(results, baseline, tolerance=TOLERANCE):
+    """ Compare the result with the baseline, return the list of the regression
+        messages (the cases not in the baseline are ignored).
+    """
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name, None)
+        if not base or 'minUs' not in base or 'minUs' not in result: continue
+        ratio = result['minUs'] / max(base['minUs'], 1e-3)
+        if ratio > 1 + tolerance:
+            failures.append("%s: %sus vs baseline %sus (x%.2f)" %(name, result['minUs'], 
+                                                                 base['minUs'], ratio))
+    return failures
+
+def getEnvInfo():
+    import numpy as np
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    suite = argv[0] if argv else 'all'
+    saveFlg = 'save' in argv[1:] or 'saveall' in argv[1:]
+    output = {'env': getEnvInfo()}
+    failures = []
+    if suite in ('import', 'all'):
+        output['import'], importFailures = runImportBench()
+        failures += importFailures
+    if suite in ('hotpath', 'all'):
+        output['hotpath'] = runHotpathBench()
+        baseline = None
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, 'r') as fh:
+                baseline = json.load(fh)
+        if saveFlg:
+            if baseline is None or 'saveall' in argv[1:]:
+                baseline = {'env': output['env'], 'hotpath': output['hotpath']}
+            else:
+                for name, result in output['hotpath'].items():
+                    baseline['hotpath'].setdefault(name, result)
+            folder = os.path.dirname(BASELINE_PATH)
+            if not os.path.exists(folder): os.makedirs(folder)
+            with open(BASELINE_PATH, 'w') as fh:
+                json.dump(baseline, fh, indent=4)
+        elif baseline:
+            failures += compareBaseline(output['hotpath'], baseline['hotpath'])
+        else:
+            failures.append("Baseline file %s not found, run with 'save' first." %BASELINE_PATH)
+    output['failures'] = failures
+    print(json.dumps(output, indent=4))
+    for msg in failures: print("FAIL: %s" %msg, file=sys.stderr)
+    return 1 if failures else 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
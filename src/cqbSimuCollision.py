@@ -0,0 +1,174 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuCollision.py
+#
+# Purpose:     This module provides the robot wall collision check: a clearance
+#              map (distance from every map cell to the nearest wall) is built once
+#              per map matrix, then the robots' move steps are swept against the
+#              clearance inflated by the robot radius and the blocked steps slide
+#              along the wall.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/30
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The clearance map is a truncated euclidean distance transform of the map matrix
+    (numpy only, no scipy): the vertical distance to the nearest wall is scanned
+    row by row for all the columns, then the squared distance of every cell is the
+    min of (dx^2 + colDis^2) of the cells in the same row within the max distance.
+    The map border is a wall: the cells out of the map count as wall cells in both
+    passes, so a robot can not be swept off the map.
+    A robot (circle with ROBOT_RADIUS) can stand on the cells whose clearance is
+    not less than the radius, so the grid does not need to be inflated again.
+    The sweep check of a move step:
+    - If the start clearance minus the radius is larger than the step length, the
+      whole step is free (the clearance changes at most 1 pixel per pixel), no
+      sample is needed, which is the usual case in the rooms' open area.
+    - Else the step is sampled 1 per pixel, the robot stops at the last free sample.
+    - The blocked step's remaining part is projected on the wall tangent (the wall
+      normal is the clearance gradient at the contact point) and swept again, so
+      the robot slides along the wall instead of sticking on it.
+    A robot already closer to the wall than the radius (planted near the wall) can
+    still move as long as the step does not get closer to the wall.
+"""
+
+import math
+import numpy as np
+
+ROBOT_RADIUS = 8        # robot body radius (pixel).
+CLEAR_MAX = 32          # clearance map truncate distance (pixel).
+
+#-----------------------------------------------------------------------------
+def buildClearanceMap(mapMatrix, maxDis=CLEAR_MAX):
+    """ Build the clearance map of the map matrix.
+        Args:
+            mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+            maxDis (int, optional): truncate distance. Defaults to CLEAR_MAX.
+        Returns:
+            numpy.ndarray: (rows, cols) float32 distance from the cell to the nearest
+                wall cell or the map border (0 on the wall, 1 on the map edge cells, 
+                <maxDis> if no wall is within the distance).
+    """
+    rows, cols = mapMatrix.shape
+    wallArr = np.asarray(mapMatrix) == 1
+    farVal = np.float32(maxDis + 1)
+    # vertical distance to the nearest wall in the same column (down and up scan),
+    # the scans start from the wall row out of the map.
+    colDis = np.empty((rows, cols), dtype=np.float32)
+    runArr = np.zeros(cols, dtype=np.float32)
+    for y in range(rows):
+        runArr = np.where(wallArr[y], 0, np.minimum(runArr + 1, farVal))
+        colDis[y] = runArr
+    runArr = np.zeros(cols, dtype=np.float32)
+    for y in range(rows-1, -1, -1):
+        runArr = np.where(wallArr[y], 0, np.minimum(runArr + 1, farVal))
+        np.minimum(colDis[y], runArr, out=colDis[y])
+    # horizontal pass: squared distance = min(dx^2 + colDis[x+dx]^2).
+    colSq = colDis**2
+    edgeDis = np.minimum(np.arange(1, cols+1), np.arange(cols, 0, -1)).astype(np.float32)
+    disSq = np.minimum(colSq, edgeDis**2)   # the wall columns out of the map.
+    for dx in range(1, min(maxDis, cols-1) + 1):
+        dxSq = np.float32(dx*dx)
+        np.minimum(disSq[:, dx:], colSq[:, :-dx] + dxSq, out=disSq[:, dx:])
+        np.minimum(disSq[:, :-dx], colSq[:, dx:] + dxSq, out=disSq[:, :-dx])
+    return np.minimum(np.sqrt(disSq), np.float32(maxDis))
+
+#-----------------------------------------------------------------------------
+def _lookupClear(clearMap, ptArr):
+    """ Return the clearance of the integer points (0 if out of the map)."""
+    rows, cols = clearMap.shape
+    xArr, yArr = ptArr[..., 0], ptArr[..., 1]
+    inMap = (xArr >= 0) & (xArr < cols) & (yArr >= 0) & (yArr < rows)
+    valArr = np.zeros(xArr.shape, dtype=np.float32)
+    valArr[inMap] = clearMap[yArr[inMap], xArr[inMap]]
+    return valArr
+
+def _clearNormal(clearMap, ptArr):
+    """ Return the (n, 2) unit wall normals (clearance gradient, pointing away from
+        the wall) at the integer points, (0, 0) if the clearance is flat.
+    """
+    rows, cols = clearMap.shape
+    xArr = np.clip(ptArr[:, 0], 1, cols-2)
+    yArr = np.clip(ptArr[:, 1], 1, rows-2)
+    gradArr = np.stack((clearMap[yArr, xArr+1] - clearMap[yArr, xArr-1],
+                        clearMap[yArr+1, xArr] - clearMap[yArr-1, xArr]), axis=1)
+    normArr = np.hypot(gradArr[:, 0], gradArr[:, 1])
+    return np.where(normArr[:, None] > 1e-6, gradArr / np.maximum(normArr, 1e-6)[:, None], 0)
+
+def _sweep(clearMap, startArr, endArr, radius):
+    """ Sweep the straight steps from the int start to the end positions, return
+        the (n, 2) int reached positions and the (n, ) bool blocked flags.
+    """
+    diffArr = endArr - startArr
+    lenArr = np.hypot(diffArr[:, 0], diffArr[:, 1])
+    startClear = _lookupClear(clearMap, startArr)
+    posArr = np.rint(endArr).astype(np.int64)
+    blockArr = np.zeros(len(startArr), dtype=bool)
+    # the steps which can not reach a wall do not need the samples.
+    chkIdx = np.nonzero(startClear - radius - 1 < lenArr)[0]
+    if chkIdx.size == 0: return posArr, blockArr
+    sampleNum = max(1, int(math.ceil(lenArr[chkIdx].max())))
+    ratios = np.arange(1, sampleNum+1) / sampleNum
+    ptArr = np.rint(startArr[chkIdx, None, :] + diffArr[chkIdx, None, :]*ratios[None, :, None]).astype(np.int64)
+    limitArr = np.minimum(radius, startClear[chkIdx])
+    hitArr = _lookupClear(clearMap, ptArr) < limitArr[:, None]
+    hitFlg = hitArr.any(axis=1)
+    firstIdx = hitArr.argmax(axis=1)
+    lastFree = np.where(firstIdx[:, None] > 0, ptArr[np.arange(chkIdx.size), firstIdx-1],
+                        startArr[chkIdx].astype(np.int64))
+    posArr[chkIdx[hitFlg]] = lastFree[hitFlg]
+    blockArr[chkIdx[hitFlg]] = True
+    return posArr, blockArr
+
+#-----------------------------------------------------------------------------
+def checkSegmentFree(clearMap, startArr, endArr, radius=ROBOT_RADIUS):
+    """ Check whether the robot can move along the straight segments (sampled 1 per
+        pixel). A segment end already closer to the wall than the radius lowers the
+        clearance limit near the end (the limit goes up 1 per pixel away from it).
+        Returns:
+            numpy.ndarray: (n, ) bool array, True if the segment is free.
+    """
+    startArr = np.asarray(startArr, dtype=np.int64).reshape(-1, 2)
+    endArr = np.asarray(endArr, dtype=np.int64).reshape(-1, 2)
+    if len(startArr) == 0: return np.zeros(0, dtype=bool)
+    diffArr = endArr - startArr
+    lenArr = np.hypot(diffArr[:, 0], diffArr[:, 1])
+    sampleNum = max(1, int(math.ceil(lenArr.max())))
+    ratios = np.arange(sampleNum+1) / sampleNum
+    ptArr = np.rint(startArr[:, None, :] + diffArr[:, None, :]*ratios[None, :, None]).astype(np.int64)
+    disArr = lenArr[:, None] * ratios[None, :]
+    limitArr = np.minimum(_lookupClear(clearMap, startArr)[:, None] + disArr,
+                          _lookupClear(clearMap, endArr)[:, None] + lenArr[:, None] - disArr)
+    return ~(_lookupClear(clearMap, ptArr) < np.minimum(limitArr, radius)).any(axis=1)
+
+#-----------------------------------------------------------------------------
+def sweepMove(clearMap, startArr, endArr, radius=ROBOT_RADIUS):
+    """ Move the robots from the start to the end positions with the wall collision
+        check and the slide along the wall resolution, all the robots are swept in
+        one numpy pass.
+        Args:
+            clearMap (numpy.ndarray): clearance map from <buildClearanceMap()>.
+            startArr (array like): (n, 2) int robots' current positions.
+            endArr (array like): (n, 2) robots' step end positions.
+            radius (int, optional): robot radius. Defaults to ROBOT_RADIUS.
+        Returns:
+            tuple: ((n, 2) int64 array of the robots' new positions, (n, ) bool array,
+                True if the robot's step is blocked by the wall).
+    """
+    startArr = np.asarray(startArr, dtype=np.int64).reshape(-1, 2)
+    endArr = np.asarray(endArr, dtype=np.float64).reshape(-1, 2)
+    posArr, blockArr = _sweep(clearMap, startArr, endArr, radius)
+    idxArr = np.nonzero(blockArr)[0]
+    if idxArr.size == 0: return posArr, blockArr
+    # slide: remove the remaining step's part which goes into the wall.
+    contactArr = posArr[idxArr]
+    normalArr = _clearNormal(clearMap, contactArr)
+    remainArr = endArr[idxArr] - contactArr
+    intoArr = np.minimum((remainArr*normalArr).sum(axis=1), 0)
+    slideArr = remainArr - intoArr[:, None]*normalArr
+    posArr[idxArr] = _sweep(clearMap, contactArr, contactArr + slideArr, radius)[0]
+    return posArr, blockArr
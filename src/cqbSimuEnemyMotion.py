@@ -0,0 +1,213 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuEnemyMotion.py
+#
+# Purpose:     This module provides the enemies motion models (patrol route, random
+#              wander constrained by the map matrix and flee from the robots). The
+#              motion state of all the enemies is kept in numpy arrays and every
+#              model is evaluated for all its enemies in one pass per tick.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/29
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    <EnemyMotion.load()> builds the state arrays from the <AgentEnemy> obj list and
+    rebinds every enemy's current position to a row view of the position array, so
+    the UI reads the moved positions without any per-tick copy. The patrol target
+    index and the wander heading only live in the arrays while the simulation is
+    running, <storeState()> copies them back to the enemy objs (before a snapshot
+    or a enemy list change).
+    - static : the enemy does not move.
+    - patrol : move along the patrol route (org position first) in a loop, the
+      route is planned by the user so the walls are not checked.
+    - wander : random walk, the heading is changed by a normal distributed turn
+      every tick, a new random heading is picked if the next step hits a wall.
+    - flee   : move away from the nearest robot if it is in the flee range.
+    The wander and flee steps are swept through the map matrix (1 sample per pixel),
+    a blocked step tries the x-only and y-only part to slide along the wall.
+"""
+
+import math
+import numpy as np
+
+MOTION_TYPES = ('static', 'patrol', 'wander', 'flee')
+STATIC_MD, PATROL_MD, WANDER_MD, FLEE_MD = range(len(MOTION_TYPES))
+DEF_SPEED = 3           # enemy default move speed (pixel per tick).
+FLEE_RANGE = 150        # enemy flees if a robot is closer than the range (pixel).
+WANDER_TURN = 0.5       # wander heading change standard deviation (radian per tick).
+
+#-----------------------------------------------------------------------------
+def checkPathFree(mapMatrix, startArr, endArr):
+    """ Check whether the straight paths from the start to the end positions are
+        free (no wall and in the map), all paths are sampled in one numpy pass.
+        Args:
+            mapMatrix (numpy.ndarray): environment map matrix.
+            startArr (numpy.ndarray): (n, 2) path start positions.
+            endArr (numpy.ndarray): (n, 2) path end positions.
+        Returns:
+            numpy.ndarray: (n, ) bool array, True if the path is free.
+    """
+    if len(startArr) == 0: return np.zeros(0, dtype=bool)
+    rows, cols = mapMatrix.shape
+    sampleNum = max(1, int(math.ceil(np.abs(endArr - startArr).max())))
+    ratios = np.arange(1, sampleNum+1) / sampleNum
+    ptArr = startArr[:, None, :] + (endArr - startArr)[:, None, :]*ratios[None, :, None]
+    xArr = ptArr[..., 0].astype(np.int64)
+    yArr = ptArr[..., 1].astype(np.int64)
+    hitArr = (xArr <= 0) | (xArr >= cols) | (yArr <= 0) | (yArr >= rows)
+    inMap = ~hitArr
+    hitArr[inMap] = mapMatrix[yArr[inMap], xArr[inMap]] == 1
+    return ~hitArr.any(axis=1)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class EnemyMotion(object):
+    """ Array-backed motion state of all the enemies."""
+    def __init__(self, seed=None, fleeRange=FLEE_RANGE, wanderTurn=WANDER_TURN):
+        """ Init example : motion = EnemyMotion(seed=1)
+            Args:
+                seed (int, optional): random seed of the wander model. Defaults to None.
+                fleeRange (int, optional): flee trigger distance. Defaults to FLEE_RANGE.
+                wanderTurn (float, optional): wander turn std. Defaults to WANDER_TURN.
+        """
+        self.rand = np.random.default_rng(seed)
+        self.fleeRange = fleeRange
+        self.wanderTurn = wanderTurn
+        self.enemyList = []
+        self.dirty = True       # flag to identify whether the enemy list is changed.
+        self._initArrays(0, 1)
+
+    #-----------------------------------------------------------------------------
+    def _initArrays(self, num, routeSize):
+        self.posArr = np.zeros((num, 2))
+        self.modeArr = np.zeros(num, dtype=np.int8)
+        self.speedArr = np.zeros(num)
+        self.headingArr = np.zeros(num)
+        self.routeArr = np.zeros((num, routeSize, 2))   # patrol routes padded to the same size.
+        self.routeLenArr = np.ones(num, dtype=np.int64)
+        self.tgtIdxArr = np.zeros(num, dtype=np.int64)
+
+    #-----------------------------------------------------------------------------
+    def load(self, enemyList):
+        """ Build the state arrays from the <AgentEnemy> obj list (the array row
+            order is the list order).
+        """
+        self.storeState()
+        num = len(enemyList)
+        routeSize = max([len(enemyObj.getPatrolPts()) for enemyObj in enemyList] + [0]) + 1
+        self._initArrays(num, routeSize)
+        for i, enemyObj in enumerate(enemyList):
+            self.posArr[i] = enemyObj.crtPos
+            self.modeArr[i] = MOTION_TYPES.index(enemyObj.getMotion())
+            self.speedArr[i] = enemyObj.getSpeed()
+            route = [enemyObj.getOrgPos()] + enemyObj.getPatrolPts()
+            self.routeArr[i, :len(route)] = route
+            self.routeLenArr[i] = len(route)
+            self.tgtIdxArr[i] = enemyObj.patrolIdx % len(route)
+            heading = enemyObj.heading
+            self.headingArr[i] = self.rand.uniform(0, 2*math.pi) if heading is None else heading
+            enemyObj.crtPos = self.posArr[i]    # row view, updated by step().
+        self.enemyList = list(enemyList)
+        self.dirty = False
+
+    def storeState(self):
+        """ Copy the motion state back to the enemy objs and detach the position
+            views, the arrays must be reloaded before the next step.
+        """
+        for i, enemyObj in enumerate(self.enemyList):
+            enemyObj.crtPos = self.posArr[i].tolist()
+            enemyObj.patrolIdx = int(self.tgtIdxArr[i])
+            enemyObj.heading = float(self.headingArr[i])
+        self.enemyList = []
+        self.dirty = True
+
+    #-----------------------------------------------------------------------------
+    def getPosArr(self):
+        return self.posArr
+
+    def getPatrolIdxList(self, enemyList):
+        """ Return the patrol target point index of the enemy objs, the loaded ones
+            are read from the state array (the objs are only updated by storeState()).
+        """
+        idxDict = {id(enemyObj): i for i, enemyObj in enumerate(self.enemyList)}
+        return [int(self.tgtIdxArr[idxDict[id(enemyObj)]]) if id(enemyObj) in idxDict
+                else enemyObj.patrolIdx for enemyObj in enemyList]
+
+    def isMoving(self):
+        return bool(np.any(self.modeArr != STATIC_MD))
+
+    #-----------------------------------------------------------------------------
+    def _moveInGrid(self, mapMatrix, idxArr, stepArr):
+        """ Move the enemies <idxArr> by the step vectors if the swept paths are free,
+            else try the x-only and y-only part of the step (slide along the wall).
+            Return the bool array of the enemies which can not move.
+        """
+        startArr = self.posArr[idxArr]
+        blockArr = np.ones(len(idxArr), dtype=bool)
+        for trialArr in (stepArr, stepArr*(1, 0), stepArr*(0, 1)):
+            tryIdx = np.nonzero(blockArr)[0]
+            if tryIdx.size == 0: break
+            endArr = startArr[tryIdx] + trialArr[tryIdx]
+            freeArr = checkPathFree(mapMatrix, startArr[tryIdx], endArr)
+            self.posArr[idxArr[tryIdx[freeArr]]] = endArr[freeArr]
+            blockArr[tryIdx[freeArr]] = False
+        return blockArr
+
+    #-----------------------------------------------------------------------------
+    def _stepPatrol(self):
+        idxArr = np.nonzero(self.modeArr == PATROL_MD)[0]
+        if idxArr.size == 0: return
+        posArr = self.posArr[idxArr]
+        tgtArr = self.routeArr[idxArr, self.tgtIdxArr[idxArr]]
+        diffArr = tgtArr - posArr
+        distArr = np.hypot(diffArr[:, 0], diffArr[:, 1])
+        speedArr = self.speedArr[idxArr]
+        arrivedArr = distArr <= speedArr
+        stepArr = diffArr / np.where(arrivedArr, 1, distArr)[:, None] * speedArr[:, None]
+        self.posArr[idxArr] = np.where(arrivedArr[:, None], tgtArr, posArr + stepArr)
+        nextIdxArr = (self.tgtIdxArr[idxArr] + 1) % self.routeLenArr[idxArr]
+        self.tgtIdxArr[idxArr] = np.where(arrivedArr, nextIdxArr, self.tgtIdxArr[idxArr])
+
+    def _stepWander(self, mapMatrix):
+        idxArr = np.nonzero(self.modeArr == WANDER_MD)[0]
+        if idxArr.size == 0: return
+        headingArr = self.headingArr[idxArr] + self.rand.normal(0, self.wanderTurn, idxArr.size)
+        stepArr = np.stack((np.sin(headingArr), -np.cos(headingArr)), axis=1) * self.speedArr[idxArr, None]
+        blockArr = self._moveInGrid(mapMatrix, idxArr, stepArr)
+        # turn to a random new heading if the enemy hits the wall.
+        headingArr[blockArr] = self.rand.uniform(0, 2*math.pi, int(blockArr.sum()))
+        self.headingArr[idxArr] = headingArr
+
+    def _stepFlee(self, mapMatrix, robotPosArr):
+        idxArr = np.nonzero(self.modeArr == FLEE_MD)[0]
+        if idxArr.size == 0 or robotPosArr is None or len(robotPosArr) == 0: return
+        # vector from the nearest robot to every flee enemy.
+        awayArr = self.posArr[idxArr, None, :] - np.asarray(robotPosArr, dtype=np.float64)[None, :, :]
+        distArr = np.hypot(awayArr[..., 0], awayArr[..., 1])
+        nearIdx = distArr.argmin(axis=1)
+        rowIdx = np.arange(idxArr.size)
+        awayArr, distArr = awayArr[rowIdx, nearIdx], distArr[rowIdx, nearIdx]
+        fleeFlg = distArr < self.fleeRange
+        if not fleeFlg.any(): return
+        awayArr, distArr = awayArr[fleeFlg], np.maximum(distArr[fleeFlg], 1e-6)
+        idxArr = idxArr[fleeFlg]
+        stepArr = awayArr / distArr[:, None] * self.speedArr[idxArr, None]
+        self._moveInGrid(mapMatrix, idxArr, stepArr)
+
+    #-----------------------------------------------------------------------------
+    def step(self, mapMatrix, robotPosArr=None):
+        """ Move all the enemies one clock cycle.
+            Args:
+                mapMatrix (numpy.ndarray): environment map matrix, the wander and
+                    flee enemies do not move if it is None.
+                robotPosArr (numpy.ndarray, optional): (n, 2) robots' positions.
+        """
+        if len(self.posArr) == 0: return
+        self._stepPatrol()
+        if mapMatrix is None: return
+        self._stepWander(mapMatrix)
+        self._stepFlee(mapMatrix, robotPosArr)
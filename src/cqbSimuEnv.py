@@ -0,0 +1,501 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuEnv.py
+#
+# Purpose:     This module provides the reinforcement learning environments of the
+#              robot enemy search task: the single environment wraps a headless
+#              <MapMgr> with the reset / step / observation / reward API, the
+#              vectorized environment steps N independent environments of the same
+#              map in lockstep with numpy arrays (all the robots' moves and sensor
+#              beams of all the environments are calculated in one pass) to reach
+#              thousands of environment steps per second on CPU.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/08
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - Action: the index of the manual control directions DIR_DICT (ACTION_NAMES, 9
+      actions, 'return' is stay), the robot moves <moveSpeed> along the direction
+      with the wall collision sweep and heads to the direction (same as the robot
+      manual control), the start position is clipped in the map so the move sweep
+      keeps the robot in the map.
+    - Observation (float32 vector of OBS size): the obstacle scan beams range ratio
+      (SCAN_BEAMS, 1 is no obstacle within SCAN_RANGE), the robot position ratio
+      (x, y), the head direction (sin, cos), the step ratio, then for every enemy the
+      sound bearing (sin, cos, 0 if not heard) and the detected flag.
+    - Reward: DET_REWARD per new detected enemy (camera detection), VISIT_REWARD per
+      new visited VISIT_CELL map cell, -STEP_COST per step and -BUMP_COST if the
+      move is blocked by the wall. The episode is terminated when all the enemies
+      are detected and truncated at <maxSteps>.
+    - CQBEnv: the robot and the scenario enemies (with their motion models) in a
+      <MapMgr>, the lidar, camera, camera detection and obstacle scan are on.
+    - VecCQBEnv: the same sensors, observation and reward calculated on the arrays
+      of N environments, the finished environments are reset automatically. The
+      enemies are static (the scenario positions, or the random positions in the
+      robot's region if <randomEnemy>) and the sound bearing is the direct bearing,
+      so CQBEnv with the static enemies and the wall aware sound off gives the same
+      episodes.
+    - Seeds: the environment random generators are spawned from the seed with
+      np.random.SeedSequence, the same seed gives the same episodes.
+
+    Usage (headless benchmark):
+        python cqbSimuEnv.py <*.cqbs scenario> [environment number] [steps number]
+"""
+
+import sys
+import math
+import time
+import numpy as np
+
+from cqbSimuMapMgr import MapMgr, DIR_DICT, castBeams
+from cqbSimuCollision import buildClearanceMap, sweepMove
+from cqbSimuPlanner import RoutePlanner
+from cqbSimuAvoidance import SCAN_BEAMS, SCAN_RANGE
+from cqbSimuRouteOptimizer import buildScene
+
+ACTION_NAMES = tuple(DIR_DICT.keys())
+ACTION_VEC = np.array([DIR_DICT[name] for name in ACTION_NAMES], dtype=np.int64)
+# head direction degree of the actions (same as <MapMgr._getSquadPose()>).
+ACTION_DEG = np.array([int(180 - math.degrees(math.atan2(x, y))) for x, y in ACTION_VEC], dtype=np.int64)
+STAY_ACTION = ACTION_NAMES.index('return')
+MAX_STEPS = 500         # max steps of an episode.
+VISIT_CELL = 30         # visited map cell size (pixel).
+DET_REWARD = 1.0        # reward of a new detected enemy.
+VISIT_REWARD = 0.02     # reward of a new visited cell.
+STEP_COST = 0.005       # cost of every step.
+BUMP_COST = 0.05        # cost of a move blocked by the wall.
+ENV_NUM = 64            # default vectorized environments number.
+
+#-----------------------------------------------------------------------------
+def getObsSize(enemyNum):
+    """ Return the observation vector size of the enemies number."""
+    return SCAN_BEAMS + 5 + 3*enemyNum
+
+def buildObs(scanArr, posArr, headDegArr, soundArr, detArr, stepArr, maxSteps, mapShape):
+    """ Build the observations of n robots.
+        Args:
+            scanArr (numpy.ndarray): (n, SCAN_BEAMS) obstacle scan range, 0 is no reading.
+            posArr (numpy.ndarray): (n, 2) robots' position.
+            headDegArr (numpy.ndarray): (n, ) robots' head direction degree.
+            soundArr (numpy.ndarray): (n, enemyNum) sound bearing degree, -1 if not heard.
+            detArr (numpy.ndarray): (n, enemyNum) bool enemy detected in the episode.
+            stepArr (numpy.ndarray): (n, ) episode steps.
+            maxSteps (int): max steps of an episode.
+            mapShape (tuple): (rows, cols) of the map matrix.
+        Returns:
+            numpy.ndarray: (n, obsSize) float32 observations.
+    """
+    rows, cols = mapShape
+    scanArr = np.asarray(scanArr, dtype=np.float64)
+    headRad = np.radians(np.asarray(headDegArr, dtype=np.float64))
+    soundArr = np.asarray(soundArr)
+    heardArr = soundArr >= 0
+    soundRad = np.radians(np.where(heardArr, soundArr, 0))
+    enemyArr = np.stack((np.where(heardArr, np.sin(soundRad), 0), np.where(heardArr, np.cos(soundRad), 0),
+                         detArr), axis=2).reshape(len(posArr), -1)
+    return np.concatenate((
+        np.where(scanArr > 0, np.minimum(scanArr / SCAN_RANGE, 1), 1),
+        posArr[:, :1] / cols, posArr[:, 1:2] / rows,
+        np.sin(headRad)[:, None], np.cos(headRad)[:, None],
+        (np.asarray(stepArr) / maxSteps)[:, None],
+        enemyArr), axis=1).astype(np.float32)
+
+def calReward(newDetArr, newCellArr, bumpArr):
+    """ Return the (n, ) float reward of the new detected enemies number, the new
+        visited cells flag and the bump flag arrays.
+    """
+    return DET_REWARD*np.asarray(newDetArr) + VISIT_REWARD*np.asarray(newCellArr) \
+        - STEP_COST - BUMP_COST*np.asarray(bumpArr)
+
+def calBump(startArr, endArr, actionArr, speed):
+    """ Return the (n, ) bool array, True if the robot moved less than half of the
+        speed with a move action.
+    """
+    movedArr = np.hypot(*(np.asarray(endArr) - np.asarray(startArr)).T)
+    return (np.asarray(actionArr) != STAY_ACTION) & (movedArr < speed * 0.5)
+
+def clipInMap(pos, mapShape):
+    """ Return the [x, y] int position clipped in the map, the wall collision sweep
+        only bounds the robot which starts in the map (the clearance is 0 out of it).
+    """
+    rows, cols = mapShape
+    return [min(max(int(pos[0]), 0), cols-1), min(max(int(pos[1]), 0), rows-1)]
+
+def getVisitShape(mapShape):
+    """ Return the (rows, cols) of the visited cells array of the map."""
+    rows, cols = mapShape
+    return (-(-rows // VISIT_CELL), -(-cols // VISIT_CELL))
+
+def spawnRands(seed, num):
+    """ Return the num independent random generators spawned from the seed."""
+    return [np.random.default_rng(seq) for seq in np.random.SeedSequence(seed).spawn(num)]
+
+#-----------------------------------------------------------------------------
+def getRegionCells(clearMap, startPos, planner=None):
+    """ Return the (k, 2) int64 array of the plan grid cell center positions in the
+        same free region as the start position (the random enemy positions).
+    """
+    planner = planner or RoutePlanner(clearMap)
+    if planner.regionList is None: planner._labelRegions()
+    gRows, gCols = planner.freeGrid.shape
+    regionArr = np.array(planner.regionList).reshape(gRows+2, gCols+2)[1:-1, 1:-1]
+    startIdx = planner._snapIdx(startPos)
+    regionID = planner.regionList[startIdx] if startIdx is not None else -1
+    rowArr, colArr = np.nonzero(regionArr == regionID)
+    half = planner.cellSize // 2
+    return np.stack((colArr*planner.cellSize + half, rowArr*planner.cellSize + half), axis=1).astype(np.int64)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class CQBEnv(object):
+    """ Single robot enemy search environment around a headless <MapMgr>."""
+    def __init__(self, mapMatrix, scene, clearMap=None, maxSteps=MAX_STEPS, randomEnemy=False,
+                 soundWall=False, seed=0):
+        """ Init example : env = CQBEnv(mapMatrix, buildScene(mapMgr))
+                           obs, info = env.reset()
+                           obs, reward, terminated, truncated, info = env.step(action)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                scene (dict): {'robotPos': [x, y], 'enemy': scenario enemies list,
+                    'params': scenario parameters dict} (refer to <buildScene()>).
+                clearMap (numpy.ndarray, optional): clearance array of the map
+                    matrix. Defaults to None (built).
+                maxSteps (int, optional): max steps of an episode. Defaults to MAX_STEPS.
+                randomEnemy (bool, optional): place the scenario enemies number of
+                    static enemies randomly in the robot's region at every reset.
+                    Defaults to False.
+                soundWall (bool, optional): wall aware sound. Defaults to False.
+                seed (int, optional): random seed. Defaults to 0.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = buildClearanceMap(mapMatrix) if clearMap is None else clearMap
+        self.planner = RoutePlanner(self.clearMap)
+        self.scene = scene
+        self.maxSteps = maxSteps
+        self.randomEnemy = randomEnemy
+        self.soundWall = soundWall
+        self.enemyNum = len(scene['enemy'])
+        self.startPos = clipInMap(scene['robotPos'], mapMatrix.shape)
+        self.regionCells = getRegionCells(self.clearMap, self.startPos, planner=self.planner) \
+            if randomEnemy else None
+        self.moveSpeed = int(scene['params'].get('moveSpeed', 10))
+        self.obsSize = getObsSize(self.enemyNum)
+        self.actionNum = len(ACTION_NAMES)
+        self.seed = seed
+        # the 1st stream is the same as the 1st <VecCQBEnv> environment's.
+        self.rand, self.motionRand = spawnRands(seed, 2)
+        self.mapMgr = None
+        self.steps = 0
+        self.detArr = np.zeros(self.enemyNum, dtype=bool)
+        self.visitShape = getVisitShape(mapMatrix.shape)
+        self.visitArr = None
+
+    #-----------------------------------------------------------------------------
+    def _buildMapMgr(self):
+        mapMgr = MapMgr()
+        mapMgr.setMapMatrix(self.mapMatrix)
+        mapMgr.clearMap, mapMgr.clearSrc = self.clearMap, self.mapMatrix
+        mapMgr.planner = self.planner
+        mapMgr.setRobots([{'id': 0, 'pos': list(self.startPos), 'route': []}])
+        mapMgr.setMotionSeed(int(self.motionRand.integers(2**31)))
+        if self.randomEnemy:
+            posArr = self.regionCells[self.rand.choice(len(self.regionCells), self.enemyNum)]
+            mapMgr.setEnemy([[idx, pos] for idx, pos in enumerate(posArr.tolist())])
+        else:
+            mapMgr.setEnemy(self.scene['enemy'])
+        mapMgr.setScenarioParams(self.scene['params'])
+        for flgFun in (mapMgr.setCollision, mapMgr.setLidarOn, mapMgr.setCamOn, mapMgr.setCamDetectionOn,
+                       mapMgr.setObsAvoid):
+            flgFun(True)
+        mapMgr.setSoundWall(self.soundWall)
+        mapMgr.setNoise(False)
+        return mapMgr
+
+    def _visit(self):
+        """ Mark the robot's visited cell, return True if it is a new cell."""
+        x, y = self.mapMgr.getRobot().getCrtPos()
+        cell = (min(max(int(y) // VISIT_CELL, 0), self.visitShape[0]-1),
+                min(max(int(x) // VISIT_CELL, 0), self.visitShape[1]-1))
+        newFlg = not self.visitArr[cell]
+        self.visitArr[cell] = True
+        return newFlg
+
+    #-----------------------------------------------------------------------------
+    def reset(self, seed=None):
+        """ Start a new episode (with a new seed if given).
+            Returns:
+                tuple: (observation, info dict)
+        """
+        if seed is not None:
+            self.seed = seed
+            self.rand, self.motionRand = spawnRands(seed, 2)
+        self.mapMgr = self._buildMapMgr()
+        self.steps = 0
+        self.detArr = np.zeros(self.enemyNum, dtype=bool)
+        self.visitArr = np.zeros(self.visitShape, dtype=bool)
+        self._visit()
+        # the sensors of the start position, the enemies are not moved.
+        for senseFun in (self.mapMgr.calSoundDir, self.mapMgr.calLidarDetect, self.mapMgr.checkObstacle,
+                         self.mapMgr.calCameDetect, self.mapMgr.checkCamEnemyDetect):
+            senseFun()
+        self._updateDetect()
+        self.mapMgr.startMove(True)
+        return self.getObservation(), self._getInfo()
+
+    def _updateDetect(self):
+        """ Add the current detected enemies, return the new detected number."""
+        detArr = self.mapMgr.getSquadData().get('detected', None)
+        if detArr is None: return 0
+        newNum = int((detArr[0] & ~self.detArr).sum())
+        self.detArr |= detArr[0]
+        return newNum
+
+    #-----------------------------------------------------------------------------
+    def step(self, action):
+        """ Move the robot with the action (index of ACTION_NAMES) for one tick.
+            Returns:
+                tuple: (observation, reward, terminated, truncated, info dict)
+        """
+        robotObj = self.mapMgr.getRobot()
+        startPos = list(robotObj.getCrtPos())
+        self.mapMgr.setRobotManualMove(True, ACTION_NAMES[int(action)])
+        self.mapMgr.periodic()
+        self.steps += 1
+        bump = calBump([startPos], [robotObj.getCrtPos()], [action], self.moveSpeed)[0]
+        reward = float(calReward(self._updateDetect(), self._visit(), bump))
+        terminated = bool(self.detArr.all()) and self.enemyNum > 0
+        truncated = not terminated and self.steps >= self.maxSteps
+        return self.getObservation(), reward, terminated, truncated, self._getInfo()
+
+    #-----------------------------------------------------------------------------
+    def getObservation(self):
+        """ Return the (obsSize, ) float32 observation of the current state."""
+        squadData = self.mapMgr.getSquadData()
+        posArr, degList = self.mapMgr._getSquadPose()
+        soundArr = squadData.get('sound', None)
+        if soundArr is None: soundArr = np.full((1, self.enemyNum), -1, dtype=np.int64)
+        return buildObs(squadData['scan'], posArr, degList, soundArr, self.detArr[None, :],
+                        [self.steps], self.maxSteps, self.mapMatrix.shape)[0]
+
+    def _getInfo(self):
+        return {'steps': self.steps, 'detNum': int(self.detArr.sum()),
+                'visited': int(self.visitArr.sum())}
+
+    def getMapMgr(self):
+        return self.mapMgr
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class VecCQBEnv(object):
+    """ N independent enemy search environments of the same map stepped in lockstep
+        with numpy arrays.
+    """
+    def __init__(self, mapMatrix, scene, envNum=ENV_NUM, clearMap=None, maxSteps=MAX_STEPS,
+                 randomEnemy=False, seed=0):
+        """ Init example : envs = VecCQBEnv(mapMatrix, buildScene(mapMgr), envNum=256)
+                           obsArr, info = envs.reset()
+                           obsArr, rewardArr, termArr, truncArr, info = envs.step(actionArr)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                scene (dict): refer to <CQBEnv>, the enemies motion is not used.
+                envNum (int, optional): environments number. Defaults to ENV_NUM.
+                clearMap (numpy.ndarray, optional): clearance array of the map
+                    matrix. Defaults to None (built).
+                maxSteps (int, optional): max steps of an episode. Defaults to MAX_STEPS.
+                randomEnemy (bool, optional): refer to <CQBEnv>. Defaults to False.
+                seed (int, optional): random seed. Defaults to 0.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = buildClearanceMap(mapMatrix) if clearMap is None else clearMap
+        self.envNum = envNum
+        self.maxSteps = maxSteps
+        self.randomEnemy = randomEnemy
+        self.startPos = np.array(clipInMap(scene['robotPos'], mapMatrix.shape), dtype=np.int64)
+        self.sceneEnemyArr = np.array([info[1] for info in scene['enemy']], dtype=np.int64).reshape(-1, 2)
+        self.enemyNum = len(self.sceneEnemyArr)
+        self.regionCells = getRegionCells(self.clearMap, self.startPos.tolist()) if randomEnemy else None
+        self.moveSpeed = int(scene['params'].get('moveSpeed', 10))
+        self.camAngle = int(scene['params'].get('camAngle', 15))
+        self.obsSize = getObsSize(self.enemyNum)
+        self.actionNum = len(ACTION_NAMES)
+        rows, cols = mapMatrix.shape
+        self.visitShape = getVisitShape(mapMatrix.shape)
+        # scan beams of all the environments (env by env) then the lidar and cameras beams.
+        self.scanDegs = [int(round(deg)) for deg in np.arange(SCAN_BEAMS) * 360.0 / SCAN_BEAMS]
+        self.beamMaxArr = np.concatenate((np.full(envNum*SCAN_BEAMS, SCAN_RANGE),
+                                          np.full(envNum*3, rows+cols))).astype(np.int64)
+        self.rands = spawnRands(seed, envNum)
+        self.posArr = np.zeros((envNum, 2), dtype=np.int64)
+        self.headDegArr = np.zeros(envNum, dtype=np.int64)
+        self.enemyArr = np.zeros((envNum, self.enemyNum, 2), dtype=np.int64)
+        self.detArr = np.zeros((envNum, self.enemyNum), dtype=bool)
+        self.visitArr = np.zeros((envNum, ) + self.visitShape, dtype=bool)
+        self.stepArr = np.zeros(envNum, dtype=np.int64)
+        self.sensorData = {}
+
+    #-----------------------------------------------------------------------------
+    def _resetEnvs(self, idxArr):
+        """ Reset the environments of the index array (the sensors are not updated)."""
+        self.posArr[idxArr] = self.startPos
+        self.headDegArr[idxArr] = ACTION_DEG[STAY_ACTION]
+        for idx in idxArr:
+            if self.randomEnemy:
+                self.enemyArr[idx] = self.regionCells[self.rands[idx].choice(len(self.regionCells), self.enemyNum)]
+            else:
+                self.enemyArr[idx] = self.sceneEnemyArr
+        self.detArr[idxArr] = False
+        self.visitArr[idxArr] = False
+        self._visit(idxArr)
+        self.stepArr[idxArr] = 0
+
+    def _visit(self, idxArr):
+        """ Mark the robots' visited cells, return the (k, ) new cell flag array."""
+        cellArr = self.posArr[idxArr] // VISIT_CELL
+        rowArr = np.clip(cellArr[:, 1], 0, self.visitShape[0]-1)
+        colArr = np.clip(cellArr[:, 0], 0, self.visitShape[1]-1)
+        newArr = ~self.visitArr[idxArr, rowArr, colArr]
+        self.visitArr[idxArr, rowArr, colArr] = True
+        return newArr
+
+    def _sense(self):
+        """ Calculate the sensors of all the environments (same as the <MapMgr>
+            sound, lidar, obstacle scan, camera and camera detection), return the
+            (envNum, enemyNum) bool detection array.
+        """
+        envNum, posArr, headArr = self.envNum, self.posArr, self.headDegArr
+        # all the beams in one pass: the obstacle scan, the lidar and the camera edges.
+        beamDegList = self.scanDegs * envNum + headArr.tolist() + (headArr - self.camAngle).tolist() \
+            + (headArr + self.camAngle).tolist()
+        beamPosArr = np.concatenate((np.repeat(posArr, SCAN_BEAMS, axis=0), np.tile(posArr, (3, 1))))
+        disArr, _ = castBeams(self.mapMatrix, beamPosArr, beamDegList, maxDisArr=self.beamMaxArr)
+        scanArr = disArr[:envNum*SCAN_BEAMS].reshape(envNum, SCAN_BEAMS)
+        frontArr = disArr[envNum*SCAN_BEAMS:].reshape(3, envNum)
+        # enemies bearing and the camera sector detection.
+        vecArr = np.trunc(self.enemyArr - posArr[:, None, :]).astype(np.int64)
+        degArr = MapMgr._vectorDegree(vecArr)
+        distArr = np.sqrt((vecArr**2).sum(axis=2))
+        detArr = (degArr >= headArr[:, None] - self.camAngle) & (degArr <= headArr[:, None] + self.camAngle) \
+            & (distArr <= frontArr.max(axis=0)[:, None])
+        self.sensorData = {'scan': scanArr, 'lidarDis': frontArr[0], 'camDis': frontArr[1:].T,
+                           'sound': degArr, 'detected': detArr}
+        return detArr
+
+    #-----------------------------------------------------------------------------
+    def reset(self, seed=None):
+        """ Reset all the environments (with a new seed if given).
+            Returns:
+                tuple: ((envNum, obsSize) observations, info dict)
+        """
+        if seed is not None: self.rands = spawnRands(seed, self.envNum)
+        self._resetEnvs(np.arange(self.envNum))
+        self.detArr |= self._sense()
+        return self.getObservation(), self._getInfo()
+
+    def step(self, actionArr):
+        """ Step all the environments with the (envNum, ) action index array, the
+            finished environments are reset and their observations are the reset
+            observations.
+            Returns:
+                tuple: ((envNum, obsSize) observations, (envNum, ) float rewards,
+                    (envNum, ) bool terminated, (envNum, ) bool truncated, info dict
+                    with the 'finalObs' (envNum, obsSize) observations before the
+                    reset, the 'detNum' and 'visited' of the episodes)
+        """
+        actionArr = np.asarray(actionArr, dtype=np.int64)
+        allIdx = np.arange(self.envNum)
+        startArr = self.posArr
+        endArr = startArr + ACTION_VEC[actionArr] * self.moveSpeed
+        self.posArr, _ = sweepMove(self.clearMap, startArr, endArr)
+        self.headDegArr = ACTION_DEG[actionArr]
+        self.stepArr += 1
+        bumpArr = calBump(startArr, self.posArr, actionArr, self.moveSpeed)
+        detArr = self._sense()
+        newDetArr = (detArr & ~self.detArr).sum(axis=1)
+        self.detArr |= detArr
+        rewardArr = calReward(newDetArr, self._visit(allIdx), bumpArr)
+        termArr = self.detArr.all(axis=1) & (self.enemyNum > 0)
+        truncArr = ~termArr & (self.stepArr >= self.maxSteps)
+        info = self._getInfo()
+        info['finalObs'] = self.getObservation()
+        doneIdx = np.nonzero(termArr | truncArr)[0]
+        if doneIdx.size:
+            self._resetEnvs(doneIdx)
+            self.detArr |= self._sense()
+            obsArr = self.getObservation()
+        else:
+            obsArr = info['finalObs']
+        return obsArr, rewardArr, termArr, truncArr, info
+
+    #-----------------------------------------------------------------------------
+    def getObservation(self):
+        """ Return the (envNum, obsSize) float32 observations of the current states."""
+        return buildObs(self.sensorData['scan'], self.posArr, self.headDegArr, self.sensorData['sound'],
+                        self.detArr, self.stepArr, self.maxSteps, self.mapMatrix.shape)
+
+    def _getInfo(self):
+        return {'steps': self.stepArr.copy(), 'detNum': self.detArr.sum(axis=1),
+                'visited': self.visitArr.reshape(self.envNum, -1).sum(axis=1)}
+
+    def getSensorData(self):
+        """ Return the sensors arrays dict of all the environments: 'scan' (envNum,
+            SCAN_BEAMS), 'lidarDis' (envNum, ), 'camDis' (envNum, 2), 'sound' (envNum,
+            enemyNum) and 'detected' (envNum, enemyNum) bool.
+        """
+        return self.sensorData
+
+#-----------------------------------------------------------------------------
+def createEnv(mapMgr, **kwargs):
+    """ Create a <CQBEnv> of the map manager's map, enemies and active robot start
+        position, None if no map or robot.
+    """
+    if mapMgr.getMapMatrix() is None or mapMgr.getRobot() is None: return None
+    return CQBEnv(mapMgr.getMapMatrix(), buildScene(mapMgr), clearMap=mapMgr.getClearMap(), **kwargs)
+
+def createVecEnv(mapMgr, envNum=ENV_NUM, **kwargs):
+    """ Create a <VecCQBEnv> of the map manager's map, enemies and active robot start
+        position, None if no map or robot.
+    """
+    if mapMgr.getMapMatrix() is None or mapMgr.getRobot() is None: return None
+    return VecCQBEnv(mapMgr.getMapMatrix(), buildScene(mapMgr), envNum=envNum,
+                     clearMap=mapMgr.getClearMap(), **kwargs)
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ Headless benchmark the vectorized environment with the random actions."""
+    if len(argv) < 1:
+        print("Usage: python cqbSimuEnv.py <*.cqbs scenario> [environment number] [steps number]")
+        return 1
+    import cqbSimuScenario as scenario
+    data = scenario.loadScenario(argv[0])
+    mapMgr = MapMgr()
+    mapMgr.setMapMatrix(data['mapMatrix'])
+    mapMgr.setRobots(scenario.getRobotList(data))
+    mapMgr.setEnemy(data['enemy'])
+    mapMgr.setScenarioParams(data['params'])
+    envNum = int(argv[1]) if len(argv) > 1 else ENV_NUM
+    stepNum = int(argv[2]) if len(argv) > 2 else 200
+    envs = createVecEnv(mapMgr, envNum=envNum, randomEnemy=True)
+    if envs is None:
+        print("The scenario has no robot.")
+        return 1
+    rand = np.random.default_rng(0)
+    envs.reset(seed=0)
+    episodeNum = detNum = 0
+    startT = time.perf_counter()
+    for _ in range(stepNum):
+        _, _, termArr, truncArr, info = envs.step(rand.integers(envs.actionNum, size=envNum))
+        doneArr = termArr | truncArr
+        episodeNum += int(doneArr.sum())
+        detNum += int(info['detNum'][doneArr].sum())
+    useT = time.perf_counter() - startT
+    print("%d environments x %d steps in %.2f sec: %.0f steps/sec, %d episodes finished (%.2f enemies detected)"
+          %(envNum, stepNum, useT, envNum*stepNum/useT, episodeNum, detNum/max(episodeNum, 1)))
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
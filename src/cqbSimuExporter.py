@@ -0,0 +1,327 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuExporter.py
+#
+# Purpose:     This module is used to export the simulation frames to a PNG image
+#              sequence or an animated GIF file. The frames are drawn by a headless
+#              PIL rasterizer (mirror the viewer <PanelRealworldMap._drawItems()>)
+#              in a background worker pool, so the export never blocks the UI
+#              timer and can also run on the servers without display.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/22
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - FrameRasterizer: draw one frame (background blue print + robot, sensors and
+      enemies) with PIL, the dashed wx pens are drawn as solid lines.
+    - FrameExporter: a feeder thread reads the tick states from a tick source (the
+      decoded <SimuTimeline> ticks list or a <SimuPlayer>), builds the picklable frame jobs
+      (tick state + trailing trajectory) and submits them to a process pool, every
+      worker process init its own rasterizer once.
+    This module does not import the <cqbSimuGlobal> module at the top level (only the
+    headless <main()> loads it) so the worker processes and the server runner can
+    import it without any side effect.
+
+    Usage (headless):
+        python cqbSimuExporter.py <recordFile> <scenario.cqbs|json> <outDir> [gif]
+"""
+
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+MAP_SIZE = (900, 600)
+ROBOT_RAD = 8
+ENEMY_RAD = 8
+DETECT_RAD = 40
+TRA_MAX_SIZE = 100      # trajectory record way point size, same as <AgentRobot>.
+GIF_MAX_FRAMES = 1000   # max frames number of a GIF export (all kept in memory).
+BG_COLOR = (200, 200, 200)
+
+# Default display flags, same as the <PanelRealworldMap> init flags.
+DEF_FLAGS = {
+    'showRoute': False,
+    'showDetect': True,
+    'showTrajectory': True,
+    'showEnemy': True,
+    'showPredict': True,
+    'showSonar': False,
+    'showLidar': True,
+    'showCam': True,
+    'showCamDetect': True
+}
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class FrameRasterizer(object):
+    """ Headless PIL rasterizer to draw the simulation viewer frame."""
+    def __init__(self, scene, size=MAP_SIZE, scaleImgFlg=True):
+        """ Init example : rasterizer = FrameRasterizer(scene)
+            Args:
+                scene (dict): the static scene info: {'bluePrint': image path or None,
+                    'route': [[x, y], ...], 'enemies': [(id, [x, y]), ...] (only drawn
+                    if the tick state has no 'enemies'),
+                    'flags': display flags dict (refer to DEF_FLAGS)}
+                size (tuple, optional): frame size. Defaults to MAP_SIZE.
+                scaleImgFlg (bool, optional): scale the blue print to the frame size,
+                    else put the blue print in the center. Defaults to True.
+        """
+        self.size = size
+        self.route = [tuple(pt) for pt in scene.get('route', [])]
+        self.enemies = scene.get('enemies', [])
+        self.flags = DEF_FLAGS.copy()
+        self.flags.update(scene.get('flags', {}))
+        self.bgImg = Image.new('RGB', size, BG_COLOR)
+        bpPath = scene.get('bluePrint', None)
+        if bpPath and os.path.exists(bpPath):
+            bpImg = Image.open(bpPath).convert('RGB')
+            if scaleImgFlg:
+                self.bgImg.paste(bpImg.resize(size))
+            else:
+                x = int((size[0] - bpImg.width) / 2)
+                y = int((size[1] - bpImg.height) / 2)
+                self.bgImg.paste(bpImg, (x, y))
+
+    #-----------------------------------------------------------------------------
+    def _drawCircle(self, draw, pos, rad, fill, outline=(0, 0, 0)):
+        draw.ellipse((pos[0]-rad, pos[1]-rad, pos[0]+rad, pos[1]+rad), fill=fill, outline=outline)
+
+    #-----------------------------------------------------------------------------
+    def drawFrame(self, state, trajectory=None):
+        """ Draw and return the frame image (RGB) of a tick state dict (refer to
+            <MapMgr.getTickState()>).
+        """
+        img = self.bgImg.copy()
+        draw = ImageDraw.Draw(img)
+        overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        odraw = ImageDraw.Draw(overlay)
+        flags = self.flags
+        pos = tuple(state['pos'])
+        # the enemies' positions of the tick, the scene ones are the init positions.
+        enemies = [item[:2] for item in state['enemies']] if 'enemies' in state else self.enemies
+        # Draw the route path
+        if flags['showRoute'] and len(self.route) > 1:
+            draw.line(self.route, fill=(0, 255, 0), width=1)
+            for i, pt in enumerate(self.route):
+                draw.text((pt[0]+3, pt[1]+3), "WP-%s %s" %(str(i), str(list(pt))), fill=(0, 0, 0))
+        # Draw trajectory
+        if flags['showTrajectory'] and trajectory and len(trajectory) > 1:
+            draw.line([tuple(pt) for pt in trajectory], fill=(255, 0, 0), width=2)
+        # Draw the sonar env detection reflection lines.
+        if flags['showSonar'] and state['sonar']:
+            f, b, l, r = state['sonar']
+            color = (31, 156, 229)
+            draw.line((pos, (pos[0], pos[1]-f)), fill=color)
+            draw.line((pos, (pos[0]-l, pos[1])), fill=color)
+            draw.line((pos, (pos[0], pos[1]+b)), fill=color)
+            draw.line((pos, (pos[0]+r, pos[1])), fill=color)
+        # Draw the front lidar detection line and point.
+        if flags['showLidar'] and state['lidarDis'] and state['lidarPt']:
+            lidarPt = tuple(state['lidarPt'])
+            draw.line((pos, lidarPt), fill=(127, 31, 31))
+            self._drawCircle(draw, lidarPt, 3, (127, 31, 31))
+        # Draw the camera viewer lines.
+        if flags['showCam']:
+            if state['camLDis'] and state['camLPt']:
+                draw.line((pos, tuple(state['camLPt'])), fill=(67, 138, 85))
+            if state['camRDis'] and state['camRPt']:
+                draw.line((pos, tuple(state['camRPt'])), fill=(67, 138, 85))
+            if flags['showCamDetect'] and state['detected']:
+                enemyDict = dict((eID, ePos) for eID, ePos in enemies)
+                for eID in state['detected']:
+                    if eID in enemyDict:
+                        draw.line((pos, tuple(enemyDict[eID])), fill=(255, 0, 0), width=2)
+        # Draw robot transparent enemy detection area.
+        if flags['showDetect']:
+            odraw.ellipse((pos[0]-DETECT_RAD, pos[1]-DETECT_RAD, pos[0]+DETECT_RAD,
+                           pos[1]+DETECT_RAD), fill=(157, 204, 149, 20), outline=(157, 204, 149, 255))
+        # Draw the robot
+        self._drawCircle(draw, pos, ROBOT_RAD, (67, 138, 85))
+        # Draw the enemies actual pos
+        if flags['showEnemy']:
+            for eID, ePos in enemies:
+                self._drawCircle(draw, ePos, ENEMY_RAD, (255, 0, 0))
+                draw.text((ePos[0]+8, ePos[1]+8), "E-%s %s" %(str(eID), str(list(ePos))), fill=(255, 0, 0))
+        # Draw the enemy predict pos
+        if flags['showPredict']:
+            for eID, pPos in state['predicted']:
+                odraw.ellipse((pPos[0], pPos[1], pPos[0]+16, pPos[1]+16), fill=(2, 2, 230, 254))
+                draw.text((pPos[0]+8, pPos[1]+8), "P-%s %s" %(str(eID), str(list(pPos))), fill=(0, 0, 0))
+        img.paste(overlay, (0, 0), overlay)
+        return img
+
+#-----------------------------------------------------------------------------
+# Worker process functions: every worker init the rasterizer once.
+_gRasterizer = None
+
+def _initWorker(scene, size, scaleImgFlg):
+    global _gRasterizer
+    _gRasterizer = FrameRasterizer(scene, size=size, scaleImgFlg=scaleImgFlg)
+
+def _renderJob(job, outPath):
+    """ Render one frame job, save it to <outPath> if given, else return the image."""
+    img = _gRasterizer.drawFrame(job['state'], trajectory=job['trajectory'])
+    if outPath is None: return img
+    img.save(outPath)
+    return outPath
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class FrameExporter(object):
+    """ Export the simulation frames in the background worker pool."""
+    def __init__(self, scene, outDir, workerNum=None, useProcess=True,
+                 size=MAP_SIZE, scaleImgFlg=True):
+        """ Init example : exporter = FrameExporter(scene, 'export/Export_01')
+            Args:
+                scene (dict): static scene info, refer to <FrameRasterizer>.
+                outDir (str): export output folder.
+                workerNum (int, optional): worker number. Defaults to the CPU number.
+                useProcess (bool, optional): use process pool, else thread pool.
+                    Defaults to True.
+        """
+        self.scene = scene
+        self.outDir = outDir
+        self.workerNum = workerNum or max(1, (os.cpu_count() or 2) - 1)
+        self.useProcess = useProcess
+        self.size = size
+        self.scaleImgFlg = scaleImgFlg
+        self.totalNum = 0
+        self.doneNum = 0
+        self.outFile = None
+        self.error = None
+        self.feeder = None
+        self.terminate = False
+
+    #-----------------------------------------------------------------------------
+    def _buildPool(self):
+        initArgs = (self.scene, self.size, self.scaleImgFlg)
+        if self.useProcess:
+            return ProcessPoolExecutor(max_workers=self.workerNum, initializer=_initWorker,
+                                       initargs=initArgs)
+        _initWorker(*initArgs)
+        return ThreadPoolExecutor(max_workers=self.workerNum)
+
+    #-----------------------------------------------------------------------------
+    def _feed(self, tickIter, gifFlg, frameDuration, frameStep, maxPending):
+        """ Feeder thread: build the frame jobs and collect the worker results. The
+            GIF frames are kept in memory until the file is written, so a GIF export
+            longer than GIF_MAX_FRAMES only renders every <frameStep> tick.
+        """
+        try:
+            if not os.path.exists(self.outDir): os.makedirs(self.outDir)
+            trajectory = deque(maxlen=TRA_MAX_SIZE)
+            pending = deque()
+            images = []
+            with self._buildPool() as pool:
+                for idx, state in enumerate(tickIter):
+                    if self.terminate: break
+                    pos = state['pos']
+                    if not trajectory or list(trajectory[-1]) != list(pos):
+                        trajectory.append((pos[0], pos[1]))
+                    if idx % frameStep: continue
+                    job = {'state': state, 'trajectory': list(trajectory)}
+                    outPath = None if gifFlg else os.path.join(self.outDir, 'frame_%06d.png' %idx)
+                    pending.append(pool.submit(_renderJob, job, outPath))
+                    # limit the pending jobs so the memory is bounded for long runs.
+                    while len(pending) >= maxPending:
+                        result = pending.popleft().result()
+                        if gifFlg: images.append(result)
+                        self.doneNum += 1
+                while pending:
+                    result = pending.popleft().result()
+                    if gifFlg: images.append(result)
+                    self.doneNum += 1
+            if gifFlg and images:
+                self.outFile = os.path.join(self.outDir, 'simulation.gif')
+                images[0].save(self.outFile, save_all=True, append_images=images[1:],
+                               duration=frameDuration*frameStep, loop=0)
+            elif not gifFlg:
+                self.outFile = self.outDir
+        except Exception as err:
+            self.error = str(err)
+
+    #-----------------------------------------------------------------------------
+    def startExport(self, tickIter, totalNum, gifFlg=False, frameDuration=100):
+        """ Start the export in the background and return immediately.
+            Args:
+                tickIter (iterable): tick state dicts source.
+                totalNum (int): total frames number (used for the progress).
+                gifFlg (bool, optional): export an animated GIF file (at most 
+                    GIF_MAX_FRAMES frames), else PNG sequence. Defaults to False.
+                frameDuration (int, optional): GIF frame duration in ms.
+        """
+        self.totalNum = totalNum
+        self.doneNum = 0
+        frameStep = 1
+        if gifFlg:
+            frameStep = -(-totalNum // GIF_MAX_FRAMES)
+            self.totalNum = -(-totalNum // frameStep)
+        self.feeder = threading.Thread(target=self._feed, args=(tickIter, gifFlg, frameDuration,
+                                                                frameStep, self.workerNum*4), daemon=True)
+        self.feeder.start()
+
+    #-----------------------------------------------------------------------------
+    def getProgress(self):
+        """ Return the export progress tuple (doneNum, totalNum)."""
+        return (self.doneNum, self.totalNum)
+
+    def getOutput(self):
+        return self.outFile
+
+    def getError(self):
+        return self.error
+
+    def isFinished(self):
+        return self.feeder is not None and not self.feeder.is_alive()
+
+    def stop(self):
+        self.terminate = True
+
+#-----------------------------------------------------------------------------
+def iterPlayerTicks(player):
+    """ Generator to read all the tick states from a <SimuPlayer>."""
+    for idx in range(player.getTickNum()):
+        yield player.getTick(idx)
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ Headless export a simulation record with the scenario file."""
+    if len(argv) < 4:
+        print("Usage: python cqbSimuExporter.py <recordFile> <scenario.cqbs|json> <outDir> [gif]")
+        return
+    import cqbSimuGlobal as gv
+    import cqbSimuScenario as scenario
+    from cqbSimuRecorder import SimuPlayer
+    recordPath, scenarioPath, outDir = argv[1:4]
+    gifFlg = len(argv) > 4 and argv[4].lower() == 'gif'
+    if scenarioPath.endswith(scenario.SCE_EXT):
+        data = scenario.loadScenario(scenarioPath, bpDir=gv.gBluePrintDir)
+    else:
+        data = scenario.importJson(scenarioPath, bpDir=gv.gBluePrintDir)
+    robots = scenario.getRobotList(data)
+    scene = {
+        'bluePrint': data['bluePrint'],
+        'route': robots[0]['route'] if robots else [],
+        'enemies': [enemy[:2] for enemy in data['enemy']]
+    }
+    player = SimuPlayer(recordPath)
+    exporter = FrameExporter(scene, outDir)
+    exporter.startExport(iterPlayerTicks(player), player.getTickNum(), gifFlg=gifFlg)
+    exporter.feeder.join()
+    player.close()
+    if exporter.getError():
+        print("Export error: %s" %exporter.getError())
+    else:
+        print("Exported %s frames to %s" %(str(exporter.getProgress()[0]), exporter.getOutput()))
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv)
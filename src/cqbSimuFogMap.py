@@ -0,0 +1,156 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuFogMap.py
+#
+# Purpose:     This module provides the explored area (fog of war) map: a bitset
+#              grid of the map cells which the robots' sensors (camera view sector,
+#              front lidar beam and the detection circle) have observed so far. The
+#              grid is updated incrementally every tick and keeps the explored cells
+#              count, so the search coverage percentage is an O(1) query.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/03
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The map is split in FOG_CELL size cells, a cell is free if any of its pixels is
+    not wall (the coverage base number). The explored state is a packed bitset (1
+    bit per cell, row by row as np.packbits()).
+    Every tick the observed area of all the robots is sampled as beam fans (built
+    by <fanBeams()> and cast together by the map manager <castBeams()>): the camera
+    sector (FAN_STEP degree between the two edge beams) or the lidar beam, and the
+    DETECT_RAD detection circle (CIRCLE_STEP degree), every beam is sampled per half
+    cell until it touches the wall. Only the sampled cells whose bit is not set are
+    written and counted, and the update is skipped if the robots' poses and the
+    sensors are not changed since the last tick (the robot is not moving).
+"""
+
+import numpy as np
+
+FOG_CELL = 4            # explored grid cell size (pixel).
+FAN_STEP = 2            # camera sector beams degree step.
+CIRCLE_STEP = 6         # detection circle beams degree step.
+DETECT_RAD = 40         # robot detection circle radius, same as the viewer.
+
+#-----------------------------------------------------------------------------
+def fanBeams(posArr, degList, camAngle, camFlg=True, lidarFlg=True, farDis=1500):
+    """ Build the observation beams of all the robots: the camera sector fan (or
+        the front lidar beam if the camera is off) and the detection circle fan.
+        Returns:
+            tuple: ((n, 2) int beams start position array, list of the beams degree,
+                (n, ) beams max range array)
+    """
+    startIdx, beamDegs, rangeList = [], [], []
+    circleDegs = list(range(0, 360, CIRCLE_STEP))
+    for idx, degree in enumerate(degList):
+        fanDegs = []
+        if camFlg:
+            fanDegs = list(range(degree - camAngle, degree + camAngle + 1, FAN_STEP))
+        elif lidarFlg:
+            fanDegs = [degree]
+        startIdx += [idx] * (len(fanDegs) + len(circleDegs))
+        beamDegs += fanDegs + circleDegs
+        rangeList += [farDis] * len(fanDegs) + [DETECT_RAD] * len(circleDegs)
+    return posArr[startIdx], beamDegs, np.array(rangeList, dtype=np.int64)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class ExploredMap(object):
+    """ Explored area bitset grid of one map matrix."""
+    def __init__(self, mapMatrix, cellSize=FOG_CELL):
+        """ Init example : exploredMap = ExploredMap(mapMatrix)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                cellSize (int, optional): grid cell size. Defaults to FOG_CELL.
+        """
+        self.mapMatrix = mapMatrix
+        self.cellSize = cellSize
+        rows, cols = mapMatrix.shape
+        self.gRows, self.gCols = -(-rows // cellSize), -(-cols // cellSize)
+        padArr = np.ones((self.gRows*cellSize, self.gCols*cellSize), dtype=bool)
+        padArr[:rows, :cols] = mapMatrix == 1
+        wallGrid = padArr.reshape(self.gRows, cellSize, self.gCols, cellSize).all(axis=(1, 3))
+        self.freeNum = int((~wallGrid).sum())
+        self.bitArr = np.zeros((self.gRows, (self.gCols + 7) // 8), dtype=np.uint8)
+        self.exploredNum = 0
+        self.version = 0        # increased when new cells are explored.
+        self.lastKey = None     # robots' pose and sensors key of the last update.
+
+    #-----------------------------------------------------------------------------
+    def copy(self):
+        """ Return a copy with the same explored state (the map is shared)."""
+        newMap = ExploredMap.__new__(ExploredMap)
+        newMap.__dict__.update(self.__dict__)
+        newMap.bitArr = self.bitArr.copy()
+        return newMap
+
+    def reset(self):
+        self.bitArr[:] = 0
+        self.exploredNum = 0
+        self.version += 1
+        self.lastKey = None
+
+    #-----------------------------------------------------------------------------
+    def markCells(self, rowArr, colArr):
+        """ Set the cells' explored bits, return the number of the new explored cells."""
+        flatArr = np.unique(rowArr * self.gCols + colArr)
+        rowArr, colArr = np.divmod(flatArr, self.gCols)
+        byteArr = colArr >> 3
+        maskArr = (0x80 >> (colArr & 7)).astype(np.uint8)
+        newArr = (self.bitArr[rowArr, byteArr] & maskArr) == 0
+        newNum = int(newArr.sum())
+        if newNum:
+            np.bitwise_or.at(self.bitArr, (rowArr[newArr], byteArr[newArr]), maskArr[newArr])
+            self.exploredNum += newNum
+            self.version += 1
+        return newNum
+
+    #-----------------------------------------------------------------------------
+    def checkPose(self, posArr, degList, *sensorFlgs):
+        """ Return True if the robots' poses or the sensors (camera angle and on flags)
+            changed since the last check, else there is no new observed cell.
+        """
+        key = (posArr.tobytes(), tuple(degList), sensorFlgs)
+        if key == self.lastKey: return False
+        self.lastKey = key
+        return True
+
+    def markBeams(self, startArr, degList, disArr):
+        """ Mark the cells along the beams (sampled per half cell, the wall touch
+            point is not included), return the number of the new explored cells.
+            Args:
+                startArr (numpy.ndarray): (n, 2) int beams start position.
+                degList (list(int)): degree of every beam.
+                disArr (numpy.ndarray): (n, ) beams length.
+        """
+        if len(degList) == 0: return 0
+        step = max(1, self.cellSize // 2)
+        disSteps = np.arange(0, int(disArr.max()) + 1, step)
+        validArr = disSteps[None, :] < disArr[:, None]
+        radArr = np.radians(degList)
+        xArr = startArr[:, 0, None] + np.trunc(disSteps[None, :] * np.sin(radArr)[:, None]).astype(np.int64)
+        yArr = startArr[:, 1, None] - np.trunc(disSteps[None, :] * np.cos(radArr)[:, None]).astype(np.int64)
+        rows, cols = self.mapMatrix.shape
+        validArr &= (xArr >= 0) & (xArr < cols) & (yArr >= 0) & (yArr < rows)
+        return self.markCells(yArr[validArr] // self.cellSize, xArr[validArr] // self.cellSize)
+
+    #-----------------------------------------------------------------------------
+    def getCoverage(self):
+        """ Return the explored ratio (0~1) of the free cells."""
+        return self.exploredNum / self.freeNum if self.freeNum else 0.0
+
+    def getExploredGrid(self):
+        """ Return the (gRows, gCols) bool array of the explored cells."""
+        return np.unpackbits(self.bitArr, axis=1, count=self.gCols).astype(bool)
+
+    def getFogAlpha(self, alpha=160):
+        """ Return the (rows, cols) uint8 fog alpha array in the map pixel size: the
+            not explored free cells are <alpha>, the explored cells and walls are 0.
+        """
+        rows, cols = self.mapMatrix.shape
+        fogGrid = ~self.getExploredGrid()
+        fogArr = np.repeat(np.repeat(fogGrid, self.cellSize, axis=0), self.cellSize, axis=1)[:rows, :cols]
+        return np.where(fogArr & (self.mapMatrix != 1), np.uint8(alpha), np.uint8(0))
@@ -1,9 +1,9 @@
 #-----------------------------------------------------------------------------
 # Name:        cqbSimuGlobal.py
 #
-# Purpose:     This module is used as a local config file to set constants, 
+# Purpose:     This module is used as a local config file to set constants,
 #              global parameters which will be used in the other modules.
-#              
+#
 # Author:      Yuancheng Liu
 #
 # Created:     2024/07/30
@@ -11,12 +11,16 @@
 # Copyright:   Copyright (c) 2024 LiuYuancheng
 # License:     MIT License
 #-----------------------------------------------------------------------------
+""" Importing this module has no side effect (no print, file I/O or sys.path
+    change), all the global parameters are set to the default config values. The
+    UI program calls <bootstrap()> to init the logger and load the config file,
+    the headless runner and the batch workers can call <applyConfig()> directly.
+    The config file is watched by <checkConfigUpdate()>, the simulation parameters
+    (update rate, camera angle, robot speed, trajectory size) are applied live.
+"""
 import os
-import sys
 
-print("Current working directory is : %s" % os.getcwd())
 dirpath = os.path.dirname(os.path.abspath(__file__))
-print("Current source code location : %s" % dirpath)
 APP_NAME = ('CQB_Simulator', 'PWS_UI')
 
 UI_TITLE = "2D Indoor CQB Simulator"
@@ -25,65 +29,189 @@ TOPDIRS = 'src'
 LIBDIR = 'lib'
 idx = dirpath.find(TOPDIRS)
 gTopDir = dirpath[:idx + len(TOPDIRS)] if idx != -1 else dirpath   # found it - truncate right after TOPDIR
-# Config the lib folder 
+# Config the lib folder
 gLibDir = os.path.join(gTopDir, LIBDIR)
-if os.path.exists(gLibDir):
-    print("Import all the lib-module from folder : %s" %str(gLibDir))
-    sys.path.insert(0, gLibDir)
 
 #------<IMAGES PATH>-------------------------------------------------------------
 IMG_FD = os.path.join(dirpath, "img")
 ICO_PATH = os.path.join(IMG_FD, "cqbIcon.png")
 
 #-----------------------------------------------------------------------------
-# Init the logger:
-# find the lib directory
-import Log
-Log.initLogger(gTopDir, 'Logs', APP_NAME[0], APP_NAME[1], historyCnt=100, fPutLogsUnderDate=True)
-
 # Init the log type parameters.
 DEBUG_FLG   = False
 LOG_INFO    = 0
 LOG_WARN    = 1
 LOG_ERR     = 2
 LOG_EXCEPT  = 3
+TICK_LOG_INV = 5    # min interval (sec) of the same per-tick debug message.
+
+Log = None          # <lib.Log> module, imported when the first message is logged.
 
-def gDebugPrint(msg, prt=True, logType=None):
-    if prt: print(msg)
+def _loadLog():
+    global Log
+    if Log is None:
+        from lib import Log as logModule
+        Log = logModule
+    return Log
+
+def gDebugPrint(msg, prt=True, logType=None, rateKey=None):
+    """ Print and log the message, if <rateKey> is set the messages with the same
+        key are rate limited to one per TICK_LOG_INV seconds. <msg> can also be a 
+        function returning the message string, it is only called if the message 
+        is not rate limited.
+    """
+    log = _loadLog()
+    suppressed = log.rateLimit(rateKey, TICK_LOG_INV) if rateKey else 0
+    if suppressed is None: return
+    if callable(msg): msg = msg()
+    if suppressed: msg = "%s (%s similar messages suppressed)" %(msg, str(suppressed))
+    if prt: log.asyncPrint(msg)
+    if log.gLogger is None: return  # logger not inited, print only.
     if logType == LOG_WARN:
-        Log.warning(msg)
+        log.warning(msg)
     elif logType == LOG_ERR:
-        Log.error(msg)
+        log.error(msg)
     elif logType == LOG_EXCEPT:
-        Log.exception(msg)
+        log.exception(msg)
     elif logType == LOG_INFO or DEBUG_FLG:
-        Log.info(msg)
+        log.info(msg)
 
 #-----------------------------------------------------------------------------
-# Init the configure file loader.
-import ConfigLoader
+# Init the configure file parameters.
 CONFIG_FILE_NAME = 'Config.txt'
 gGonfigPath = os.path.join(dirpath, CONFIG_FILE_NAME)
-iConfigLoader = ConfigLoader.ConfigLoader(gGonfigPath, mode='r')
-if iConfigLoader is None:
-    print("Error: The config file %s is not exist.Program exit!" %str(gGonfigPath))
-    exit()
-
-CONFIG_DICT = iConfigLoader.getJson()
+iConfigLoader = None    # <lib.ConfigLoader.TypedConfig> obj.
+# config schema {key: (type, default value, (min, max) or allowed values)}, the
+# default values are the same as the <Config_template.txt> except 'SC_FMT': the
+# old config files without the key keep saving the legacy json scenario.
+CONFIG_SCHEMA = {
+    'TEST_MD': (bool, True, None),
+    'BP_DIR': (str, 'floorBluePrint', None),
+    'HM_DIR': (str, 'heatmap', None),
+    'TEST_HM': (str, '', None),
+    'SC_DIR': (str, 'scenario', None),
+    'SC_FMT': (str, 'json', ('cqbs', 'json')),
+    'RC_DIR': (str, 'record', None),
+    'EX_DIR': (str, 'export', None),
+    'NG_DIR': (str, 'navgraph', None),
+    'TM_FMT': (str, 'npz', ('npz', 'csv')),
+    'SCALE_IMG': (bool, True, None),
+    'UPDATE_RATE': (float, 1.0, (0.05, 60.0)),
+    'CAM_ANGLE': (int, 15, (1, 90)),
+    'MOVE_SPEED': (int, 10, (1, 100)),
+    'TRA_SIZE': (int, 100, (2, 100000)),
+    'NOISE_ON': (bool, False, None),
+    'NOISE_SEED': (int, 0, (0, 2147483647)),
+    'NOISE_SCALE': (float, 1.0, (0.0, 10.0))
+}
+# config keys which can be applied to a running simulation.
+LIVE_CONFIG_KEYS = ('UPDATE_RATE', 'CAM_ANGLE', 'MOVE_SPEED', 'TRA_SIZE', 'NOISE_ON', 
+                    'NOISE_SEED', 'NOISE_SCALE')
+DEF_CONFIG = {key: item[1] for key, item in CONFIG_SCHEMA.items()}
+CONFIG_DICT = {}
+gInited = False     # flag to identify whether the bootstrap() is finished.
 
 #-------<GLOBAL VARIABLES (start with "g")>------------------------------------
-# VARIABLES are the built in data type.
-gTestMode = CONFIG_DICT['TEST_MD']
-gBluePrintDir = os.path.join(dirpath, CONFIG_DICT['BP_DIR'])
-gScenarioDir = os.path.join(dirpath, CONFIG_DICT['SC_DIR'])
-gBluePrintFilePath = None 
+# VARIABLES are the built in data type, set by applyConfig().
+gTestMode = None
+gBluePrintDir = None
+gScenarioDir = None
+gScenarioFmt = None
+gBluePrintFilePath = None
 gBluePrintBM = None
-gScaleImgFlg = CONFIG_DICT['SCALE_IMG']
-gHeatMapDir = CONFIG_DICT['HM_DIR']
-gHeatMapFile = os.path.join(gHeatMapDir, CONFIG_DICT['TEST_HM']) if 'TEST_HM' in CONFIG_DICT.keys() else None
+gScaleImgFlg = None
+gHeatMapDir = None
+gHeatMapFile = None
+gRecordDir = None
+gTelemetryFmt = None
+gExportDir = None
+gNavGraphDir = None
+gUpdateRate = 1     # main frame update rate 1 sec.
+gCamAngle = None    # camera half view angle (degree).
+gMoveSpeed = None   # robot move speed (pixel per tick).
+gTraMaxSize = None  # robot trajectory max size.
+gNoiseOnFlg = None  # flag to add the noise to the sensors data.
+gNoiseSeed = None   # sensors noise random seed.
+gNoiseScale = None  # sensors noise parameters multiplier.
 
 gTranspPct = 70     # Windows transparent percentage.
-gUpdateRate = 1     # main frame update rate 1 sec.
+
+def applyConfig(configDict):
+    """ Set the global parameters from the config dict, the missing keys use the
+        DEF_CONFIG value. (no file I/O)
+    """
+    global CONFIG_DICT, gTestMode, gBluePrintDir, gScenarioDir, gScenarioFmt, \
+        gScaleImgFlg, gHeatMapDir, gHeatMapFile, gRecordDir, gTelemetryFmt, gExportDir, \
+        gNavGraphDir, \
+        gUpdateRate, gCamAngle, gMoveSpeed, gTraMaxSize, gNoiseOnFlg, gNoiseSeed, gNoiseScale
+    CONFIG_DICT = dict(DEF_CONFIG)
+    CONFIG_DICT.update(configDict)
+    gTestMode = CONFIG_DICT['TEST_MD']
+    gBluePrintDir = os.path.join(dirpath, CONFIG_DICT['BP_DIR'])
+    gScenarioDir = os.path.join(dirpath, CONFIG_DICT['SC_DIR'])
+    gScenarioFmt = CONFIG_DICT['SC_FMT']
+    gScaleImgFlg = CONFIG_DICT['SCALE_IMG']
+    gHeatMapDir = CONFIG_DICT['HM_DIR']
+    gHeatMapFile = os.path.join(gHeatMapDir, CONFIG_DICT['TEST_HM']) if CONFIG_DICT['TEST_HM'] else None
+    gRecordDir = os.path.join(dirpath, CONFIG_DICT['RC_DIR'])
+    gTelemetryFmt = CONFIG_DICT['TM_FMT']
+    gExportDir = os.path.join(dirpath, CONFIG_DICT['EX_DIR'])
+    gNavGraphDir = os.path.join(dirpath, CONFIG_DICT['NG_DIR'])
+    gUpdateRate = CONFIG_DICT['UPDATE_RATE']
+    gCamAngle = CONFIG_DICT['CAM_ANGLE']
+    gMoveSpeed = CONFIG_DICT['MOVE_SPEED']
+    gTraMaxSize = CONFIG_DICT['TRA_SIZE']
+    gNoiseOnFlg = CONFIG_DICT['NOISE_ON']
+    gNoiseSeed = CONFIG_DICT['NOISE_SEED']
+    gNoiseScale = CONFIG_DICT['NOISE_SCALE']
+
+applyConfig({})
+
+#-----------------------------------------------------------------------------
+def bootstrap(configPath=None, logFlg=True):
+    """ Init the program running environment: init the logger (with the background
+        writer) and load the config file. Call once before the UI is created.
+        Args:
+            configPath (str, optional): config file path. Defaults to gGonfigPath.
+            logFlg (bool, optional): flag to init the log file. Defaults to True.
+        Returns:
+            bool: False if the config file does not exist.
+    """
+    global iConfigLoader, gInited
+    if gInited: return True
+    print("Current working directory is : %s" % os.getcwd())
+    print("Current source code location : %s" % dirpath)
+    if logFlg:
+        log = _loadLog()
+        log.initLogger(gTopDir, 'Logs', APP_NAME[0], APP_NAME[1], historyCnt=100, fPutLogsUnderDate=True)
+        # write the log file and the debug print in the background thread.
+        log.startAsyncWriter(queueSize=10000, batchSize=256, flushInv=0.5)
+    configPath = configPath or gGonfigPath
+    if not os.path.exists(configPath):
+        print("Error: The config file %s is not exist." %str(configPath))
+        return False
+    from lib.ConfigLoader import TypedConfig
+    iConfigLoader = TypedConfig(configPath, CONFIG_SCHEMA)
+    if iConfigLoader.load() is None:
+        print("Error: The config file is invalid: %s" %str(iConfigLoader.getError()))
+        return False
+    applyConfig(iConfigLoader.getDict())
+    gInited = True
+    return True
+
+def checkConfigUpdate():
+    """ Reload the config file if it is modified (only the file mtime is checked if
+        not), return the dict of the changed live config values.
+    """
+    if iConfigLoader is None: return {}
+    changedDict = iConfigLoader.checkUpdate()
+    if changedDict:
+        applyConfig(iConfigLoader.getDict())
+        gDebugPrint("Config file reloaded, changed: %s" %str(changedDict), logType=LOG_INFO)
+    elif iConfigLoader.getError():
+        gDebugPrint("Config file reload error: %s" %str(iConfigLoader.getError()), 
+                    logType=LOG_WARN, rateKey='configError')
+    return {key: val for key, val in changedDict.items() if key in LIVE_CONFIG_KEYS}
 
 #-------<GLOBAL PARAMTERS>-----------------------------------------------------
 iMainFrame = None   # MainFrame.
@@ -92,4 +220,5 @@ iEDMapPnl = None    # Edit panel.
 iEDCtrlPanel = None   # editer control panel
 iRWCtrlPanel = None   # read only control panel
 iDetectPanel = None   # detect panel
-iMapMgr = None
\ No newline at end of file
+iMapMgr = None
+iScenarioLib = None   # scenario library catalog
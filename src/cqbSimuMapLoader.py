@@ -0,0 +1,108 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuMapLoader.py
+#
+# Purpose:     This module provides a background worker thread to load the floor
+#              blue print image or a scenario file, decode the image and build the
+#              environment map matrix without blocking the UI thread. The loading
+#              progress and the result are reported through the callback functions.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/24
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The worker only uses PIL and numpy (no wx obj is created in the worker thread),
+    it returns the decoded RGB(A) pixel bytes, so the UI thread only needs to do a
+    fast memory copy to build the wx.Image/wx.Bitmap. The UI side should pass the
+    callbacks wrapped by wx.CallAfter() and swap the result in one UI function call.
+"""
+
+import io
+import threading
+from PIL import Image
+
+import cqbSimuScenario as scenario
+from cqbSimuMapMgr import buildMapMatrix
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class MapLoader(threading.Thread):
+    """ Background thread to load a blue print image or a scenario file."""
+    def __init__(self, loadID, bpPath=None, scenarioPath=None, bpDir=None,
+                 progressCB=None, doneCB=None):
+        """ Init example : loader = MapLoader(1, bpPath='floorBluePrint/img.png',
+                                              doneCB=onLoaded)
+            Args:
+                loadID (int): load request ID, used by the caller to drop the result
+                    of an older request.
+                bpPath (str, optional): blue print image path to load.
+                scenarioPath (str, optional): scenario file (*.cqbs or *.json) to load.
+                bpDir (str, optional): local blue print folder to resolve the path.
+                progressCB (function, optional): progressCB(loadID, percent, message)
+                doneCB (function, optional): doneCB(loadID, result), the result is None
+                    if the load failed, else refer to <run()>.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.loadID = loadID
+        self.bpPath = bpPath
+        self.scenarioPath = scenarioPath
+        self.bpDir = bpDir
+        self.progressCB = progressCB
+        self.doneCB = doneCB
+        self.error = None
+
+    #-----------------------------------------------------------------------------
+    def _report(self, percent, msg):
+        if self.progressCB: self.progressCB(self.loadID, percent, msg)
+
+    #-----------------------------------------------------------------------------
+    def getError(self):
+        return self.error
+
+    #-----------------------------------------------------------------------------
+    def run(self):
+        """ Load the file and call the doneCB with the result dict:
+            {'bluePrint': path, 'imgSize': (w, h), 'rgbBytes': bytes, 'alphaBytes':
+            bytes or None, 'mapMatrix': numpy array, 'scenario': scenario dict or None}
+        """
+        result = None
+        try:
+            data, mapMatrix = None, None
+            bpPath, img = self.bpPath, None
+            if self.scenarioPath:
+                self._report(5, 'Load scenario file')
+                if self.scenarioPath.endswith(scenario.SCE_EXT):
+                    data = scenario.loadScenario(self.scenarioPath, bpDir=self.bpDir)
+                    mapMatrix = data['mapMatrix']
+                    if data['bluePrintBytes']:
+                        img = Image.open(io.BytesIO(data['bluePrintBytes']))
+                else:
+                    data = scenario.importJson(self.scenarioPath, bpDir=self.bpDir)
+                bpPath = data['bluePrint']
+            if bpPath is None: raise ValueError("The blue print file does not exist.")
+            self._report(20, 'Decode blue print image')
+            if img is None: img = Image.open(bpPath)
+            img.load()
+            hasAlpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+            rgbImg = img.convert('RGB')
+            alphaBytes = img.convert('RGBA').getchannel('A').tobytes() if hasAlpha else None
+            self._report(50, 'Build floor map matrix')
+            if mapMatrix is None: mapMatrix = buildMapMatrix(rgbImg)
+            self._report(90, 'Build display image')
+            result = {
+                'bluePrint': bpPath,
+                'imgSize': rgbImg.size,
+                'rgbBytes': rgbImg.tobytes(),
+                'alphaBytes': alphaBytes,
+                'mapMatrix': mapMatrix,
+                'scenario': data
+            }
+            self._report(100, 'Finished')
+        except Exception as err:
+            self.error = str(err)
+            self._report(100, 'Error: %s' %str(err))
+        if self.doneCB: self.doneCB(self.loadID, result)
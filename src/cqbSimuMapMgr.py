@@ -18,13 +18,28 @@
 
 import math
 from random import randint
+import numpy as np
 from PIL import Image 
 
 import cqbSimuGlobal as gv
+from cqbSimuRecorder import SimuRecorder, SimuPlayer
+from cqbSimuTimeline import SimuTimeline
+from cqbSimuTelemetry import TelemetrySink
+from cqbSimuEnemyMotion import EnemyMotion, MOTION_TYPES, STATIC_MD, PATROL_MD, DEF_SPEED
+from cqbSimuCollision import ROBOT_RADIUS, buildClearanceMap, sweepMove
+from cqbSimuPlanner import RoutePlanner
+from cqbSimuNavGraph import getNavGraph
+from cqbSimuFogMap import ExploredMap, fanBeams
+from cqbSimuSound import SoundModel
+from cqbSimuNoise import SensorNoise
+from cqbSimuAvoidance import AvoidController
 
 ROB_TYPE = 0 
 EMY_TYPE = 1
 PRE_TYPE = 2
+MAP_ROWS, MAP_COLS = (600, 900) # 900 x 600 matrix (600 row, 900 colum)
+WALL_RGB_SUM = 120              # blue print pixel (r+g+b) <= 120 is wall.
+BEAM_CHUNK = 64                 # beam march steps per numpy pass.
 # manual control direction dict
 DIR_DICT = {
     'upleft'    : (-1, -1),
@@ -38,6 +53,73 @@ DIR_DICT = {
     'downright' : (1, 1)
 }
 
+#-----------------------------------------------------------------------------
+def buildMapMatrix(bluePrintImg, rows=MAP_ROWS, cols=MAP_COLS):
+    """ Build the environment map matrix (numpy uint8 array, 1 is wall) from the 
+        building blue print image, the image is put in the center of the matrix.
+        Args:
+            bluePrintImg (str/PIL.Image): blue print image file path or image obj.
+        Returns:
+            numpy.ndarray: (rows, cols) map matrix.
+    """
+    img = Image.open(bluePrintImg) if isinstance(bluePrintImg, str) else bluePrintImg
+    pixels = np.asarray(img.convert('RGB'), dtype=np.uint16)
+    wallArr = (pixels.sum(axis=2) <= WALL_RGB_SUM).astype(np.uint8)
+    imH, imW = wallArr.shape
+    matrix = np.zeros((rows, cols), dtype=np.uint8)
+    offsetX = (cols-imW) // 2
+    offsetY = (rows-imH) // 2
+    # crop the image part which is out of the matrix range.
+    srcX, srcY = max(0, -offsetX), max(0, -offsetY)
+    dstX, dstY = max(0, offsetX), max(0, offsetY)
+    w = min(imW - srcX, cols - dstX)
+    h = min(imH - srcY, rows - dstY)
+    matrix[dstY:dstY+h, dstX:dstX+w] = wallArr[srcY:srcY+h, srcX:srcX+w]
+    return matrix
+
+#-----------------------------------------------------------------------------
+def castBeams(mapMatrix, posArr, degList, stepChunk=BEAM_CHUNK, maxDisArr=None):
+    """ Cast all the beams in the map matrix together, the beams are marched
+        <stepChunk> pixels per numpy pass and the finished beams are dropped, each
+        beam gets the same result as <MapMgr._calculateBeamTouch()>.
+        Args:
+            mapMatrix (numpy.ndarray): environment map matrix.
+            posArr (numpy.ndarray): (n, 2) int array of the beams start position.
+            degList (list(int)): degree of every beam.
+            maxDisArr (numpy.ndarray, optional): (n, ) max range of every beam, a 
+                beam stops at its max range if it does not touch the wall before.
+        Returns:
+            tuple: ((n, ) int array of the distance, (n, 2) int array of the touch point)
+    """
+    rows, cols = mapMatrix.shape
+    beamNum = len(degList)
+    disArr = np.zeros(beamNum, dtype=np.int64)
+    ptArr = np.zeros((beamNum, 2), dtype=np.int64)
+    # use math (not numpy) sin/cos so the result is the same as the single beam.
+    sinArr = np.array([math.sin(math.radians(degree)) for degree in degList])
+    cosArr = np.array([math.cos(math.radians(degree)) for degree in degList])
+    steps = np.arange(stepChunk, dtype=np.float64)
+    activeArr = np.arange(beamNum)
+    startDis = 0
+    while activeArr.size:
+        disSteps = steps + startDis
+        xArr = posArr[activeArr, 0, None] + np.trunc(disSteps*sinArr[activeArr, None]).astype(np.int64)
+        yArr = posArr[activeArr, 1, None] - np.trunc(disSteps*cosArr[activeArr, None]).astype(np.int64)
+        hitArr = (xArr >= cols) | (xArr <= 0) | (yArr >= rows) | (yArr <= 0)
+        inMap = ~hitArr
+        hitArr[inMap] = mapMatrix[yArr[inMap], xArr[inMap]] == 1
+        if maxDisArr is not None: hitArr |= disSteps[None, :] >= maxDisArr[activeArr, None]
+        doneArr = hitArr.any(axis=1)
+        doneIdx = np.nonzero(doneArr)[0]
+        stepIdx = hitArr[doneIdx].argmax(axis=1)
+        beamIdx = activeArr[doneIdx]
+        disArr[beamIdx] = startDis + stepIdx
+        ptArr[beamIdx, 0] = xArr[doneIdx, stepIdx]
+        ptArr[beamIdx, 1] = yArr[doneIdx, stepIdx]
+        activeArr = activeArr[~doneArr]
+        startDis += stepChunk
+    return disArr, ptArr
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class AgentTarget(object):
@@ -88,14 +170,22 @@ class AgentTarget(object):
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class AgentEnemy(AgentTarget):
-    """ Agent enemy class, inherit from the <AgentTarget> class. In current version
-        enemies are stationary
+    """ Agent enemy class, inherit from the <AgentTarget> class. The enemy moves 
+        with one of the motion models in <cqbSimuEnemyMotion> (stationary if the 
+        motion is 'static'), the motion is calculated by the <MapMgr> for all the
+        enemies together.
     """
 
     def __init__(self, parent, tgtID, pos):
         """ Init refer to the class <AgentTarget>. """
         super().__init__(parent, tgtID, pos, EMY_TYPE)
         self.predPos = None # predicted position of the target.
+        self.crtPos = pos.copy()    # current position (a row view of the motion array when moving).
+        self.motion = MOTION_TYPES[STATIC_MD]
+        self.speed = DEF_SPEED
+        self.patrolPts = []     # patrol way points (the org position is the 1st point).
+        self.patrolIdx = 0      # patrol target point index.
+        self.heading = None     # wander heading (radian).
 
     def getPredPos(self):
         return self.predPos
@@ -103,6 +193,61 @@ class AgentEnemy(AgentTarget):
     def setPredPos(self, pos):
         self.predPos = pos.copy()
 
+    #-----------------------------------------------------------------------------
+    def getCrtPos(self):
+        return [int(self.crtPos[0]), int(self.crtPos[1])]
+
+    def getMotion(self):
+        return self.motion
+
+    def getSpeed(self):
+        return self.speed
+
+    def getPatrolPts(self):
+        return self.patrolPts
+
+    def getMotionInfo(self):
+        """ Return the motion dict saved in the scenario, None if the enemy is static."""
+        if self.motion == MOTION_TYPES[STATIC_MD]: return None
+        return {'motion': self.motion, 'speed': self.speed, 'route': self.patrolPts}
+
+    def setMotion(self, motion, speed=None, patrolPts=None):
+        """ Set the motion model.
+            Args:
+                motion (str): one of the <MOTION_TYPES>.
+                speed (int, optional): move speed (pixel per tick).
+                patrolPts (list, optional): patrol way points.
+        """
+        if motion not in MOTION_TYPES: return
+        self.motion = motion
+        if speed is not None: self.speed = speed
+        if patrolPts is not None: self.patrolPts = [list(pt) for pt in patrolPts]
+
+    def addPatrolPt(self, pos):
+        self.patrolPts.append(pos)
+
+    def resetCrtPos(self):
+        self.crtPos = self.orgPos.copy()
+        self.patrolIdx = 0
+        self.heading = None
+
+    #-----------------------------------------------------------------------------
+    def getState(self):
+        """ Return the enemy state as a tuple of immutable values."""
+        predPos = None if self.predPos is None else tuple(self.predPos)
+        return (self.id, tuple(self.orgPos), predPos, self.selected, tuple(float(v) for v in self.crtPos), 
+                self.motion, self.speed, tuple(tuple(pt) for pt in self.patrolPts), 
+                self.patrolIdx, self.heading)
+
+    def setState(self, state):
+        """ Restore the enemy state from a <getState()> tuple."""
+        self.id, orgPos, predPos, self.selected, crtPos, self.motion, self.speed, \
+            patrolPts, self.patrolIdx, self.heading = state
+        self.orgPos = list(orgPos)
+        self.predPos = None if predPos is None else list(predPos)
+        self.crtPos = list(crtPos)
+        self.patrolPts = [list(pt) for pt in patrolPts]
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class AgentRobot(AgentTarget):
@@ -140,6 +285,16 @@ class AgentRobot(AgentTarget):
             self.traplayStepIdx = len(self.trajectory)
             self.trajectory.append(pos)
 
+    def setTrajectoryMaxSize(self, size):
+        """ Change the trajectory max size, the oldest points are removed in place if
+            the trajectory is longer than the new size.
+        """
+        self.trajectoryMaxSize = size
+        overNum = len(self.trajectory) - size
+        if overNum > 0:
+            del self.trajectory[:overNum]
+            self.traplayStepIdx = max(0, self.traplayStepIdx - overNum)
+
     def addWayPt(self, pos):
         """Add a new way point in the route list."""
         self.routePts.append(pos)
@@ -186,6 +341,47 @@ class AgentRobot(AgentTarget):
     def getTrajectory(self):
         return self.trajectory.copy()
 
+    #-----------------------------------------------------------------------------
+    def getState(self):
+        """ Return the robot state as a dict of immutable values (the position lists 
+            are converted to tuples), the dict can be pickled to the worker processes.
+        """
+        state = {
+            'id': self.id,
+            'orgPos': tuple(self.orgPos),
+            'crtPos': tuple(self.crtPos),
+            'routePts': tuple(tuple(pt) for pt in self.routePts),
+            'trajectory': tuple(tuple(pt) for pt in self.trajectory),
+            'trajectoryMaxSize': self.trajectoryMaxSize,
+            'traplayStepMode': self.traplayStepMode,
+            'traplayStepIdx': self.traplayStepIdx,
+            'autoMoveFlg': self.autoMoveFlg,
+            'moveTgtIdx': self.moveTgtIdx,
+            'moveSpeed': self.moveSpeed,
+            'manualCtrl': self.manualCtrl,
+            'direction': tuple(self.direction),
+            'selected': self.selected
+        }
+        return state
+
+    def setState(self, state):
+        """ Restore the robot state from a <getState()> dict."""
+        self.id = state['id']
+        self.orgPos = list(state['orgPos'])
+        self.crtPos = list(state['crtPos'])
+        # the route's 1st point is the robot org position.
+        self.routePts = [self.orgPos] + [list(pt) for pt in state['routePts'][1:]]
+        self.trajectory = [list(pt) for pt in state['trajectory']]
+        self.trajectoryMaxSize = state['trajectoryMaxSize']
+        self.traplayStepMode = state['traplayStepMode']
+        self.traplayStepIdx = state['traplayStepIdx']
+        self.autoMoveFlg = state['autoMoveFlg']
+        self.moveTgtIdx = state['moveTgtIdx']
+        self.moveSpeed = state['moveSpeed']
+        self.manualCtrl = state['manualCtrl']
+        self.direction = state['direction']
+        self.selected = state['selected']
+
     #-----------------------------------------------------------------------------
     def resetCrtPos(self):
         """ Reset the robot position to orignal Pos."""
@@ -222,14 +418,20 @@ class AgentRobot(AgentTarget):
         self.direction = (dirVectorX, dirVectorY)
 
     #-----------------------------------------------------------------------------
-    def updateCrtPos(self):
+    def updateCrtPos(self, clearMap=None):
         """ Update the current train positions on the map. This function will be 
             called periodicly by the main frame UI clock.
+            Args:
+                clearMap (numpy.ndarray, optional): map clearance array, the move 
+                    step is checked with the walls if given. Defaults to None.
         """
         # Manual move control 
         if self.manualCtrl:
-            self.crtPos[0] += self.direction[0]*self.moveSpeed
-            self.crtPos[1] += self.direction[1]*self.moveSpeed
+            newPos = [self.crtPos[0] + self.direction[0]*self.moveSpeed,
+                      self.crtPos[1] + self.direction[1]*self.moveSpeed]
+            if clearMap is not None:
+                newPos = sweepMove(clearMap, [self.crtPos], [newPos])[0][0].tolist()
+            self.crtPos[0], self.crtPos[1] = newPos
             self._addPosInTra(self.crtPos.copy())
             return None
         # Auto move control 
@@ -245,18 +447,63 @@ class AgentRobot(AgentTarget):
             # Update the current position under moving mode
             nextPt = self.routePts[self.moveTgtIdx]
             dist = math.sqrt((self.crtPos[0] - nextPt[0])**2 + (self.crtPos[1] - nextPt[1])**2)
-            if dist <= self.moveSpeed:
-                self.crtPos[0], self.crtPos[1] = nextPt[0], nextPt[1]
-                if self.moveTgtIdx < len(self.routePts)-1: 
-                    self.moveTgtIdx +=1
-                else:
-                    self.autoMoveFlg = False
+            arrived = dist <= self.moveSpeed
+            if arrived:
+                newPos = [nextPt[0], nextPt[1]]
             else:
-                self.crtPos[0] += int((nextPt[0] - self.crtPos[0])*1.0/dist * self.moveSpeed)
-                self.crtPos[1] += int((nextPt[1] - self.crtPos[1])*1.0/dist * self.moveSpeed)
-                self.updateDir()
-            # Add the current pos to the trajectory
-            self._addPosInTra(self.crtPos.copy())
+                newPos = [self.crtPos[0] + int((nextPt[0] - self.crtPos[0])*1.0/dist * self.moveSpeed),
+                          self.crtPos[1] + int((nextPt[1] - self.crtPos[1])*1.0/dist * self.moveSpeed)]
+            if clearMap is not None:
+                posArr, blockArr = sweepMove(clearMap, [self.crtPos], [newPos])
+                newPos = posArr[0].tolist()
+                # a way point too close to the wall is reached when the robot touches the wall.
+                if blockArr[0]: 
+                    arrived = math.hypot(newPos[0] - nextPt[0], newPos[1] - nextPt[1]) <= ROBOT_RADIUS
+            # Update the position and add it to the trajectory
+            self.applyStep(newPos, arrived)
+
+    def applyStep(self, newPos, arrived, direction=None):
+        """ Apply the auto move step calculated by <MapMgr.stepRobots()> (same as
+            the moving mode part of <updateCrtPos()>).
+            Args:
+                newPos (list(int, int)): the robot new position.
+                arrived (bool): whether the robot reached the target way point.
+                direction (tuple(int, int), optional): the robot head direction set
+                    by the avoidance controller, else the robot heads to the target 
+                    way point. Defaults to None.
+        """
+        self.crtPos[0], self.crtPos[1] = newPos
+        if arrived:
+            if self.moveTgtIdx < len(self.routePts)-1:
+                self.moveTgtIdx += 1
+            else:
+                self.autoMoveFlg = False
+        elif direction:
+            self.direction = direction
+        else:
+            self.updateDir()
+        self._addPosInTra(self.crtPos.copy())
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SimuSnapshot(object):
+    """ A snapshot of the whole simulation engine state at one tick. All the agents 
+        and sensors data are stored as immutable values, the environment map matrix
+        is shared by reference with the <MapMgr> (copy-on-write: the manager never 
+        changes the matrix in place, it replaces it), so taking a snapshot only costs 
+        the copy of the agents' states and a snapshot can be restored many times or 
+        pickled to worker processes to fork parallel "what-if" runs.
+    """
+    def __init__(self, tick, mapMatrix, robotStates, enemyStates, mgrState, activeIdx=0):
+        self.tick = tick
+        self.mapMatrix = mapMatrix
+        self.robotStates = robotStates  # state dict of every robot in the squad.
+        self.enemyStates = enemyStates
+        self.mgrState = mgrState
+        self.activeIdx = activeIdx      # index of the active robot in the squad.
+
+    def getTick(self):
+        return self.tick
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -265,79 +512,283 @@ class MapMgr(object):
         components to simulate the real world.
     """
     def __init__(self) -> None:
-        self.robot = None
+        self.robots = []        # all the robots in the squad.
+        self.robotIdCount = 0
+        self.robot = None       # the active robot (sensors shown, recorded and route edited).
         self.robotDirDegree = 0 # robot direction in degree
         self.enemys = []
         self.enemysIdCount = 0
+        self.enemyMotion = EnemyMotion()    # array-backed motion state of the enemies.
+        self.enemyMoveFlg = False
         # Environment map matrix
         self.mapMatrix = None
+        # Robot wall collision control
+        self.collisionFlg = True
+        self.clearMap = None    # clearance array of the map matrix <clearSrc>.
+        self.clearSrc = None
+        self.planner = None     # <RoutePlanner> obj of the clearance array.
+        self.navGraph = None    # <NavGraph> obj of the planner.
+        # Explored area (fog of war) control
+        self.fogOnFlg = True
+        self.exploredMap = None # <ExploredMap> obj of the map matrix.
         # Sonar control
         self.sonaOn = False
         self.sonarData = None
         # microphone control
         self.soundData = None
+        self.soundDisData = None
+        self.soundWallFlg = True    # sound propagates around the walls.
+        self.soundModel = None  # <SoundModel> obj of the map matrix.
         # Lidar control
         self.lidarOnflg = False
         self.lidarDetectDis = 0
         self.lidarDetecPt = None # front lidar detection point
         # Camera control
         self.camOnFlg = False
-        self.camAngle = 15
+        self.camAngle = gv.gCamAngle
         self.camDetectDisL = 0
         self.camDetectDisR = 0
         self.camDetecPtL = None # left camera detection point
         self.camDetecPtR = None # right camera detection point
         self.camEnemyDetFlg = False
         self.camEnemyDetIdxList = []
+        # Sensors noise models (None if the sensors are perfect)
+        self.noise = SensorNoise(seed=gv.gNoiseSeed, scale=gv.gNoiseScale) if gv.gNoiseOnFlg else None
+        # Sensors data arrays of all the robots (one row per robot), the active 
+        # robot's row is also copied to the sensor attributes above.
+        self.squadData = {}
         # Auto pilot flag
         self.obstacleAvdFlg = False
+        self.avoider = AvoidController()    # obstacle avoidance controller.
+        # Simulation record and replay control
+        self.tickCount = 0      # simulation clock tick count.
+        self.seekTick = None    # timeline tick shown after a scrub (None if not seeking).
+        self.recorder = None    # <SimuRecorder> obj when recording.
+        self.player = None      # <SimuPlayer> obj when replaying a record.
+        self.telemetry = None   # <TelemetrySink> obj when streaming the telemetry.
+        self.profiler = None    # <SimuProfiler> obj when profiling.
+        self.profCounters = None  # sensor counters dict when profiling.
+        self.playIdx = 0        # current replay tick index in the record.
+        self.timeline = SimuTimeline() # in-memory timeline for the viewer slider.
 
     #-----------------------------------------------------------------------------
     def initRobot(self, pos):
-        self.robot = AgentRobot(self, 0, pos)
+        """ Replace the squad with one robot at the input position."""
+        self.robots = []
+        self.robotIdCount = 0
+        self.addRobot(pos)
+
+    def addRobot(self, pos, robotID=None):
+        """ Add a robot in the squad and set it as the active robot."""
+        if robotID is None: robotID = self.robotIdCount
+        self.robot = AgentRobot(self, robotID, pos, speed=gv.gMoveSpeed, traMaxSize=gv.gTraMaxSize)
+        self.robots.append(self.robot)
+        self.robotIdCount = max(self.robotIdCount, robotID) + 1
+        return self.robot
 
-    def addEnemy(self, pos):
-        self.enemys.append(AgentEnemy(self, self.enemysIdCount, pos))
+    def addEnemy(self, pos, motionInfo=None):
+        """ Add a enemy, <motionInfo> is the scenario motion dict {'motion', 'speed', 
+            'route'} (static enemy if None).
+        """
+        enemyObj = AgentEnemy(self, self.enemysIdCount, pos)
+        if motionInfo:
+            enemyObj.setMotion(motionInfo['motion'], speed=motionInfo.get('speed', None),
+                               patrolPts=motionInfo.get('route', None))
+        self.enemys.append(enemyObj)
         self.enemysIdCount += 1
+        self.enemyMotion.dirty = True
+        return enemyObj
 
     def clearRobotRoute(self):
         if self.robot: self.robot.clearRoute()
 
+    def planRobotRoute(self):
+        """ Expand the active robot's sparse route way points to a collision free 
+            route with the navigation graph and the route planner, return the number
+            of the route legs which can not be planned (None if no robot or map).
+        """
+        planner = self.getPlanner()
+        if self.robot is None or planner is None: return None
+        route, failNum = planner.planRoute(self.robot.getRoutePts(), navGraph=self.getNavGraph())
+        self.setRobotRoute(route)
+        gv.gDebugPrint("planRobotRoute()> route way points: %s, failed legs: %s" 
+                       %(str(len(route)), str(failNum)), logType=gv.LOG_INFO)
+        return failNum
+
+    def setRobotRoute(self, route):
+        """ Replace the active robot's route with the route points list (the 1st point
+            is the robot start position and is not added).
+        """
+        if self.robot is None: return
+        self.robot.clearRoute()
+        for wayPt in route[1:]: self.robot.addWayPt(list(wayPt))
+
     #-----------------------------------------------------------------------------
     def initMapMatix(self):
         """ Load in the building blue print and create the environment map matrix."""
         if gv.gBluePrintFilePath is None: 
             gv.gDebugPrint("initMapMatix()> load the floor blue print first.", logType=gv.LOG_WARN)
             return
-        # Build the empy env matrix
-        rows, cols = (600, 900) # 900 x 600 matrix (600 row, 900 colum)
-        arr = [[0 for i in range(cols)] for j in range(rows)]
-        self.mapMatrix = arr
-        # Build the build print image matrix 
-        img = Image.open(gv.gBluePrintFilePath)
-        imW, imH = img.size
-        offsetX = (cols-imW) // 2
-        offsetY = (rows-imH) // 2
-        arr2 = [[0 for i in range(imW)] for j in range(imH)]
-        # set the matrix material value.
-        datas = img.getdata()
-        for i, data in enumerate(datas):
-            if data[0] + data[1] + data[2] <= 120:
-                arr2[i//imW][i%imW] = 1
-        # map image matrix to environment matrix
-        for i in range(len(arr2)):
-            data = arr2[i]
-            for j in range(len(data)):
-                if data[j] == 1: self.mapMatrix[i+offsetY][j+offsetX] = 1
-        self.mapMatrix = arr
-        #gv.gDebugPrint("Map matrix %s" %str(arr), prt=False, logType=gv.LOG_INFO)
+        self.mapMatrix = buildMapMatrix(gv.gBluePrintFilePath)
+        self._clearTimeline()
+
+    def getMapMatrix(self):
+        return self.mapMatrix
+
+    def setMapMatrix(self, matrix):
+        """ Set a pre-processed map matrix (such as loaded from a v2 scenario file)."""
+        self.mapMatrix = matrix
+        self._clearTimeline()   # the ticks of the previous map are not shown.
+
+    def getClearMap(self):
+        """ Return the clearance array (distance to the nearest wall) of the current 
+            map matrix, it is built once per matrix obj as the matrix is replaced 
+            (never changed in place) when the map is changed.
+        """
+        if self.mapMatrix is None: return None
+        if self.clearSrc is not self.mapMatrix:
+            self.clearMap = buildClearanceMap(self.mapMatrix)
+            self.clearSrc = self.mapMatrix
+        return self.clearMap
+
+    def getPlanner(self):
+        """ Return the route planner of the current map matrix (None if no map)."""
+        clearMap = self.getClearMap()
+        if clearMap is None: return None
+        if self.planner is None or self.planner.clearMap is not clearMap:
+            self.planner = RoutePlanner(clearMap)
+        return self.planner
+
+    def getNavGraph(self):
+        """ Return the cached navigation graph of the current map (None if no map)."""
+        planner = self.getPlanner()
+        if planner is None: return None
+        if self.navGraph is None or self.navGraph.planner is not planner:
+            self.navGraph = getNavGraph(self.mapMatrix, planner, cacheDir=gv.gNavGraphDir)
+        return self.navGraph
+    
+    def getExploredMap(self):
+        """ Return the explored area map of the current map matrix (None if no map),
+            a new map is created (nothing explored) when the map matrix is replaced.
+        """
+        if self.mapMatrix is None: return None
+        if self.exploredMap is None or self.exploredMap.mapMatrix is not self.mapMatrix:
+            self.exploredMap = ExploredMap(self.mapMatrix)
+        return self.exploredMap
+
+    def getExploredCoverage(self):
+        """ Return the explored ratio (0~1) of the map free area."""
+        return self.exploredMap.getCoverage() if self.exploredMap else 0.0
+
+    def getSoundModel(self):
+        """ Return the wall aware sound model of the current map matrix (None if no
+            map), the model is rebuilt when the map matrix is replaced.
+        """
+        if self.mapMatrix is None: return None
+        if self.soundModel is None or self.soundModel.mapMatrix is not self.mapMatrix:
+            self.soundModel = SoundModel(self.mapMatrix)
+        return self.soundModel
     
     #-----------------------------------------------------------------------------
     def reInit(self):
         """Clear the robot and enmeies for reinit."""
+        self.robots = []
+        self.robotIdCount = 0
         self.robot = None
+        self.squadData = {}
         self.enemys = []
         self.enemysIdCount = 0
+        self.enemyMotion.storeState()
+        self._clearTimeline()
+
+    #-----------------------------------------------------------------------------
+    # define the simulation state snapshot functions
+    def takeSnapshot(self):
+        """ Capture the whole simulation state of the current tick and return a 
+            <SimuSnapshot> obj.
+        """
+        mgrState = {
+            'robotDirDegree': self.robotDirDegree,
+            'robotIdCount': self.robotIdCount,
+            'enemysIdCount': self.enemysIdCount,
+            'sonaOn': self.sonaOn,
+            'sonarData': self.sonarData,
+            'soundData': None if self.soundData is None else tuple(self.soundData),
+            'soundDisData': None if self.soundDisData is None else tuple(self.soundDisData),
+            'soundWallFlg': self.soundWallFlg,
+            # the sources' fields assignment is changed in place, the cache is shared.
+            'soundModel': self.soundModel.copy() if self.soundModel else None,
+            'lidarOnflg': self.lidarOnflg,
+            'lidarDetectDis': self.lidarDetectDis,
+            'lidarDetecPt': self.lidarDetecPt,
+            'camOnFlg': self.camOnFlg,
+            'camAngle': self.camAngle,
+            'camDetectDisL': self.camDetectDisL,
+            'camDetectDisR': self.camDetectDisR,
+            'camDetecPtL': self.camDetecPtL,
+            'camDetecPtR': self.camDetecPtR,
+            'camEnemyDetFlg': self.camEnemyDetFlg,
+            'camEnemyDetIdxList': tuple(self.camEnemyDetIdxList),
+            'obstacleAvdFlg': self.obstacleAvdFlg,
+            'collisionFlg': self.collisionFlg,
+            'fogOnFlg': self.fogOnFlg,
+            # the generators state is changed every tick, the snapshot keeps a copy.
+            'noise': self.noise.copy() if self.noise else None,
+            # the explored bitset is changed in place, the snapshot keeps a copy.
+            'exploredMap': self.exploredMap.copy() if self.exploredMap else None,
+            'enemyMoveFlg': self.enemyMoveFlg,
+            # the sensors arrays are replaced (never changed in place) every tick.
+            'squadData': dict(self.squadData)
+        }
+        robotStates = tuple(robotObj.getState() for robotObj in self.robots)
+        self.enemyMotion.storeState()   # copy the enemies motion state to the objs.
+        enemyStates = tuple(enemyObj.getState() for enemyObj in self.enemys)
+        return SimuSnapshot(self.tickCount, self.mapMatrix, robotStates, enemyStates, 
+                            mgrState, activeIdx=self._getActiveIdx())
+
+    def restoreSnapshot(self, snapshot):
+        """ Restore (rewind) the whole simulation state to the input <SimuSnapshot>,
+            the timeline ticks after the snapshot are removed and the record and 
+            telemetry streams are stopped (the files keep the discarded branch).
+        """
+        self._stopStreams("restoreSnapshot()> Rewind to tick %d" %snapshot.tick)
+        self.timeline.truncate(snapshot.tick)
+        self.seekTick = None
+        self.tickCount = snapshot.tick
+        self.mapMatrix = snapshot.mapMatrix
+        for key, val in snapshot.mgrState.items():
+            setattr(self, key, val)
+        self.soundData = None if self.soundData is None else list(self.soundData)
+        self.soundDisData = None if self.soundDisData is None else list(self.soundDisData)
+        if self.soundModel: self.soundModel = self.soundModel.copy()
+        if self.noise: self.noise = self.noise.copy()
+        self.camEnemyDetIdxList = list(self.camEnemyDetIdxList)
+        self.squadData = dict(self.squadData)
+        if self.exploredMap: self.exploredMap = self.exploredMap.copy()
+        self.robots = []
+        for robotState in snapshot.robotStates:
+            robotObj = AgentRobot(self, robotState['id'], list(robotState['orgPos']))
+            robotObj.setState(robotState)
+            self.robots.append(robotObj)
+        self.robot = self.robots[snapshot.activeIdx] if self.robots else None
+        self.enemyMotion.storeState()
+        self.enemys = []
+        for enemyState in snapshot.enemyStates:
+            enemyObj = AgentEnemy(self, enemyState[0], list(enemyState[1]))
+            enemyObj.setState(enemyState)
+            self.enemys.append(enemyObj)
+
+    def fork(self, snapshot=None):
+        """ Create a new independent <MapMgr> which continues the simulation from 
+            the input snapshot (or the current state if snapshot is None). The 
+            recorder and the replay player are not shared with the forked manager.
+        """
+        newMgr = MapMgr()
+        newMgr.restoreSnapshot(snapshot if snapshot else self.takeSnapshot())
+        if newMgr.mapMatrix is self.clearSrc:
+            newMgr.clearMap, newMgr.clearSrc = self.clearMap, self.clearSrc
+            newMgr.planner, newMgr.navGraph = self.planner, self.navGraph
+        return newMgr
 
     #-----------------------------------------------------------------------------
     # define all the calculation() function here:
@@ -363,128 +814,189 @@ class MapMgr(object):
                 detY = detIdy
                 break
             # detection the beam reflection point
-            if self.mapMatrix[detIdy][detIdx] == 1:
+            if self.mapMatrix[detIdy, detIdx] == 1:
                 detX = detIdx
                 detY = detIdy
                 break
             detectDis += 1
         return detectDis, (detX, detY)
 
+    #-----------------------------------------------------------------------------
+    def getEnemyPosArr(self):
+        """ Return the (enemyNum, 2) array of all the enemies' current position."""
+        if self.enemyMotion.dirty: self.enemyMotion.load(self.enemys)
+        return self.enemyMotion.getPosArr()
+
+    def _getEnemyVector(self, posArr):
+        """ Return the (n, enemyNum, 2) int vectors from every robot position to 
+            every enemy.
+        """
+        enemyArr = np.trunc(self.getEnemyPosArr())
+        return np.trunc(enemyArr[None, :, :] - posArr[:, None, :]).astype(np.int64)
+
+    @staticmethod
+    def _vectorDegree(vectorArr):
+        """ Convert the (x, y) vectors to the map degree (0 is up, clockwise)."""
+        return (180 - np.degrees(np.arctan2(vectorArr[..., 0], vectorArr[..., 1]))).astype(np.int64)
+
     #-----------------------------------------------------------------------------
     def calSoundDir(self):
-        """ Calculate the sound direction (degree) from the robot current postion 
-            to all the enemies. 
+        """ Calculate the sound direction (degree) from all the robots' current 
+            postion to all the enemies. If the wall aware sound is on, the direction
+            is where the sound arrives from (around the walls) and the propagation
+            distance is also calculated, the direction is -1 in the squad array (None 
+            in the sound data) if the sound can not reach the robot.
         """
         if self.robot is None or len(self.enemys) == 0: return
-        robotPos = self.robot.getCrtPos()
-        soundDir = []
-        for enemyObj in self.enemys:
-            enemyPos = enemyObj.getOrgPos()
-            x = int(enemyPos[0] - robotPos[0])
-            y = int(enemyPos[1] - robotPos[1])
-            degreeVal = int(180 - math.degrees(math.atan2(x, y))) # convert to degree
-            soundDir.append(degreeVal)
-        self.soundData = soundDir.copy()
+        posArr, _ = self._getSquadPose()
+        soundModel = self.getSoundModel() if self.soundWallFlg else None
+        idx = self._getActiveIdx()
+        if soundModel is None:
+            vecArr = self._getEnemyVector(posArr)
+            soundArr = self._vectorDegree(vecArr)
+            disArr = np.hypot(vecArr[..., 0], vecArr[..., 1])
+            buildNum = 0
+        else:
+            enemyArr = self.getEnemyPosArr()
+            buildNum = soundModel.updateSources(enemyArr)
+            soundArr, disArr = soundModel.calSound(posArr, enemyArr)
+        if self.noise: soundArr, disArr = self.noise.noisyBearing('sound', soundArr, disArr)
+        self.squadData['sound'] = soundArr
+        self.squadData['soundDis'] = disArr
+        self.soundData = [None if deg < 0 else deg for deg in soundArr[idx].tolist()]
+        self.soundDisData = [None if math.isinf(dis) else int(dis) for dis in disArr[idx].tolist()]
+        if self.profCounters: self._addCount('sound', enemies=soundArr.size, fields=buildNum)
 
     #-----------------------------------------------------------------------------
     def calsonarData(self):
-        """ Calculate the sonar data from the robot current postion to four directions 
-            based on the map matrix. 
-        """
-        if self.robot and self.mapMatrix:
-            x, y = self.robot.getCrtPos()
-            maplineH = self.mapMatrix[y]
-            # Left sonar reflection
-            idxL = x
-            leftDis = 0
-            while idxL >= 0:
-                if maplineH[idxL] == 1:
-                    leftDis = x - idxL
-                    break
-                else:
-                    idxL -=1
-            # Right sonar reflection
-            idxR = x
-            rightDis = 0
-            while idxR < len(maplineH):
-                if maplineH[idxR] == 1:
-                    rightDis = idxR - x
-                    break
-                else:
-                    idxR += 1
-            maplineV = [self.mapMatrix[i][x] for i in range(600)]
-            # Up sonar reflection
-            idxF = y
-            frontDis = 0
-            while idxF >= 0:
-                if maplineV[idxF] == 1:
-                    frontDis = y - idxF
-                    break
-                else:
-                    idxF -=1
-            # Down sonar reflection
-            idxB = y
-            backDis = 0
-            while idxB < len(maplineV):
-                if maplineV[idxB] == 1:
-                    backDis = idxB - y
-                    break
-                else:
-                    idxB += 1
-    
-            self.sonarData = (frontDis, backDis, leftDis, rightDis)
-            #print(self.sonarData)
+        """ Calculate the sonar data from all the robots' current postion to four 
+            directions based on the map matrix, the robots' horizontal and vertical
+            map lines are checked in one numpy pass.
+        """
+        if self.robot and self.mapMatrix is not None:
+            rows, cols = self.mapMatrix.shape
+            posArr, _ = self._getSquadPose()
+            xArr = posArr[:, 0, None]
+            yArr = posArr[:, 1, None]
+            maplineH = self.mapMatrix[np.clip(posArr[:, 1], 0, rows-1)] == 1     # (n, cols)
+            maplineV = self.mapMatrix[:, np.clip(posArr[:, 0], 0, cols-1)].T == 1 # (n, rows)
+            colIdx = np.arange(cols)
+            rowIdx = np.arange(rows)
+            # the nearest wall index on each side, the sonar distance is 0 if no wall.
+            idxL = np.where(maplineH & (colIdx <= xArr), colIdx, -1).max(axis=1)
+            idxR = np.where(maplineH & (colIdx >= xArr), colIdx, cols).min(axis=1)
+            idxF = np.where(maplineV & (rowIdx <= yArr), rowIdx, -1).max(axis=1)
+            idxB = np.where(maplineV & (rowIdx >= yArr), rowIdx, rows).min(axis=1)
+            sonarArr = np.stack((np.where(idxF >= 0, posArr[:, 1] - idxF, 0),
+                                 np.where(idxB < rows, idxB - posArr[:, 1], 0),
+                                 np.where(idxL >= 0, posArr[:, 0] - idxL, 0),
+                                 np.where(idxR < cols, idxR - posArr[:, 0], 0)), axis=1)
+            if self.noise: sonarArr = self.noise.noisyRange('sonar', sonarArr)
+            self.squadData['sonar'] = sonarArr
+            self.sonarData = tuple(sonarArr[self._getActiveIdx()].tolist())
+            if self.profCounters:
+                self._addCount('sonar', rays=4*len(posArr), cells=maplineH.size+maplineV.size)
 
     #-----------------------------------------------------------------------------
     def calLidarDetect(self):
-        """Calculate the lidar detection calculation."""
-        if self.robot and self.mapMatrix:
-            x, y = self.robot.getCrtPos()
-            degree = self.getRobotDirDegree()
-            lidarDis, lidarPt = self._calculateBeamTouch((x, y), degree)
-            self.lidarDetectDis = lidarDis
-            self.lidarDetecPt = lidarPt
+        """Calculate the front lidar detection of all the robots."""
+        if self.robot and self.mapMatrix is not None:
+            posArr, degList = self._getSquadPose()
+            disArr, ptArr = castBeams(self.mapMatrix, posArr, degList)
+            if self.noise: disArr, ptArr = self.noise.noisyBeams('lidar', posArr, degList, disArr)
+            self.squadData['lidarDis'] = disArr
+            self.squadData['lidarPt'] = ptArr
+            idx = self._getActiveIdx()
+            self.lidarDetectDis = int(disArr[idx])
+            self.lidarDetecPt = tuple(ptArr[idx].tolist())
+            if self.profCounters: 
+                self._addCount('lidar', rays=len(disArr), cells=int(disArr.sum())+len(disArr))
             return 
 
     #-----------------------------------------------------------------------------
     def calCameDetect(self):
-        """Calculate the camera view detection. """
-        if self.robot and self.mapMatrix:
-            x, y = self.robot.getCrtPos()
-            degree = self.getRobotDirDegree()
-            degAClk = degree - self.camAngle
-            degClk =  degree + self.camAngle
-            ldis, lpt = self._calculateBeamTouch((x, y), degAClk)
-            rdis, rpt = self._calculateBeamTouch((x, y), degClk)
-            self.camDetectDisL = ldis
-            self.camDetecPtL = lpt
-            self.camDetectDisR = rdis
-            self.camDetecPtR = rpt
+        """Calculate the camera view (left and right edge beams) of all the robots."""
+        if self.robot and self.mapMatrix is not None:
+            posArr, degList = self._getSquadPose()
+            beamDegList = []
+            for degree in degList:
+                beamDegList += [degree - self.camAngle, degree + self.camAngle]
+            beamPosArr = np.repeat(posArr, 2, axis=0)
+            disArr, ptArr = castBeams(self.mapMatrix, beamPosArr, beamDegList)
+            if self.noise: disArr, ptArr = self.noise.noisyBeams('camera', beamPosArr, beamDegList, disArr)
+            camDisArr = disArr.reshape(-1, 2)
+            camPtArr = ptArr.reshape(-1, 2, 2)
+            self.squadData['camDis'] = camDisArr
+            self.squadData['camPt'] = camPtArr
+            idx = self._getActiveIdx()
+            self.camDetectDisL, self.camDetectDisR = camDisArr[idx].tolist()
+            self.camDetecPtL, self.camDetecPtR = [tuple(pt) for pt in camPtArr[idx].tolist()]
+            if self.profCounters: 
+                self._addCount('camera', rays=len(disArr), cells=int(disArr.sum())+len(disArr))
 
     #-----------------------------------------------------------------------------
     def checkObstacle(self):
-        if 0 < self.lidarDetectDis < 20:
-            self.startMove(False)
+        """ Scan the obstacles around all the robots with the multi-beam lidar, the
+            scan (n, beamNum) is used by the avoidance controller to steer the robots'
+            next step in <stepRobots()>.
+        """
+        if self.robot is None or self.mapMatrix is None: return
+        posArr, _ = self._getSquadPose()
+        beamNum = self.avoider.beamNum
+        degList, rangeArr = self.avoider.getScanBeams(len(posArr))
+        disArr, _ = castBeams(self.mapMatrix, np.repeat(posArr, beamNum, axis=0), degList, 
+                              maxDisArr=rangeArr)
+        if self.noise: disArr = self.noise.noisyRange('scan', disArr)
+        self.squadData['scan'] = disArr.reshape(-1, beamNum)
+        if self.profCounters: 
+            self._addCount('avoid', rays=len(disArr), cells=int(disArr.sum())+len(disArr))
 
     def checkCamEnemyDetect(self):
+        """ Check which enemies are in every robot's camera view sector and in the
+            sensors detection range, all the robot-enemy pairs are checked together.
+        """
         if self.robot is None or len(self.enemys) == 0: return
-        robotPos = self.robot.getCrtPos()
-        capturedEnmeyIdxList = []
-        degree = self.getRobotDirDegree()
-        degAClk = degree - self.camAngle
-        degClk =  degree + self.camAngle
-        for idx, enemyObj in enumerate(self.enemys):
-            enemyPos = enemyObj.getOrgPos()
-            x = int(enemyPos[0] - robotPos[0])
-            y = int(enemyPos[1] - robotPos[1])
-            degreeVal = int(180 - math.degrees(math.atan2(x, y)))
-            # Check enemy in the camera detection range
-            if degAClk <= degreeVal <=degClk:
-                dist = math.sqrt(x**2 + y**2)
-                if dist <= max(self.lidarDetectDis, max(self.camDetectDisL, self.camDetectDisR)):
-                #self.camDetectDisL and dist <= self.camDetectDisR and dist<=self.lidarDetectDis:
-                    capturedEnmeyIdxList.append(idx)
-        self.camEnemyDetIdxList = capturedEnmeyIdxList.copy()
+        posArr, degList = self._getSquadPose()
+        robotNum = len(posArr)
+        vectorArr = self._getEnemyVector(posArr)
+        degreeArr = self._vectorDegree(vectorArr)
+        degArr = np.array(degList, dtype=np.int64)[:, None]
+        # the detection range is the max of the lidar and cameras distance.
+        rangeArr = np.zeros(robotNum)
+        for key in ('lidarDis', 'camDis'):
+            disArr = self._getSquadVal(key)
+            if disArr is not None: 
+                rangeArr = np.maximum(rangeArr, disArr.reshape(robotNum, -1).max(axis=1))
+        idx = self._getActiveIdx()
+        rangeArr[idx] = max(self.lidarDetectDis, max(self.camDetectDisL, self.camDetectDisR))
+        distArr = np.sqrt((vectorArr**2).sum(axis=2))
+        inRangeArr = distArr <= rangeArr[:, None]
+        trueArr = (degreeArr >= degArr - self.camAngle) & (degreeArr <= degArr + self.camAngle) & inRangeArr
+        detArr = trueArr
+        if self.noise:
+            degreeArr = degreeArr + self.noise.bearingError('detect', degreeArr.shape)
+            detArr = (degreeArr >= degArr - self.camAngle) & (degreeArr <= degArr + self.camAngle) & inRangeArr
+            detArr = self.noise.noisyDetect('detect', detArr)
+        self.squadData['detected'] = detArr
+        self.squadData['detectedTrue'] = trueArr
+        self.camEnemyDetIdxList = np.nonzero(detArr[idx])[0].tolist()
+        if self.profCounters:
+            self._addCount('camDetect', enemies=detArr.size, detected=int(detArr.sum()))
+
+    def updateExplored(self):
+        """ Mark the map cells observed by all the robots' camera sector (or the 
+            lidar beam) and detection circle in the explored area map.
+        """
+        exploredMap = self.getExploredMap()
+        if self.robot is None or exploredMap is None: return
+        posArr, degList = self._getSquadPose()
+        if not exploredMap.checkPose(posArr, degList, self.camAngle, self.camOnFlg, self.lidarOnflg):
+            return
+        startArr, beamDegs, rangeArr = fanBeams(posArr, degList, self.camAngle, 
+                                                camFlg=self.camOnFlg, lidarFlg=self.lidarOnflg)
+        disArr, _ = castBeams(self.mapMatrix, startArr, beamDegs, maxDisArr=rangeArr)
+        newNum = exploredMap.markBeams(startArr, beamDegs, disArr)
+        if self.profCounters: self._addCount('fog', rays=len(beamDegs), cells=newNum)
 
     #-----------------------------------------------------------------------------
     # Selection control
@@ -492,13 +1004,14 @@ class MapMgr(object):
         """ Check if the input position is near any of the map components. 
             If yes, set the component as selected.
         """
-        if self.robot:
-            if self.robot.checkNear(posX, posY, threshold):
+        for robotObj in self.robots:
+            if robotObj.checkNear(posX, posY, threshold):
                 gv.gDebugPrint("User selected the robot at pos %s" %str((posX, posY)), 
                                logType=gv.LOG_INFO)
-                self.robot.setSelected(True)
+                robotObj.setSelected(True)
+                self.robot = robotObj   # the selected robot becomes the active robot.
             else:
-                self.robot.setSelected(False)
+                robotObj.setSelected(False)
         for enemyObj in self.enemys:
             if enemyObj.checkNear(posX, posY, threshold):
                 enemyObj.setSelected(True)
@@ -509,12 +1022,15 @@ class MapMgr(object):
         if gv.iEDCtrlPanel: gv.iEDCtrlPanel.updateSelectTargetInfo()
 
     def deleteSelected(self):
-        if self.robot and self.robot.getSelected():
-            self.robot.setMoveFlag(False)
-            self.robot = None
+        for robotObj in [robotObj for robotObj in self.robots if robotObj.getSelected()]:
+            robotObj.setMoveFlag(False)
+            self.robots.remove(robotObj)
+        if self.robot not in self.robots:
+            self.robot = self.robots[0] if self.robots else None
         for i, enemyObj in enumerate(self.enemys):
             if enemyObj.getSelected():
                 self.enemys.pop(i)
+                self.enemyMotion.dirty = True
                 return None
 
     #-----------------------------------------------------------------------------
@@ -525,6 +1041,9 @@ class MapMgr(object):
     # Define all the get() functions here:
     def getRobot(self):
         return self.robot
+
+    def getRobots(self):
+        return self.robots
     
     def getEnemy(self, id=None):
         """ Return all enemy obj list if input id is None, else return the 
@@ -539,16 +1058,19 @@ class MapMgr(object):
     def getSoundData(self):
         return self.soundData
 
+    def getSoundDisData(self):
+        return self.soundDisData
+
     def getSelectedInfo(self):
         """ Return the selected target's id, position and type.
             Return ('N.A', 'N.A', 'N.A') if no target is selected.
         """
-        if self.robot and self.robot.getSelected():
-            return (self.robot.getID(), self.robot.getOrgPos(), 'Robot')
-        else:
-            for enemyObj in self.enemys:
-                if enemyObj.getSelected():
-                    return (enemyObj.getID(), enemyObj.getOrgPos(), 'Enemy')
+        for robotObj in self.robots:
+            if robotObj.getSelected():
+                return (robotObj.getID(), robotObj.getOrgPos(), 'Robot')
+        for enemyObj in self.enemys:
+            if enemyObj.getSelected():
+                return (enemyObj.getID(), enemyObj.getOrgPos(), 'Enemy')
         return ('N.A', 'N.A', 'N.A')
 
     #-----------------------------------------------------------------------------
@@ -573,10 +1095,128 @@ class MapMgr(object):
     def getCamEnemyDetectList(self):
         return self.camEnemyDetIdxList
 
+    def getCamEnemyTrueDetectList(self):
+        """ Return the enemies index list in the active robot's camera view without
+            the sensors noise (no false positive or missed detection).
+        """
+        trueArr = self._getSquadVal('detectedTrue')
+        if trueArr is None or trueArr.shape[1] != len(self.enemys): return []
+        return np.nonzero(trueArr[self._getActiveIdx()])[0].tolist()
+
+    def getScenarioParams(self):
+        """ Return the simulation parameters saved in the scenario file."""
+        params = {'camAngle': self.camAngle}
+        if self.robot:
+            params['moveSpeed'] = self.robot.moveSpeed
+            params['traMaxSize'] = self.robot.trajectoryMaxSize
+        return params
+
+    def setScenarioParams(self, params):
+        if 'camAngle' in params: self.camAngle = params['camAngle']
+        for robotObj in self.robots:
+            if 'moveSpeed' in params: robotObj.moveSpeed = params['moveSpeed']
+            if 'traMaxSize' in params: robotObj.setTrajectoryMaxSize(params['traMaxSize'])
+
+    def _getActiveIdx(self):
+        return self.robots.index(self.robot) if self.robot in self.robots else 0
+
+    def _getSquadPose(self):
+        """ Return the (n, 2) int array of all the robots' current position and the 
+            list of the robots' head direction degree.
+        """
+        posArr = np.array([robotObj.getCrtPos() for robotObj in self.robots], 
+                          dtype=np.int64).reshape(-1, 2)
+        degList = []
+        for robotObj in self.robots:
+            dirTuple = robotObj.getDirection()
+            degList.append(int(180 - math.degrees(math.atan2(int(dirTuple[0]), int(dirTuple[1])))))
+        return posArr, degList
+
+    def _getSquadVal(self, key):
+        """ Return the squad sensor array of the key, None if the array is not 
+            calculated for the current robots.
+        """
+        val = self.squadData.get(key, None)
+        return val if val is not None and len(val) == len(self.robots) else None
+
+    def getSquadData(self):
+        """ Return the sensors arrays dict of all the robots: 'sonar' (n, 4), 
+            'lidarDis' (n, ), 'lidarPt' (n, 2), 'camDis' (n, 2), 'camPt' (n, 2, 2),
+            'sound' (n, enemyNum), 'soundDis' (n, enemyNum), 'detected' (n, enemyNum)
+            bool, 'detectedTrue' (n, enemyNum) bool detection without the sensors 
+            noise and the obstacle avoidance 'scan' (n, beamNum).
+        """
+        return self.squadData
+
+    def getRobotSensorData(self, idx):
+        """ Return the sensors data dict of the robot <idx> in the robots list (same
+            keys as the tick state, 'detected' is the enemy index list). The active
+            robot's data is the cached sensor values (also restored by the replay),
+            the other robots' data is from the squad arrays.
+        """
+        if self.robots[idx] is self.robot:
+            return {
+                'sonar': self.sonarData,
+                'lidarDis': self.lidarDetectDis,
+                'lidarPt': self.lidarDetecPt,
+                'camLDis': self.camDetectDisL,
+                'camLPt': self.camDetecPtL,
+                'camRDis': self.camDetectDisR,
+                'camRPt': self.camDetecPtR,
+                'detected': self.camEnemyDetIdxList
+            }
+        data = {'sonar': None, 'lidarDis': 0, 'lidarPt': None, 'camLDis': 0, 'camLPt': None,
+                'camRDis': 0, 'camRPt': None, 'detected': []}
+        sonarArr = self._getSquadVal('sonar')
+        if sonarArr is not None: data['sonar'] = tuple(sonarArr[idx].tolist())
+        lidarDisArr = self._getSquadVal('lidarDis')
+        if lidarDisArr is not None:
+            data['lidarDis'] = int(lidarDisArr[idx])
+            data['lidarPt'] = tuple(self.squadData['lidarPt'][idx].tolist())
+        camDisArr = self._getSquadVal('camDis')
+        if camDisArr is not None:
+            data['camLDis'], data['camRDis'] = camDisArr[idx].tolist()
+            data['camLPt'], data['camRPt'] = [tuple(pt) for pt in self.squadData['camPt'][idx].tolist()]
+        detArr = self._getSquadVal('detected')
+        if detArr is not None and detArr.shape[1] == len(self.enemys):
+            data['detected'] = np.nonzero(detArr[idx])[0].tolist()
+        return data
+
+    def getTickState(self):
+        """ Return the robot pose, sensors data, enemy positions, detection and 
+            prediction of the current tick in a dict (used by the simulation recorder).
+        """
+        predList, enemyList = [], []
+        patrolIdxList = self.enemyMotion.getPatrolIdxList(self.enemys)
+        for enemyObj, patrolIdx in zip(self.enemys, patrolIdxList):
+            predPos = enemyObj.getPredPos()
+            if predPos: predList.append((enemyObj.getID(), predPos))
+            enemyList.append((enemyObj.getID(), enemyObj.getCrtPos(), patrolIdx))
+        squad = [(*robotObj.getCrtPos(), robotObj.moveTgtIdx) for robotObj in self.robots 
+                 if robotObj is not self.robot]
+        state = {
+            'pos': self.robot.getCrtPos(),
+            'dir': self.robot.getDirection(),
+            'tgtIdx': self.robot.moveTgtIdx,
+            'dirDeg': self.robotDirDegree,
+            'sonar': self.sonarData,
+            'lidarDis': self.lidarDetectDis,
+            'lidarPt': self.lidarDetecPt,
+            'camLDis': self.camDetectDisL,
+            'camLPt': self.camDetecPtL,
+            'camRDis': self.camDetectDisR,
+            'camRPt': self.camDetecPtR,
+            'detected': [self.enemys[idx].getID() for idx in self.camEnemyDetIdxList],
+            'predicted': predList,
+            'squad': squad,
+            'enemies': enemyList
+        }
+        return state
+
     def genRandomPred(self, ranRange=50):
         """ Generate enemy random prediction positions based on the input range."""
         for enemyObj in self.enemys:
-            pos = enemyObj.getOrgPos()
+            pos = enemyObj.getCrtPos()
             x = pos[0] + randint(-ranRange, ranRange)
             y = pos[1] + randint(-ranRange, ranRange)
             enemyObj.setPredPos([x, y])
@@ -584,8 +1224,13 @@ class MapMgr(object):
     #-----------------------------------------------------------------------------
     def periodic(self):
         """ Periodic update function."""
+        if self.seekTick is not None:
+            # stay on the tick shown by the timeline scrub until the simulation resumes.
+            if not (self.enemyMoveFlg or any(robotObj.isMoving() for robotObj in self.robots)): return
+            self._resumeFromSeek()
         if self.robot: 
-            self.robot.updateCrtPos()
+            self.stepRobots()
+            if self.enemyMoveFlg: self.moveEnemies()
             self.updateSensorsDis()
             if self.sonaOn: self.calsonarData()
             self.calSoundDir()
@@ -593,7 +1238,68 @@ class MapMgr(object):
             if self.obstacleAvdFlg: self.checkObstacle()
             if self.camOnFlg: self.calCameDetect()
             if self.camEnemyDetFlg: self.checkCamEnemyDetect()
-                
+            if self.fogOnFlg: self.updateExplored()
+            tickState = self.getTickState()
+            self.timeline.addTick(tickState, tick=self.tickCount)
+            if self.recorder: self.recorder.addTick(self.tickCount, tickState)
+            if self.telemetry: self.telemetry.addTick(self.tickCount, tickState, self.soundData)
+            self.tickCount += 1
+
+    #-----------------------------------------------------------------------------
+    def stepRobots(self):
+        """ Move all the robots one clock cycle: the auto moving robots are stepped 
+            together in one numpy pass, the manual control and trajectory stepping 
+            robots are updated one by one. The steps are swept with the walls if the
+            collision check is on. If the obstacle avoidance is on, the auto moving 
+            robots are steered by the controller with the last obstacle scan and the 
+            robots which are blocked in all the directions are stopped.
+        """
+        clearMap = self.getClearMap() if self.collisionFlg else None
+        autoList, autoIdx = [], []
+        for idx, robotObj in enumerate(self.robots):
+            if robotObj.manualCtrl or robotObj.traplayStepMode:
+                robotObj.updateCrtPos(clearMap=clearMap)
+            elif robotObj.autoMoveFlg and len(robotObj.routePts) > 1:
+                autoList.append(robotObj)
+                autoIdx.append(idx)
+        if not autoList: return
+        posArr = np.array([robotObj.crtPos for robotObj in autoList], dtype=np.float64)
+        tgtArr = np.array([robotObj.routePts[robotObj.moveTgtIdx] for robotObj in autoList], 
+                          dtype=np.float64)
+        speedArr = np.array([robotObj.moveSpeed for robotObj in autoList], dtype=np.float64)
+        diffArr = tgtArr - posArr
+        distArr = np.sqrt((diffArr**2).sum(axis=1))
+        arrivedArr = distArr <= speedArr
+        # same calculation order as <AgentRobot.updateCrtPos()>: int(diff/dist*speed)
+        stepArr = np.trunc(diffArr/np.where(arrivedArr, 1, distArr)[:, None]*speedArr[:, None])
+        scanArr = self._getSquadVal('scan') if self.obstacleAvdFlg else None
+        headList, stopArr = [None] * len(autoList), np.zeros(len(autoList), dtype=bool)
+        if scanArr is not None:
+            headDegArr = np.array(self._getSquadPose()[1])[autoIdx]
+            dirArr, ratioArr, stopArr = self.avoider.steer(scanArr[autoIdx], posArr, tgtArr, headDegArr)
+            avoidArr = ~arrivedArr
+            stepArr = np.where(avoidArr[:, None], np.trunc(dirArr*(speedArr*ratioArr)[:, None]), stepArr)
+            # the robot heads to the steer direction.
+            headList = [tuple(vec) if avoid else None for vec, avoid in 
+                        zip(np.rint(dirArr*100).astype(np.int64).tolist(), avoidArr.tolist())]
+            stopArr &= avoidArr
+        newPosArr = np.where(arrivedArr[:, None], tgtArr, posArr + stepArr).astype(np.int64)
+        if clearMap is not None:
+            newPosArr, blockArr = sweepMove(clearMap, posArr, newPosArr)
+            # a way point too close to the wall is reached when the robot touches the wall.
+            nearArr = np.hypot(*(tgtArr - newPosArr).T) <= ROBOT_RADIUS
+            arrivedArr = np.where(blockArr, nearArr, arrivedArr)
+        for robotObj, newPos, arrived, head, stop in zip(autoList, newPosArr.tolist(), arrivedArr.tolist(),
+                                                         headList, stopArr.tolist()):
+            robotObj.applyStep(newPos, arrived, direction=head)
+            if stop: robotObj.setMoveFlag(False)
+
+    def moveEnemies(self):
+        """ Move all the enemies one clock cycle with their motion models."""
+        if not self.enemys: return
+        if self.enemyMotion.dirty: self.enemyMotion.load(self.enemys)
+        self.enemyMotion.step(self.mapMatrix, self._getSquadPose()[0])
+
     #-----------------------------------------------------------------------------
     def updateSensorsDis(self):
         """ Update the sensor display data on the viewer control panel."""
@@ -608,27 +1314,63 @@ class MapMgr(object):
             'dir': str(degreeVal)
         }
         sonarData = self.getSonarData()
+        if self.exploredMap: data['explored'] = "%.1f%%" %(self.exploredMap.getCoverage()*100)
         if sonarData:
             data['front'] = sonarData[0]
             data['back'] = sonarData[1]
             data['left'] = sonarData[2]
             data['right'] = sonarData[3]
-        gv.iRWCtrlPanel.updateMovSensorsData(data)
+        if gv.iRWCtrlPanel: gv.iRWCtrlPanel.updateMovSensorsData(data)
 
     #-----------------------------------------------------------------------------
     # define all the set() functions
     def startMove(self, moveFlag):
-        if self.robot: self.robot.setMoveFlag(moveFlag)
+        for robotObj in self.robots:
+            robotObj.setMoveFlag(moveFlag)
+        self.enemyMoveFlg = moveFlag
 
     def setRobot(self, id, pos, route):
         self.initRobot(pos)
         for wayPt in route:
             self.robot.addWayPt(wayPt)
 
+    def setRobots(self, robotInfoList):
+        """ Replace the squad with the robots info list [{'id', 'pos', 'route'}, ...],
+            the first robot is the active robot.
+        """
+        self.robots = []
+        self.robotIdCount = 0
+        for robotInfo in robotInfoList:
+            robotObj = self.addRobot(robotInfo['pos'], robotID=robotInfo.get('id', None))
+            for wayPt in robotInfo['route']:
+                robotObj.addWayPt(wayPt)
+        self.robot = self.robots[0] if self.robots else None
+
     def setEnemy(self, enemyDict):
+        """ Add the scenario enemies [[id, pos], ...], a moving enemy has the motion
+            dict as the 3rd item.
+        """
         for info in enemyDict:
-            id, pos = info
-            self.addEnemy(pos)
+            id, pos = info[:2]
+            self.addEnemy(pos, motionInfo=info[2] if len(info) > 2 else None)
+
+    def setSelectedEnemyMotion(self, motion):
+        """ Set the motion model of the selected enemy."""
+        for enemyObj in self.enemys:
+            if enemyObj.getSelected(): 
+                enemyObj.setMotion(motion)
+                self.enemyMotion.dirty = True
+
+    def addWayPt(self, pos):
+        """ Add a way point to the selected patrol enemy's route, else to the active
+            robot's route.
+        """
+        for enemyObj in self.enemys:
+            if enemyObj.getSelected() and enemyObj.getMotion() == MOTION_TYPES[PATROL_MD]:
+                enemyObj.addPatrolPt(pos)
+                self.enemyMotion.dirty = True
+                return
+        if self.robot: self.robot.addWayPt(pos)
 
     def setLidarOn(self, lidarOnFlag):
         self.lidarOnflg = lidarOnFlag
@@ -642,16 +1384,209 @@ class MapMgr(object):
     def setObsAvoid(self, obsAvoidFlag):
         self.obstacleAvdFlg = obsAvoidFlag
 
+    def setCollision(self, collisionFlag):
+        self.collisionFlg = collisionFlag
+
+    def setFogOn(self, fogOnFlag):
+        self.fogOnFlg = fogOnFlag
+
+    def setSoundWall(self, soundWallFlag):
+        self.soundWallFlg = soundWallFlag
+
+    def setNoise(self, noiseOnFlag, seed=None, scale=None):
+        """ Turn on/off the sensors noise models, the generators are restarted if
+            the seed is given.
+        """
+        if not noiseOnFlag:
+            self.noise = None
+        elif self.noise is None:
+            self.noise = SensorNoise(seed=gv.gNoiseSeed if seed is None else seed, 
+                                     scale=gv.gNoiseScale if scale is None else scale)
+        else:
+            if scale is not None: self.noise.scale = scale
+            if seed is not None: self.noise.reset(seed)
+
+    def getNoise(self):
+        return self.noise
+
+    def setMotionSeed(self, seed):
+        """ Restart the enemies motion random generator with the seed (set it before
+            the enemies are added to reproduce the wander enemies' motion).
+        """
+        self.enemyMotion.storeState()
+        self.enemyMotion = EnemyMotion(seed=seed)
+
     def setRobotManualMove(self, moveFlag, dirStr):
         if self.robot:
             self.robot.setManualControl(moveFlag)
             if moveFlag: self.robot.setMoveDir(dirStr)
 
     def resetBot(self):
-        self.robot.resetCrtPos()
+        for robotObj in self.robots:
+            robotObj.resetCrtPos()
+        self.enemyMotion.storeState()
+        for enemyObj in self.enemys:
+            enemyObj.resetCrtPos()
+        if self.exploredMap: self.exploredMap.reset()
+        if self.noise: self.noise.reset()
+        self._clearTimeline()
+        if self.player: self.replayTick(0)
 
     def robotbackward(self, timeInv=3):
-        self.robot.backward(timeInv=timeInv)
+        if self.player:
+            self.replayTick(self.playIdx - timeInv)
+        else:
+            for robotObj in self.robots:
+                robotObj.backward(timeInv=timeInv)
 
     def robotforward(self, timeInv=3):
-        self.robot.forward(timeInv=timeInv)
+        if self.player:
+            self.replayTick(self.playIdx + timeInv)
+        else:
+            for robotObj in self.robots:
+                robotObj.forward(timeInv=timeInv)
+
+    #-----------------------------------------------------------------------------
+    # define the simulation record and replay functions
+    def startRecord(self, filePath):
+        """ Start to record every simulation tick to the record file <filePath>."""
+        self.stopRecord()
+        self.recorder = SimuRecorder(filePath)
+        gv.gDebugPrint("startRecord()> Record simulation to file: %s" %filePath, 
+                       logType=gv.LOG_INFO)
+
+    def stopRecord(self):
+        if self.recorder:
+            self.recorder.close()
+            gv.gDebugPrint("stopRecord()> Recorded %s ticks." %str(self.recorder.getTickNum()), 
+                           logType=gv.LOG_INFO)
+            self.recorder = None
+
+    def startTelemetry(self, filePath):
+        """ Start to stream the per-tick telemetry to a *.csv or *.npz file."""
+        self.stopTelemetry()
+        enemyIDs = [enemyObj.getID() for enemyObj in self.enemys]
+        self.telemetry = TelemetrySink(filePath, enemyIDs=enemyIDs)
+        gv.gDebugPrint("startTelemetry()> Stream telemetry to file: %s" %self.telemetry.getFilePath(), 
+                       logType=gv.LOG_INFO)
+
+    def stopTelemetry(self, wait=False):
+        if self.telemetry:
+            # the remaining chunks are written by the background thread.
+            self.telemetry.close(wait=wait)
+            gv.gDebugPrint("stopTelemetry()> Streamed %s ticks." %str(self.telemetry.getTickNum()), 
+                           logType=gv.LOG_INFO)
+            self.telemetry = None
+
+    def startProfile(self, profiler):
+        """ Wrap the periodic() with the <SimuProfiler> and enable the per sensor 
+            counters (rays cast, cells visited, enemies tested).
+        """
+        self.stopProfile()
+        self.profiler = profiler
+        self.periodic = profiler.wrap('periodic', MapMgr.periodic.__get__(self))
+        self.profCounters = {sensor: profiler.getCounters(sensor) for sensor in 
+                             ('sound', 'sonar', 'lidar', 'camera', 'camDetect', 'fog', 'avoid')}
+
+    def stopProfile(self):
+        if self.profiler is None: return
+        del self.periodic   # remove the instance wrapper, use the class method.
+        self.profiler = self.profCounters = None
+
+    def _addCount(self, sensor, **counts):
+        counters = self.profCounters[sensor]
+        for key, val in counts.items():
+            counters[key] = counters.get(key, 0) + val
+
+    def loadReplay(self, filePath):
+        """ Load a simulation record file, the step through control will seek the 
+            recorded ticks instead of the robot trajectory list.
+        """
+        self.stopReplay()
+        try:
+            self.player = SimuPlayer(filePath)
+        except Exception as err:
+            gv.gDebugPrint("loadReplay()> Error to load the record: %s" %str(err), 
+                           logType=gv.LOG_ERR)
+            return False
+        self.replayTick(0)
+        return True
+
+    def stopReplay(self):
+        if self.player:
+            self.player.close()
+            self.player = None
+        self.playIdx = 0
+
+    def replayTick(self, idx):
+        """ Restore the robot pose and the sensors data of the recorded tick <idx>."""
+        if self.player is None or self.player.getTickNum() == 0 or self.robot is None: return
+        idx = min(max(0, idx), self.player.getTickNum()-1)
+        self.playIdx = idx
+        self._applyTickState(self.player.getTick(idx))
+
+    #-----------------------------------------------------------------------------
+    def seekTimeline(self, idx):
+        """ Pause the simulation and restore the state of the tick <idx> in the 
+            timeline. No tick is added while the simulation stays paused, when it 
+            is resumed the timeline ticks after the shown one are removed (the new
+            ticks replace them) and the record and telemetry streams are stopped.
+        """
+        if self.timeline.getTickNum() == 0 or self.robot is None: return
+        idx = min(max(0, idx), self.timeline.getTickNum()-1)
+        self.startMove(False)
+        self._applyTickState(self.timeline.getTick(idx))
+        self.seekTick = self.timeline.getStartTick() + idx
+
+    def _resumeFromSeek(self):
+        """ Continue the simulation from the tick shown by <seekTimeline()>."""
+        self._stopStreams("seekTimeline()> Resume from tick %d" %self.seekTick)
+        self.tickCount = self.seekTick + 1
+        self.timeline.truncate(self.tickCount)
+        self.seekTick = None
+
+    def _clearTimeline(self):
+        self.timeline.clear()
+        self.seekTick = None
+
+    def _stopStreams(self, reason):
+        """ Stop the record and telemetry streams when the simulation jumps to an
+            other tick (the files keep the discarded ticks).
+        """
+        if self.recorder or self.telemetry:
+            gv.gDebugPrint("%s, stop the record and telemetry." %reason, logType=gv.LOG_WARN)
+            self.stopRecord()
+            self.stopTelemetry()
+
+    def getTimelineTickNum(self):
+        return self.timeline.getTickNum()
+
+    #-----------------------------------------------------------------------------
+    def _applyTickState(self, state):
+        """ Apply a tick state dict (<getTickState()> format) to the robot and the 
+            sensors data cache.
+        """
+        self.robot.setMoveFlag(False)
+        self.robot.crtPos = state['pos']
+        self.robot.direction = state['dir']
+        self.robot.moveTgtIdx = min(state['tgtIdx'], len(self.robot.routePts)-1)
+        otherRobots = [robotObj for robotObj in self.robots if robotObj is not self.robot]
+        if len(otherRobots) == len(state['squad']):
+            for robotObj, (x, y, tgtIdx) in zip(otherRobots, state['squad']):
+                robotObj.crtPos = [x, y]
+                robotObj.moveTgtIdx = min(tgtIdx, len(robotObj.routePts)-1)
+        self.robotDirDegree = state['dirDeg']
+        self.sonarData = state['sonar']
+        self.lidarDetectDis, self.lidarDetecPt = state['lidarDis'] or 0, state['lidarPt']
+        self.camDetectDisL, self.camDetecPtL = state['camLDis'] or 0, state['camLPt']
+        self.camDetectDisR, self.camDetecPtR = state['camRDis'] or 0, state['camRPt']
+        idxDict = {enemyObj.getID(): i for i, enemyObj in enumerate(self.enemys)}
+        self.camEnemyDetIdxList = [idxDict[eID] for eID in state['detected'] if eID in idxDict]
+        predDict = dict(state['predicted'])
+        self.enemyMotion.storeState()   # detach the motion position views before moving.
+        enemyDict = {eID: (pos, patrolIdx) for eID, pos, patrolIdx in state['enemies']}
+        for enemyObj in self.enemys:
+            if enemyObj.getID() in predDict: enemyObj.setPredPos(predDict[enemyObj.getID()])
+            if enemyObj.getID() in enemyDict:
+                pos, enemyObj.patrolIdx = enemyDict[enemyObj.getID()]
+                enemyObj.crtPos = list(pos)
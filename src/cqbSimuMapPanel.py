@@ -31,6 +31,8 @@ class PanelRealworldMap(wx.Panel):
         self.toggle = False 
         self.bgBmp = None
         self.heatMapBmp = None
+        self.fogBmp = None      # explored area fog overlay bitmap.
+        self.fogKey = None      # (explored map id, version) of the fog bitmap.
         # Set the test heat map if under test mode
         if gv.gTestMode and gv.gHeatMapFile and os.path.exists(gv.gHeatMapFile):
             self.heatMapBmp = wx.Bitmap(gv.gHeatMapFile, wx.BITMAP_TYPE_ANY)
@@ -45,6 +47,7 @@ class PanelRealworldMap(wx.Panel):
         self.showLidarFlg = True        # flag to show the lidar detection area
         self.showCamFlg = True          # flag to show the camera detection area
         self.showCamDetect = True       # flag to show enemy detection 
+        self.showFogFlg = False         # flag to show the not explored area fog
         # Pain the panel.
         self.Bind(wx.EVT_PAINT, self.onPaint)
         self.SetDoubleBuffered(True)
@@ -65,6 +68,24 @@ class PanelRealworldMap(wx.Panel):
                 dc.DrawBitmap(self.bgBmp, x, y)
         if self.showHeatmap and self.heatMapBmp:
             dc.DrawBitmap(self._scaleBitmap(self.heatMapBmp, w, h), 0, 0)
+        if self.showFogFlg: self._drawFog(dc)
+
+    #-----------------------------------------------------------------------------
+    def _drawFog(self, dc):
+        """ Draw the fog overlay on the not explored area, the overlay bitmap is 
+            only rebuilt when the explored map is changed.
+        """
+        exploredMap = gv.iMapMgr.getExploredMap() if gv.iMapMgr else None
+        if exploredMap is None: return
+        fogKey = (id(exploredMap), exploredMap.version)
+        if fogKey != self.fogKey:
+            alphaArr = exploredMap.getFogAlpha()
+            h, w = alphaArr.shape
+            image = wx.Image(w, h, bytes(w*h*3))    # black fog.
+            image.SetAlpha(alphaArr.tobytes())
+            self.fogBmp = wx.Bitmap(image)
+            self.fogKey = fogKey
+        dc.DrawBitmap(self.fogBmp, 0, 0)
 
     #-----------------------------------------------------------------------------
     def _drawItems(self, dc):
@@ -72,10 +93,10 @@ class PanelRealworldMap(wx.Panel):
         dc.SetPen(self.defaultPen)
         if gv.iMapMgr is None: return None
         gdc = wx.GCDC(dc) # Init the graph contexts to draw special items
-        # Draw the robot
-        robotObj = gv.iMapMgr.getRobot()
-        if robotObj:
+        # Draw all the robots, the sensors data of every robot is from the squad.
+        for robotIdx, robotObj in enumerate(gv.iMapMgr.getRobots()):
             pos = robotObj.getCrtPos()
+            sensorData = gv.iMapMgr.getRobotSensorData(robotIdx)
             # Draw the route path
             if self.showRouteFlg:
                 waypts = robotObj.getRoutePts()
@@ -92,68 +113,67 @@ class PanelRealworldMap(wx.Panel):
                 dc.DrawLines(trajectory)
             # Draw the sonar env detection reflection lines.
             if self.showSonarFlg:
-                disVal = gv.iMapMgr.getSonarData()
+                disVal = sensorData['sonar']
                 if disVal:
                     color = wx.Colour(31, 156, 229) if self.toggle else wx.Colour('BLUE')
                     dc.SetPen(wx.Pen(color, 1, style=wx.PENSTYLE_LONG_DASH))
-                    f, b, l, r = gv.iMapMgr.getSonarData()
+                    f, b, l, r = disVal
                     dc.DrawLine(pos[0], pos[1], pos[0], pos[1]-f)
                     dc.DrawLine(pos[0], pos[1], pos[0]-l, pos[1])
                     dc.DrawLine(pos[0], pos[1], pos[0], pos[1]+b)
                     dc.DrawLine(pos[0], pos[1], pos[0]+r, pos[1])
             # Draw the front lidar detection line and point.
             if self.showLidarFlg:
-                lidarData = gv.iMapMgr.getLidarData()
-                if lidarData:
-                    lidarDis = lidarData[0]
-                    lidarPt = lidarData[1]
-                    if lidarDis > 0 and lidarPt:
-                        pen = wx.Pen(wx.Colour(169, 167, 12), 1) if self.toggle else wx.Pen(wx.Colour(127, 31, 31), 1, style=wx.PENSTYLE_LONG_DASH)
-                        dc.SetPen(pen)
-                        dc.DrawLine(pos[0], pos[1], lidarPt[0], lidarPt[1])
-                        dc.SetBrush(wx.Brush(wx.Colour(127, 31, 31)))
-                        dc.DrawCircle(lidarPt[0], lidarPt[1], 3)
+                lidarDis = sensorData['lidarDis']
+                lidarPt = sensorData['lidarPt']
+                if lidarDis > 0 and lidarPt:
+                    pen = wx.Pen(wx.Colour(169, 167, 12), 1) if self.toggle else wx.Pen(wx.Colour(127, 31, 31), 1, style=wx.PENSTYLE_LONG_DASH)
+                    dc.SetPen(pen)
+                    dc.DrawLine(pos[0], pos[1], lidarPt[0], lidarPt[1])
+                    dc.SetBrush(wx.Brush(wx.Colour(127, 31, 31)))
+                    dc.DrawCircle(lidarPt[0], lidarPt[1], 3)
             # Draw the camera viewer lines.
             if self.showCamFlg:
-                camData = gv.iMapMgr.getCamData()
-                if camData:
-                    leftDis = camData['leftDis']
-                    rightDis = camData['rightDis']
-                    leftPt = camData['leftPt']
-                    rightPt = camData['rightPt']
-                    dc.SetPen(wx.Pen(wx.Colour(67, 138, 85), 1, style=wx.PENSTYLE_LONG_DASH))
-                    if leftDis > 0 and leftPt:
-                        dc.DrawLine(pos[0], pos[1], leftPt[0], leftPt[1])
-                    if rightDis > 0 and rightPt:
-                        dc.DrawLine(pos[0], pos[1], rightPt[0], rightPt[1])
-                    # Show enemy detection in the camera view sector
-                    if self.showCamDetect:
-                        dc.SetPen(wx.Pen(wx.Colour('RED'), 2))
-                        enemies = gv.iMapMgr.getEnemy()
-                        detectedEnemy = gv.iMapMgr.getCamEnemyDetectList()
-                        if len(enemies) > 0 and len(detectedEnemy) > 0:
-                            for idx in detectedEnemy:
-                                enemyObj = enemies[idx]
-                                enemyPos = enemyObj.getOrgPos()
-                                dc.DrawLine(pos[0], pos[1], enemyPos[0], enemyPos[1])
+                leftDis, leftPt = sensorData['camLDis'], sensorData['camLPt']
+                rightDis, rightPt = sensorData['camRDis'], sensorData['camRPt']
+                dc.SetPen(wx.Pen(wx.Colour(67, 138, 85), 1, style=wx.PENSTYLE_LONG_DASH))
+                if leftDis > 0 and leftPt:
+                    dc.DrawLine(pos[0], pos[1], leftPt[0], leftPt[1])
+                if rightDis > 0 and rightPt:
+                    dc.DrawLine(pos[0], pos[1], rightPt[0], rightPt[1])
+                # Show enemy detection in the camera view sector
+                if self.showCamDetect:
+                    dc.SetPen(wx.Pen(wx.Colour('RED'), 2))
+                    enemies = gv.iMapMgr.getEnemy()
+                    detectedEnemy = sensorData['detected']
+                    if len(enemies) > 0 and len(detectedEnemy) > 0:
+                        for idx in detectedEnemy:
+                            enemyObj = enemies[idx]
+                            enemyPos = enemyObj.getCrtPos()
+                            dc.DrawLine(pos[0], pos[1], enemyPos[0], enemyPos[1])
             # Draw robot transparent enemy detection area.
             if self.showDetectFlg:
                 dc.SetPen(wx.Pen(wx.Colour(157, 204, 149), 1, style=wx.PENSTYLE_LONG_DASH))
                 color = wx.Colour(157, 204, 149, 128) if self.toggle else wx.Colour(157, 204, 149, 20)
                 gdc.SetBrush(wx.Brush(color))  
                 gdc.DrawEllipse(pos[0]-40, pos[1]-40, 80, 80)
-            # Draw the robot
+            # Draw the robot, the active robot is highlighted.
+            if robotObj is gv.iMapMgr.getRobot() and len(gv.iMapMgr.getRobots()) > 1:
+                dc.SetBrush(wx.Brush(wx.Colour("BLUE")))
+                dc.DrawCircle(pos[0], pos[1], 11)
             robotColor = wx.Colour("GREEN") if self.toggle else wx.Colour(67, 138, 85)
             dc.SetBrush(wx.Brush(robotColor))
             dc.SetPen(self.defaultPen)
             dc.DrawCircle(pos[0], pos[1], 8)
+            dc.SetTextForeground(wx.Colour(67, 138, 85))
+            dc.DrawText("R-%s" %str(robotObj.getID()), pos[0]+8, pos[1]-20)
         # drow the enemies actual pos
         if self.showEnemyFlg:
             dc.SetPen(self.defaultPen)
             dc.SetBrush(wx.Brush(wx.Colour("RED")))
             enemies = gv.iMapMgr.getEnemy()
             for enemyObj in enemies:
-                pos = enemyObj.getOrgPos()
+                pos = enemyObj.getCrtPos()
                 dc.DrawCircle(pos[0], pos[1], 8)
                 dc.SetTextForeground(wx.Colour("RED"))
                 dc.DrawText("E-%s %s" %(str(enemyObj.getID()), str(pos)), pos[0]+8, pos[1]+8)
@@ -201,6 +221,24 @@ class PanelRealworldMap(wx.Panel):
     def setShowSonar(self, flg):
         self.showSonarFlg = flg
 
+    def setShowFog(self, flg):
+        self.showFogFlg = flg
+
+    def getDisplayFlags(self):
+        """ Return the display flags dict used by the headless frame exporter."""
+        flags = {
+            'showRoute': self.showRouteFlg,
+            'showDetect': self.showDetectFlg,
+            'showTrajectory': self.showTrajectoryFlg,
+            'showEnemy': self.showEnemyFlg,
+            'showPredict': self.showPredictFlg,
+            'showSonar': self.showSonarFlg,
+            'showLidar': self.showLidarFlg,
+            'showCam': self.showCamFlg,
+            'showCamDetect': self.showCamDetect
+        }
+        return flags
+
     #-----------------------------------------------------------------------------
     def onPaint(self, evt):
         """ Draw the map on the panel, this function will be called when update the map."""
@@ -294,16 +332,19 @@ class PanelEditorMap(wx.Panel):
     def _drawItems(self, dc):
         dc.SetPen(self.defaultPen)
         if gv.iMapMgr is None: return None
-        # Draw the robot
-        robotObj = gv.iMapMgr.getRobot()
-        if robotObj:
+        # Draw the robots, the new way points are added to the active robot's route.
+        for robotObj in gv.iMapMgr.getRobots():
             pos = robotObj.getOrgPos()
+            dc.SetPen(self.defaultPen)
             # draw the selected highlight cycle.
             if robotObj.getSelected():
                 dc.SetBrush(wx.Brush(wx.Colour("BLUE")))
                 dc.DrawCircle(pos[0], pos[1], 12)
             dc.SetBrush(wx.Brush(wx.Colour(67, 138, 85)))
             dc.DrawCircle(pos[0], pos[1], 8)
+            dc.SetTextForeground(wx.Colour(67, 138, 85))
+            activeMark = '*' if robotObj is gv.iMapMgr.getRobot() else ''
+            dc.DrawText("R-%s%s" %(str(robotObj.getID()), activeMark), pos[0]+8, pos[1]-20)
             # draw the route way points
             waypts = robotObj.getRoutePts()
             if len(waypts) > 1:
@@ -321,6 +362,15 @@ class PanelEditorMap(wx.Panel):
         enemies = gv.iMapMgr.getEnemy()
         for enemyObj in enemies:
             pos = enemyObj.getOrgPos()
+            # draw the patrol route and the motion type of the moving enemy.
+            patrolPts = enemyObj.getPatrolPts()
+            if enemyObj.getMotion() == 'patrol' and patrolPts:
+                dc.SetPen(wx.Pen(wx.Colour("RED"), 1, style=wx.PENSTYLE_LONG_DASH))
+                dc.DrawLines([pos] + patrolPts + [pos])
+                dc.SetPen(self.defaultPen)
+            if enemyObj.getMotion() != 'static':
+                dc.SetTextForeground(wx.Colour("RED"))
+                dc.DrawText(enemyObj.getMotion(), pos[0]+8, pos[1]+8)
             if enemyObj.getSelected():                    
                 dc.SetBrush(wx.Brush(wx.Colour("BLUE")))
                 dc.DrawCircle(pos[0], pos[1], 12)
@@ -351,11 +401,13 @@ class PanelEditorMap(wx.Panel):
     def onLeftDown(self, event):
         pos = event.GetPosition()
         wxPointTuple = pos.Get()
-        # Check whether user select item
-        if gv.iMapMgr: gv.iMapMgr.checkSelected(wxPointTuple[0], wxPointTuple[1])
-        robot = gv.iMapMgr.getRobot()
-        # Add a way point if user is planning route.
-        if self.addWaypt and robot: robot.addWayPt([wxPointTuple[0], wxPointTuple[1]])
+        if gv.iMapMgr is None: return
+        if self.addWaypt:
+            # Add a way point to the selected patrol enemy or the active robot route.
+            gv.iMapMgr.addWayPt([wxPointTuple[0], wxPointTuple[1]])
+        else:
+            # Check whether user select item
+            gv.iMapMgr.checkSelected(wxPointTuple[0], wxPointTuple[1])
         self.updateDisplay()
         gv.iEDCtrlPanel.updateMapInfo()
         
@@ -369,7 +421,7 @@ class PanelEditorMap(wx.Panel):
         item = self.popupmenu.FindItemById(event.GetId())
         text = item.GetItemLabel()
         if text == "Plant A Robot":
-            if gv.iMapMgr: gv.iMapMgr.initRobot(self.clickPos.copy())
+            if gv.iMapMgr: gv.iMapMgr.addRobot(self.clickPos.copy())
         elif text == "Plant A Enemy":
             if gv.iMapMgr: gv.iMapMgr.addEnemy(self.clickPos.copy())
         self.updateDisplay()
@@ -437,10 +489,15 @@ class PanelDetection(wx.Panel):
         dc.SetPen(wx.Pen(wx.Colour('RED'), 2, style=wx.PENSTYLE_LONG_DASH))
         dc.SetTextForeground(wx.Colour("RED"))
         soundDirtList = gv.iMapMgr.getSoundData()
+        soundDisList = gv.iMapMgr.getSoundDisData()
         if soundDirtList and len(soundDirtList) > 0:
-            for soundDeg in soundDirtList:
-                x = 65 + int(50*math.sin(math.radians(soundDeg)))
-                y = 65 - int(50*math.cos(math.radians(soundDeg)))
+            for idx, soundDeg in enumerate(soundDirtList):
+                if soundDeg is None: continue # the sound can not reach the robot.
+                # the nearer (louder) sound is drawn longer.
+                soundDis = soundDisList[idx] if soundDisList and idx < len(soundDisList) else None
+                lineLen = 50 if soundDis is None else max(20, 50 - soundDis//20)
+                x = 65 + int(lineLen*math.sin(math.radians(soundDeg)))
+                y = 65 - int(lineLen*math.cos(math.radians(soundDeg)))
                 dc.DrawLine(65, 65, x, y)
                 dc.DrawText(str(int(soundDeg)), x+5, y-5)
 
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuNavGraph.py
+#
+# Purpose:     This module provides the navigation graph (visibility graph of the
+#              robot radius inflated wall corners) of one floor map for the repeated
+#              route queries, the graph is cached in memory and in the navigation
+#              graph folder keyed by the map hash.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/01
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The graph nodes are the convex corners of the free cells of the route planner
+    grid (refer to <cqbSimuPlanner>): a free cell whose diagonal neighbour is blocked
+    while the 2 cells beside the diagonal are free. The shortest route between two
+    points in the free space only turns at these corners, so the route query is an
+    A* search on a few hundred nodes instead of the grid cells.
+    The edges are the node pairs in the same connected region which have a free
+    straight segment. All the candidate segments are sorted by length and checked
+    in numpy batches: a coarse check on the cell grid first rejects the segments
+    which pass a cell without any robot clearance pixel, then the survivors are
+    checked on the pixel clearance (same check as the planner).
+    The cache key is the sha1 of the bit-packed map matrix and the graph parameters,
+    so the blue print image and the v2 scenario file of the same floor share the
+    cached graph file.
+    Usage: python cqbSimuNavGraph.py <blue print image | *.cqbs scenario>
+        - build (or load) the cached graph of the map and print the graph info.
+"""
+
+import os
+import sys
+import math
+import time
+import heapq
+import hashlib
+import numpy as np
+
+import cqbSimuGlobal as gv
+from cqbSimuCollision import checkSegmentFree
+
+NAV_VERSION = 1
+NAV_PREFIX = 'navGraph_'
+SEG_BATCH = 4096        # segments checked per numpy pass.
+VIS_BATCH = 32          # nearest nodes checked per group in the route query.
+
+gGraphCache = {}        # in memory graph cache {map hash: <NavGraph>}
+
+#-----------------------------------------------------------------------------
+def mapHash(mapMatrix, planner):
+    """ Return the navigation graph cache key of the map matrix and the planner
+        parameters.
+    """
+    sha = hashlib.sha1()
+    sha.update(np.packbits(np.asarray(mapMatrix) != 0, axis=1).tobytes())
+    sha.update(str((mapMatrix.shape, planner.cellSize, planner.radius, planner.segRadius,
+                    NAV_VERSION)).encode('utf-8'))
+    return sha.hexdigest()
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class NavGraph(object):
+    """ Visibility graph of the wall corners of one map."""
+    def __init__(self, planner, nodeArr, edgeArr):
+        """ Init example : graph = NavGraph.build(planner)
+            Args:
+                planner (RoutePlanner): route planner of the map.
+                nodeArr (numpy.ndarray): (n, 2) int nodes' positions.
+                edgeArr (numpy.ndarray): (m, 2) int node index pairs.
+        """
+        self.planner = planner
+        self.clearMap = planner.clearMap
+        self.nodeArr = np.asarray(nodeArr, dtype=np.int64).reshape(-1, 2)
+        self.edgeArr = np.asarray(edgeArr, dtype=np.int64).reshape(-1, 2)
+        if planner.regionList is None: planner._labelRegions()
+        self.regionArr = np.array([planner.regionList[planner._toIdx(pos)]
+                                   for pos in self.nodeArr.tolist()], dtype=np.int64)
+        # coarse cell grid: True if the cell has a pixel with the robot clearance.
+        cellSize = planner.cellSize
+        gRows, gCols = planner.freeGrid.shape
+        padArr = np.zeros((gRows*cellSize, gCols*cellSize), dtype=self.clearMap.dtype)
+        padArr[:self.clearMap.shape[0], :self.clearMap.shape[1]] = self.clearMap
+        self.maybeGrid = padArr.reshape(gRows, cellSize, gCols, cellSize).max(axis=(1, 3)) \
+            >= planner.segRadius
+        # adjacency list [[(node idx, length), ...], ...]
+        self.adjList = [[] for _ in range(len(self.nodeArr))]
+        nodeList = self.nodeArr.tolist()
+        for i, j in self.edgeArr.tolist():
+            length = math.hypot(nodeList[i][0] - nodeList[j][0], nodeList[i][1] - nodeList[j][1])
+            self.adjList[i].append((j, length))
+            self.adjList[j].append((i, length))
+
+    #-----------------------------------------------------------------------------
+    @classmethod
+    def build(cls, planner):
+        """ Build the navigation graph of the planner's map."""
+        freeGrid = planner.freeGrid
+        padGrid = np.zeros((freeGrid.shape[0]+2, freeGrid.shape[1]+2), dtype=bool)
+        padGrid[1:-1, 1:-1] = freeGrid
+        rows, cols = padGrid.shape
+        cornerArr = np.zeros(freeGrid.shape, dtype=bool)
+        for dy in (-1, 1):
+            for dx in (-1, 1):
+                diagArr = padGrid[1+dy:rows-1+dy, 1+dx:cols-1+dx]
+                sideXArr = padGrid[1:-1, 1+dx:cols-1+dx]
+                sideYArr = padGrid[1+dy:rows-1+dy, 1:-1]
+                cornerArr |= freeGrid & ~diagArr & sideXArr & sideYArr
+        rowArr, colArr = np.nonzero(cornerArr)
+        half = planner.cellSize // 2
+        nodeArr = np.stack((colArr*planner.cellSize + half, rowArr*planner.cellSize + half), axis=1)
+        graph = cls(planner, nodeArr, np.zeros((0, 2), dtype=np.int64))
+        iArr, jArr = np.triu_indices(len(nodeArr), 1)
+        sameRegion = graph.regionArr[iArr] == graph.regionArr[jArr]
+        iArr, jArr = iArr[sameRegion], jArr[sameRegion]
+        freeArr = graph._checkSegments(nodeArr[iArr], nodeArr[jArr])
+        return cls(planner, nodeArr, np.stack((iArr[freeArr], jArr[freeArr]), axis=1))
+
+    def save(self, filePath):
+        np.savez_compressed(filePath, nodes=self.nodeArr, edges=self.edgeArr)
+
+    @classmethod
+    def load(cls, filePath, planner):
+        with np.load(filePath) as data:
+            return cls(planner, data['nodes'], data['edges'])
+
+    #-----------------------------------------------------------------------------
+    def _checkSegments(self, startArr, endArr):
+        """ Check whether the straight segments are free in length sorted batches,
+            return the (n, ) bool array.
+        """
+        resultArr = np.zeros(len(startArr), dtype=bool)
+        if len(startArr) == 0: return resultArr
+        cellSize, segRadius = self.planner.cellSize, self.planner.segRadius
+        gRows, gCols = self.maybeGrid.shape
+        diffArr = endArr - startArr
+        lenArr = np.hypot(diffArr[:, 0], diffArr[:, 1])
+        orderArr = np.argsort(lenArr)
+        for batchIdx in range(0, len(orderArr), SEG_BATCH):
+            idxArr = orderArr[batchIdx:batchIdx+SEG_BATCH]
+            batchStart, batchDiff = startArr[idxArr], diffArr[idxArr]
+            # coarse check: 1 sample per cell, the samples near the segment ends are
+            # skipped as the clearance limit is lowered there (end close to the wall).
+            sampleNum = max(1, int(math.ceil(np.abs(batchDiff).max() / cellSize)))
+            ratios = np.arange(sampleNum+1) / sampleNum
+            cellArr = ((batchStart[:, None, :] + batchDiff[:, None, :]*ratios[None, :, None])
+                       // cellSize).astype(np.int64)
+            maybeArr = self.maybeGrid[np.clip(cellArr[..., 1], 0, gRows-1), 
+                                      np.clip(cellArr[..., 0], 0, gCols-1)]
+            disArr = lenArr[idxArr, None] * ratios[None, :]
+            nearEnd = (disArr < segRadius) | (lenArr[idxArr, None] - disArr < segRadius)
+            idxArr = idxArr[(maybeArr | nearEnd).all(axis=1)]
+            if idxArr.size == 0: continue
+            resultArr[idxArr] = checkSegmentFree(self.clearMap, startArr[idxArr], endArr[idxArr],
+                                                 radius=self.planner.segRadius)
+        return resultArr
+
+    def _visibleNodes(self, pos):
+        """ Return the index array of the visible nodes of the position, the nodes
+            are checked from near to far in VIS_BATCH groups until a group has a 
+            visible node (the far nodes are reached by the graph edges).
+        """
+        planner = self.planner
+        snapIdx = planner._snapIdx(pos)
+        if snapIdx is None: return np.zeros(0, dtype=np.int64)
+        idxArr = np.nonzero(self.regionArr == planner.regionList[snapIdx])[0]
+        diffArr = self.nodeArr[idxArr] - pos
+        idxArr = idxArr[np.argsort(diffArr[:, 0]**2 + diffArr[:, 1]**2)]
+        for batchIdx in range(0, idxArr.size, VIS_BATCH):
+            batchArr = idxArr[batchIdx:batchIdx+VIS_BATCH]
+            freeArr = self._checkSegments(np.repeat([pos], batchArr.size, axis=0), self.nodeArr[batchArr])
+            if freeArr.any(): return batchArr[freeArr]
+        return np.zeros(0, dtype=np.int64)
+
+    #-----------------------------------------------------------------------------
+    def planLeg(self, startPos, endPos):
+        """ Plan the route from the start to the end position on the graph.
+            Returns:
+                list: the way points after the start position (the last one is the
+                    end position), None if the end is not reachable on the graph.
+        """
+        startPos, endPos = [int(startPos[0]), int(startPos[1])], [int(endPos[0]), int(endPos[1])]
+        if self._checkSegments(np.array([startPos]), np.array([endPos]))[0]: return [endPos]
+        startVis = self._visibleNodes(startPos)
+        if startVis.size == 0:
+            # start close to the wall (such as the robot org position): go to the 
+            # nearest free cell first, the snapped position is not close to the wall.
+            snapPos = self.planner.snapPos(startPos)
+            if snapPos == startPos: return None
+            legPts = self.planLeg(snapPos, endPos)
+            return None if legPts is None else [snapPos] + legPts
+        endVis = self._visibleNodes(endPos)
+        if endVis.size == 0: return None
+        nodeList = self.nodeArr.tolist()
+        goalId = len(nodeList)
+        endX, endY = endPos
+        def heuristic(idx):
+            return math.hypot(nodeList[idx][0] - endX, nodeList[idx][1] - endY)
+        endCost = {idx: heuristic(idx) for idx in endVis.tolist()}
+        gScore, parent, closeSet, openHeap = {}, {}, set(), []
+        for idx in startVis.tolist():
+            g = math.hypot(nodeList[idx][0] - startPos[0], nodeList[idx][1] - startPos[1])
+            gScore[idx], parent[idx] = g, -1
+            openHeap.append((g + heuristic(idx), idx))
+        heapq.heapify(openHeap)
+        while openHeap:
+            crtIdx = heapq.heappop(openHeap)[1]
+            if crtIdx == goalId: break
+            if crtIdx in closeSet: continue
+            closeSet.add(crtIdx)
+            crtG = gScore[crtIdx]
+            nextList = self.adjList[crtIdx]
+            if crtIdx in endCost: nextList = nextList + [(goalId, endCost[crtIdx])]
+            for nextIdx, length in nextList:
+                nextG = crtG + length
+                if nextIdx in closeSet or gScore.get(nextIdx, float('inf')) <= nextG: continue
+                gScore[nextIdx], parent[nextIdx] = nextG, crtIdx
+                heapq.heappush(openHeap, (nextG + (0 if nextIdx == goalId else heuristic(nextIdx)), nextIdx))
+        else:
+            return None
+        legPts, idx = [endPos], parent[goalId]
+        while idx >= 0:
+            legPts.append(nodeList[idx])
+            idx = parent[idx]
+        legPts.reverse()
+        return legPts
+
+#-----------------------------------------------------------------------------
+def getNavGraph(mapMatrix, planner, cacheDir=None):
+    """ Return the navigation graph of the map from the memory cache, else from
+        the cache folder <cacheDir>, else build it (and save it in the folder).
+    """
+    key = mapHash(mapMatrix, planner)
+    graph = gGraphCache.get(key, None)
+    filePath = os.path.join(cacheDir, NAV_PREFIX + key + '.npz') if cacheDir else None
+    if graph is None and filePath and os.path.exists(filePath):
+        try:
+            graph = NavGraph.load(filePath, planner)
+        except Exception as err:
+            gv.gDebugPrint("getNavGraph()> load %s failed: %s" %(filePath, str(err)), logType=gv.LOG_WARN)
+    if graph is None:
+        graph = NavGraph.build(planner)
+        if filePath:
+            if not os.path.exists(cacheDir): os.makedirs(cacheDir)
+            graph.save(filePath)
+    elif graph.planner is not planner:
+        # same map in the other manager, only rebind the graph to its planner.
+        graph = NavGraph(planner, graph.nodeArr, graph.edgeArr)
+    gGraphCache[key] = graph
+    return graph
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    if len(argv) < 1:
+        print("Usage: python cqbSimuNavGraph.py <blue print image | *.cqbs scenario>")
+        return 1
+    from cqbSimuMapMgr import MapMgr
+    mapMgr = MapMgr()
+    if argv[0].endswith('.cqbs'):
+        import cqbSimuScenario as scenario
+        mapMgr.setMapMatrix(scenario.loadScenario(argv[0])['mapMatrix'])
+    else:
+        gv.gBluePrintFilePath = argv[0]
+        mapMgr.initMapMatix()
+    startT = time.perf_counter()
+    graph = mapMgr.getNavGraph()
+    print("Navigation graph: %d nodes, %d edges, loaded/built in %.1f ms, cached in %s"
+          %(len(graph.nodeArr), len(graph.edgeArr), (time.perf_counter() - startT)*1000,
+            gv.gNavGraphDir))
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
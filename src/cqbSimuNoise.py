@@ -0,0 +1,178 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuNoise.py
+#
+# Purpose:     This module provides the sensors noise models (sonar, lidar, camera
+#              and microphone): the gaussian range noise, the reading dropout, the
+#              bearing error and the false positive. Every sensor draws from its own
+#              seeded numpy random generator stream and the noise of all the beams
+#              (or robot-enemy pairs) is drawn in one array, so a noisy simulation
+#              is reproducible with the same seed.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/05
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The noise parameters of a sensor (DEF_NOISE, all are multiplied by the noise
+    scale):
+    - rangeStd, rangeRatio: the range noise std is rangeStd + rangeRatio * range.
+    - dropout: the probability of a reading is lost (the range is 0 as no wall is
+      found, the bearing is -1 as the sound can not be heard, the enemy in the view
+      sector is not detected).
+    - bearingStd: the bearing error std (degree).
+    - falsePos: the probability of a false reading (a ghost echo shorter than the
+      real range, a random bearing of a not heard sound, a not seen enemy detected).
+    The sensors' generators are spawned from one np.random.SeedSequence(seed), so
+    the draws of a sensor are not changed when an other sensor is turned on/off.
+    The obstacle avoidance scan ('scan') and the camera enemy detection ('detect')
+    have their own generators (not shared with the lidar and camera beams).
+"""
+
+import numpy as np
+
+# new sensors are appended: the spawned generators of the listed ones are kept.
+NOISE_SENSORS = ('sonar', 'lidar', 'camera', 'sound', 'scan', 'detect')
+DEF_NOISE = {
+    'sonar': {'rangeStd': 1.0, 'rangeRatio': 0.01, 'dropout': 0.02, 'bearingStd': 0.0, 'falsePos': 0.01},
+    'lidar': {'rangeStd': 0.5, 'rangeRatio': 0.005, 'dropout': 0.01, 'bearingStd': 0.0, 'falsePos': 0.005},
+    'camera': {'rangeStd': 1.0, 'rangeRatio': 0.01, 'dropout': 0.02, 'bearingStd': 2.0, 'falsePos': 0.005},
+    'sound': {'rangeStd': 5.0, 'rangeRatio': 0.02, 'dropout': 0.05, 'bearingStd': 5.0, 'falsePos': 0.01},
+    'scan': {'rangeStd': 0.5, 'rangeRatio': 0.005, 'dropout': 0.01, 'bearingStd': 0.0, 'falsePos': 0.005},
+    'detect': {'rangeStd': 0.0, 'rangeRatio': 0.0, 'dropout': 0.02, 'bearingStd': 2.0, 'falsePos': 0.005}
+}
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SensorNoise(object):
+    """ Seeded noise models of all the sensors."""
+    def __init__(self, seed=0, scale=1.0, params=None):
+        """ Init example : noise = SensorNoise(seed=1, scale=0.5)
+            Args:
+                seed (int, optional): random seed. Defaults to 0.
+                scale (float, optional): noise parameters multiplier. Defaults to 1.0.
+                params (dict, optional): {sensor: {param: val}} to replace the
+                    DEF_NOISE parameters. Defaults to None.
+        """
+        self.scale = scale
+        self.params = {sensor: dict(DEF_NOISE[sensor]) for sensor in NOISE_SENSORS}
+        if params:
+            for sensor, sensorParams in params.items(): self.setParams(sensor, **sensorParams)
+        self.reset(seed)
+
+    #-----------------------------------------------------------------------------
+    def reset(self, seed=None):
+        """ Restart all the sensors' generator streams (with a new seed if given)."""
+        if seed is not None: self.seed = int(seed)
+        seqList = np.random.SeedSequence(self.seed).spawn(len(NOISE_SENSORS))
+        self.rands = {sensor: np.random.default_rng(seq) for sensor, seq in zip(NOISE_SENSORS, seqList)}
+
+    def setParams(self, sensor, **kwargs):
+        """ Set the noise parameters of a sensor, the unknown parameters are ignored."""
+        sensorParams = self.params.get(sensor, None)
+        if sensorParams is None: return
+        for key, val in kwargs.items():
+            if key in sensorParams: sensorParams[key] = float(val)
+
+    def getParams(self, sensor):
+        return dict(self.params[sensor])
+
+    def _getParam(self, sensor, key):
+        return self.params[sensor][key] * self.scale
+
+    #-----------------------------------------------------------------------------
+    def getState(self):
+        """ Return the generators state dict (used by the simulation snapshot)."""
+        return {sensor: rand.bit_generator.state for sensor, rand in self.rands.items()}
+
+    def setState(self, state):
+        for sensor, genState in state.items():
+            if sensor in self.rands: self.rands[sensor].bit_generator.state = genState
+
+    def copy(self):
+        """ Return a copy with the same parameters and generators state."""
+        newNoise = SensorNoise(seed=self.seed, scale=self.scale, params=self.params)
+        newNoise.setState(self.getState())
+        return newNoise
+
+    #-----------------------------------------------------------------------------
+    def noisyRange(self, sensor, disArr):
+        """ Add the range noise, dropout and false positive to the range readings.
+            Args:
+                sensor (str): sensor name in NOISE_SENSORS.
+                disArr (numpy.ndarray): int range array of any shape, 0 is no reading.
+            Returns:
+                numpy.ndarray: int64 noisy range array (same shape), 0 is no reading.
+        """
+        disArr = np.asarray(disArr)
+        if self.scale <= 0 or disArr.size == 0: return disArr.astype(np.int64)
+        rand = self.rands[sensor]
+        gaussArr = rand.standard_normal(disArr.shape)
+        uniArr = rand.random((3, ) + disArr.shape)
+        stdArr = self._getParam(sensor, 'rangeStd') + self._getParam(sensor, 'rangeRatio') * disArr
+        noisyArr = np.maximum(np.rint(disArr + gaussArr * stdArr), 1)
+        # the ghost echo is a random range shorter than the real range.
+        ghostArr = uniArr[0] < self._getParam(sensor, 'falsePos')
+        noisyArr = np.where(ghostArr, np.maximum(np.trunc(disArr * uniArr[1]), 1), noisyArr)
+        dropArr = (uniArr[2] < self._getParam(sensor, 'dropout')) | (disArr <= 0)
+        return np.where(dropArr, 0, noisyArr).astype(np.int64)
+
+    def noisyBeams(self, sensor, posArr, degList, disArr):
+        """ Add the range noise to the beams (lidar or camera edge beams) and move
+            the beams' touch points to the noisy range, the dropout beam's touch point
+            is the start position.
+            Returns:
+                tuple: ((n, ) int64 noisy range array, (n, 2) int64 touch points array)
+        """
+        noisyArr = self.noisyRange(sensor, disArr)
+        radArr = np.radians(np.asarray(degList, dtype=np.float64))
+        posArr = np.asarray(posArr, dtype=np.int64).reshape(-1, 2)
+        ptArr = np.stack((posArr[:, 0] + np.trunc(noisyArr * np.sin(radArr)),
+                          posArr[:, 1] - np.trunc(noisyArr * np.cos(radArr))), axis=1)
+        return noisyArr, ptArr.astype(np.int64)
+
+    def noisyBearing(self, sensor, degArr, disArr=None):
+        """ Add the bearing error, dropout and false positive to the bearings.
+            Args:
+                sensor (str): sensor name in NOISE_SENSORS.
+                degArr (numpy.ndarray): int bearing (degree) array, -1 is no reading.
+                disArr (numpy.ndarray, optional): range array of the bearings (same
+                    shape), the range noise is added if given. Defaults to None.
+            Returns:
+                tuple: (int64 noisy bearing array (-1 is no reading), float noisy range
+                    array or None)
+        """
+        degArr = np.asarray(degArr)
+        if self.scale <= 0 or degArr.size == 0: return degArr.astype(np.int64), disArr
+        rand = self.rands[sensor]
+        gaussArr = rand.standard_normal((2, ) + degArr.shape)
+        uniArr = rand.random((2, ) + degArr.shape)
+        noisyArr = np.rint(degArr + gaussArr[0] * self._getParam(sensor, 'bearingStd')) % 360
+        # a not heard source may be heard from a random direction.
+        ghostArr = (degArr < 0) & (uniArr[0] < self._getParam(sensor, 'falsePos'))
+        noisyArr = np.where(ghostArr, np.trunc(uniArr[1] * 360), noisyArr)
+        dropArr = ((degArr < 0) & ~ghostArr) | ((degArr >= 0) & (uniArr[0] < self._getParam(sensor, 'dropout')))
+        noisyArr = np.where(dropArr, -1, noisyArr).astype(np.int64)
+        if disArr is not None:
+            stdArr = self._getParam(sensor, 'rangeStd') + self._getParam(sensor, 'rangeRatio') * np.where(
+                np.isinf(disArr), 0, disArr)
+            disArr = np.where(dropArr, np.inf, np.maximum(disArr + gaussArr[1] * stdArr, 0))
+        return noisyArr, disArr
+
+    def noisyDetect(self, sensor, detArr):
+        """ Add the missed detection (dropout) and the false positive detection to the
+            bool detection array of any shape.
+        """
+        detArr = np.asarray(detArr, dtype=bool)
+        if self.scale <= 0 or detArr.size == 0: return detArr
+        uniArr = self.rands[sensor].random(detArr.shape)
+        return np.where(detArr, uniArr >= self._getParam(sensor, 'dropout'),
+                        uniArr < self._getParam(sensor, 'falsePos'))
+
+    def bearingError(self, sensor, shape):
+        """ Return the float bearing error (degree) array of the shape."""
+        if self.scale <= 0: return np.zeros(shape)
+        return self.rands[sensor].standard_normal(shape) * self._getParam(sensor, 'bearingStd')
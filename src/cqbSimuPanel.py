@@ -19,9 +19,14 @@ import wx
 from datetime import datetime
 
 import cqbSimuGlobal as gv
+import cqbSimuScenario as scenario
 from cqbSimuMapPanel import PanelDetection
+from cqbSimuMapMgr import buildMapMatrix
+from cqbSimuMapLoader import MapLoader
+from cqbSimuEnemyMotion import MOTION_TYPES
+from cqbSimuRouteOptimizer import createOptimizer
 
-from ConfigLoader import JsonLoader
+from lib.ConfigLoader import JsonLoader
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -124,6 +129,27 @@ class PanelViewerCtrl(wx.Panel):
         self.obsAvoidCB = wx.CheckBox(self, label = 'Enable Obstacle Avoidance')
         self.obsAvoidCB.Bind(wx.EVT_CHECKBOX, self.onObsAvoid)
         sizer.Add(self.obsAvoidCB, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        sizer.AddSpacer(10)
+        # Add the robot wall collision control check box
+        self.collisionCB = wx.CheckBox(self, label = 'Wall Collision')
+        self.collisionCB.SetValue(True)
+        self.collisionCB.Bind(wx.EVT_CHECKBOX, self.onCollision)
+        sizer.Add(self.collisionCB, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        sizer.AddSpacer(10)
+        # Add the simulation tick record control check box
+        self.recordCB = wx.CheckBox(self, label = 'Record Simulation')
+        self.recordCB.Bind(wx.EVT_CHECKBOX, self.onRecord)
+        sizer.Add(self.recordCB, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        sizer.AddSpacer(10)
+        # Add the per-tick telemetry stream control check box
+        self.telemetryCB = wx.CheckBox(self, label = 'Stream Telemetry')
+        self.telemetryCB.Bind(wx.EVT_CHECKBOX, self.onTelemetry)
+        sizer.Add(self.telemetryCB, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        sizer.AddSpacer(10)
+        # Add the simulation tick and paint profiling control check box
+        self.profileCB = wx.CheckBox(self, label = 'Profiling')
+        self.profileCB.Bind(wx.EVT_CHECKBOX, self.onProfile)
+        sizer.Add(self.profileCB, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=2)
         sizer.AddSpacer(20)
         # Add the state display 
         stlabel = wx.StaticText(self, label="State : ")
@@ -134,6 +160,15 @@ class PanelViewerCtrl(wx.Panel):
         self.stValLb.SetForegroundColour(wx.Colour(195, 60, 45))
         self.stValLb.SetFont(font)
         sizer.Add(self.stValLb, flag= wx.RIGHT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        sizer.AddSpacer(20)
+        # Add the simulation timeline scrub slider
+        tllabel = wx.StaticText(self, label="Timeline : ")
+        tllabel.SetFont(font)
+        sizer.Add(tllabel, flag= wx.RIGHT | wx.ALIGN_CENTER_VERTICAL, border=2)
+        self.timelineSD = wx.Slider(self, value=0, minValue=0, maxValue=1, size=(200, -1),
+                                    style=wx.SL_HORIZONTAL | wx.SL_LABELS)
+        self.timelineSD.Bind(wx.EVT_SLIDER, self.onTimelineScrub)
+        sizer.Add(self.timelineSD, flag= wx.RIGHT | wx.ALIGN_CENTER_VERTICAL, border=2)
         return sizer
 
     #-----------------------------------------------------------------------------
@@ -187,6 +222,12 @@ class PanelViewerCtrl(wx.Panel):
         self.showSonarMCB.SetValue(False)
         sizer.Add(self.showSonarMCB, flag=flagsL, border=2)
         sizer.AddSpacer(5)
+        # Add the not explored area fog enable/disable checkbox
+        self.showFogCB = wx.CheckBox(self, label = 'Show Explored Area Fog')
+        self.showFogCB.Bind(wx.EVT_CHECKBOX, self.onShowFog)
+        self.showFogCB.SetValue(False)
+        sizer.Add(self.showFogCB, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
         return sizer
     
     #-----------------------------------------------------------------------------
@@ -201,7 +242,7 @@ class PanelViewerCtrl(wx.Panel):
         sizer.Add(label, flag=flagsL, border=2)
         sizer.AddSpacer(10)
 
-        gSizer = wx.GridSizer(7, 2, 2, 2)
+        gSizer = wx.GridSizer(8, 2, 2, 2)
         gSizer.Add(wx.StaticText(self, label="Robot Position: "), flag=flagsL, border=0)
         self.robotPosTF = wx.StaticText(self, label="N.A")
         gSizer.Add(self.robotPosTF, flag=flagsL, border=0)
@@ -232,6 +273,10 @@ class PanelViewerCtrl(wx.Panel):
         self.robotBackTF = wx.StaticText(self, label="N.A")
         gSizer.Add(self.robotBackTF, flag=flagsL, border=0)
 
+        gSizer.Add(wx.StaticText(self, label="Explored Area: "), flag=flagsL, border=0)
+        self.exploredTF = wx.StaticText(self, label="N.A")
+        gSizer.Add(self.exploredTF, flag=flagsL, border=0)
+
         sizer.Add(gSizer, flag=flagsL, border=2)
         return sizer
 
@@ -270,6 +315,11 @@ class PanelViewerCtrl(wx.Panel):
         sizer.AddSpacer(10)
         gv.iDetectPanel = PanelDetection(self)
         sizer.Add(gv.iDetectPanel, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
+        self.soundWallCB = wx.CheckBox(self, label = 'Sound Around Walls')
+        self.soundWallCB.SetValue(True)
+        self.soundWallCB.Bind(wx.EVT_CHECKBOX, self.onSoundWall)
+        sizer.Add(self.soundWallCB, flag=flagsL, border=2)
         return sizer
     
     #-----------------------------------------------------------------------------
@@ -301,6 +351,11 @@ class PanelViewerCtrl(wx.Panel):
         self.camDectOnCB.Bind(wx.EVT_CHECKBOX, self.onEnableCamDetect)
         self.camDectOnCB.SetValue(False)
         sizer.Add(self.camDectOnCB, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
+        self.noiseOnCB = wx.CheckBox(self, label = 'Sensors Noise')
+        self.noiseOnCB.Bind(wx.EVT_CHECKBOX, self.onEnableNoise)
+        self.noiseOnCB.SetValue(bool(gv.gNoiseOnFlg))
+        sizer.Add(self.noiseOnCB, flag=flagsL, border=2)
         return sizer
 
     #-----------------------------------------------------------------------------
@@ -352,11 +407,52 @@ class PanelViewerCtrl(wx.Panel):
     def onEnableCamDetect(self, evt):
         flg = self.camDectOnCB.IsChecked()
         gv.iMapMgr.setCamDetectionOn(flg)
+
+    def onEnableNoise(self, evt):
+        flg = self.noiseOnCB.IsChecked()
+        gv.iMapMgr.setNoise(flg)
     
     def onObsAvoid(self, event):
         flg = self.obsAvoidCB.IsChecked()
         gv.iMapMgr.setObsAvoid(flg)
 
+    def onCollision(self, event):
+        flg = self.collisionCB.IsChecked()
+        gv.iMapMgr.setCollision(flg)
+
+    def onSoundWall(self, event):
+        flg = self.soundWallCB.IsChecked()
+        gv.iMapMgr.setSoundWall(flg)
+
+    def onTimelineScrub(self, event):
+        """ Pause the simulation and show the tick selected by the timeline slider."""
+        self.stValLb.SetForegroundColour(wx.Colour(195, 60, 45))
+        self.stValLb.SetLabel("Paused")
+        gv.iMapMgr.seekTimeline(self.timelineSD.GetValue())
+        if gv.iRWMapPnl: gv.iRWMapPnl.updateDisplay()
+        if gv.iDetectPanel: gv.iDetectPanel.updateDisplay()
+
+    def onRecord(self, event):
+        """ Start/stop recording the simulation ticks to a record file."""
+        if self.recordCB.IsChecked():
+            date_time = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
+            gv.iMapMgr.startRecord(os.path.join(gv.gRecordDir, "Record_%s" %str(date_time)))
+        else:
+            gv.iMapMgr.stopRecord()
+
+    def onProfile(self, event):
+        """ Start/stop profiling the simulation tick and the map panels painting."""
+        gv.iMainFrame.setProfiling(self.profileCB.IsChecked())
+
+    def onTelemetry(self, event):
+        """ Start/stop streaming the per-tick telemetry to a csv/npz file."""
+        if self.telemetryCB.IsChecked():
+            date_time = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
+            fileName = "Telemetry_%s.%s" %(str(date_time), gv.gTelemetryFmt)
+            gv.iMapMgr.startTelemetry(os.path.join(gv.gRecordDir, fileName))
+        else:
+            gv.iMapMgr.stopTelemetry()
+
     def onRobotMove(self, event):
         """ Handle the robot manual move event """
         cmd = str(event.GetEventObject().GetName())
@@ -392,6 +488,21 @@ class PanelViewerCtrl(wx.Panel):
         flg = self.showSonarMCB.IsChecked()
         gv.iRWMapPnl.setShowSonar(flg)
 
+    def onShowFog(self, event):
+        flg = self.showFogCB.IsChecked()
+        gv.iRWMapPnl.setShowFog(flg)
+
+    #-----------------------------------------------------------------------------
+    def updateTimeline(self, tickNum):
+        """ Update the timeline slider range with the timeline ticks number (the
+            range is reset when the timeline is cleared).
+        """
+        maxVal = max(tickNum-1, 1)
+        if maxVal != self.timelineSD.GetMax():
+            atEnd = self.timelineSD.GetValue() == self.timelineSD.GetMax()
+            self.timelineSD.SetMax(maxVal)
+            if atEnd or self.timelineSD.GetValue() > maxVal: self.timelineSD.SetValue(maxVal)
+
     #-----------------------------------------------------------------------------
     def updateMovSensorsData(self, dataDict):
         posStr = dataDict['pos'] if 'pos' in dataDict.keys() else 'N.A'
@@ -406,6 +517,8 @@ class PanelViewerCtrl(wx.Panel):
         self.robotFrontTF.SetLabel(str(frontDic))
         backDic = dataDict['back'] if 'back' in dataDict.keys() else 'N.A'
         self.robotBackTF.SetLabel(str(backDic))
+        exploredStr = dataDict['explored'] if 'explored' in dataDict.keys() else 'N.A'
+        self.exploredTF.SetLabel(str(exploredStr))
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -415,6 +528,10 @@ class PanelEditorCtrl(wx.Panel):
     def __init__(self, parent, panelSize=(850, 300)):
         wx.Panel.__init__(self, parent, size=panelSize)
         self.SetBackgroundColour(wx.Colour(200, 210, 200))
+        self.loadID = 0         # latest background map load request ID.
+        self.mapLoader = None   # background map loader thread.
+        self.optimizer = None   # background search route optimizer.
+        self.optResults = []    # best search routes of the last optimize.
         self.SetSizer(self._buildUISizer())
 
     #-----------------------------------------------------------------------------
@@ -464,6 +581,12 @@ class PanelEditorCtrl(wx.Panel):
         self.bpval = wx.TextCtrl(self, -1, " ",size=(200, 25))
         sizer.Add(self.bpval, flag=flagsL, border=2)
         sizer.AddSpacer(5)
+        # Background map load progress
+        self.loadGauge = wx.Gauge(self, range=100, size=(200, 10))
+        sizer.Add(self.loadGauge, flag=flagsL, border=2)
+        self.loadStateLb = wx.StaticText(self, label="Map Load : Idle")
+        sizer.Add(self.loadStateLb, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
         # Mouse pos info
         label = wx.StaticText(self, label="Current Mouse Pos :")
         sizer.Add(label, flag=flagsL, border=2)
@@ -514,6 +637,15 @@ class PanelEditorCtrl(wx.Panel):
         self.rmTgtbtn = wx.Button(self, -1, "Remove Selected Target")
         self.rmTgtbtn.Bind(wx.EVT_BUTTON, self.onRemoveTarget)
         sizer.Add(self.rmTgtbtn, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
+        # Selected enemy motion model.
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        hbox.Add(wx.StaticText(self, label="Enemy Motion: "), flag=wx.CENTER)
+        self.motionCH = wx.Choice(self, -1, size=(80, 25), choices=list(MOTION_TYPES))
+        self.motionCH.SetSelection(0)
+        self.motionCH.Bind(wx.EVT_CHOICE, self.onEnemyMotion)
+        hbox.Add(self.motionCH, flag=wx.CENTER)
+        sizer.Add(hbox, flag=flagsL, border=2)
         sizer.AddSpacer(10)
         sizer.Add(wx.StaticText(self, label="Robot Route Control:"), flag=flagsL, border=2)
         sizer.AddSpacer(5)
@@ -522,6 +654,11 @@ class PanelEditorCtrl(wx.Panel):
         self.routePlanCB.Bind(wx.EVT_CHECKBOX, self.onEnableRoutePlan)
         sizer.Add(self.routePlanCB, flag=flagsL, border=2)
         sizer.AddSpacer(5)
+        # Expand the clicked way points to a collision free route.
+        self.autoRoutebtn = wx.Button(self, -1, "Auto Plan Robot Route")
+        self.autoRoutebtn.Bind(wx.EVT_BUTTON, self.onAutoPlanRoute)
+        sizer.Add(self.autoRoutebtn, flag=flagsL, border=2)
+        sizer.AddSpacer(5)
         # Route clear
         self.rmRoutebtn = wx.Button(self, -1, "Clear Robot Route")
         self.rmRoutebtn.Bind(wx.EVT_BUTTON, self.onRemoveRoute)
@@ -546,6 +683,18 @@ class PanelEditorCtrl(wx.Panel):
         self.initMapMxbtn = wx.Button(self, -1, "Generate Floor Map Matrix")
         self.initMapMxbtn.Bind(wx.EVT_BUTTON, self.onGenerateMapMx)
         sizer.Add(self.initMapMxbtn, flag=flagsL, border=2)
+        sizer.AddSpacer(10)
+        # Search route optimizer, the selected best route is set to the active robot.
+        sizer.Add(wx.StaticText(self, label="Search Route Optimizer:"), flag=flagsL, border=2)
+        sizer.AddSpacer(5)
+        self.optRoutebtn = wx.Button(self, -1, "Optimize Search Route")
+        self.optRoutebtn.Bind(wx.EVT_BUTTON, self.onOptimizeRoute)
+        sizer.Add(self.optRoutebtn, flag=flagsL, border=2)
+        self.optStateLb = wx.StaticText(self, label="Optimizer : Idle")
+        sizer.Add(self.optStateLb, flag=flagsL, border=2)
+        self.optRouteCH = wx.Choice(self, -1, size=(220, 25), choices=[])
+        self.optRouteCH.Bind(wx.EVT_CHOICE, self.onSelectOptRoute)
+        sizer.Add(self.optRouteCH, flag=flagsL, border=2)
         return sizer
 
     #-----------------------------------------------------------------------------
@@ -591,7 +740,9 @@ class PanelEditorCtrl(wx.Panel):
         if gv.iMapMgr: gv.iMapMgr.genRandomPred()
     
     def onGenerateMapMx(self, evt):
-        if gv.iMapMgr: gv.iMapMgr.initMapMatix()
+        if gv.iMapMgr and gv.gBluePrintFilePath: 
+            self.startMapLoad(bpPath=gv.gBluePrintFilePath, 
+                              displayName=os.path.basename(gv.gBluePrintFilePath))
 
     def onRemoveTarget(self, evt):
         if gv.iMapMgr and gv.iEDMapPnl:
@@ -599,6 +750,68 @@ class PanelEditorCtrl(wx.Panel):
             gv.iEDMapPnl.updateDisplay()
             self.updateMapInfo()
 
+    def onEnemyMotion(self, evt):
+        """ Set the selected enemy motion, the patrol way points are added by the 
+            route planning mode when the patrol enemy is selected.
+        """
+        if gv.iMapMgr and gv.iEDMapPnl:
+            gv.iMapMgr.setSelectedEnemyMotion(self.motionCH.GetString(self.motionCH.GetSelection()))
+            gv.iEDMapPnl.updateDisplay()
+
+    def onAutoPlanRoute(self, evt):
+        """ Expand the active robot's way points to a route around the walls."""
+        if gv.iMapMgr and gv.iEDMapPnl:
+            failNum = gv.iMapMgr.planRobotRoute()
+            if failNum is None:
+                gv.gDebugPrint("Load the floor map and plant a robot first.", logType=gv.LOG_WARN)
+            elif failNum:
+                gv.gDebugPrint("%s route legs are not reachable, kept as straight line." %str(failNum), 
+                               logType=gv.LOG_WARN)
+            gv.iEDMapPnl.updateDisplay()
+            self.updateMapInfo()
+
+    def onOptimizeRoute(self, evt):
+        """ Start the background search route optimizer of the active robot."""
+        if self.optimizer:
+            gv.gDebugPrint("The search route optimizer is running.", logType=gv.LOG_WARN)
+            return
+        progressCB = lambda doneNum, totalNum: wx.CallAfter(self._onOptimizeProgress, doneNum, totalNum)
+        doneCB = lambda results: wx.CallAfter(self._onOptimizeDone, results)
+        self.optimizer = createOptimizer(gv.iMapMgr, progressCB=progressCB, doneCB=doneCB)
+        if self.optimizer is None:
+            gv.gDebugPrint("Load the floor map and plant a robot first.", logType=gv.LOG_WARN)
+            return
+        self.optStateLb.SetLabel("Optimizer : Start")
+        self.optimizer.startOptimize()
+
+    def _onOptimizeProgress(self, doneNum, totalNum):
+        self.optStateLb.SetLabel("Optimizer : %s/%s" %(str(doneNum), str(totalNum)))
+
+    def _onOptimizeDone(self, results):
+        """ Show the best routes in the choice list and set the best one to the robot."""
+        if results is None:
+            gv.gDebugPrint("Optimize error: %s" %str(self.optimizer.getError()), logType=gv.LOG_ERR)
+            results = []
+        self.optimizer = None
+        self.optResults = results
+        choices = []
+        for rank, result in enumerate(results):
+            detNum = sum(val is not None for val in result['detTicks'])
+            choices.append("#%d score %.2f cover %d%% det %d/%d" %(rank+1, result['score'], 
+                           int(result['coverage']*100), detNum, len(result['detTicks'])))
+        self.optRouteCH.SetItems(choices)
+        self.optStateLb.SetLabel("Optimizer : %s routes" %str(len(results)))
+        if results:
+            self.optRouteCH.SetSelection(0)
+            self.onSelectOptRoute(None)
+
+    def onSelectOptRoute(self, evt):
+        idx = self.optRouteCH.GetSelection()
+        if gv.iMapMgr and gv.iEDMapPnl and 0 <= idx < len(self.optResults):
+            gv.iMapMgr.setRobotRoute(self.optResults[idx]['route'])
+            gv.iEDMapPnl.updateDisplay()
+            self.updateMapInfo()
+
     def onRemoveRoute(self, evt):
         if gv.iMapMgr and gv.iEDMapPnl:
             gv.iMapMgr.clearRobotRoute()
@@ -606,61 +819,114 @@ class PanelEditorCtrl(wx.Panel):
             self.updateMapInfo()
 
     def onSaveScensrio(self, evt):
-        """ Save current editor scenario to a json file."""
+        """ Save current editor scenario to a v2 scenario file or a json file based
+            on the config scenario format.
+        """
         data = {
             "bluePrint": gv.gBluePrintFilePath,
             "robot": None,
-            "enemy": []
+            "robots": [],
+            "enemy": [],
+            "params": gv.iMapMgr.getScenarioParams()
         }
-        robotObj = gv.iMapMgr.getRobot()
-        if robotObj:
-            data["robot"] = {
+        for robotObj in gv.iMapMgr.getRobots():
+            data["robots"].append({
                 'id': robotObj.getID(),
                 'pos': robotObj.getOrgPos(),
                 'route': robotObj.getRoutePts()
-            }
+            })
+        # the single 'robot' is kept for the older version simulator.
+        if data["robots"]: data["robot"] = data["robots"][0]
         enemryList = gv.iMapMgr.getEnemy()
         for enemyObj in enemryList:
-            data["enemy"].append([enemyObj.getID(), enemyObj.getOrgPos()])
-        saver = JsonLoader()
+            enemyInfo = [enemyObj.getID(), enemyObj.getOrgPos()]
+            # the motion dict is only saved for the moving enemy.
+            if enemyObj.getMotionInfo(): enemyInfo.append(enemyObj.getMotionInfo())
+            data["enemy"].append(enemyInfo)
         now = datetime.now() # current date and time
         date_time = now.strftime("%m_%d_%Y_%H_%M_%S")
+        if gv.gScenarioFmt == 'cqbs' and gv.gBluePrintFilePath:
+            mapMatrix = gv.iMapMgr.getMapMatrix()
+            if mapMatrix is None: mapMatrix = buildMapMatrix(gv.gBluePrintFilePath)
+            filePath = os.path.join(gv.gScenarioDir, "Scenario_%s%s" %(str(date_time), scenario.SCE_EXT))
+            gv.gDebugPrint("onSaveScensrio()> Save current scenario to file: %s" %filePath, 
+                           logType=gv.LOG_INFO)
+            scenario.saveScenario(filePath, data, mapMatrix)
+            if gv.iScenarioLib: gv.iScenarioLib.updateEntry(filePath)
+            return
+        saver = JsonLoader()
         filePath = os.path.join(gv.gScenarioDir, "Scenario_%s.json" %str(date_time))
         saver.setJsonFilePath(filePath)
         saver.setJsonData(data)
         gv.gDebugPrint("onSaveScensrio()> Save current scenario to file: %s" %filePath, 
                        logType=gv.LOG_INFO)
         saver.updateRcdFile()
+        if gv.iScenarioLib: gv.iScenarioLib.updateEntry(filePath)
 
     #-----------------------------------------------------------------------------
     def onLoadScensrio(self, evt):
-        """ Load a scenario from a json file."""
-        openFileDialog = wx.FileDialog(self, "Open Scenario JSON File", gv.gScenarioDir, "", 
-            "Packet Capture Files (*.json)|*.json", 
+        """ Load a scenario from a v2 scenario file or a json file."""
+        openFileDialog = wx.FileDialog(self, "Open Scenario File", gv.gScenarioDir, "", 
+            "Scenario Files (*.cqbs;*.json)|*.cqbs;*.json", 
             wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
         openFileDialog.ShowModal()
         scenarioPath = str(openFileDialog.GetPath())
         filename = str(openFileDialog.GetFilename())
         openFileDialog.Destroy()
-        loader = JsonLoader()
-        loader.loadFile(scenarioPath)
-        gv.iMapMgr.startMove(False)
-        gv.iMapMgr.reInit()
-        data = loader.getJsonData()
-        bpPath = data['bluePrint']
-        if bpPath is None: return False
-        gv.gBluePrintFilePath = bpPath
-        gv.gBluePrintBM = wx.Bitmap(bpPath, wx.BITMAP_TYPE_ANY)
-        if gv.iEDCtrlPanel: gv.iEDCtrlPanel.setBPInfo(filename)
-        if gv.iRWMapPnl: gv.iRWMapPnl.updateBitmap(gv.gBluePrintBM)
-        if gv.iEDMapPnl: gv.iEDMapPnl.updateBitmap(gv.gBluePrintBM)
-        robotInfo = data["robot"]
-        gv.iMapMgr.setRobot(robotInfo['id'], robotInfo['pos'], robotInfo['route'])
-        gv.iMapMgr.setEnemy(data['enemy'])
-        gv.iRWMapPnl.updateDisplay()
-        gv.iEDMapPnl.updateDisplay()
-        self.updateScenarioName(filename)
-        gv.gDebugPrint("onLoadScensrio()> Load scenario from file: %s" %filename, logType=gv.LOG_INFO)
+        if filename == "": return False
+        self.startMapLoad(scenarioPath=scenarioPath, displayName=filename)
+
+    #-----------------------------------------------------------------------------
+    # Define the background map load functions here
+    def startMapLoad(self, bpPath=None, scenarioPath=None, displayName=''):
+        """ Start a background thread to load the blue print or scenario file and 
+            build the map matrix, the result of an older request will be dropped.
+        """
+        self.loadID += 1
+        self.loadGauge.SetValue(0)
+        self.loadStateLb.SetLabel("Map Load : Start")
+        progressCB = lambda loadID, pct, msg: wx.CallAfter(self._onMapLoadProgress, loadID, pct, msg)
+        doneCB = lambda loadID, result: wx.CallAfter(self._onMapLoaded, loadID, result, displayName)
+        self.mapLoader = MapLoader(self.loadID, bpPath=bpPath, scenarioPath=scenarioPath, 
+                                   bpDir=gv.gBluePrintDir, progressCB=progressCB, doneCB=doneCB)
+        self.mapLoader.start()
+
+    def _onMapLoadProgress(self, loadID, percent, msg):
+        if loadID != self.loadID: return
+        self.loadGauge.SetValue(percent)
+        self.loadStateLb.SetLabel("Map Load : %s" %str(msg))
+
+    def _onMapLoaded(self, loadID, result, displayName):
+        """ Swap the loaded blue print, map matrix (and scenario) in the UI thread."""
+        if loadID != self.loadID: return
+        self.mapLoader = None
+        if result is None:
+            gv.gDebugPrint("_onMapLoaded()> Map load failed: %s" %displayName, logType=gv.LOG_ERR)
+            return
+        w, h = result['imgSize']
+        image = wx.Image(w, h, result['rgbBytes'])
+        if result['alphaBytes']: image.SetAlpha(result['alphaBytes'])
+        data = result['scenario']
+        if data:
+            gv.iMapMgr.startMove(False)
+            gv.iMapMgr.reInit()
+        gv.gBluePrintFilePath = result['bluePrint']
+        gv.gBluePrintBM = wx.Bitmap(image)
+        gv.iMapMgr.setMapMatrix(result['mapMatrix'])
+        if data:
+            gv.iMapMgr.setRobots(scenario.getRobotList(data))
+            gv.iMapMgr.setEnemy(data['enemy'])
+            gv.iMapMgr.setScenarioParams(data['params'])
+            self.updateScenarioName(displayName)
+            self.updateMapInfo()
+        self.setBPInfo(displayName)
+        if gv.iRWMapPnl: 
+            gv.iRWMapPnl.updateBitmap(gv.gBluePrintBM)
+            gv.iRWMapPnl.updateDisplay()
+        if gv.iEDMapPnl: 
+            gv.iEDMapPnl.updateBitmap(gv.gBluePrintBM)
+            gv.iEDMapPnl.updateDisplay()
+        gv.gDebugPrint("_onMapLoaded()> Loaded map from file: %s" %displayName, logType=gv.LOG_INFO)
 
     #-----------------------------------------------------------------------------
     def setBPInfo(self, bpInfo):
@@ -685,7 +951,7 @@ class PanelEditorCtrl(wx.Panel):
     def updateMapInfo(self):
         if gv.iMapMgr:
             rbtObj = gv.iMapMgr.getRobot()
-            rbtNum = 0 if rbtObj is None else 1
+            rbtNum = len(gv.iMapMgr.getRobots())
             wpNum = 0 if rbtObj is None else len(rbtObj.getRoutePts())
             emNum = len(gv.iMapMgr.getEnemy())
             self.updateRobotNum(rbtNum)
@@ -698,6 +964,9 @@ class PanelEditorCtrl(wx.Panel):
             self.targetIDLb.SetLabel(" - ID : %s" %str(infoTuple[0]))
             self.targetPosLb.SetLabel(" - Pos : %s" %str(infoTuple[1]))
             self.targetTypeLb.SetLabel(" - Type : %s" %str(infoTuple[2]))
+            if infoTuple[2] == 'Enemy':
+                enemyObj = gv.iMapMgr.getEnemy(infoTuple[0])
+                if enemyObj: self.motionCH.SetSelection(MOTION_TYPES.index(enemyObj.getMotion()))
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
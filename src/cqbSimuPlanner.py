@@ -0,0 +1,331 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuPlanner.py
+#
+# Purpose:     This module provides the robot route planner: the user's sparse way
+#              points are expanded to a collision free route with the jump point
+#              search on a down sampled occupancy grid inflated by the robot radius.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/31
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The planner grid cell is PLAN_CELL x PLAN_CELL pixels, a cell is free if the
+    robot can stand on all its pixels (the min clearance of the cell is not less
+    than the robot radius, refer to <cqbSimuCollision>), so the inflated grid is
+    built from the clearance map with one numpy block reduce. The grid has a blocked
+    border ring and is flattened, the neighbours of a cell are fixed index offsets.
+    The search workspace (g score, parent and the open / closed stamps) is allocated
+    once per planner and reused by all the searches: a node value is only valid if
+    its stamp is the current search id, so nothing is cleared between two searches.
+    The 8-connected grid is searched with the jump point search (JPS): A* only
+    expands the jump points, the octile distance is both the heuristic and the cost
+    between two jump points. The diagonal move is not allowed to cut a blocked
+    corner, so the jump rules are the no-corner-cutting variant:
+    - A straight jump stops at the goal or at a cell with a forced neighbour: a side
+      cell which is free while the side cell of the previous cell is blocked.
+    - A diagonal jump stops at the goal or at a cell from which one of its two
+      straight components reaches a jump point, and ends if either straight
+      component cell is blocked (the corner).
+    - The pruned successors of a jump point only follow the parent's move direction
+      plus the turns into the free side cells (straight move) or the free straight
+      components (diagonal move).
+    The path lengths are the same as the plain 8-connected A* (Dijkstra) ones.
+    A route leg whose straight segment is already free is not searched. The cell
+    path of a searched leg is reduced to its turning points, then the points which
+    can be skipped by a free straight segment (checked on the pixel clearance with
+    PLAN_MARGIN) are removed, so the route only has the way points needed to go
+    around the walls.
+    The connected free regions of the grid are labeled once (at the first search),
+    a goal in the other region is rejected without search.
+"""
+
+import math
+import heapq
+import numpy as np
+
+import cqbSimuGlobal as gv
+from cqbSimuCollision import ROBOT_RADIUS, checkSegmentFree
+
+PLAN_CELL = 4           # planner grid cell size (pixel).
+SNAP_RANGE = 6          # max cells to search a free cell for a blocked way point.
+PLAN_MARGIN = 2         # extra clearance (pixel) of the planned straight segments.
+SQRT2 = math.sqrt(2)
+
+#-----------------------------------------------------------------------------
+def buildPlanGrid(clearMap, cellSize=PLAN_CELL, radius=ROBOT_RADIUS):
+    """ Build the down sampled robot radius inflated occupancy grid.
+        Args:
+            clearMap (numpy.ndarray): clearance map from <buildClearanceMap()>.
+            cellSize (int, optional): grid cell size. Defaults to PLAN_CELL.
+            radius (int, optional): robot radius. Defaults to ROBOT_RADIUS.
+        Returns:
+            numpy.ndarray: (ceil(rows/cellSize), ceil(cols/cellSize)) bool array,
+                True if the cell is free.
+    """
+    rows, cols = clearMap.shape
+    gRows, gCols = -(-rows // cellSize), -(-cols // cellSize)
+    padArr = np.zeros((gRows*cellSize, gCols*cellSize), dtype=clearMap.dtype)
+    padArr[:rows, :cols] = clearMap
+    minArr = padArr.reshape(gRows, cellSize, gCols, cellSize).min(axis=(1, 3))
+    return minArr >= radius
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class RoutePlanner(object):
+    """ Jump point search route planner of one map with a reusable search workspace."""
+    def __init__(self, clearMap, cellSize=PLAN_CELL, radius=ROBOT_RADIUS):
+        """ Init example : planner = RoutePlanner(mapMgr.getClearMap())
+            Args:
+                clearMap (numpy.ndarray): clearance map of the map matrix.
+                cellSize (int, optional): grid cell size. Defaults to PLAN_CELL.
+                radius (int, optional): robot radius. Defaults to ROBOT_RADIUS.
+        """
+        self.clearMap = clearMap
+        self.cellSize = cellSize
+        self.radius = radius
+        # the segment check margin covers the points between two samples (the 
+        # clearance changes at most 1 per pixel) and the robot's int step drift.
+        self.segRadius = radius + PLAN_MARGIN
+        self.freeGrid = buildPlanGrid(clearMap, cellSize=cellSize, radius=radius)
+        gRows, gCols = self.freeGrid.shape
+        # flat grid with a blocked border ring, index = (row+1)*width + (col+1).
+        self.width = gCols + 2
+        padGrid = np.zeros((gRows+2, gCols+2), dtype=bool)
+        padGrid[1:-1, 1:-1] = self.freeGrid
+        self.freeList = padGrid.ravel().tolist()
+        # reusable search workspace.
+        size = len(self.freeList)
+        self.gScore = [0.0] * size
+        self.parent = [0] * size
+        self.openStamp = [0] * size
+        self.closeStamp = [0] * size
+        self.searchId = 0
+        self.regionList = None  # connected region label of every cell.
+        self.goalIdx = 0        # goal cell index of the current search.
+        w = self.width
+        # (index offset, cost, corner cell offsets which must be free)
+        self.neighbours = ((1, 1.0, ()), (-1, 1.0, ()), (w, 1.0, ()), (-w, 1.0, ()),
+                           (w+1, SQRT2, (1, w)), (w-1, SQRT2, (-1, w)),
+                           (-w+1, SQRT2, (1, -w)), (-w-1, SQRT2, (-1, -w)))
+
+    #-----------------------------------------------------------------------------
+    def _toIdx(self, pos):
+        col = min(max(int(pos[0]) // self.cellSize, 0), self.freeGrid.shape[1]-1)
+        row = min(max(int(pos[1]) // self.cellSize, 0), self.freeGrid.shape[0]-1)
+        return (row+1)*self.width + col + 1
+
+    def _toPos(self, idx):
+        row, col = divmod(idx, self.width)
+        half = self.cellSize // 2
+        return [(col-1)*self.cellSize + half, (row-1)*self.cellSize + half]
+
+    def _snapIdx(self, pos):
+        """ Return the nearest free cell index of the position (None if no free
+            cell in the SNAP_RANGE).
+        """
+        idx = self._toIdx(pos)
+        if self.freeList[idx]: return idx
+        gRows, gCols = self.freeGrid.shape
+        row, col = divmod(idx, self.width)
+        row, col = row-1, col-1
+        r0, c0 = max(row-SNAP_RANGE, 0), max(col-SNAP_RANGE, 0)
+        subGrid = self.freeGrid[r0:row+SNAP_RANGE+1, c0:col+SNAP_RANGE+1]
+        rowArr, colArr = np.nonzero(subGrid)
+        if rowArr.size == 0: return None
+        nearIdx = ((rowArr + r0 - row)**2 + (colArr + c0 - col)**2).argmin()
+        return (int(rowArr[nearIdx]) + r0 + 1)*self.width + int(colArr[nearIdx]) + c0 + 1
+
+    def _labelRegions(self):
+        """ Label the connected free regions with the same neighbour rule as the search."""
+        freeList, regionList = self.freeList, [0] * len(self.freeList)
+        label = 0
+        for seedIdx, freeFlg in enumerate(freeList):
+            if not freeFlg or regionList[seedIdx]: continue
+            label += 1
+            regionList[seedIdx] = label
+            stack = [seedIdx]
+            while stack:
+                crtIdx = stack.pop()
+                for offset, _, corners in self.neighbours:
+                    nextIdx = crtIdx + offset
+                    if not freeList[nextIdx] or regionList[nextIdx]: continue
+                    if corners and not (freeList[crtIdx+corners[0]] and freeList[crtIdx+corners[1]]):
+                        continue
+                    regionList[nextIdx] = label
+                    stack.append(nextIdx)
+        self.regionList = regionList
+
+    def snapPos(self, pos):
+        """ Return the position if the robot can stand on it, else the center of the
+            nearest free cell (the position if no free cell in the SNAP_RANGE).
+        """
+        x, y = int(pos[0]), int(pos[1])
+        rows, cols = self.clearMap.shape
+        if 0 <= x < cols and 0 <= y < rows and self.clearMap[y, x] >= self.radius: return [x, y]
+        idx = self._snapIdx(pos)
+        return [x, y] if idx is None else self._toPos(idx)
+
+    #-----------------------------------------------------------------------------
+    def _jumpLine(self, idx, step, side):
+        """ Jump from the cell along the straight direction <step>, return the jump
+            point index (the goal or a cell with a forced neighbour) or None.
+        """
+        freeList, goalIdx = self.freeList, self.goalIdx
+        while freeList[idx]:
+            if idx == goalIdx: return idx
+            backIdx = idx - step
+            if (freeList[idx+side] and not freeList[backIdx+side]) or \
+                    (freeList[idx-side] and not freeList[backIdx-side]):
+                return idx
+            idx += step
+        return None
+
+    def _jumpDiag(self, idx, stepX, stepY):
+        """ Jump from the cell along the diagonal direction, return the jump point
+            index (the goal or a cell which has a straight jump point) or None.
+        """
+        freeList, goalIdx, w = self.freeList, self.goalIdx, self.width
+        while freeList[idx]:
+            if idx == goalIdx: return idx
+            if self._jumpLine(idx+stepX, stepX, w) is not None or \
+                    self._jumpLine(idx+stepY, stepY, 1) is not None:
+                return idx
+            # the diagonal move can not cut a blocked corner.
+            if not (freeList[idx+stepX] and freeList[idx+stepY]): return None
+            idx += stepX + stepY
+        return None
+
+    def _successors(self, idx, parentIdx):
+        """ Return the (x step, y step) directions to jump from the cell, the 
+            directions are pruned by the move direction from the parent cell.
+        """
+        freeList, w = self.freeList, self.width
+        if parentIdx < 0:
+            return [(x, y) for x in (-1, 0, 1) for y in (-w, 0, w) if x or y]
+        row, col = divmod(idx, w)
+        parentRow, parentCol = divmod(parentIdx, w)
+        stepX = (col > parentCol) - (col < parentCol)
+        stepY = ((row > parentRow) - (row < parentRow)) * w
+        dirList = []
+        if stepX and stepY:
+            if freeList[idx+stepY]: dirList.append((0, stepY))
+            if freeList[idx+stepX]: dirList.append((stepX, 0))
+            dirList.append((stepX, stepY))
+        elif stepX:
+            dirList.append((stepX, 0))
+            for side in (w, -w):
+                if freeList[idx+side]: dirList += [(0, side), (stepX, side)]
+        else:
+            dirList.append((0, stepY))
+            for side in (1, -1):
+                if freeList[idx+side]: dirList += [(side, 0), (side, stepY)]
+        return dirList
+
+    #-----------------------------------------------------------------------------
+    def search(self, startIdx, goalIdx):
+        """ Jump point search (A* on the jump points) on the flat grid, return the 
+            jump point index path list from the start to the goal (None if the goal
+            is not reachable).
+        """
+        if self.regionList is None: self._labelRegions()
+        if self.regionList[startIdx] != self.regionList[goalIdx]: return None
+        self.searchId += 1
+        sid = self.searchId
+        self.goalIdx = goalIdx
+        freeList, gScore, parent = self.freeList, self.gScore, self.parent
+        openStamp, closeStamp = self.openStamp, self.closeStamp
+        w = self.width
+        def octile(idx1, idx2):
+            row1, col1 = divmod(idx1, w)
+            row2, col2 = divmod(idx2, w)
+            dx, dy = abs(col1 - col2), abs(row1 - row2)
+            return (dx + dy) + (SQRT2 - 2) * (dx if dx < dy else dy)
+        gScore[startIdx], parent[startIdx], openStamp[startIdx] = 0.0, -1, sid
+        openHeap = [(octile(startIdx, goalIdx), startIdx)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+        while openHeap:
+            crtIdx = heappop(openHeap)[1]
+            if closeStamp[crtIdx] == sid: continue
+            if crtIdx == goalIdx: break
+            closeStamp[crtIdx] = sid
+            crtG = gScore[crtIdx]
+            for stepX, stepY in self._successors(crtIdx, parent[crtIdx]):
+                nextIdx = crtIdx + stepX + stepY
+                if not freeList[nextIdx]: continue
+                if stepX and stepY:
+                    if not (freeList[crtIdx+stepX] and freeList[crtIdx+stepY]): continue
+                    jumpIdx = self._jumpDiag(nextIdx, stepX, stepY)
+                else:
+                    jumpIdx = self._jumpLine(nextIdx, stepX + stepY, w if stepX else 1)
+                if jumpIdx is None or closeStamp[jumpIdx] == sid: continue
+                nextG = crtG + octile(crtIdx, jumpIdx)
+                if openStamp[jumpIdx] == sid and gScore[jumpIdx] <= nextG: continue
+                gScore[jumpIdx], parent[jumpIdx], openStamp[jumpIdx] = nextG, crtIdx, sid
+                heappush(openHeap, (nextG + octile(jumpIdx, goalIdx), jumpIdx))
+        else:
+            return None
+        path = [goalIdx]
+        while path[-1] != startIdx: path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    #-----------------------------------------------------------------------------
+    def _simplify(self, ptList):
+        """ Remove the points which can be skipped by a free straight segment."""
+        result = [ptList[0]]
+        anchorIdx = 0
+        while anchorIdx < len(ptList) - 1:
+            candList = ptList[anchorIdx+1:]
+            freeArr = checkSegmentFree(self.clearMap, [ptList[anchorIdx]]*len(candList),
+                                       candList, radius=self.segRadius)
+            # the next point is always kept even its segment is not free (snapped pos).
+            freeIdx = np.nonzero(freeArr)[0]
+            anchorIdx += int(freeIdx[-1]) + 1 if freeIdx.size else 1
+            result.append(ptList[anchorIdx])
+        return result
+
+    def planLeg(self, startPos, endPos):
+        """ Plan the route from the start to the end position.
+            Returns:
+                list: the way points after the start position (the last one is the
+                    end position), None if the end is not reachable.
+        """
+        startPos, endPos = list(startPos), list(endPos)
+        if checkSegmentFree(self.clearMap, [startPos], [endPos], radius=self.segRadius)[0]:
+            return [endPos]
+        startIdx, goalIdx = self._snapIdx(startPos), self._snapIdx(endPos)
+        if startIdx is None or goalIdx is None: return None
+        path = self.search(startIdx, goalIdx)
+        if path is None: return None
+        ptList = [startPos] + [self._toPos(idx) for idx in path] + [endPos]
+        return self._simplify(ptList)[1:]
+
+    def planRoute(self, wayPts, navGraph=None):
+        """ Expand the sparse way points to a collision free route.
+            Args:
+                wayPts (list): [[x, y], ...] way points, the 1st is the start position.
+                navGraph (NavGraph, optional): the legs are planned on the navigation
+                    graph of the map first, the grid search is the fall back.
+            Returns:
+                tuple: (route point list (the input way points are kept, the way
+                    points too close to the wall are moved to the nearest free cell),
+                    number of the legs which can not be planned and are kept as 
+                    straight).
+        """
+        if not wayPts: return [], 0
+        wayPts = [list(wayPts[0])] + [self.snapPos(pos) for pos in wayPts[1:]]
+        route, failNum = [wayPts[0]], 0
+        for startPos, endPos in zip(wayPts[:-1], wayPts[1:]):
+            legPts = navGraph.planLeg(startPos, endPos) if navGraph else None
+            if legPts is None: legPts = self.planLeg(startPos, endPos)
+            if legPts is None:
+                gv.gDebugPrint("planRoute()> no route from %s to %s." %(str(startPos), str(endPos)),
+                               logType=gv.LOG_WARN)
+                legPts, failNum = [list(endPos)], failNum + 1
+            route += legPts
+        return route, failNum
@@ -0,0 +1,285 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuProfiler.py
+#
+# Purpose:     This module provides the built-in profiler of the simulation tick
+#              and the map panels paint handlers. It aggregates the sections time
+#              cost, the sampled (or deterministic) call stacks and the per sensor
+#              counters over a window of ticks and dumps every window to files.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/28
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The profiled functions are wrapped by <SimuProfiler.wrap()>, nothing is wrapped
+    when the profiling is off so there is no overhead.
+    - 'sample' mode: a sampler thread reads the profiled thread's current stack
+      every <sampleInv> sec while a section is running, the stacks are counted in
+      the flame graph folded format ('section;file:func;file:func count' per line,
+      can be used by flamegraph.pl / speedscope).
+    - 'deterministic' mode: cProfile is enabled inside the sections, every window
+      is dumped as a pstats *.prof file, the pstats call graph is also unfolded to
+      the folded stacks with the time cost in micro second as the count.
+    Every <windowSize> ticks (calls of the <tickSection>) the window is written to
+    <outDir>/window_<idx>.json (sections time and sensor counters) plus the
+    *.folded (and *.prof) file, then the window data is reset.
+    Usage (headless): python cqbSimuProfiler.py <scenario.cqbs> [tickNum] [mode]
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from functools import wraps
+
+SAMPLE_MD = 'sample'
+DETERM_MD = 'deterministic'
+MAX_STACK_DEPTH = 64    # max unfolded call graph depth of the deterministic mode.
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SimuProfiler(object):
+    """ Windowed profiler of the simulation tick and the paint handlers."""
+    def __init__(self, outDir, mode=SAMPLE_MD, windowSize=50, sampleInv=0.002,
+                 tickSection='periodic'):
+        """ Init example : profiler = SimuProfiler('profile/Profile_01', mode='sample')
+            Args:
+                outDir (str): window dump files folder.
+                mode (str, optional): 'sample' or 'deterministic'. Defaults to 'sample'.
+                windowSize (int, optional): ticks number per window. Defaults to 50.
+                sampleInv (float, optional): stack sample interval (sec). Defaults to 0.002.
+                tickSection (str, optional): the section counted as one tick.
+        """
+        self.outDir = outDir
+        self.mode = mode
+        self.windowSize = windowSize
+        self.sampleInv = sampleInv
+        self.tickSection = tickSection
+        self.counters = {}      # sensor : {counter name: value}, shared with the MapMgr.
+        self.windowIdx = 0
+        self.running = False
+        self.threadID = None    # the profiled thread (the thread called start()).
+        self.activeSec = None   # (section name, entry frame) of the running section.
+        self.sampler = None
+        self.cprofile = None
+        self._resetWindow()
+
+    #-----------------------------------------------------------------------------
+    def _resetWindow(self):
+        self.tickNum = 0
+        self.sections = {}      # section : [call count, total sec, max sec]
+        self.stacks = {}        # folded stack : sample count
+        for counterDict in self.counters.values():
+            for key in counterDict: counterDict[key] = 0
+        if self.mode == DETERM_MD: self.cprofile = cProfile.Profile()
+
+    #-----------------------------------------------------------------------------
+    def start(self):
+        """ Start profiling, must be called in the thread which runs the sections."""
+        if self.running: return
+        if not os.path.exists(self.outDir): os.makedirs(self.outDir)
+        self.threadID = threading.get_ident()
+        self.running = True
+        if self.mode == SAMPLE_MD:
+            self.sampler = threading.Thread(target=self._sampleLoop, daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        """ Stop profiling and dump the last (part) window."""
+        if not self.running: return
+        self.running = False
+        if self.sampler: self.sampler.join()
+        self.sampler = None
+        if self.tickNum or self.sections: self.dumpWindow()
+
+    #-----------------------------------------------------------------------------
+    def _sampleLoop(self):
+        """ Sampler thread: count the folded stack of the running section."""
+        while self.running:
+            time.sleep(self.sampleInv)
+            active = self.activeSec
+            if active is None: continue
+            frame = sys._current_frames().get(self.threadID, None)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append("%s:%s" %(os.path.basename(code.co_filename).rsplit('.', 1)[0], code.co_name))
+                if frame is active[1]: break
+                frame = frame.f_back
+            names.append(active[0])
+            folded = ';'.join(reversed(names))
+            self.stacks[folded] = self.stacks.get(folded, 0) + 1
+
+    #-----------------------------------------------------------------------------
+    def wrap(self, secName, func):
+        """ Return the wrapped function which profiles every call of <func> as the
+            section <secName>.
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.running or self.activeSec is not None:
+                # nested section call is counted in the outer section.
+                return func(*args, **kwargs)
+            self.activeSec = (secName, sys._getframe())
+            if self.cprofile: self.cprofile.enable()
+            startT = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                useT = time.perf_counter() - startT
+                if self.cprofile: self.cprofile.disable()
+                self.activeSec = None
+                self._addSection(secName, useT)
+        return wrapper
+
+    #-----------------------------------------------------------------------------
+    def _addSection(self, secName, useT):
+        sec = self.sections.setdefault(secName, [0, 0.0, 0.0])
+        sec[0] += 1
+        sec[1] += useT
+        if useT > sec[2]: sec[2] = useT
+        if secName == self.tickSection:
+            self.tickNum += 1
+            if self.tickNum >= self.windowSize: self.dumpWindow()
+
+    #-----------------------------------------------------------------------------
+    def getCounters(self, sensor):
+        """ Return the counter dict of the sensor, the caller adds the values
+            directly: counters['rays'] = counters.get('rays', 0) + 1
+        """
+        return self.counters.setdefault(sensor, {})
+
+    def getSummary(self):
+        """ Return the current window summary dict."""
+        sections = {}
+        for secName, (count, totalT, maxT) in self.sections.items():
+            sections[secName] = {
+                'count': count,
+                'totalMs': round(totalT*1000, 3),
+                'avgMs': round(totalT*1000/count, 3) if count else 0,
+                'maxMs': round(maxT*1000, 3)
+            }
+        summary = {
+            'window': self.windowIdx,
+            'mode': self.mode,
+            'ticks': self.tickNum,
+            'sections': sections,
+            'counters': {sensor: dict(vals) for sensor, vals in self.counters.items()},
+            'samples': sum(self.stacks.values())
+        }
+        return summary
+
+    #-----------------------------------------------------------------------------
+    def _getProfStacks(self):
+        """ Unfold the cProfile call graph to the folded stacks {stack: micro sec},
+            a function's time is split to its callers by the caller edges' time.
+        """
+        stats = pstats.Stats(self.cprofile).stats
+        callees = {}
+        for func, (_, _, _, _, callers) in stats.items():
+            for caller in callers: callees.setdefault(caller, []).append(func)
+        getName = lambda func: "%s:%s" %(os.path.basename(func[0]).rsplit('.', 1)[0], func[2])
+        stacks = {}
+        def unfold(path, func, share):
+            selfT = int(stats[func][2]*share*1e6)
+            if selfT > 0:
+                stack = ';'.join(getName(item) for item in path)
+                stacks[stack] = stacks.get(stack, 0) + selfT
+            if len(path) >= MAX_STACK_DEPTH: return
+            for callee in callees.get(func, []):
+                if callee in path: continue # recursion is counted in the first call.
+                calleeCt = stats[callee][3]
+                if calleeCt <= 0: continue
+                calleeShare = share * stats[callee][4][func][3] / calleeCt
+                if stats[callee][3] * calleeShare * 1e6 >= 1:
+                    unfold(path + [callee], callee, calleeShare)
+        for func, (_, _, _, _, callers) in stats.items():
+            if not callers: unfold([func], func, 1.0)
+        return stacks
+
+    #-----------------------------------------------------------------------------
+    def dumpWindow(self):
+        """ Write the current window data to files and start a new window."""
+        filePrefix = os.path.join(self.outDir, 'window_%04d' %self.windowIdx)
+        with open(filePrefix + '.json', 'w') as fh:
+            json.dump(self.getSummary(), fh, indent=4)
+        stacks = None
+        if self.mode == SAMPLE_MD:
+            stacks = self.stacks
+        elif self.cprofile and self.sections:
+            pstats.Stats(self.cprofile).dump_stats(filePrefix + '.prof')
+            stacks = self._getProfStacks()
+        if stacks is not None:
+            stacks = sorted(list(stacks.items()), key=lambda item: -item[1])
+            with open(filePrefix + '.folded', 'w') as fh:
+                fh.write(''.join("%s %d\n" %(stack, count) for stack, count in stacks))
+        self.windowIdx += 1
+        self._resetWindow()
+
+    #-----------------------------------------------------------------------------
+    def getOutDir(self):
+        return self.outDir
+
+    def isRunning(self):
+        return self.running
+
+#-----------------------------------------------------------------------------
+def makeOutDir(baseDir):
+    """ Create and return a new result folder <baseDir>/Profile_<date_time>, an
+        index is appended to the name if the folder of the same second exists.
+    """
+    dirName = 'Profile_%s' %time.strftime('%Y%m%d_%H%M%S')
+    outDir, idx = os.path.join(baseDir, dirName), 1
+    while True:
+        try:
+            os.makedirs(outDir)
+            return outDir
+        except FileExistsError:
+            idx += 1
+            outDir = os.path.join(baseDir, '%s_%d' %(dirName, idx))
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ Profile a scenario headless: python cqbSimuProfiler.py scenario [tickNum] [mode]"""
+    if len(argv) < 1:
+        print("Usage: python cqbSimuProfiler.py <scenario.cqbs|json> [tickNum] [sample|deterministic]")
+        return
+    import cqbSimuGlobal as gv
+    import cqbSimuScenario as scenario
+    from cqbSimuMapMgr import MapMgr, buildMapMatrix
+    scenarioPath = argv[0]
+    tickNum = int(argv[1]) if len(argv) > 1 else 500
+    mode = argv[2] if len(argv) > 2 else SAMPLE_MD
+    if scenarioPath.endswith(scenario.SCE_EXT):
+        data = scenario.loadScenario(scenarioPath, bpDir=gv.gBluePrintDir)
+    else:
+        data = scenario.importJson(scenarioPath, bpDir=gv.gBluePrintDir)
+        data['mapMatrix'] = buildMapMatrix(data['bluePrint'])
+    mapMgr = MapMgr()
+    mapMgr.setMapMatrix(data['mapMatrix'])
+    mapMgr.setRobots(scenario.getRobotList(data))
+    mapMgr.setEnemy(data['enemy'])
+    mapMgr.setScenarioParams(data['params'])
+    for flgFun in (mapMgr.enableSonar, mapMgr.setLidarOn, mapMgr.setCamOn, mapMgr.setCamDetectionOn):
+        flgFun(True)
+    mapMgr.startMove(True)
+    outDir = makeOutDir(os.path.join(gv.dirpath, 'profile'))
+    profiler = SimuProfiler(outDir, mode=mode)
+    mapMgr.startProfile(profiler)
+    profiler.start()
+    for _ in range(tickNum):
+        mapMgr.periodic()
+    profiler.stop()
+    mapMgr.stopProfile()
+    print("Profile result saved in folder: %s" %outDir)
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv[1:])
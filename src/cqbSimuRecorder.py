@@ -0,0 +1,236 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuRecorder.py
+#
+# Purpose:     This module is used to record the simulation state of every clock
+#              tick (robot pose, direction, sensors data, enemy detection and
+#              prediction) into a compact binary record file and provide a player
+#              to seek and replay any recorded tick without re-simulating.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/20
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The recorder writes two files:
+    1. <name>.rcd : a file header followed by one record per tick. Every record is
+        a fixed-width tick section (REC_FMT) followed by the detected enemy ID list,
+        the enemy prediction list, the other squad robots' pose list and the enemy
+        state (position, patrol way point index) list (the four counts are in the
+        tick section).
+    2. <name>.idx : the tick-offset index, one fixed-width uint64 data file offset
+        per tick, so the player can seek to any tick in O(1) by reading 8 bytes.
+    Records are written through a small buffer and flushed every <flushCnt> ticks,
+    the memory use is bounded no matter how many ticks are recorded.
+"""
+
+import os
+import struct
+
+RCD_MAGIC = b'CQBR'
+RCD_VERSION = 3
+RCD_EXT = '.rcd'
+IDX_EXT = '.idx'
+HEADER_FMT = '<4sHH'    # magic, version, reserved
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+# tick, posX, posY, dirX, dirY, dirDeg, sonar(front, back, left, right),
+# lidarDis, lidarX, lidarY, camLDis, camLX, camLY, camRDis, camRX, camRY, target
+# way point index, detected enemy number, predicted enemy number, squad robot number,
+# enemy number
+REC_FMT = '<I5h4h3h3h3hHHHHH'
+REC_SIZE = struct.calcsize(REC_FMT)
+DET_FMT = '<H'          # detected enemy ID
+PRED_FMT = '<Hhh'       # enemy ID, predict posX, predict posY
+PRED_SIZE = struct.calcsize(PRED_FMT)
+ENEMY_FMT = '<HhhH'     # enemy ID, posX, posY, patrol way point index
+ENEMY_SIZE = struct.calcsize(ENEMY_FMT)
+SQUAD_FMT = '<hhH'      # robot posX, posY, target way point index
+SQUAD_SIZE = struct.calcsize(SQUAD_FMT)
+IDX_FMT = '<Q'
+IDX_SIZE = struct.calcsize(IDX_FMT)
+NONE_VAL = -32768       # value used when a sensor data is not available.
+MAX_VAL = 32767
+
+#-----------------------------------------------------------------------------
+def _clamp(val):
+    """ Clamp the value in the int16 range (NONE_VAL is kept for the not available
+        data), a robot driven out of the map with the collision off can exceed it.
+    """
+    val = int(val)
+    return val if val == NONE_VAL else min(max(val, NONE_VAL+1), MAX_VAL)
+
+def _toInt(val):
+    return NONE_VAL if val is None else _clamp(val)
+
+def _toPt(pt):
+    return (NONE_VAL, NONE_VAL) if pt is None else (_clamp(pt[0]), _clamp(pt[1]))
+
+def _fromInt(val):
+    return None if val == NONE_VAL else val
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SimuRecorder(object):
+    """ Append the simulation state of every tick to the record and index file."""
+    def __init__(self, filePath, flushCnt=256):
+        """ Init example : recorder = SimuRecorder('record/Record_01', flushCnt=256)
+            Args:
+                filePath (str): record file path without extension.
+                flushCnt (int, optional): flush the buffer to disk every <flushCnt>
+                    ticks. Defaults to 256.
+        """
+        self.filePath = filePath
+        self.flushCnt = flushCnt
+        self.tickNum = 0
+        self.dataBuf = []
+        self.idxBuf = []
+        folder = os.path.dirname(filePath)
+        if folder and not os.path.exists(folder): os.makedirs(folder)
+        self.dataFh = open(filePath + RCD_EXT, 'wb')
+        self.idxFh = open(filePath + IDX_EXT, 'wb')
+        self.dataFh.write(struct.pack(HEADER_FMT, RCD_MAGIC, RCD_VERSION, 0))
+        self.offset = HEADER_SIZE
+
+    #-----------------------------------------------------------------------------
+    def _flush(self):
+        """ Write the buffered records and index to the files."""
+        if self.dataBuf:
+            self.dataFh.write(b''.join(self.dataBuf))
+            self.idxFh.write(b''.join(self.idxBuf))
+            self.dataBuf = []
+            self.idxBuf = []
+
+    #-----------------------------------------------------------------------------
+    def addTick(self, tick, state):
+        """ Add one tick record.
+            Args:
+                tick (int): simulation clock tick count.
+                state (dict): tick state build by <MapMgr.getTickState()>.
+        """
+        sonar = [_clamp(v) for v in state['sonar']] if state['sonar'] else (NONE_VAL, )*4
+        lidarX, lidarY = _toPt(state['lidarPt'])
+        camLX, camLY = _toPt(state['camLPt'])
+        camRX, camRY = _toPt(state['camRPt'])
+        detList = state['detected']
+        predList = state['predicted']
+        squadList = state['squad']
+        enemyList = state['enemies']
+        data = [struct.pack(REC_FMT, tick, *_toPt(state['pos']), *_toPt(state['dir']),
+                            _clamp(state['dirDeg']), *sonar,
+                            _toInt(state['lidarDis']), lidarX, lidarY,
+                            _toInt(state['camLDis']), camLX, camLY,
+                            _toInt(state['camRDis']), camRX, camRY,
+                            state['tgtIdx'], len(detList), len(predList), len(squadList),
+                            len(enemyList))]
+        for enemyID in detList:
+            data.append(struct.pack(DET_FMT, enemyID))
+        for enemyID, pos in predList:
+            data.append(struct.pack(PRED_FMT, enemyID, *_toPt(pos)))
+        for x, y, tgtIdx in squadList:
+            data.append(struct.pack(SQUAD_FMT, *_toPt((x, y)), tgtIdx))
+        for enemyID, pos, patrolIdx in enemyList:
+            data.append(struct.pack(ENEMY_FMT, enemyID, *_toPt(pos), patrolIdx))
+        record = b''.join(data)
+        self.dataBuf.append(record)
+        self.idxBuf.append(struct.pack(IDX_FMT, self.offset))
+        self.offset += len(record)
+        self.tickNum += 1
+        if len(self.dataBuf) >= self.flushCnt: self._flush()
+
+    #-----------------------------------------------------------------------------
+    def getTickNum(self):
+        return self.tickNum
+
+    def getFilePath(self):
+        return self.filePath
+
+    #-----------------------------------------------------------------------------
+    def close(self):
+        """ Flush all the buffered records and close the files."""
+        if self.dataFh is None: return
+        self._flush()
+        self.dataFh.close()
+        self.idxFh.close()
+        self.dataFh = self.idxFh = None
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SimuPlayer(object):
+    """ Seek and read the tick state from a record file created by <SimuRecorder>."""
+    def __init__(self, filePath):
+        """ Init example : player = SimuPlayer('record/Record_01')
+            Args:
+                filePath (str): record file path, with or without the extension.
+        """
+        if filePath.endswith(RCD_EXT) or filePath.endswith(IDX_EXT):
+            filePath = filePath[:-len(RCD_EXT)]
+        self.filePath = filePath
+        self.dataFh = open(filePath + RCD_EXT, 'rb')
+        self.idxFh = open(filePath + IDX_EXT, 'rb')
+        magic, version, _ = struct.unpack(HEADER_FMT, self.dataFh.read(HEADER_SIZE))
+        if magic != RCD_MAGIC or version != RCD_VERSION:
+            self.close()
+            raise ValueError("SimuPlayer: %s is not a valid record file." %str(filePath))
+        self.idxFh.seek(0, os.SEEK_END)
+        self.tickNum = self.idxFh.tell() // IDX_SIZE
+
+    #-----------------------------------------------------------------------------
+    def getTickNum(self):
+        return self.tickNum
+
+    #-----------------------------------------------------------------------------
+    def getTick(self, idx):
+        """ Seek and return the state dict (same format as the one passed to
+            <SimuRecorder.addTick()>) of the record at index <idx>, return None if
+            the index is out of range.
+        """
+        if idx < 0 or idx >= self.tickNum: return None
+        self.idxFh.seek(idx*IDX_SIZE)
+        offset, = struct.unpack(IDX_FMT, self.idxFh.read(IDX_SIZE))
+        self.dataFh.seek(offset)
+        vals = struct.unpack(REC_FMT, self.dataFh.read(REC_SIZE))
+        detNum, predNum, squadNum, enemyNum = vals[-4:]
+        tail = self.dataFh.read(detNum*2 + predNum*PRED_SIZE + squadNum*SQUAD_SIZE 
+                                + enemyNum*ENEMY_SIZE)
+        detList = list(struct.unpack('<%dH' %detNum, tail[:detNum*2]))
+        predList = []
+        for i in range(predNum):
+            enemyID, x, y = struct.unpack_from(PRED_FMT, tail, detNum*2 + i*PRED_SIZE)
+            predList.append((enemyID, [x, y]))
+        squadOffset = detNum*2 + predNum*PRED_SIZE
+        squadList = [list(struct.unpack_from(SQUAD_FMT, tail, squadOffset + i*SQUAD_SIZE)) 
+                     for i in range(squadNum)]
+        enemyOffset = squadOffset + squadNum*SQUAD_SIZE
+        enemyList = []
+        for i in range(enemyNum):
+            enemyID, x, y, patrolIdx = struct.unpack_from(ENEMY_FMT, tail, enemyOffset + i*ENEMY_SIZE)
+            enemyList.append((enemyID, [x, y], patrolIdx))
+        sonar = vals[6:10]
+        state = {
+            'tick': vals[0],
+            'pos': [vals[1], vals[2]],
+            'dir': (vals[3], vals[4]),
+            'dirDeg': vals[5],
+            'sonar': None if sonar[0] == NONE_VAL else sonar,
+            'lidarDis': _fromInt(vals[10]),
+            'lidarPt': None if vals[11] == NONE_VAL else (vals[11], vals[12]),
+            'camLDis': _fromInt(vals[13]),
+            'camLPt': None if vals[14] == NONE_VAL else (vals[14], vals[15]),
+            'camRDis': _fromInt(vals[16]),
+            'camRPt': None if vals[17] == NONE_VAL else (vals[17], vals[18]),
+            'tgtIdx': vals[19],
+            'detected': detList,
+            'predicted': predList,
+            'squad': squadList,
+            'enemies': enemyList
+        }
+        return state
+
+    #-----------------------------------------------------------------------------
+    def close(self):
+        if self.dataFh: self.dataFh.close()
+        if self.idxFh: self.idxFh.close()
+        self.dataFh = self.idxFh = None
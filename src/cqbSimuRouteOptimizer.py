@@ -0,0 +1,435 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuRouteOptimizer.py
+#
+# Purpose:     This module provides the robot search route optimizer: candidate
+#              search routes are generated over the floor map, every candidate is
+#              expanded by the route planner and simulated headless to score the
+#              enemies detection time and the map coverage. The candidates are
+#              evaluated in a background worker process pool which shares the read
+#              only map data, the best routes are returned as way point lists.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/02
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - Candidate generation (in the optimizer feeder thread): the free plan grid cells
+      of the robot's connected region are split in VIEW_TILE size tiles (the rooms
+      and corridors parts), the view point of a tile is its free cell nearest to the
+      tile's free cells center. The candidates are the view points visit orders: the
+      current robot route (as the reference), the greedy nearest neighbour order and
+      the seeded randomized nearest neighbour orders.
+    - RouteEvaluator (one per worker): expand the candidate with the route planner
+      and the navigation graph, then run a headless <MapMgr> with the scenario
+      enemies and the lidar / camera detection on until the robot finishes the
+      route or MAX_TICKS, record the 1st detection tick of every enemy and the free
+      cells within COVER_RANGE of the robot trajectory.
+    - Score (lower is better): mean enemy detection tick / MAX_TICKS (MAX_TICKS if
+      not detected) + (1 - coverage), the ties are sorted by the ticks used.
+    - RouteOptimizer: same background pool structure as <FrameExporter>, the map
+      matrix and clearance array are put in the shared memory blocks (python 3.8+,
+      else they are passed to the workers as the init args) and every worker builds
+      its own planner and navigation graph once from the shared data.
+
+    Usage (headless):
+        python cqbSimuRouteOptimizer.py <*.cqbs scenario> [candidate number]
+"""
+
+import os
+import sys
+import time
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None    # python 3.7, the map arrays are copied to the workers.
+
+from cqbSimuMapMgr import MapMgr
+from cqbSimuPlanner import RoutePlanner
+from cqbSimuNavGraph import NavGraph
+
+VIEW_TILE = 120         # view point tile size (pixel).
+MIN_TILE_CELLS = 16     # min free plan cells number of a tile to add a view point.
+CAND_NUM = 16           # candidate routes number.
+RAND_RATIO = 0.5        # max distance noise ratio of the randomized orders.
+MAX_TICKS = 2000        # max simulation ticks of a candidate.
+COVER_RANGE = 40        # trajectory coverage range (pixel).
+TOP_NUM = 5             # returned best routes number.
+
+#-----------------------------------------------------------------------------
+def genViewPoints(planner, startPos, tileSize=VIEW_TILE):
+    """ Return the (n, 2) int array of the view points of the free region which
+        the start position is in (one per tile).
+    """
+    if planner.regionList is None: planner._labelRegions()
+    gRows, gCols = planner.freeGrid.shape
+    startIdx = planner._snapIdx(startPos)
+    if startIdx is None: return np.zeros((0, 2), dtype=np.int64)
+    regionArr = np.array(planner.regionList).reshape(gRows+2, gCols+2)[1:-1, 1:-1]
+    rowArr, colArr = np.nonzero(regionArr == planner.regionList[startIdx])
+    tileCells = max(1, tileSize // planner.cellSize)
+    tileArr = (rowArr // tileCells) * (gCols // tileCells + 1) + colArr // tileCells
+    viewList = []
+    for tileID in np.unique(tileArr):
+        mask = tileArr == tileID
+        if mask.sum() < MIN_TILE_CELLS: continue
+        rows, cols = rowArr[mask], colArr[mask]
+        nearIdx = ((rows - rows.mean())**2 + (cols - cols.mean())**2).argmin()
+        viewList.append(planner._toPos((int(rows[nearIdx])+1)*planner.width + int(cols[nearIdx])+1))
+    return np.array(viewList, dtype=np.int64).reshape(-1, 2)
+
+def orderViewPoints(startPos, viewArr, rand=None, noiseRatio=RAND_RATIO):
+    """ Return the view points visit order (list of [x, y]) by the nearest neighbour
+        from the start position, the distances are randomized by <rand> if given.
+    """
+    crtPos = np.array(startPos[:2], dtype=np.float64)
+    leftIdx = list(range(len(viewArr)))
+    order = []
+    while leftIdx:
+        disArr = np.hypot(*(viewArr[leftIdx] - crtPos).T)
+        if rand is not None: disArr = disArr * rand.uniform(1, 1+noiseRatio, len(disArr))
+        idx = leftIdx.pop(int(disArr.argmin()))
+        order.append(viewArr[idx].tolist())
+        crtPos = viewArr[idx]
+    return order
+
+def genCandidates(planner, startPos, candNum=CAND_NUM, seed=0, routePts=None):
+    """ Generate the candidate sparse way points lists (the 1st point is the start
+        position), <routePts> is the current robot route added as the reference.
+    """
+    startPos = list(startPos[:2])
+    candList = []
+    if routePts and len(routePts) > 1: candList.append([startPos] + [list(pt) for pt in routePts[1:]])
+    viewArr = genViewPoints(planner, startPos)
+    if len(viewArr) == 0: return candList
+    candList.append([startPos] + orderViewPoints(startPos, viewArr))
+    rand = np.random.default_rng(seed)
+    while len(candList) < candNum:
+        candList.append([startPos] + orderViewPoints(startPos, viewArr, rand=rand))
+    return candList
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class RouteEvaluator(object):
+    """ Plan and simulate the candidate routes on one map (one obj per worker)."""
+    def __init__(self, mapMatrix, clearMap, navArrs, scene, maxTicks=MAX_TICKS,
+                 coverRange=COVER_RANGE):
+        """ Init example : evaluator = RouteEvaluator(mapMatrix, clearMap, navArrs, scene)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                clearMap (numpy.ndarray): clearance array of the map matrix.
+                navArrs (tuple): (nodeArr, edgeArr) of the map navigation graph, the
+                    graph is not used if None.
+                scene (dict): {'robotPos': [x, y], 'enemy': scenario enemies list,
+                    'params': scenario parameters dict}
+                maxTicks (int, optional): max simulation ticks. Defaults to MAX_TICKS.
+                coverRange (int, optional): coverage range. Defaults to COVER_RANGE.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = clearMap
+        self.planner = RoutePlanner(clearMap)
+        self.navGraph = NavGraph(self.planner, *navArrs) if navArrs else None
+        self.scene = scene
+        self.maxTicks = maxTicks
+        # free cells of the robot's region and the cover disk cell offsets.
+        if self.planner.regionList is None: self.planner._labelRegions()
+        gRows, gCols = self.planner.freeGrid.shape
+        regionArr = np.array(self.planner.regionList).reshape(gRows+2, gCols+2)[1:-1, 1:-1]
+        startIdx = self.planner._snapIdx(scene['robotPos'])
+        regionID = self.planner.regionList[startIdx] if startIdx is not None else -1
+        self.freeMask = regionArr == regionID
+        rad = coverRange // self.planner.cellSize
+        dyArr, dxArr = np.mgrid[-rad:rad+1, -rad:rad+1]
+        inDisk = dxArr**2 + dyArr**2 <= rad**2
+        self.diskOffsets = (dyArr[inDisk], dxArr[inDisk])
+
+    #-----------------------------------------------------------------------------
+    def _buildMapMgr(self, route):
+        mapMgr = MapMgr()
+        mapMgr.setMapMatrix(self.mapMatrix)
+        mapMgr.clearMap, mapMgr.clearSrc = self.clearMap, self.mapMatrix
+        mapMgr.planner, mapMgr.navGraph = self.planner, self.navGraph
+        mapMgr.setRobots([{'id': 0, 'pos': list(route[0]), 'route': route[1:]}])
+        mapMgr.setEnemy(self.scene['enemy'])
+        mapMgr.setScenarioParams(self.scene['params'])
+        for flgFun in (mapMgr.setLidarOn, mapMgr.setCamOn, mapMgr.setCamDetectionOn):
+            flgFun(True)
+        return mapMgr
+
+    def _calCoverage(self, posArr):
+        """ Return the ratio of the region free cells within the cover range of the
+            trajectory positions.
+        """
+        freeNum = self.freeMask.sum()
+        if freeNum == 0: return 0.0
+        gRows, gCols = self.freeMask.shape
+        cellArr = np.unique(posArr // self.planner.cellSize, axis=0)
+        rowArr = np.clip(cellArr[:, 1, None] + self.diskOffsets[0][None, :], 0, gRows-1)
+        colArr = np.clip(cellArr[:, 0, None] + self.diskOffsets[1][None, :], 0, gCols-1)
+        coverArr = np.zeros(self.freeMask.shape, dtype=bool)
+        coverArr[rowArr.ravel(), colArr.ravel()] = True
+        return float((coverArr & self.freeMask).sum() / freeNum)
+
+    #-----------------------------------------------------------------------------
+    def evaluate(self, wayPts):
+        """ Plan and simulate a candidate.
+            Args:
+                wayPts (list): [[x, y], ...] sparse way points, the 1st is the start.
+            Returns:
+                dict: {'route': planned route points, 'failNum': unplanned legs
+                    number, 'detTicks': 1st detection tick of every enemy (None if
+                    not detected), 'coverage': float 0~1, 'explored': sensors explored
+                    area ratio 0~1, 'ticks': simulation ticks,
+                    'score': float, lower is better}
+        """
+        route, failNum = self.planner.planRoute(wayPts, navGraph=self.navGraph)
+        mapMgr = self._buildMapMgr(route)
+        enemyNum = len(mapMgr.getEnemy())
+        detTicks = [None] * enemyNum
+        posList = [list(route[0])]
+        mapMgr.startMove(True)
+        tick = 0
+        while tick < self.maxTicks and mapMgr.getRobot().isMoving():
+            mapMgr.periodic()
+            posList.append(mapMgr.getRobot().getCrtPos().copy())
+            for idx in mapMgr.getCamEnemyDetectList():
+                if detTicks[idx] is None: detTicks[idx] = tick
+            tick += 1
+        coverage = self._calCoverage(np.array(posList, dtype=np.int64))
+        detScore = np.mean([self.maxTicks if val is None else val for val in detTicks]) \
+            / self.maxTicks if enemyNum else 0.0
+        return {
+            'route': [list(pt) for pt in route],
+            'failNum': failNum,
+            'detTicks': detTicks,
+            'coverage': coverage,
+            'explored': mapMgr.getExploredCoverage(),
+            'ticks': tick,
+            'score': float(detScore + 1 - coverage)
+        }
+
+#-----------------------------------------------------------------------------
+# Shared read only array functions.
+def _shareArray(arr):
+    """ Copy the array in a new shared memory block, return (block, spec)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _attachArray(spec):
+    """ Return (block, read only array view) of a <_shareArray()> spec."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    arr.flags.writeable = False
+    return shm, arr
+
+#-----------------------------------------------------------------------------
+# Worker process functions: every worker init the evaluator once.
+_gEvaluator = None
+_gShmList = []
+
+def _initWorker(mapData, navArrs, scene, maxTicks, shareFlg):
+    global _gEvaluator
+    if shareFlg:
+        arrList = []
+        for spec in mapData:
+            shm, arr = _attachArray(spec)
+            _gShmList.append(shm)   # keep the blocks open in the worker.
+            arrList.append(arr)
+        mapData = arrList
+    _gEvaluator = RouteEvaluator(mapData[0], mapData[1], navArrs, scene, maxTicks=maxTicks)
+
+def _evalJob(idx, wayPts):
+    result = _gEvaluator.evaluate(wayPts)
+    result['candIdx'] = idx
+    return result
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class RouteOptimizer(object):
+    """ Generate and evaluate the candidate search routes in the background worker
+        pool.
+    """
+    def __init__(self, mapMatrix, clearMap, navGraph, scene, workerNum=None, useProcess=True,
+                 candNum=CAND_NUM, maxTicks=MAX_TICKS, seed=0, routePts=None,
+                 progressCB=None, doneCB=None):
+        """ Init example : optimizer = RouteOptimizer(mapMatrix, clearMap, navGraph, scene)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                clearMap (numpy.ndarray): clearance array of the map matrix.
+                navGraph (NavGraph): navigation graph of the map (the planner is
+                    used to generate the candidates).
+                scene (dict): refer to <RouteEvaluator>.
+                workerNum (int, optional): worker number. Defaults to the CPU number.
+                useProcess (bool, optional): use process pool, else thread pool.
+                    Defaults to True.
+                candNum (int, optional): candidate number. Defaults to CAND_NUM.
+                maxTicks (int, optional): max simulation ticks. Defaults to MAX_TICKS.
+                seed (int, optional): randomized candidates seed. Defaults to 0.
+                routePts (list, optional): current route added as a candidate.
+                progressCB (function, optional): progressCB(doneNum, totalNum) called
+                    in the feeder thread when a candidate is evaluated.
+                doneCB (function, optional): doneCB(results) called in the feeder
+                    thread when finished, results is None if the optimize failed.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = clearMap
+        self.navGraph = navGraph
+        self.scene = scene
+        self.workerNum = workerNum or max(1, (os.cpu_count() or 2) - 1)
+        self.useProcess = useProcess
+        self.candNum = candNum
+        self.maxTicks = maxTicks
+        self.seed = seed
+        self.routePts = routePts
+        self.progressCB = progressCB
+        self.doneCB = doneCB
+        self.totalNum = 0
+        self.doneNum = 0
+        self.results = []
+        self.error = None
+        self.feeder = None
+        self.terminate = False
+
+    #-----------------------------------------------------------------------------
+    def _buildPool(self, shmList):
+        navArrs = (self.navGraph.nodeArr, self.navGraph.edgeArr)
+        if not self.useProcess:
+            _initWorker((self.mapMatrix, self.clearMap), navArrs, self.scene, self.maxTicks, False)
+            return ThreadPoolExecutor(max_workers=1)    # the worker evaluator is shared.
+        mapData, shareFlg = (self.mapMatrix, self.clearMap), shared_memory is not None
+        if shareFlg:
+            specList = []
+            for arr in mapData:
+                shm, spec = _shareArray(np.ascontiguousarray(arr))
+                shmList.append(shm)
+                specList.append(spec)
+            mapData = specList
+        return ProcessPoolExecutor(max_workers=self.workerNum, initializer=_initWorker,
+                                   initargs=(mapData, navArrs, self.scene, self.maxTicks, shareFlg))
+
+    #-----------------------------------------------------------------------------
+    def _feed(self):
+        """ Feeder thread: generate the candidates and collect the worker results."""
+        shmList = []
+        try:
+            candList = genCandidates(self.navGraph.planner, self.scene['robotPos'],
+                                     candNum=self.candNum, seed=self.seed, routePts=self.routePts)
+            self.totalNum = len(candList)
+            results = []
+            with self._buildPool(shmList) as pool:
+                futures = [pool.submit(_evalJob, idx, wayPts) for idx, wayPts in enumerate(candList)]
+                for future in as_completed(futures):
+                    if self.terminate:
+                        for pending in futures: pending.cancel()
+                        break
+                    results.append(future.result())
+                    self.doneNum += 1
+                    if self.progressCB: self.progressCB(self.doneNum, self.totalNum)
+            results.sort(key=lambda result: (result['score'], result['ticks']))
+            self.results = results
+        except Exception as err:
+            self.error = str(err)
+        finally:
+            for shm in shmList:
+                shm.close()
+                shm.unlink()
+        if self.doneCB: self.doneCB(None if self.error else self.getResults())
+
+    #-----------------------------------------------------------------------------
+    def startOptimize(self):
+        """ Start the optimize in the background and return immediately."""
+        self.doneNum = 0
+        self.feeder = threading.Thread(target=self._feed, daemon=True)
+        self.feeder.start()
+
+    #-----------------------------------------------------------------------------
+    def getProgress(self):
+        """ Return the optimize progress tuple (doneNum, totalNum)."""
+        return (self.doneNum, self.totalNum)
+
+    def getResults(self, topNum=TOP_NUM):
+        """ Return the best <topNum> result dicts (refer to <RouteEvaluator.evaluate()>,
+            plus the 'candIdx'), sorted by the score.
+        """
+        return self.results[:topNum]
+
+    def getError(self):
+        return self.error
+
+    def isFinished(self):
+        return self.feeder is not None and not self.feeder.is_alive()
+
+    def stop(self):
+        self.terminate = True
+
+#-----------------------------------------------------------------------------
+def buildScene(mapMgr):
+    """ Return the evaluator scene dict of the map manager's active robot position,
+        the enemies and the scenario parameters.
+    """
+    robotObj = mapMgr.getRobot()
+    enemyList = []
+    for enemyObj in mapMgr.getEnemy():
+        enemyInfo = [enemyObj.getID(), list(enemyObj.getOrgPos())]
+        if enemyObj.getMotionInfo(): enemyInfo.append(enemyObj.getMotionInfo())
+        enemyList.append(enemyInfo)
+    return {
+        'robotPos': list(robotObj.getOrgPos()),
+        'enemy': enemyList,
+        'params': mapMgr.getScenarioParams()
+    }
+
+def createOptimizer(mapMgr, **kwargs):
+    """ Create a <RouteOptimizer> of the map manager's map, enemies and active robot
+        (the current route is added as a candidate), None if no map or robot.
+    """
+    navGraph = mapMgr.getNavGraph()
+    if navGraph is None or mapMgr.getRobot() is None: return None
+    return RouteOptimizer(mapMgr.getMapMatrix(), mapMgr.getClearMap(), navGraph,
+                          buildScene(mapMgr), routePts=mapMgr.getRobot().getRoutePts(), **kwargs)
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ Headless optimize the search route of a scenario file."""
+    if len(argv) < 1:
+        print("Usage: python cqbSimuRouteOptimizer.py <*.cqbs scenario> [candidate number]")
+        return 1
+    import cqbSimuScenario as scenario
+    data = scenario.loadScenario(argv[0])
+    mapMgr = MapMgr()
+    mapMgr.setMapMatrix(data['mapMatrix'])
+    mapMgr.setRobots(scenario.getRobotList(data))
+    mapMgr.setEnemy(data['enemy'])
+    mapMgr.setScenarioParams(data['params'])
+    candNum = int(argv[1]) if len(argv) > 1 else CAND_NUM
+    optimizer = createOptimizer(mapMgr, candNum=candNum)
+    if optimizer is None:
+        print("The scenario has no robot.")
+        return 1
+    startT = time.perf_counter()
+    optimizer.startOptimize()
+    optimizer.feeder.join()
+    if optimizer.getError():
+        print("Optimize error: %s" %optimizer.getError())
+        return 1
+    print("Evaluated %d candidates in %.1f sec" %(optimizer.getProgress()[0],
+                                                  time.perf_counter() - startT))
+    for rank, result in enumerate(optimizer.getResults()):
+        detNum = sum(val is not None for val in result['detTicks'])
+        print("#%d candidate %d: score %.3f, coverage %.1f%%, explored %.1f%%, detected %d/%d, ticks %d, way points %d"
+              %(rank+1, result['candIdx'], result['score'], result['coverage']*100, result['explored']*100,
+                detNum, len(result['detTicks']), result['ticks'], len(result['route'])))
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
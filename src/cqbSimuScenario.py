@@ -0,0 +1,229 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuScenario.py
+#
+# Purpose:     This module provides the API to save and load the CQB scenario in
+#              the compact v2 binary container (*.cqbs) which bundles the processed
+#              floor map matrix, the blue print image, the agents, route and the
+#              simulation parameters in one portable file. The v1 JSON scenario
+#              import and export are still supported.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/23
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    v2 scenario file layout (all the int are little endian):
+    - Header (HEADER_FMT, 64 bytes): magic, version, map rows, map cols, and the
+        (offset, length) of the meta, grid and blue print sections.
+    - Meta section: zlib compressed compact JSON of the robot (pos, route), the
+        enemies, the parameters and the blue print file name.
+    - Grid section: the occupancy grid bit-packed row by row (1 bit per cell, a
+        900x600 map is 67.5KB), the section starts at a GRID_ALIGN aligned offset
+        and is not further compressed so it can be memory-mapped directly.
+    - Blue print section: the original blue print image file bytes, so the file
+        does not depend on the absolute path on the machine which created it.
+    Loading a v2 file only unpacks the grid bits, no JSON formatting parse or blue
+    print image decode is needed to get the map matrix.
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import numpy as np
+
+SCE_MAGIC = b'CQBS'
+SCE_VERSION = 2
+SCE_EXT = '.cqbs'
+JSON_EXT = '.json'
+# magic, version, reserved, rows, cols, metaOffset, metaLen, gridOffset, gridLen,
+# bluePrintOffset, bluePrintLen
+HEADER_FMT = '<4sHHII6Q'
+HEADER_SIZE = 64
+GRID_ALIGN = 4096       # grid section offset alignment (memory page size).
+
+#-----------------------------------------------------------------------------
+def _align(val, base):
+    return (val + base - 1) // base * base
+
+def fileHash(filePath):
+    """ Return the sha1 hex digest of a file."""
+    sha = hashlib.sha1()
+    with open(filePath, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def resolveBluePrint(bpPath, bpDir):
+    """ Return a blue print path which exists on the current machine: the input
+        path, else the same file name under the blue print folder <bpDir>, else None.
+    """
+    if bpPath is None: return None
+    if os.path.exists(bpPath): return bpPath
+    # the path may be created on other OS, handle both '\\' and '/'.
+    localPath = os.path.join(bpDir, bpPath.replace('\\', '/').split('/')[-1])
+    return localPath if os.path.exists(localPath) else None
+
+#-----------------------------------------------------------------------------
+def getRobotList(scenario):
+    """ Return the robots info list of the scenario dict, the scenario saved before
+        the multi-robot squad only has the single 'robot' (or None).
+    """
+    robots = scenario.get('robots', None)
+    if robots: return robots
+    robot = scenario.get('robot', None)
+    return [robot] if robot else []
+
+#-----------------------------------------------------------------------------
+def saveScenario(filePath, scenario, mapMatrix):
+    """ Save the scenario to a v2 binary file.
+        Args:
+            filePath (str): output *.cqbs file path.
+            scenario (dict): {'bluePrint': path, 'robot': {'id', 'pos', 'route'} or
+                None, 'robots': [robot dict, ...] (optional, all the squad robots, the 
+                'robot' is the first one), 'enemy': [[id, [x, y]], ...] (a moving enemy 
+                has the motion dict {'motion', 'speed', 'route'} as the 3rd item), 
+                'params': dict}
+            mapMatrix (numpy.ndarray): (rows, cols) map matrix, none zero is wall.
+    """
+    bpPath = scenario.get('bluePrint', None)
+    bpBytes = b''
+    if bpPath and os.path.exists(bpPath):
+        with open(bpPath, 'rb') as fh:
+            bpBytes = fh.read()
+    meta = {
+        'bluePrintName': os.path.basename(bpPath.replace('\\', '/')) if bpPath else None,
+        'bluePrintHash': hashlib.sha1(bpBytes).hexdigest() if bpBytes else None,
+        'robot': scenario.get('robot', None),
+        'robots': scenario.get('robots', None),
+        'enemy': scenario.get('enemy', []),
+        'params': scenario.get('params', {})
+    }
+    metaBytes = zlib.compress(json.dumps(meta, separators=(',', ':')).encode('utf-8'))
+    rows, cols = mapMatrix.shape
+    gridBytes = np.packbits(np.asarray(mapMatrix) != 0, axis=1).tobytes()
+    metaOffset = HEADER_SIZE
+    gridOffset = _align(metaOffset + len(metaBytes), GRID_ALIGN)
+    bpOffset = gridOffset + len(gridBytes)
+    header = struct.pack(HEADER_FMT, SCE_MAGIC, SCE_VERSION, 0, rows, cols,
+                         metaOffset, len(metaBytes), gridOffset, len(gridBytes),
+                         bpOffset, len(bpBytes))
+    with open(filePath, 'wb') as fh:
+        fh.write(header.ljust(HEADER_SIZE, b'\0'))
+        fh.write(metaBytes)
+        fh.write(b'\0' * (gridOffset - metaOffset - len(metaBytes)))
+        fh.write(gridBytes)
+        fh.write(bpBytes)
+    return True
+
+#-----------------------------------------------------------------------------
+def _readHeader(fh):
+    vals = struct.unpack(HEADER_FMT, fh.read(HEADER_SIZE)[:struct.calcsize(HEADER_FMT)])
+    if vals[0] != SCE_MAGIC or vals[1] != SCE_VERSION:
+        raise ValueError("Not a v%s scenario file." %str(SCE_VERSION))
+    keys = ('rows', 'cols', 'metaOffset', 'metaLen', 'gridOffset', 'gridLen', 'bpOffset', 'bpLen')
+    return dict(zip(keys, vals[3:]))
+
+#-----------------------------------------------------------------------------
+def loadMeta(filePath):
+    """ Read only the header and the meta section (agents, parameters, blue print
+        name and hash) of a v2 scenario file, the grid and blue print are skipped.
+    """
+    with open(filePath, 'rb') as fh:
+        header = _readHeader(fh)
+        fh.seek(header['metaOffset'])
+        meta = json.loads(zlib.decompress(fh.read(header['metaLen'])).decode('utf-8'))
+    return meta
+
+def loadBluePrintBytes(filePath):
+    """ Read only the embedded blue print image bytes of a v2 scenario file."""
+    with open(filePath, 'rb') as fh:
+        header = _readHeader(fh)
+        fh.seek(header['bpOffset'])
+        return fh.read(header['bpLen'])
+
+#-----------------------------------------------------------------------------
+def mapGrid(filePath):
+    """ Memory-map the bit-packed grid section of a v2 scenario file without
+        reading the whole file, return the (rows, cols//8) read only uint8 memmap.
+    """
+    with open(filePath, 'rb') as fh:
+        header = _readHeader(fh)
+    return np.memmap(filePath, dtype=np.uint8, mode='r', offset=header['gridOffset'],
+                     shape=(header['rows'], header['gridLen'] // header['rows']))
+
+#-----------------------------------------------------------------------------
+def loadScenario(filePath, bpDir=None):
+    """ Load a v2 scenario file.
+        Args:
+            filePath (str): *.cqbs file path.
+            bpDir (str, optional): blue print folder, if the embedded blue print
+                does not exist in the folder it will be extracted there.
+        Returns:
+            dict: the scenario dict (same format as <saveScenario()>) plus the
+                'mapMatrix' (numpy uint8 array) and 'bluePrintBytes'.
+    """
+    with open(filePath, 'rb') as fh:
+        header = _readHeader(fh)
+        fh.seek(header['metaOffset'])
+        meta = json.loads(zlib.decompress(fh.read(header['metaLen'])).decode('utf-8'))
+        fh.seek(header['bpOffset'])
+        bpBytes = fh.read(header['bpLen'])
+    grid = mapGrid(filePath)
+    # unpack from a plain ndarray view, else the result is also a (slow) memmap obj.
+    mapMatrix = np.unpackbits(np.asarray(grid), axis=1, count=header['cols'])
+    del grid
+    bpPath = None
+    if meta['bluePrintName'] and bpDir:
+        bpPath = os.path.join(bpDir, meta['bluePrintName'])
+        if bpBytes and os.path.exists(bpPath) and fileHash(bpPath) != meta['bluePrintHash']:
+            # a different blue print with the same name exists, add the hash in the name.
+            name, ext = os.path.splitext(meta['bluePrintName'])
+            bpPath = os.path.join(bpDir, "%s_%s%s" %(name, meta['bluePrintHash'][:8], ext))
+        if bpBytes and not os.path.exists(bpPath):
+            with open(bpPath, 'wb') as fh:
+                fh.write(bpBytes)
+    scenario = {
+        'bluePrint': bpPath,
+        'robot': meta['robot'],
+        'robots': meta.get('robots', None),
+        'enemy': meta['enemy'],
+        'params': meta['params'],
+        'mapMatrix': mapMatrix,
+        'bluePrintBytes': bpBytes
+    }
+    return scenario
+
+#-----------------------------------------------------------------------------
+def importJson(filePath, bpDir=None):
+    """ Load a v1 JSON scenario file, the blue print path is resolved to the local
+        machine path (refer to <resolveBluePrint()>) if <bpDir> is given.
+    """
+    with open(filePath, 'r') as fh:
+        data = json.load(fh)
+    scenario = {
+        'bluePrint': resolveBluePrint(data['bluePrint'], bpDir) if bpDir else data['bluePrint'],
+        'robot': data.get('robot', None),
+        'robots': data.get('robots', None),
+        'enemy': data.get('enemy', []),
+        'params': data.get('params', {})
+    }
+    return scenario
+
+def exportJson(filePath, scenario, indent=4):
+    """ Save the scenario to a v1 JSON scenario file."""
+    data = {
+        'bluePrint': scenario.get('bluePrint', None),
+        'robot': scenario.get('robot', None),
+        'robots': scenario.get('robots', None),
+        'enemy': scenario.get('enemy', []),
+        'params': scenario.get('params', {})
+    }
+    with open(filePath, 'w') as fh:
+        fh.write(json.dumps(data, indent=indent))
+    return True
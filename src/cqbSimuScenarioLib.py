@@ -0,0 +1,295 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuScenarioLib.py
+#
+# Purpose:     This module provides the indexed scenario library: a catalog file
+#              in the scenario folder which caches every scenario's metadata (blue
+#              print hash, robot and enemy number, route length) and a thumbnail,
+#              so the scenarios can be listed and filtered without opening each
+#              scenario file.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/25
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    The catalog (CATALOG_NAME json file) is a dict {scenario file name: entry}, a
+    scenario entry is only rebuilt when the file's mtime or size changed:
+    - updateEntry() is called after the editor saved a scenario.
+    - scan() compares the folder with the catalog, parses the new/changed files and
+      removes the deleted ones (incremental, an unchanged folder costs one stat()
+      per file).
+    The blue print hash of the v1 JSON scenario is cached by the blue print file
+    path + mtime, so scenarios sharing one blue print only hash the image once.
+"""
+
+import io
+import os
+import json
+import math
+import threading
+from PIL import Image, ImageDraw
+
+import cqbSimuGlobal as gv
+import cqbSimuScenario as scenario
+
+CATALOG_NAME = 'scenarioLib.json'
+THUMB_DIR = 'thumbs'
+THUMB_SIZE = (180, 120)
+MAP_SIZE = (900, 600)   # map panel size (same as the map matrix cols, rows).
+SCE_EXTS = (scenario.SCE_EXT, scenario.JSON_EXT)
+
+#-----------------------------------------------------------------------------
+def routeLength(routePts):
+    """ Return the total length (pixel) of the waypoints route."""
+    if not routePts: return 0
+    return sum(math.hypot(p2[0]-p1[0], p2[1]-p1[1]) for p1, p2 in zip(routePts, routePts[1:]))
+
+#-----------------------------------------------------------------------------
+def drawThumbnail(bluePrint, robots, enemies, size=THUMB_SIZE):
+    """ Draw the scenario thumbnail image.
+        Args:
+            bluePrint (str/PIL.Image): blue print image path or image obj, can be None.
+            robots (list): scenario robot dicts [{'id', 'pos', 'route'}, ...].
+            enemies (list): [[id, [x, y]], ...] (a moving enemy has the motion dict).
+        Returns:
+            PIL.Image: thumbnail image.
+    """
+    canvas = Image.new('RGB', MAP_SIZE, (255, 255, 255))
+    if bluePrint is not None:
+        img = Image.open(bluePrint) if isinstance(bluePrint, str) else bluePrint
+        img = img.convert('RGB')
+        # same as the map matrix, the blue print is put in the center.
+        canvas.paste(img, ((MAP_SIZE[0]-img.size[0])//2, (MAP_SIZE[1]-img.size[1])//2))
+    dc = ImageDraw.Draw(canvas)
+    for robot in robots:
+        route = [tuple(pt) for pt in robot['route']]
+        if len(route) > 1: dc.line(route, fill=(0, 128, 255), width=4)
+        x, y = robot['pos']
+        dc.ellipse((x-10, y-10, x+10, y+10), fill=(0, 200, 0))
+    for enemy in enemies:
+        x, y = enemy[1]
+        dc.ellipse((x-10, y-10, x+10, y+10), fill=(255, 0, 0))
+    return canvas.resize(size, Image.BILINEAR)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class ScenarioLibrary(object):
+    """ Catalog of the scenario files in the scenario folder."""
+    def __init__(self, scenarioDir, bpDir=None, thumbFlg=True):
+        """ Init example : scenarioLib = ScenarioLibrary('scenario', 'floorBluePrint')
+            Args:
+                scenarioDir (str): scenario folder.
+                bpDir (str, optional): blue print folder to resolve the JSON scenario
+                    blue print path.
+                thumbFlg (bool, optional): flag to create the thumbnail. Defaults to True.
+        """
+        self.scenarioDir = scenarioDir
+        self.bpDir = bpDir
+        self.thumbFlg = thumbFlg
+        self.catalogPath = os.path.join(scenarioDir, CATALOG_NAME)
+        self.thumbDir = os.path.join(scenarioDir, THUMB_DIR)
+        self.entries = {}
+        self.bpHashes = {}      # blue print path : [mtime, hash]
+        self.lock = threading.Lock()
+        self._loadCatalog()
+
+    #-----------------------------------------------------------------------------
+    def _loadCatalog(self):
+        if not os.path.exists(self.catalogPath): return
+        try:
+            with open(self.catalogPath, 'r') as fh:
+                data = json.load(fh)
+            self.entries = data.get('entries', {})
+            self.bpHashes = data.get('bluePrints', {})
+        except Exception as err:
+            # a broken catalog is rebuilt by the next scan().
+            gv.gDebugPrint("ScenarioLibrary: load catalog error: %s" %str(err), 
+                           logType=gv.LOG_WARN)
+            self.entries, self.bpHashes = {}, {}
+
+    #-----------------------------------------------------------------------------
+    def _saveCatalog(self):
+        """ Write the catalog to a temporary file then replace the old one, so a
+            crash in the middle will not corrupt the catalog. The lock is held until
+            the file is replaced as the scan() thread and the UI thread both save.
+        """
+        with self.lock:
+            data = {'entries': self.entries, 'bluePrints': self.bpHashes}
+            text = json.dumps(data, separators=(',', ':'))
+            tmpPath = self.catalogPath + '.tmp'
+            with open(tmpPath, 'w') as fh:
+                fh.write(text)
+            os.replace(tmpPath, self.catalogPath)
+
+    #-----------------------------------------------------------------------------
+    def _bluePrintHash(self, bpPath):
+        """ Return the blue print file hash, use the cached one if the file is not
+            modified.
+        """
+        if bpPath is None: return None
+        mtime = os.path.getmtime(bpPath)
+        with self.lock:
+            cache = self.bpHashes.get(bpPath, None)
+        if cache and cache[0] == mtime: return cache[1]
+        bpHash = scenario.fileHash(bpPath)
+        with self.lock:
+            self.bpHashes[bpPath] = [mtime, bpHash]
+        return bpHash
+
+    #-----------------------------------------------------------------------------
+    def _buildEntry(self, filePath, stat):
+        """ Parse the scenario file and build the catalog entry."""
+        name = os.path.basename(filePath)
+        bluePrint = None
+        if name.endswith(scenario.SCE_EXT):
+            meta = scenario.loadMeta(filePath)
+            bpName, bpHash = meta['bluePrintName'], meta['bluePrintHash']
+            if self.thumbFlg and bpHash:
+                bpBytes = scenario.loadBluePrintBytes(filePath)
+                bluePrint = Image.open(io.BytesIO(bpBytes))
+        else:
+            meta = scenario.importJson(filePath, bpDir=self.bpDir)
+            bpPath = meta['bluePrint']
+            if bpPath is not None and not os.path.exists(bpPath): bpPath = None
+            bpName = os.path.basename(bpPath) if bpPath else None
+            bpHash = self._bluePrintHash(bpPath)
+            bluePrint = bpPath
+        robots = scenario.getRobotList(meta)
+        enemies = meta.get('enemy', [])
+        routes = [robot['route'] for robot in robots]
+        entry = {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'bluePrintName': bpName,
+            'bluePrintHash': bpHash,
+            'robotNum': len(robots),
+            'enemyNum': len(enemies),
+            'wayPtNum': sum(len(route) for route in routes),
+            'routeLen': round(sum(routeLength(route) for route in routes), 1),
+            'params': meta.get('params', {}),
+            'thumbnail': None
+        }
+        if self.thumbFlg:
+            if not os.path.exists(self.thumbDir): os.makedirs(self.thumbDir)
+            thumbName = os.path.splitext(name)[0] + '_' + name.rsplit('.', 1)[-1] + '.png'
+            drawThumbnail(bluePrint, robots, enemies).save(os.path.join(self.thumbDir, thumbName))
+            entry['thumbnail'] = os.path.join(THUMB_DIR, thumbName)
+        return entry
+
+    #-----------------------------------------------------------------------------
+    def _removeEntry(self, name):
+        entry = self.entries.pop(name, None)
+        if entry and entry['thumbnail']:
+            thumbPath = os.path.join(self.scenarioDir, entry['thumbnail'])
+            if os.path.exists(thumbPath): os.remove(thumbPath)
+
+    #-----------------------------------------------------------------------------
+    def _checkEntry(self, name, stat):
+        """ Rebuild the entry if the file is changed, return True if it is rebuilt."""
+        entry = self.entries.get(name, None)
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return False
+        try:
+            newEntry = self._buildEntry(os.path.join(self.scenarioDir, name), stat)
+        except Exception as err:
+            gv.gDebugPrint("ScenarioLibrary: parse scenario %s error: %s" %(name, str(err)), 
+                           logType=gv.LOG_WARN)
+            # keep a record of the broken file so it is not parsed in every scan.
+            newEntry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'error': str(err),
+                        'thumbnail': None}
+        with self.lock:
+            self.entries[name] = newEntry
+        return True
+
+    #-----------------------------------------------------------------------------
+    def updateEntry(self, filePath):
+        """ Update the catalog entry of one scenario file (call after the file is
+            saved), return the entry or None if the file does not exist.
+        """
+        name = os.path.basename(filePath)
+        if not os.path.exists(filePath):
+            with self.lock:
+                self._removeEntry(name)
+            self._saveCatalog()
+            return None
+        if self._checkEntry(name, os.stat(filePath)): self._saveCatalog()
+        return self.entries.get(name, None)
+
+    #-----------------------------------------------------------------------------
+    def scan(self):
+        """ Incremental scan of the scenario folder, return the number of added,
+            changed and removed entries.
+        """
+        changed = 0
+        fileNames = set()
+        with os.scandir(self.scenarioDir) as it:
+            for dirEntry in it:
+                if not dirEntry.is_file() or not dirEntry.name.endswith(SCE_EXTS): continue
+                if dirEntry.name == CATALOG_NAME: continue
+                fileNames.add(dirEntry.name)
+                if self._checkEntry(dirEntry.name, dirEntry.stat()): changed += 1
+        with self.lock:
+            for name in set(self.entries.keys()) - fileNames:
+                self._removeEntry(name)
+                changed += 1
+        if changed or not os.path.exists(self.catalogPath): self._saveCatalog()
+        return changed
+
+    #-----------------------------------------------------------------------------
+    def listScenarios(self, filterFun=None, sortKey='mtime', reverse=True):
+        """ Return the list of (file name, entry) from the catalog.
+            Args:
+                filterFun (function, optional): filterFun(entry) return True to keep.
+                sortKey (str, optional): entry key to sort. Defaults to 'mtime'.
+                reverse (bool, optional): sort descending. Defaults to True.
+        """
+        with self.lock:
+            items = [(name, entry) for name, entry in self.entries.items()
+                     if 'error' not in entry and (filterFun is None or filterFun(entry))]
+        if sortKey: items.sort(key=lambda item: item[1].get(sortKey, 0) or 0, reverse=reverse)
+        return items
+
+    #-----------------------------------------------------------------------------
+    def filter(self, bluePrintHash=None, bluePrintName=None, minEnemy=None,
+               maxEnemy=None, hasRobot=None, maxRouteLen=None):
+        """ List the scenarios which match all the given conditions."""
+        def check(entry):
+            if bluePrintHash and entry['bluePrintHash'] != bluePrintHash: return False
+            if bluePrintName and entry['bluePrintName'] != bluePrintName: return False
+            if minEnemy is not None and entry['enemyNum'] < minEnemy: return False
+            if maxEnemy is not None and entry['enemyNum'] > maxEnemy: return False
+            if hasRobot is not None and bool(entry['robotNum']) != hasRobot: return False
+            if maxRouteLen is not None and entry['routeLen'] > maxRouteLen: return False
+            return True
+        return self.listScenarios(filterFun=check)
+
+    #-----------------------------------------------------------------------------
+    def getEntry(self, fileName):
+        return self.entries.get(os.path.basename(fileName), None)
+
+    def getThumbnailPath(self, fileName):
+        entry = self.getEntry(fileName)
+        if entry and entry['thumbnail']:
+            return os.path.join(self.scenarioDir, entry['thumbnail'])
+        return None
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ List the scenario library: python cqbSimuScenarioLib.py scenarioDir [bpDir]"""
+    if len(argv) < 1:
+        print("Usage: python cqbSimuScenarioLib.py <scenarioDir> [bluePrintDir]")
+        return
+    scenarioLib = ScenarioLibrary(argv[0], argv[1] if len(argv) > 1 else None)
+    print("Updated entries: %s" %str(scenarioLib.scan()))
+    for name, entry in scenarioLib.listScenarios():
+        print("%s : robot=%s, enemy=%s, route=%spx, bluePrint=%s" %(name,
+              entry['robotNum'], entry['enemyNum'], entry['routeLen'], entry['bluePrintName']))
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,240 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuSound.py
+#
+# Purpose:     This module provides the wall aware sound propagation model: the
+#              sound of an enemy goes around the walls, the robot hears it from the
+#              direction the sound arrives (the door or the corner) with the around
+#              walls (geodesic) propagation distance. The propagation distance field
+#              of every sound source is cached and the fields of the moving sources
+#              are rebuilt in a per tick budget.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/04
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - Sound grid: the map is split in SOUND_CELL size cells, a cell with any wall
+      pixel blocks the sound.
+    - Distance field: the chamfer distance (ORTH_COST per side step, DIAG_COST per
+      diagonal step, the diagonal step can not cut a wall corner) from the source
+      cell to every cell, built by the delta stepping search with the bucket width
+      ORTH_COST: all the step costs are not less than the bucket width, so every
+      bucket is final after one numpy pass (no re-relaxation).
+    - Field cache: the fields are cached per source cell (LRU, FIELD_CACHE), a
+      static source builds its field once. A moving source uses the cached field
+      of its new cell if there is one (a patrol enemy loops over the same cells),
+      else it keeps its last field until it moves more than STALE_CELLS cells away
+      from the field's cell, then it is queued and at most REBUILD_MAX fields are
+      built per tick (the sources without any field first, then the oldest ones).
+      A source without field uses the straight line.
+    - Arrival bearing: if the geodesic distance is close to the straight distance
+      the sound comes directly, else the bearing is the direction of the lowest
+      field value on the probe ring (RING_RAD) points which the robot can see (the
+      straight line bearing if the robot can not see any probe ring point).
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+SOUND_CELL = 8          # sound grid cell size (pixel).
+ORTH_COST = 2           # chamfer side step cost (a cell size is 2 units).
+DIAG_COST = 3           # chamfer diagonal step cost.
+FIELD_CACHE = 512       # max cached distance fields.
+REBUILD_MAX = 2         # max distance fields built per tick.
+STALE_CELLS = 2         # max cells a source moves before its field is rebuilt.
+RING_RAD = 24           # arrival direction probe ring radius (pixel).
+RING_NUM = 48           # probe ring points number.
+DIRECT_RATIO = 1.08     # geodesic/straight distance ratio of the direct sound.
+UNREACH = 0xFFFF        # field value of the cells the sound can not reach.
+
+#-----------------------------------------------------------------------------
+def buildSoundGrid(mapMatrix, cellSize=SOUND_CELL):
+    """ Return the (gRows+2, gCols+2) bool array of the sound passable cells, the
+        grid is padded by one blocked cell on every side.
+    """
+    rows, cols = mapMatrix.shape
+    gRows, gCols = -(-rows // cellSize), -(-cols // cellSize)
+    padArr = np.zeros((gRows*cellSize, gCols*cellSize), dtype=bool)
+    padArr[:rows, :cols] = mapMatrix == 1
+    passGrid = np.zeros((gRows+2, gCols+2), dtype=bool)
+    passGrid[1:-1, 1:-1] = ~padArr.reshape(gRows, cellSize, gCols, cellSize).any(axis=(1, 3))
+    return passGrid
+
+def buildDistField(passFlat, width, srcIdx):
+    """ Build the chamfer distance field of a source cell.
+        Args:
+            passFlat (numpy.ndarray): flat padded sound passable grid.
+            width (int): padded grid width.
+            srcIdx (int): source flat cell index.
+        Returns:
+            numpy.ndarray: flat uint16 distance (chamfer unit) of every cell, UNREACH
+                if the cell can not be reached.
+    """
+    offsets = np.array([1, -1, width, -width, width+1, width-1, -width+1, -width-1])
+    costs = np.array([ORTH_COST]*4 + [DIAG_COST]*4)
+    # the cells which must be passable for the step (a diagonal step can not cut
+    # a wall corner), a source in a wall cell can still send the sound out.
+    sideA = np.array([1, -1, width, -width, 1, -1, 1, -1])
+    sideB = np.array([1, -1, width, -width, width, width, -width, -width])
+    distArr = np.full(len(passFlat), UNREACH, dtype=np.int32)
+    distArr[srcIdx] = 0
+    buckets = {0: [np.array([srcIdx])]}
+    bucket = 0
+    while buckets:
+        while bucket not in buckets: bucket += 1
+        cells = np.concatenate(buckets.pop(bucket))
+        nbArr = cells[:, None] + offsets[None, :]
+        okArr = passFlat[nbArr] & passFlat[cells[:, None] + sideA] & passFlat[cells[:, None] + sideB]
+        newArr = (distArr[cells][:, None] + costs[None, :])[okArr]
+        nbArr = nbArr[okArr]
+        better = newArr < distArr[nbArr]
+        nbArr, newArr = nbArr[better], newArr[better]
+        if nbArr.size == 0: continue
+        np.minimum.at(distArr, nbArr, newArr)
+        nbArr = np.unique(nbArr)
+        keyArr = distArr[nbArr] // ORTH_COST
+        # the new distance is in the next two buckets.
+        nearArr = keyArr == bucket + 1
+        for key, keyNb in ((bucket+1, nbArr[nearArr]), (bucket+2, nbArr[~nearArr])):
+            if keyNb.size: buckets.setdefault(key, []).append(keyNb)
+    return distArr.astype(np.uint16)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SoundModel(object):
+    """ Wall aware sound propagation model of one map matrix."""
+    def __init__(self, mapMatrix, cellSize=SOUND_CELL):
+        """ Init example : soundModel = SoundModel(mapMatrix)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                cellSize (int, optional): sound grid cell size. Defaults to SOUND_CELL.
+        """
+        self.mapMatrix = mapMatrix
+        self.cellSize = cellSize
+        passGrid = buildSoundGrid(mapMatrix, cellSize)
+        self.gRows, self.width = passGrid.shape
+        self.passFlat = passGrid.ravel()
+        self.fieldCache = OrderedDict()     # source cell index: distance field.
+        self.srcCells = []      # field cell index of every source (-1 if no field).
+        self.srcAge = []        # ticks since the source's field is assigned.
+        # probe ring directions (map degree: 0 is up, clockwise).
+        self.ringDegs = np.arange(RING_NUM) * (360.0 / RING_NUM)
+        radArr = np.radians(self.ringDegs)
+        self.ringVec = np.stack((np.sin(radArr), -np.cos(radArr)), axis=1)
+
+    #-----------------------------------------------------------------------------
+    def copy(self):
+        """ Return a copy with the same sources' fields assignment, the fields cache
+            is shared (a field only depends on the map and the source cell).
+        """
+        newModel = SoundModel.__new__(SoundModel)
+        newModel.__dict__.update(self.__dict__)
+        newModel.srcCells, newModel.srcAge = list(self.srcCells), list(self.srcAge)
+        return newModel
+
+    def __getstate__(self):
+        # the fields cache is not pickled, the fields are rebuilt when used.
+        state = dict(self.__dict__)
+        state['fieldCache'] = OrderedDict()
+        return state
+
+    def _toCells(self, posArr):
+        """ Return the flat padded cell index of the (n, 2) positions."""
+        gCols = self.width - 2
+        colArr = np.clip(np.asarray(posArr[:, 0], dtype=np.int64) // self.cellSize, 0, gCols-1)
+        rowArr = np.clip(np.asarray(posArr[:, 1], dtype=np.int64) // self.cellSize, 0, self.gRows-3)
+        return (rowArr + 1) * self.width + colArr + 1
+
+    def _cellGap(self, cellA, cellB):
+        """ Return the chebyshev distance (cells) between two flat cell index."""
+        rowA, colA = divmod(cellA, self.width)
+        rowB, colB = divmod(cellB, self.width)
+        return max(abs(rowA - rowB), abs(colA - colB))
+
+    def getField(self, cellIdx, buildFlg=True):
+        """ Return the distance field of the source cell from the cache, else build
+            it if <buildFlg> (None if not).
+        """
+        field = self.fieldCache.get(cellIdx, None)
+        if field is not None:
+            self.fieldCache.move_to_end(cellIdx)
+        elif buildFlg:
+            field = buildDistField(self.passFlat, self.width, cellIdx)
+            self.fieldCache[cellIdx] = field
+            if len(self.fieldCache) > FIELD_CACHE: self.fieldCache.popitem(last=False)
+        return field
+
+    #-----------------------------------------------------------------------------
+    def updateSources(self, srcPosArr, buildMax=REBUILD_MAX):
+        """ Assign the distance fields to the sources' current cells: the cached
+            fields are used directly, at most <buildMax> new fields are built.
+            Returns:
+                int: number of the fields built.
+        """
+        cellArr = self._toCells(srcPosArr).tolist()
+        if len(self.srcCells) != len(cellArr):
+            self.srcCells, self.srcAge = [-1] * len(cellArr), [0] * len(cellArr)
+        pendList = []
+        for idx, cellIdx in enumerate(cellArr):
+            self.srcAge[idx] += 1
+            if self.srcCells[idx] == cellIdx: continue
+            if cellIdx in self.fieldCache:
+                self.srcCells[idx], self.srcAge[idx] = cellIdx, 0
+            elif self.srcCells[idx] < 0 or self._cellGap(cellIdx, self.srcCells[idx]) > STALE_CELLS:
+                pendList.append(idx)
+        # the sources without field first, then the longest waiting ones.
+        pendList.sort(key=lambda idx: (self.srcCells[idx] >= 0, -self.srcAge[idx]))
+        for idx in pendList[:buildMax]:
+            self.getField(cellArr[idx])
+            self.srcCells[idx], self.srcAge[idx] = cellArr[idx], 0
+        return min(len(pendList), buildMax)
+
+    #-----------------------------------------------------------------------------
+    def calSound(self, robotPosArr, srcPosArr):
+        """ Calculate the sound of every source heard by every robot.
+            Args:
+                robotPosArr (numpy.ndarray): (n, 2) robots' position.
+                srcPosArr (numpy.ndarray): (m, 2) sources' position, the sources must
+                    be assigned by <updateSources()> first.
+            Returns:
+                tuple: ((n, m) int64 arrival bearing degree, -1 if the sound can not
+                    reach the robot, (n, m) float propagation distance (pixel), inf
+                    if the sound can not reach the robot)
+        """
+        robotPosArr = np.asarray(robotPosArr, dtype=np.float64).reshape(-1, 2)
+        srcPosArr = np.asarray(srcPosArr, dtype=np.float64).reshape(-1, 2)
+        vecArr = srcPosArr[None, :, :] - robotPosArr[:, None, :]
+        lineDis = np.hypot(vecArr[..., 0], vecArr[..., 1])
+        lineDeg = (180 - np.degrees(np.arctan2(vecArr[..., 0], vecArr[..., 1]))) % 360
+        robotNum, srcNum = lineDis.shape
+        bearArr, disArr = lineDeg.copy(), lineDis.copy()
+        fieldIdx = [idx for idx in range(srcNum) if self.srcCells[idx] >= 0]
+        if robotNum == 0 or not fieldIdx: return bearArr.astype(np.int64), disArr
+        fieldArr = np.stack([self.fieldCache[self.srcCells[idx]] if self.srcCells[idx] in self.fieldCache
+                             else self.getField(self.srcCells[idx]) for idx in fieldIdx])
+        unit = self.cellSize / ORTH_COST
+        # the robot cell and the probe ring points which the robot can see.
+        robotCells = self._toCells(robotPosArr)
+        ringPts = robotPosArr[:, None, :] + self.ringVec[None, :, :] * RING_RAD
+        ringCells = self._toCells(ringPts.reshape(-1, 2)).reshape(robotNum, RING_NUM)
+        midCells = self._toCells((robotPosArr[:, None, :] + self.ringVec[None, :, :] * RING_RAD/2).reshape(-1, 2))
+        visArr = self.passFlat[ringCells] & self.passFlat[midCells.reshape(robotNum, RING_NUM)]
+        ringVal = np.where(visArr[None, :, :], fieldArr[:, ringCells].astype(np.float64), np.inf)
+        ringVal[ringVal >= UNREACH] = np.inf
+        crtVal = fieldArr[:, robotCells].astype(np.float64)
+        crtVal[crtVal >= UNREACH] = np.inf
+        ringMin = ringVal.min(axis=2)
+        geoDis = np.minimum(crtVal * unit, ringMin * unit + RING_RAD).T   # (n, k)
+        lineSub = lineDis[:, fieldIdx]
+        # no probe ring point is seen (the robot is boxed in): use the line bearing.
+        ringDeg = np.where(np.isinf(ringMin).T, lineDeg[:, fieldIdx], 
+                           self.ringDegs[ringVal.argmin(axis=2)].T)
+        directArr = geoDis <= lineSub * DIRECT_RATIO + 2*self.cellSize
+        disArr[:, fieldIdx] = np.where(directArr, lineSub, geoDis)
+        bearSub = np.where(directArr, lineDeg[:, fieldIdx], ringDeg)
+        bearArr[:, fieldIdx] = np.where(np.isinf(geoDis), -1, bearSub)
+        return bearArr.astype(np.int64), disArr
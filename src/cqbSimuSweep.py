@@ -0,0 +1,444 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuSweep.py
+#
+# Purpose:     This module provides the robot configuration parameter sweep: every
+#              combination of the parameters grid (robot move speed, camera angle,
+#              sensors on, obstacle avoidance and sensors noise level) is simulated
+#              headless on a scenario in a background worker process pool with the
+#              deterministic seeds, the run metrics are aggregated in one table with
+#              the per combination summary statistics and saved as CSV or NPZ.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/09/07
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    - Grid: {param: values list} of the SWEEP_PARAMS keys (the missing keys use the
+      scenario value or DEF_GRID), the combinations are the product of the values
+      in the SWEEP_PARAMS order, every combination is run <repeatNum> times.
+    - Seeds: the run seed only depends on the base seed and the repeat index (the
+      same for all the combinations, the common random numbers make the combinations
+      comparable), the sensors noise and the enemies motion seeds are spawned from
+      np.random.SeedSequence([seed, repeatIdx]).
+    - SweepEvaluator (one per worker): run a headless <MapMgr> with the scenario
+      robot route and enemies until the robot stops or MAX_TICKS, the metrics are
+      in SWEEP_METRICS.
+    - ParamSweep: same background pool structure as <RouteOptimizer>, the map
+      matrix and clearance array are shared with the workers.
+    - Table: the runs table (one row per run) and the summary table (one row per
+      combination, the mean / std / min / max of every metric over the repeats).
+      CSV: <name>.csv and <name>_summary.csv, NPZ: one file with 'run_<column>' and
+      'sum_<column>' arrays.
+
+    Usage (headless):
+        python cqbSimuSweep.py <*.cqbs scenario> <output *.csv/*.npz> [repeat number]
+"""
+
+import os
+import sys
+import csv
+import time
+import itertools
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from cqbSimuMapMgr import MapMgr
+from cqbSimuPlanner import RoutePlanner
+from cqbSimuNavGraph import NavGraph
+from cqbSimuRouteOptimizer import shared_memory, buildScene, _shareArray, _attachArray
+
+SWEEP_PARAMS = ('moveSpeed', 'camAngle', 'sensors', 'obsAvoid', 'noiseScale')
+SENSOR_NAMES = ('sonar', 'lidar', 'cam', 'camDetect')
+DEF_GRID = {
+    'moveSpeed': [5, 10, 15],
+    'camAngle': [10, 20, 30],
+    'sensors': [('lidar', 'cam', 'camDetect')],
+    'obsAvoid': [False, True],
+    'noiseScale': [0.0, 1.0]
+}
+SWEEP_METRICS = ('ticks', 'finished', 'detNum', 'detRatio', 'firstDetTick', 'meanDetTick',
+                 'falsePos', 'explored', 'pathLen')
+SUMMARY_STATS = ('mean', 'std', 'min', 'max')
+MAX_TICKS = 2000        # max simulation ticks of a run.
+REPEAT_NUM = 3          # runs number of every combination.
+
+#-----------------------------------------------------------------------------
+def expandGrid(paramGrid, scene=None):
+    """ Return the list of the parameters combination dicts of the grid, the missing
+        'moveSpeed' and 'camAngle' use the scene parameters, the other missing keys
+        use the DEF_GRID 1st value.
+    """
+    valLists = []
+    for key in SWEEP_PARAMS:
+        vals = paramGrid.get(key, None)
+        if not vals:
+            sceneVal = scene['params'].get(key, None) if scene else None
+            vals = [sceneVal] if sceneVal is not None else DEF_GRID[key][:1]
+        valLists.append(list(vals))
+    return [dict(zip(SWEEP_PARAMS, combo)) for combo in itertools.product(*valLists)]
+
+def runSeeds(seed, repeatIdx):
+    """ Return the (noise seed, enemy motion seed) of a run."""
+    seqList = np.random.SeedSequence([seed, repeatIdx]).spawn(2)
+    return tuple(int(seq.generate_state(1)[0]) for seq in seqList)
+
+def sensorsStr(sensors):
+    return '+'.join(name for name in SENSOR_NAMES if name in sensors) or 'none'
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SweepEvaluator(object):
+    """ Simulate the parameters combinations on one scenario (one obj per worker)."""
+    def __init__(self, mapMatrix, clearMap, navArrs, scene, maxTicks=MAX_TICKS):
+        """ Init example : evaluator = SweepEvaluator(mapMatrix, clearMap, navArrs, scene)
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                clearMap (numpy.ndarray): clearance array of the map matrix.
+                navArrs (tuple): (nodeArr, edgeArr) of the map navigation graph, the
+                    graph is not used if None.
+                scene (dict): <buildScene()> dict plus the 'route' robot route points.
+                maxTicks (int, optional): max simulation ticks. Defaults to MAX_TICKS.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = clearMap
+        self.planner = RoutePlanner(clearMap)
+        self.navGraph = NavGraph(self.planner, *navArrs) if navArrs else None
+        self.scene = scene
+        self.maxTicks = maxTicks
+
+    #-----------------------------------------------------------------------------
+    def _buildMapMgr(self, params, noiseSeed, motionSeed):
+        mapMgr = MapMgr()
+        mapMgr.setMapMatrix(self.mapMatrix)
+        mapMgr.clearMap, mapMgr.clearSrc = self.clearMap, self.mapMatrix
+        mapMgr.planner, mapMgr.navGraph = self.planner, self.navGraph
+        route = self.scene.get('route', None) or [self.scene['robotPos']]
+        mapMgr.setRobots([{'id': 0, 'pos': list(self.scene['robotPos']), 'route': route[1:]}])
+        mapMgr.setMotionSeed(motionSeed)
+        mapMgr.setEnemy(self.scene['enemy'])
+        mapMgr.setScenarioParams(self.scene['params'])
+        mapMgr.setScenarioParams({'moveSpeed': params['moveSpeed'], 'camAngle': params['camAngle']})
+        sensors = params['sensors']
+        mapMgr.enableSonar('sonar' in sensors)
+        mapMgr.setLidarOn('lidar' in sensors)
+        mapMgr.setCamOn('cam' in sensors)
+        mapMgr.setCamDetectionOn('camDetect' in sensors)
+        mapMgr.setObsAvoid(bool(params['obsAvoid']))
+        noiseScale = float(params['noiseScale'])
+        mapMgr.setNoise(noiseScale > 0, seed=noiseSeed, scale=noiseScale)
+        return mapMgr
+
+    #-----------------------------------------------------------------------------
+    def run(self, params, seed=0, repeatIdx=0):
+        """ Simulate one run of a parameters combination.
+            Returns:
+                dict: {metric: value} of the SWEEP_METRICS: 'ticks' simulation ticks,
+                    'finished' 1 if the robot finished the route, 'detNum' detected
+                    enemies number, 'detRatio' 0~1, 'firstDetTick' the 1st detection
+                    tick (nan if no detection), 'meanDetTick' mean 1st detection tick
+                    of the enemies (maxTicks if not detected), 'falsePos' number of
+                    the noisy camera detections of the enemies not in the view, 
+                    'explored' sensors explored area ratio 0~1, 'pathLen' robot moved 
+                    distance (pixel). The detection metrics use the noise free camera
+                    detection.
+        """
+        mapMgr = self._buildMapMgr(params, *runSeeds(seed, repeatIdx))
+        robotObj = mapMgr.getRobot()
+        enemyNum = len(mapMgr.getEnemy())
+        detTicks = [None] * enemyNum
+        falsePos = 0
+        lastPos = list(robotObj.getCrtPos())
+        pathLen = 0.0
+        mapMgr.startMove(True)
+        tick = 0
+        while tick < self.maxTicks and robotObj.isMoving():
+            mapMgr.periodic()
+            crtPos = robotObj.getCrtPos()
+            pathLen += ((crtPos[0] - lastPos[0])**2 + (crtPos[1] - lastPos[1])**2)**0.5
+            lastPos = list(crtPos)
+            trueList = mapMgr.getCamEnemyTrueDetectList()
+            for idx in trueList:
+                if detTicks[idx] is None: detTicks[idx] = tick
+            falsePos += len(set(mapMgr.getCamEnemyDetectList()).difference(trueList))
+            tick += 1
+        detList = [val for val in detTicks if val is not None]
+        finished = robotObj.moveTgtIdx == len(robotObj.getRoutePts()) - 1 and not robotObj.isMoving()
+        return {
+            'ticks': tick,
+            'finished': int(finished),
+            'detNum': len(detList),
+            'detRatio': len(detList) / enemyNum if enemyNum else 0.0,
+            'firstDetTick': float(min(detList)) if detList else float('nan'),
+            'meanDetTick': float(np.mean([self.maxTicks if val is None else val for val in detTicks]))
+                if enemyNum else float('nan'),
+            'falsePos': falsePos,
+            'explored': mapMgr.getExploredCoverage(),
+            'pathLen': round(pathLen, 2)
+        }
+
+#-----------------------------------------------------------------------------
+# Worker process functions: every worker init the evaluator once.
+_gEvaluator = None
+_gShmList = []
+
+def _initWorker(mapData, navArrs, scene, maxTicks, shareFlg):
+    global _gEvaluator
+    if shareFlg:
+        arrList = []
+        for spec in mapData:
+            shm, arr = _attachArray(spec)
+            _gShmList.append(shm)   # keep the blocks open in the worker.
+            arrList.append(arr)
+        mapData = arrList
+    _gEvaluator = SweepEvaluator(mapData[0], mapData[1], navArrs, scene, maxTicks=maxTicks)
+
+def _runJob(runIdx, params, seed, repeatIdx):
+    result = _gEvaluator.run(params, seed=seed, repeatIdx=repeatIdx)
+    result['runIdx'] = runIdx
+    return result
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class ParamSweep(object):
+    """ Run the parameters grid combinations in the background worker pool and
+        aggregate the metrics.
+    """
+    def __init__(self, mapMatrix, clearMap, navGraph, scene, paramGrid=None, repeatNum=REPEAT_NUM,
+                 workerNum=None, useProcess=True, maxTicks=MAX_TICKS, seed=0, progressCB=None,
+                 doneCB=None):
+        """ Init example : sweep = ParamSweep(mapMatrix, clearMap, navGraph, scene,
+                                              paramGrid={'moveSpeed': [5, 10]})
+            Args:
+                mapMatrix (numpy.ndarray): (rows, cols) map matrix, 1 is wall.
+                clearMap (numpy.ndarray): clearance array of the map matrix.
+                navGraph (NavGraph): navigation graph of the map, None to not use.
+                scene (dict): refer to <SweepEvaluator>.
+                paramGrid (dict, optional): {param: values list}. Defaults to DEF_GRID.
+                repeatNum (int, optional): runs number of every combination. Defaults
+                    to REPEAT_NUM.
+                workerNum (int, optional): worker number. Defaults to the CPU number.
+                useProcess (bool, optional): use process pool, else thread pool.
+                    Defaults to True.
+                maxTicks (int, optional): max simulation ticks. Defaults to MAX_TICKS.
+                seed (int, optional): base seed. Defaults to 0.
+                progressCB (function, optional): progressCB(doneNum, totalNum) called
+                    in the feeder thread when a run is finished.
+                doneCB (function, optional): doneCB(rows) called in the feeder thread
+                    when finished, rows is None if the sweep failed.
+        """
+        self.mapMatrix = mapMatrix
+        self.clearMap = clearMap
+        self.navGraph = navGraph
+        self.scene = scene
+        self.combos = expandGrid(DEF_GRID if paramGrid is None else paramGrid, scene=scene)
+        self.repeatNum = max(1, repeatNum)
+        self.workerNum = workerNum or max(1, (os.cpu_count() or 2) - 1)
+        self.useProcess = useProcess
+        self.maxTicks = maxTicks
+        self.seed = seed
+        self.progressCB = progressCB
+        self.doneCB = doneCB
+        self.totalNum = len(self.combos) * self.repeatNum
+        self.doneNum = 0
+        self.rows = []
+        self.error = None
+        self.feeder = None
+        self.terminate = False
+
+    #-----------------------------------------------------------------------------
+    def _buildPool(self, shmList):
+        navArrs = (self.navGraph.nodeArr, self.navGraph.edgeArr) if self.navGraph else None
+        if not self.useProcess:
+            _initWorker((self.mapMatrix, self.clearMap), navArrs, self.scene, self.maxTicks, False)
+            return ThreadPoolExecutor(max_workers=1)    # the worker evaluator is shared.
+        mapData, shareFlg = (self.mapMatrix, self.clearMap), shared_memory is not None
+        if shareFlg:
+            specList = []
+            for arr in mapData:
+                shm, spec = _shareArray(np.ascontiguousarray(arr))
+                shmList.append(shm)
+                specList.append(spec)
+            mapData = specList
+        return ProcessPoolExecutor(max_workers=self.workerNum, initializer=_initWorker,
+                                   initargs=(mapData, navArrs, self.scene, self.maxTicks, shareFlg))
+
+    #-----------------------------------------------------------------------------
+    def _feed(self):
+        """ Feeder thread: submit all the runs and collect the worker results."""
+        shmList = []
+        try:
+            jobList = []
+            for comboIdx, params in enumerate(self.combos):
+                for repeatIdx in range(self.repeatNum):
+                    jobList.append((comboIdx, repeatIdx, params))
+            resultList = [None] * len(jobList)
+            with self._buildPool(shmList) as pool:
+                futures = [pool.submit(_runJob, runIdx, params, self.seed, repeatIdx)
+                           for runIdx, (_, repeatIdx, params) in enumerate(jobList)]
+                for future in as_completed(futures):
+                    if self.terminate:
+                        for pending in futures: pending.cancel()
+                        break
+                    result = future.result()
+                    resultList[result.pop('runIdx')] = result
+                    self.doneNum += 1
+                    if self.progressCB: self.progressCB(self.doneNum, self.totalNum)
+            # the rows are in the runs order whatever the workers finish order.
+            rows = []
+            for (comboIdx, repeatIdx, params), result in zip(jobList, resultList):
+                if result is None: continue
+                row = {'combo': comboIdx, 'repeat': repeatIdx, 'seed': self.seed}
+                row.update(self._paramsRow(params))
+                row.update(result)
+                rows.append(row)
+            self.rows = rows
+        except Exception as err:
+            self.error = str(err)
+        finally:
+            for shm in shmList:
+                shm.close()
+                shm.unlink()
+        if self.doneCB: self.doneCB(None if self.error else self.rows)
+
+    @staticmethod
+    def _paramsRow(params):
+        return {
+            'moveSpeed': int(params['moveSpeed']),
+            'camAngle': int(params['camAngle']),
+            'sensors': sensorsStr(params['sensors']),
+            'obsAvoid': int(bool(params['obsAvoid'])),
+            'noiseScale': float(params['noiseScale'])
+        }
+
+    #-----------------------------------------------------------------------------
+    def startSweep(self):
+        """ Start the sweep in the background and return immediately."""
+        self.doneNum = 0
+        self.feeder = threading.Thread(target=self._feed, daemon=True)
+        self.feeder.start()
+
+    #-----------------------------------------------------------------------------
+    def getProgress(self):
+        """ Return the sweep progress tuple (doneNum, totalNum)."""
+        return (self.doneNum, self.totalNum)
+
+    def getRows(self):
+        """ Return the runs table rows (dict of the 'combo', 'repeat', 'seed', the
+            SWEEP_PARAMS and the SWEEP_METRICS columns).
+        """
+        return self.rows
+
+    def getSummary(self):
+        """ Return the summary table rows, one per combination: 'combo', 'runs', the
+            SWEEP_PARAMS and the '<metric>_<stat>' columns of the SUMMARY_STATS (the
+            nan values are ignored).
+        """
+        return summarizeRows(self.rows)
+
+    def getError(self):
+        return self.error
+
+    def isFinished(self):
+        return self.feeder is not None and not self.feeder.is_alive()
+
+    def stop(self):
+        self.terminate = True
+
+    def save(self, filePath):
+        """ Save the runs and summary tables, refer to <saveTables()>."""
+        return saveTables(filePath, self.rows, self.getSummary())
+
+#-----------------------------------------------------------------------------
+def summarizeRows(rows):
+    """ Aggregate the runs rows per combination, refer to <ParamSweep.getSummary()>."""
+    comboDict = {}
+    for row in rows:
+        comboDict.setdefault(row['combo'], []).append(row)
+    summary = []
+    for comboIdx in sorted(comboDict.keys()):
+        comboRows = comboDict[comboIdx]
+        sumRow = {'combo': comboIdx, 'runs': len(comboRows)}
+        sumRow.update({key: comboRows[0][key] for key in SWEEP_PARAMS})
+        for metric in SWEEP_METRICS:
+            valArr = np.array([row[metric] for row in comboRows], dtype=np.float64)
+            valArr = valArr[~np.isnan(valArr)]
+            for stat in SUMMARY_STATS:
+                sumRow['%s_%s' %(metric, stat)] = float(getattr(np, stat)(valArr)) if valArr.size else float('nan')
+        summary.append(sumRow)
+    return summary
+
+def saveTables(filePath, rows, summary):
+    """ Save the runs and summary tables: the *.npz file keeps the 'run_<column>' and
+        'sum_<column>' arrays, else the runs are saved in the csv file and the summary
+        in the <name>_summary.csv file.
+        Returns:
+            list: the saved file paths.
+    """
+    if filePath.lower().endswith('.npz'):
+        arrDict = {}
+        for prefix, tableRows in (('run_', rows), ('sum_', summary)):
+            for key in (tableRows[0].keys() if tableRows else []):
+                arrDict[prefix + key] = np.array([row[key] for row in tableRows])
+        np.savez_compressed(filePath, **arrDict)
+        return [filePath]
+    sumPath = os.path.splitext(filePath)[0] + '_summary.csv'
+    for path, tableRows in ((filePath, rows), (sumPath, summary)):
+        with open(path, 'w', newline='') as fh:
+            if not tableRows: continue
+            writer = csv.DictWriter(fh, fieldnames=list(tableRows[0].keys()))
+            writer.writeheader()
+            writer.writerows(tableRows)
+    return [filePath, sumPath]
+
+#-----------------------------------------------------------------------------
+def createSweep(mapMgr, paramGrid=None, **kwargs):
+    """ Create a <ParamSweep> of the map manager's map, enemies and active robot
+        route, None if no map or robot.
+    """
+    if mapMgr.getMapMatrix() is None or mapMgr.getRobot() is None: return None
+    scene = buildScene(mapMgr)
+    scene['route'] = [list(pt) for pt in mapMgr.getRobot().getRoutePts()]
+    return ParamSweep(mapMgr.getMapMatrix(), mapMgr.getClearMap(), mapMgr.getNavGraph(), scene,
+                      paramGrid=paramGrid, **kwargs)
+
+#-----------------------------------------------------------------------------
+def main(argv):
+    """ Headless sweep the default parameters grid on a scenario file."""
+    if len(argv) < 2:
+        print("Usage: python cqbSimuSweep.py <*.cqbs scenario> <output *.csv/*.npz> [repeat number]")
+        return 1
+    import cqbSimuScenario as scenario
+    data = scenario.loadScenario(argv[0])
+    mapMgr = MapMgr()
+    mapMgr.setMapMatrix(data['mapMatrix'])
+    mapMgr.setRobots(scenario.getRobotList(data))
+    mapMgr.setEnemy(data['enemy'])
+    mapMgr.setScenarioParams(data['params'])
+    repeatNum = int(argv[2]) if len(argv) > 2 else REPEAT_NUM
+    sweep = createSweep(mapMgr, repeatNum=repeatNum)
+    if sweep is None:
+        print("The scenario has no robot.")
+        return 1
+    startT = time.perf_counter()
+    sweep.startSweep()
+    sweep.feeder.join()
+    if sweep.getError():
+        print("Sweep error: %s" %sweep.getError())
+        return 1
+    print("Finished %d runs in %.1f sec" %(sweep.getProgress()[0], time.perf_counter() - startT))
+    for sumRow in sorted(sweep.getSummary(), key=lambda row: row['meanDetTick_mean']):
+        print("combo %d: speed %d, cam %d, %s, avoid %d, noise %.1f: ticks %.0f, finished %.0f%%, detected %.0f%%, false pos %.1f, explored %.1f%%"
+              %(sumRow['combo'], sumRow['moveSpeed'], sumRow['camAngle'], sumRow['sensors'],
+                sumRow['obsAvoid'], sumRow['noiseScale'], sumRow['ticks_mean'], sumRow['finished_mean']*100,
+                sumRow['detRatio_mean']*100, sumRow['falsePos_mean'], sumRow['explored_mean']*100))
+    print("Saved: %s" %str(sweep.save(argv[1])))
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
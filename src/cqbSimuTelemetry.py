@@ -0,0 +1,201 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuTelemetry.py
+#
+# Purpose:     This module provides the per-tick telemetry sink which buffers the
+#              numeric simulation data (robot pose, direction, sonar, lidar, camera,
+#              sound bearings and enemy detections) in preallocated arrays and
+#              writes them in large chunks to a CSV or NPZ file from a background
+#              thread, for the offline analysis.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/26
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    Every tick is one int32 row (columns refer to <TelemetrySink.columns>) in the
+    current chunk array. When the chunk is full it is put in the writer queue and
+    an empty chunk is taken from the free pool (a new one is allocated if all the
+    chunks are waiting to be written), so addTick() never waits for the disk.
+    - CSV : rows appended to one csv file with a header line.
+    - NPZ : every chunk is stored as one 'chunk_<idx>.npy' member of the zip file
+      plus the 'columns' member, use <loadTelemetry()> to load the columns.
+"""
+
+import io
+import os
+import queue
+import zipfile
+import threading
+import numpy as np
+
+NONE_VAL = -32768       # value used when a sensor data is not available.
+CSV_EXT = '.csv'
+NPZ_EXT = '.npz'
+BASE_COLUMNS = ('tick', 'posX', 'posY', 'dirX', 'dirY', 'dirDeg', 'sonarF', 'sonarB',
+                'sonarL', 'sonarR', 'lidarDis', 'lidarX', 'lidarY', 'camLDis', 'camLX',
+                'camLY', 'camRDis', 'camRX', 'camRY', 'detNum')
+
+#-----------------------------------------------------------------------------
+def _toInt(val):
+    return NONE_VAL if val is None else int(val)
+
+#-----------------------------------------------------------------------------
+def loadTelemetry(filePath):
+    """ Load a telemetry file and return the dict {column name: numpy array}."""
+    if filePath.endswith(CSV_EXT):
+        with open(filePath, 'r') as fh:
+            columns = fh.readline().strip().split(',')
+            emptyFlg = not fh.read(1)   # header only (closed before the 1st tick).
+        data = np.zeros((0, len(columns)), np.int32) if emptyFlg else \
+            np.loadtxt(filePath, delimiter=',', skiprows=1, dtype=np.int32, ndmin=2)
+    else:
+        with zipfile.ZipFile(filePath, 'r') as zf:
+            columns = zf.read('columns').decode('utf-8').split(',')
+            names = sorted(n for n in zf.namelist() if n.startswith('chunk_'))
+            chunks = [np.load(io.BytesIO(zf.read(n))) for n in names]
+        data = np.concatenate(chunks) if chunks else np.zeros((0, len(columns)), np.int32)
+    return {col: data[:, i] for i, col in enumerate(columns)}
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class TelemetrySink(object):
+    """ Buffer the tick telemetry rows and write them in a background thread."""
+    def __init__(self, filePath, enemyIDs=(), chunkSize=4096):
+        """ Init example : sink = TelemetrySink('record/Telemetry_01.npz', [1, 2])
+            Args:
+                filePath (str): output file path, *.csv or *.npz (default if no ext).
+                enemyIDs (list, optional): enemy IDs, each enemy has a sound bearing
+                    column and a detected flag column.
+                chunkSize (int, optional): rows per chunk. Defaults to 4096.
+        """
+        if not filePath.endswith((CSV_EXT, NPZ_EXT)): filePath += NPZ_EXT
+        self.filePath = filePath
+        folder = os.path.dirname(filePath)
+        if folder and not os.path.exists(folder): os.makedirs(folder)
+        self.csvFlg = filePath.endswith(CSV_EXT)
+        self.enemyIDs = list(enemyIDs)
+        self.enemyIdx = {eID: i for i, eID in enumerate(self.enemyIDs)}
+        self.columns = list(BASE_COLUMNS)
+        self.columns += ['sound_%s' %str(eID) for eID in self.enemyIDs]
+        self.columns += ['det_%s' %str(eID) for eID in self.enemyIDs]
+        self.colNum = len(self.columns)
+        self.soundCol = len(BASE_COLUMNS)
+        self.detCol = self.soundCol + len(self.enemyIDs)
+        self.chunkSize = chunkSize
+        self.freeChunks = queue.Queue()
+        self.freeChunks.put(self._newChunk())
+        self.chunk = self._newChunk()
+        self.rowIdx = 0
+        self.tickNum = 0
+        self.chunkNum = 0
+        self.error = None
+        self.writeQueue = queue.Queue()
+        self.writer = threading.Thread(target=self._writeLoop, daemon=True)
+        self.writer.start()
+
+    #-----------------------------------------------------------------------------
+    def _newChunk(self):
+        return np.full((self.chunkSize, self.colNum), NONE_VAL, dtype=np.int32)
+
+    #-----------------------------------------------------------------------------
+    def addTick(self, tick, state, soundData=None):
+        """ Add one tick row.
+            Args:
+                tick (int): simulation clock tick count.
+                state (dict): tick state build by <MapMgr.getTickState()>.
+                soundData (list, optional): sound bearing (degree) of every enemy, 
+                    None if the sound can not reach the robot.
+        """
+        row = self.chunk[self.rowIdx]
+        sonar = state['sonar'] if state['sonar'] else (NONE_VAL, )*4
+        lidarPt = state['lidarPt'] or (NONE_VAL, NONE_VAL)
+        camLPt = state['camLPt'] or (NONE_VAL, NONE_VAL)
+        camRPt = state['camRPt'] or (NONE_VAL, NONE_VAL)
+        row[:self.soundCol] = (tick, state['pos'][0], state['pos'][1], state['dir'][0],
+                               state['dir'][1], _toInt(state['dirDeg']), *sonar,
+                               _toInt(state['lidarDis']), *lidarPt,
+                               _toInt(state['camLDis']), *camLPt,
+                               _toInt(state['camRDis']), *camRPt, len(state['detected']))
+        if self.enemyIDs:
+            enemyNum = len(self.enemyIDs)
+            row[self.detCol:] = 0
+            if soundData:
+                num = min(len(soundData), enemyNum)
+                row[self.soundCol:self.soundCol+num] = [_toInt(val) for val in soundData[:num]]
+            for eID in state['detected']:
+                if eID in self.enemyIdx: row[self.detCol + self.enemyIdx[eID]] = 1
+        self.rowIdx += 1
+        self.tickNum += 1
+        if self.rowIdx == self.chunkSize: self._submitChunk()
+
+    #-----------------------------------------------------------------------------
+    def _submitChunk(self):
+        """ Hand the current chunk to the writer and take an empty one."""
+        if self.rowIdx == 0: return
+        self.writeQueue.put((self.chunk, self.rowIdx))
+        try:
+            self.chunk = self.freeChunks.get_nowait()
+        except queue.Empty:
+            self.chunk = self._newChunk()
+        self.rowIdx = 0
+
+    #-----------------------------------------------------------------------------
+    def _writeLoop(self):
+        """ Writer thread: write the chunks until the None end mark is received."""
+        try:
+            if self.csvFlg:
+                fh = open(self.filePath, 'w')
+                fh.write(','.join(self.columns) + '\n')
+            else:
+                fh = zipfile.ZipFile(self.filePath, 'w', zipfile.ZIP_DEFLATED)
+                fh.writestr('columns', ','.join(self.columns))
+        except Exception as err:
+            self.error = str(err)
+            fh = None
+        while True:
+            item = self.writeQueue.get()
+            if item is None: break
+            chunk, rowNum = item
+            if fh is not None:
+                try:
+                    if self.csvFlg:
+                        np.savetxt(fh, chunk[:rowNum], fmt='%d', delimiter=',')
+                    else:
+                        with fh.open('chunk_%06d.npy' %self.chunkNum, 'w') as member:
+                            np.lib.format.write_array(member, chunk[:rowNum])
+                    self.chunkNum += 1
+                except Exception as err:
+                    self.error = str(err)
+            chunk.fill(NONE_VAL)
+            self.freeChunks.put(chunk)
+        if fh is not None: fh.close()
+
+    #-----------------------------------------------------------------------------
+    def getTickNum(self):
+        return self.tickNum
+
+    def getFilePath(self):
+        return self.filePath
+
+    def getError(self):
+        return self.error
+
+    def getPendingNum(self):
+        """ Return the number of chunks waiting to be written."""
+        return self.writeQueue.qsize()
+
+    #-----------------------------------------------------------------------------
+    def close(self, wait=True):
+        """ Submit the last part chunk and stop the writer thread.
+            Args:
+                wait (bool, optional): wait until all chunks are written. Defaults to True.
+        """
+        if self.writer is None: return
+        self._submitChunk()
+        self.writeQueue.put(None)
+        if wait: self.writer.join()
+        self.writer = None
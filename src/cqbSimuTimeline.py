@@ -0,0 +1,287 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        cqbSimuTimeline.py
+#
+# Purpose:     This module is used to keep the in-memory timeline of a long
+#              simulation run with full keyframes every N ticks and compact
+#              varint encoded deltas in between, so the viewer timeline slider
+#              can reconstruct any tick in bounded time.
+#
+# Author:      Yuancheng Liu
+#
+# Version:     v0.1.3
+# Created:     2024/08/21
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+    Every tick state (the dict build by <MapMgr.getTickState()>) is flattened to a
+    fixed tuple of int fields plus the variable length lists (LISTS): the detected
+    enemy IDs, the enemy predictions, the other squad robots' pose and the enemies'
+    position and patrol way point index.
+    - Entry: a tick whose state is changed since the previous tick starts a new
+      entry, an unchanged tick (such as the paused simulation) only extends the run
+      of the last entry and costs nothing. The simulation tick number of every entry
+      is kept in an int64 array, a tick is mapped to its entry by binary search.
+    - Keyframe: the full field tuple and lists, stored every <keyInv> entries. If
+      the state did not change since the previous keyframe, the same tuple obj is
+      reused.
+    - Delta: a varint bit-mask of the changed fields followed by the zigzag varint
+      of every changed field difference. The highest mask bits flag the changed
+      lists which are then encoded in full.
+    Reconstruct a tick = find its entry + load the keyframe + apply at most
+    <keyInv>-1 deltas.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+NONE_VAL = -32768   # value used when a sensor data is not available.
+# flattened tick state fields.
+FIELDS = ('posX', 'posY', 'dirX', 'dirY', 'dirDeg', 'sonarF', 'sonarB', 'sonarL',
+          'sonarR', 'lidarDis', 'lidarX', 'lidarY', 'camLDis', 'camLX', 'camLY',
+          'camRDis', 'camRX', 'camRY', 'tgtIdx')
+FIELD_NUM = len(FIELDS)
+# tick state lists: (key, ints number of an item, 1 is a plain int item).
+LISTS = (('detected', 1), ('predicted', 3), ('squad', 3), ('enemies', 4))
+LIST_BITS = tuple(1 << (FIELD_NUM + i) for i in range(len(LISTS)))  # list changed flag bits.
+
+#-----------------------------------------------------------------------------
+# varint encoding functions.
+def encodeVarint(val, buf):
+    """ Append the unsigned int <val> to the bytearray <buf> as LEB128 varint."""
+    while val >= 0x80:
+        buf.append((val & 0x7F) | 0x80)
+        val >>= 7
+    buf.append(val)
+
+def decodeVarint(buf, pos):
+    """ Decode an unsigned varint from <buf> at index <pos>, return (val, nextPos)."""
+    val = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        val |= (byte & 0x7F) << shift
+        if byte < 0x80: return val, pos
+        shift += 7
+
+def zigzag(val):
+    return (val << 1) if val >= 0 else ((-val << 1) - 1)
+
+def unzigzag(val):
+    return (val >> 1) if not val & 1 else -((val + 1) >> 1)
+
+#-----------------------------------------------------------------------------
+def _flatState(state):
+    """ Flatten a tick state dict to (fieldTuple, *listTuples) in the LISTS order."""
+    def toInt(val): return NONE_VAL if val is None else int(val)
+    sonar = state['sonar'] if state['sonar'] else (NONE_VAL, )*4
+    pts = []
+    for key in ('lidarPt', 'camLPt', 'camRPt'):
+        pt = state[key]
+        pts.append((NONE_VAL, NONE_VAL) if pt is None else (int(pt[0]), int(pt[1])))
+    vals = (int(state['pos'][0]), int(state['pos'][1]), int(state['dir'][0]),
+            int(state['dir'][1]), int(state['dirDeg']), *[int(v) for v in sonar],
+            toInt(state['lidarDis']), *pts[0], toInt(state['camLDis']), *pts[1],
+            toInt(state['camRDis']), *pts[2], int(state['tgtIdx']))
+    detected = tuple(state['detected'])
+    predicted = tuple((eID, int(pos[0]), int(pos[1])) for eID, pos in state['predicted'])
+    squad = tuple((int(x), int(y), int(tgtIdx)) for x, y, tgtIdx in state['squad'])
+    enemies = tuple((eID, int(pos[0]), int(pos[1]), int(patrolIdx)) 
+                    for eID, pos, patrolIdx in state['enemies'])
+    return vals, detected, predicted, squad, enemies
+
+def _buildState(vals, detected, predicted, squad, enemies):
+    """ Build the tick state dict from the flattened values."""
+    def toPt(x, y): return None if x == NONE_VAL else (x, y)
+    def toVal(val): return None if val == NONE_VAL else val
+    state = {
+        'pos': [vals[0], vals[1]],
+        'dir': (vals[2], vals[3]),
+        'dirDeg': vals[4],
+        'sonar': None if vals[5] == NONE_VAL else tuple(vals[5:9]),
+        'lidarDis': toVal(vals[9]),
+        'lidarPt': toPt(vals[10], vals[11]),
+        'camLDis': toVal(vals[12]),
+        'camLPt': toPt(vals[13], vals[14]),
+        'camRDis': toVal(vals[15]),
+        'camRPt': toPt(vals[16], vals[17]),
+        'tgtIdx': vals[18],
+        'detected': list(detected),
+        'predicted': [(eID, [x, y]) for eID, x, y in predicted],
+        'squad': [list(item) for item in squad],
+        'enemies': [(eID, [x, y], patrolIdx) for eID, x, y, patrolIdx in enemies]
+    }
+    return state
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class SimuTimeline(object):
+    """ Keyframe plus delta timeline of the simulation ticks."""
+    def __init__(self, keyInv=64):
+        """ Init example : timeline = SimuTimeline(keyInv=64)
+            Args:
+                keyInv (int, optional): store a full keyframe every <keyInv> entries.
+                    Defaults to 64.
+        """
+        self.keyInv = keyInv
+        self.clear()
+
+    #-----------------------------------------------------------------------------
+    def _encodeDelta(self, frame):
+        """ Encode the difference between the last frame and the input frame."""
+        lastVals, lastLists = self.lastFrame[0], self.lastFrame[1:]
+        vals, lists = frame[0], frame[1:]
+        mask = 0
+        diffs = []
+        for i in range(FIELD_NUM):
+            if vals[i] != lastVals[i]:
+                mask |= 1 << i
+                diffs.append(vals[i] - lastVals[i])
+        for bit, items, lastItems in zip(LIST_BITS, lists, lastLists):
+            if items != lastItems: mask |= bit
+        buf = self.deltaBuf
+        encodeVarint(mask, buf)
+        for diff in diffs:
+            encodeVarint(zigzag(diff), buf)
+        for bit, (_, width), items in zip(LIST_BITS, LISTS, lists):
+            if not mask & bit: continue
+            encodeVarint(len(items), buf)
+            for item in items:
+                for val in ((item, ) if width == 1 else item):
+                    encodeVarint(zigzag(val), buf)
+
+    #-----------------------------------------------------------------------------
+    def _applyDelta(self, frame, buf, pos):
+        """ Apply the delta at <buf>[<pos>] to the frame, return the new frame and
+            the start position of the next delta.
+        """
+        mask, pos = decodeVarint(buf, pos)
+        if mask == 0: return frame, pos
+        vals, lists = list(frame[0]), list(frame[1:])
+        for i in range(FIELD_NUM):
+            if mask & (1 << i):
+                diff, pos = decodeVarint(buf, pos)
+                vals[i] += unzigzag(diff)
+        for i, (bit, (_, width)) in enumerate(zip(LIST_BITS, LISTS)):
+            if not mask & bit: continue
+            num, pos = decodeVarint(buf, pos)
+            items = []
+            for _ in range(num):
+                item = []
+                for _ in range(width):
+                    val, pos = decodeVarint(buf, pos)
+                    item.append(unzigzag(val))
+                items.append(item[0] if width == 1 else tuple(item))
+            lists[i] = tuple(items)
+        return (tuple(vals), *lists), pos
+
+    def _loadEntry(self, entryIdx):
+        """ Return the (frame, next delta position) of the entry <entryIdx>."""
+        keyIdx, deltaNum = divmod(entryIdx, self.keyInv)
+        frame, pos = self.keyframes[keyIdx], self.keyOffsets[keyIdx]
+        for _ in range(deltaNum):
+            frame, pos = self._applyDelta(frame, self.deltaBuf, pos)
+        return frame, pos
+
+    def _findEntry(self, tick):
+        """ Return the index of the entry which covers the simulation tick."""
+        return bisect_right(self.entryTicks, tick) - 1
+
+    #-----------------------------------------------------------------------------
+    def addTick(self, state, tick=None):
+        """ Append a tick state dict (build by <MapMgr.getTickState()>).
+            Args:
+                state (dict): tick state.
+                tick (int, optional): simulation tick number. Defaults to None (the
+                    next tick of the last added one, 0 for the 1st tick).
+        """
+        tick = self.lastTick + 1 if tick is None else tick
+        frame = _flatState(state)
+        if self.entryTicks and frame == self.lastFrame and tick > self.lastTick:
+            self.lastTick = tick    # extend the run of the last entry.
+            return
+        entryIdx = len(self.entryTicks)
+        if entryIdx % self.keyInv == 0:
+            lastKey = self.keyframes[-1] if self.keyframes else None
+            self.keyframes.append(lastKey if lastKey == frame else frame)
+            self.keyOffsets.append(len(self.deltaBuf))
+        else:
+            self._encodeDelta(frame)
+        self.entryTicks.append(tick)
+        self.lastFrame = frame
+        self.lastTick = tick
+
+    #-----------------------------------------------------------------------------
+    def getTick(self, idx):
+        """ Reconstruct and return the tick state dict at index <idx> (the tick 
+            number <getStartTick()> + idx), return None if the index is out of range.
+        """
+        if idx < 0 or idx >= self.getTickNum(): return None
+        frame, _ = self._loadEntry(self._findEntry(self.getStartTick() + idx))
+        return _buildState(*frame)
+
+    #-----------------------------------------------------------------------------
+    def iterTicks(self, start=0, end=None):
+        """ Generator to decode the tick states from index <start> to <end> (not 
+            included) sequentially, every following entry only costs one delta decode.
+        """
+        tickNum = self.getTickNum()
+        end = tickNum if end is None else min(end, tickNum)
+        if start < 0 or start >= end: return
+        startTick = self.getStartTick()
+        entryIdx = self._findEntry(startTick + start)
+        frame, pos = self._loadEntry(entryIdx)
+        entryNum = len(self.entryTicks)
+        for tick in range(startTick + start, startTick + end):
+            if entryIdx + 1 < entryNum and tick >= self.entryTicks[entryIdx+1]:
+                entryIdx += 1
+                if entryIdx % self.keyInv == 0:
+                    frame, pos = self.keyframes[entryIdx // self.keyInv], self.keyOffsets[entryIdx // self.keyInv]
+                else:
+                    frame, pos = self._applyDelta(frame, self.deltaBuf, pos)
+            yield _buildState(*frame)
+
+    #-----------------------------------------------------------------------------
+    def getTickNum(self):
+        """ Return the number of ticks from the start tick to the last added tick."""
+        return self.lastTick - self.entryTicks[0] + 1 if self.entryTicks else 0
+
+    def getStartTick(self):
+        """ Return the simulation tick number of the timeline index 0."""
+        return self.entryTicks[0] if self.entryTicks else 0
+
+    def getEntryNum(self):
+        """ Return the stored (changed) entries number."""
+        return len(self.entryTicks)
+
+    def getMemorySize(self):
+        """ Return the encoded delta and tick mapping bytes number (used to check 
+            the memory usage).
+        """
+        return len(self.deltaBuf) + len(self.entryTicks) * self.entryTicks.itemsize
+
+    def truncate(self, tick):
+        """ Remove the ticks from the simulation tick number <tick> (used when the 
+            simulation is rewound to a snapshot, the new ticks replace the discarded
+            branch).
+        """
+        if not self.entryTicks or tick > self.lastTick: return
+        entryNum = bisect_left(self.entryTicks, tick)
+        if entryNum == 0: return self.clear()
+        frame, pos = self._loadEntry(entryNum-1)
+        keyNum = (entryNum-1) // self.keyInv + 1
+        del self.keyframes[keyNum:]
+        del self.keyOffsets[keyNum:]
+        del self.deltaBuf[pos:]
+        del self.entryTicks[entryNum:]
+        self.lastFrame = frame
+        self.lastTick = tick - 1
+
+    def clear(self):
+        self.keyframes = []     # list of (fieldTuple, *listTuples)
+        self.keyOffsets = []    # start offset of every keyframe's following deltas.
+        self.deltaBuf = bytearray()
+        self.entryTicks = array('q')    # simulation tick number of every entry.
+        self.lastTick = -1
+        self.lastFrame = None   # last flattened tick state.
@@ -184,6 +184,104 @@ class JsonLoader(object):
                 return False
         return False
 
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class TypedConfig(object):
+    """ Typed config layer on top of the <ConfigLoader>: the values are parsed and
+        validated once based on the schema and cached, the config file is reloaded 
+        when its modified time changed.
+        Schema format: {key: (type, default, limit)}
+            - type: bool, int, float or str.
+            - limit: (min, max) for int/float, tuple of allowed values for str, or 
+              None for no limit.
+        Example: 
+            cfg = TypedConfig('Config.txt', {'FRATE': (int, 20, (1, 60))})
+            changedDict = cfg.checkUpdate() # call periodically to hot reload.
+    """
+    def __init__(self, filePath, schema, logFlg=True):
+        self.filePath = filePath
+        self.schema = schema
+        self.logFlg = logFlg
+        self.values = {key: item[1] for key, item in schema.items()}
+        self.extras = {}    # the config keys not in the schema (raw string).
+        self.mtime = None
+        self.error = None
+
+    #-----------------------------------------------------------------------------
+    def _parseVal(self, key, val):
+        """ Convert and validate the config string value, raise ValueError if the 
+            value is invalid.
+        """
+        valType, _, limit = self.schema[key]
+        if valType is bool:
+            if isinstance(val, bool): return val
+            if str(val).lower() in ('true', '1', 'yes'): return True
+            if str(val).lower() in ('false', '0', 'no'): return False
+            raise ValueError("%s: %s is not a bool value" %(key, str(val)))
+        try:
+            val = valType(val)
+        except ValueError:
+            raise ValueError("%s: %s is not a %s value" %(key, str(val), valType.__name__))
+        if limit:
+            if valType in (int, float) and not limit[0] <= val <= limit[1]:
+                raise ValueError("%s: %s out of range %s" %(key, str(val), str(limit)))
+            if valType is str and val not in limit:
+                raise ValueError("%s: %s not in %s" %(key, str(val), str(limit)))
+        return val
+
+    #-----------------------------------------------------------------------------
+    def load(self):
+        """ Load and validate the config file, the cached values are only replaced 
+            if all the values are valid. Returns the dict of the changed values or 
+            None if load failed.
+        """
+        try:
+            self.mtime = os.path.getmtime(self.filePath)
+            loader = ConfigLoader(self.filePath, mode='r', logFlg=False)
+            rawDict = loader.getJson()
+            values = {key: item[1] for key, item in self.schema.items()}
+            extras = {}
+            for key, val in rawDict.items():
+                if key in self.schema:
+                    # empty value means using the default value.
+                    if val != '': values[key] = self._parseVal(key, val)
+                else:
+                    extras[key] = val
+        except Exception as err:
+            self.error = str(err)
+            if self.logFlg: print('> Error: load config %s: %s' %(str(self.filePath), str(err)))
+            return None
+        self.error = None
+        changedDict = {key: val for key, val in values.items() if self.values.get(key) != val}
+        self.values, self.extras = values, extras
+        return changedDict
+
+    #-----------------------------------------------------------------------------
+    def checkUpdate(self):
+        """ Reload the config file if it is modified, return the dict of the changed
+            values (empty dict if the file is not changed or reload failed).
+        """
+        try:
+            mtime = os.path.getmtime(self.filePath)
+        except OSError:
+            return {}
+        if mtime == self.mtime: return {}
+        return self.load() or {}
+
+    #-----------------------------------------------------------------------------
+    def get(self, key, default=None):
+        if key in self.values: return self.values[key]
+        return self.extras.get(key, default)
+
+    def getDict(self):
+        """ Return all the config values (schema values and the extra raw values)."""
+        result = dict(self.extras)
+        result.update(self.values)
+        return result
+
+    def getError(self):
+        return self.error
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 def testCaseFilter(line):
@@ -12,9 +12,13 @@
 # License:     
 #-----------------------------------------------------------------------------
 import os
+import sys
 import time
+import queue
+import atexit
 import logging
 import logging.handlers
+import threading
 import traceback
 
 DEFAULT_LOGGER_NAME = 'Log'
@@ -25,6 +29,8 @@ gHandler = None             # logging handler
 gLogDir = None              # log directory path
 gCrtDir = ''                # current log 
 gPutLogsUnderDate = False   # flag to identify whether put log file under data folder.
+gAsyncHandler = None        # queue handler of the background log writer.
+gRateDict = {}              # rate limit key : [last pass time, suppressed count]
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -83,6 +89,115 @@ class RotateFileHandler(logging.handlers.RotatingFileHandler):
         self.autoTReset = fResetTime
 
 
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class AsyncLogHandler(logging.handlers.QueueHandler):
+    """ Queue handler which puts the prepared log record (message merged with its 
+        args in the caller's thread) in a bounded queue, a <BatchQueueListener> 
+        thread writes the records to the target handler in batches. The console 
+        print messages can also be put in the queue. If the queue is full the 
+        message is dropped instead of blocking the caller.
+    """
+    def __init__(self, target, queueSize=10000, batchSize=256, flushInv=0.5):
+        logging.handlers.QueueHandler.__init__(self, queue.Queue(maxsize=queueSize))
+        self.target = target        # the real file handler.
+        self.countLock = threading.Lock()
+        self.droppedCount = 0
+        self.writtenCount = 0
+        self.listener = BatchQueueListener(self.queue, target, batchSize=batchSize, 
+                                           flushInv=flushInv, writeCallback=self._addWritten)
+        self.listener.start()
+
+#--AsyncLogHandler-------------------------------------------------------------
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.countLock: self.droppedCount += 1
+
+    def printMsg(self, msg):
+        """ Put a console print message in the queue."""
+        record = logging.makeLogRecord({'msg': msg, 'printFlg': True})
+        self.enqueue(record)
+
+    def _addWritten(self, num):
+        with self.countLock: self.writtenCount += num
+
+#--AsyncLogHandler-------------------------------------------------------------
+    def getQueueDepth(self):
+        return self.queue.qsize()
+
+    def getCounts(self):
+        """ Return the (dropped, written) message count."""
+        with self.countLock: return (self.droppedCount, self.writtenCount)
+
+    def close(self):
+        """ Stop the listener thread after all the queued messages are written."""
+        if self.listener._thread: self.listener.stop()
+        logging.handlers.QueueHandler.close(self)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class BatchQueueListener(logging.handlers.QueueListener):
+    """ Queue listener which writes the records to the target file handler (and 
+        the print messages to the stdout) without flushing, the streams are 
+        flushed once the queue is drained, <batchSize> messages are written or 
+        <flushInv> seconds passed since the last flush.
+    """
+    def __init__(self, msgQueue, target, batchSize=256, flushInv=0.5, writeCallback=None):
+        logging.handlers.QueueListener.__init__(self, msgQueue, target)
+        self.target = target
+        self.batchSize = batchSize
+        self.flushInv = flushInv
+        self.writeCallback = writeCallback
+        self.pendingNum = 0
+        self.prtFlg = False
+        self.lastFlushT = time.monotonic()
+
+#--BatchQueueListener----------------------------------------------------------
+    def handle(self, record):
+        if getattr(record, 'printFlg', False):
+            sys.stdout.write(record.msg + '\n')
+            self.prtFlg = True
+        else:
+            self._writeRecord(record)
+        self.pendingNum += 1
+        if self.pendingNum >= self.batchSize or self.queue.empty() or \
+                time.monotonic() - self.lastFlushT >= self.flushInv:
+            self.flush()
+
+#--BatchQueueListener----------------------------------------------------------
+    def _writeRecord(self, record):
+        target = self.target
+        if record.levelno < target.level: return
+        with target.lock:
+            try:
+                if target.shouldRollover(record): target.doRollover()
+                if target.stream is None: target.stream = target._open()
+                target.stream.write(target.format(record) + target.terminator)
+            except Exception:
+                target.handleError(record)
+
+#--BatchQueueListener----------------------------------------------------------
+    def flush(self):
+        """ Flush the written records and print messages."""
+        if self.pendingNum == 0: return
+        with self.target.lock:
+            if self.target.stream: self.target.stream.flush()
+        if self.prtFlg: sys.stdout.flush()
+        if self.writeCallback: self.writeCallback(self.pendingNum)
+        self.pendingNum, self.prtFlg = 0, False
+        self.lastFlushT = time.monotonic()
+
+#--BatchQueueListener----------------------------------------------------------
+    def enqueue_sentinel(self):
+        # Block until there is space, a full queue must not lose the stop signal.
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        logging.handlers.QueueListener.stop(self)
+        self.flush()
+
 #-----------------------------------------------------------------------------
 # Module Logging functions.
 #-----------------------------------------------------------------------------
@@ -100,6 +215,36 @@ def printArgs(*args):
     s = args[0] % args[1:] if len(args) > 1 else args[0]
     print(s)
 
+#-----------------------------------------------------------------------------
+def asyncPrint(*args):
+    """ Print the message through the background writer if it is started, so the
+        caller is not blocked by the terminal output.
+    """
+    if gAsyncHandler:
+        gAsyncHandler.printMsg(args[0] % args[1:] if len(args) > 1 else args[0])
+    else:
+        printArgs(*args)
+
+#-----------------------------------------------------------------------------
+def rateLimit(key, interval):
+    """ Rate limit the messages with the same <key> (such as a debug message
+        printed in every simulation tick) to one per <interval> seconds.
+        Returns:
+            int/None: None if the message should be suppressed, else the number of
+                messages suppressed since the last passed one.
+    """
+    now = time.monotonic()
+    rate = gRateDict.get(key, None)
+    if rate is None:
+        gRateDict[key] = [now, 0]
+        return 0
+    if now - rate[0] < interval:
+        rate[1] += 1
+        return None
+    suppressed = rate[1]
+    rate[0], rate[1] = now, 0
+    return suppressed
+
 #-----------------------------------------------------------------------------
 def info(*args, printFlag=None):
     """ Log normal information message: Log.info("message %s", str(value))"""
@@ -273,6 +418,44 @@ def initLogger(pwd, logDirName, appName, filePrefix, historyCnt=100,
     # parse the directory to look for all the log files
     cleanOldFiles(os.path.dirname(gHandler.baseFilename), filePrefix, historyCnt)
 
+#-----------------------------------------------------------------------------
+def startAsyncWriter(queueSize=10000, batchSize=256, flushInv=0.5):
+    """ Replace the logger's file handler by an <AsyncLogHandler> so the log calls
+        only put the message in the queue (call after initLogger()).
+        - queueSize: max queued messages, the new messages are dropped when full.
+        - batchSize: max messages written in one batch.
+        - flushInv: max time (sec) between two flushes of the written messages.
+    """
+    global gAsyncHandler
+    if gLogger is None or gHandler is None or gAsyncHandler: return
+    gAsyncHandler = AsyncLogHandler(gHandler, queueSize=queueSize, batchSize=batchSize,
+                                    flushInv=flushInv)
+    gLogger.removeHandler(gHandler)
+    gLogger.addHandler(gAsyncHandler)
+    atexit.register(stopAsyncWriter)
+
+def stopAsyncWriter():
+    """ Write all the queued messages and restore the synchronous file handler."""
+    global gAsyncHandler
+    if gAsyncHandler is None: return
+    handler, gAsyncHandler = gAsyncHandler, None
+    if gLogger:
+        gLogger.removeHandler(handler)
+        gLogger.addHandler(gHandler)
+    handler.close()
+
+def getQueueStats():
+    """ Return the background writer state dict: queue depth, dropped and written
+        message count.
+    """
+    if gAsyncHandler is None: return {'depth': 0, 'dropped': 0, 'written': 0}
+    dropped, written = gAsyncHandler.getCounts()
+    return {
+        'depth': gAsyncHandler.getQueueDepth(),
+        'dropped': dropped,
+        'written': written
+    }
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 def writeTest(mb=10):
@@ -0,0 +1,40 @@
+# Tests of the vector field histogram obstacle avoidance steer.
+import numpy as np
+
+from cqbSimuAvoidance import AvoidController, SCAN_BEAMS, SAFE_DIS
+
+
+def _unit(vec):
+    vec = np.asarray(vec, dtype=np.float64)
+    return vec / np.hypot(*vec)
+
+
+def test_steer_clear_and_surrounded():
+    avoider = AvoidController()
+    posArr = np.array([[100, 100], [300, 300], [500, 200]])
+    tgtArr = np.array([[160, 20], [330, 340], [520, 240]])
+    scanArr = np.zeros((3, SCAN_BEAMS), dtype=np.int64)     # no obstacle reading.
+    scanArr[2] = SAFE_DIS - 4                               # surrounded by the walls.
+    dirArr, speedArr, blockArr = avoider.steer(scanArr, posArr, tgtArr, np.array([0, 90, 180]))
+    # clear: head to the way point directly with the full speed (the 1st way point
+    # is farther than the scan range, the 2nd one is not on a scan beam degree).
+    for i in (0, 1):
+        assert np.allclose(dirArr[i], _unit(tgtArr[i] - posArr[i]))
+    assert speedArr[:2].tolist() == [1.0, 1.0]
+    assert blockArr.tolist() == [False, False, True]
+    assert speedArr[2] == 0
+
+
+def test_steer_around_wall():
+    avoider = AvoidController()
+    # a wall 22 pixels in front (north) of the robot, the way point is behind it.
+    scanArr = np.zeros((2, SCAN_BEAMS), dtype=np.int64)
+    scanArr[:, [34, 35, 0, 1, 2]] = 22
+    posArr = np.array([[200, 200], [200, 200]])
+    tgtArr = np.array([[200, 100], [200, 185]])
+    dirArr, speedArr, blockArr = avoider.steer(scanArr, posArr, tgtArr, np.array([0, 0]))
+    assert not blockArr.any()
+    # the way point behind the wall: turn away from the blocked north sectors.
+    assert dirArr[0][1] > -0.9 and abs(dirArr[0][0]) > 0.4
+    # the way point before the wall is reached directly.
+    assert np.allclose(dirArr[1], [0, -1]) and speedArr[1] == 1.0
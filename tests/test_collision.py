@@ -0,0 +1,31 @@
+# Tests of the clearance map and the robot move sweep at the open map edges.
+import numpy as np
+
+from cqbSimuCollision import buildClearanceMap, sweepMove, ROBOT_RADIUS
+
+
+def test_clearance_map_border():
+    clearMap = buildClearanceMap(np.zeros((60, 90), dtype=np.uint8))
+    # the map border is a wall: 1 on the edge cells, up by 1 per pixel inwards.
+    assert clearMap[0, 45] == 1 and clearMap[59, 45] == 1
+    assert clearMap[30, 0] == 1 and clearMap[30, 89] == 1
+    assert clearMap[5, 45] == 6 and clearMap[30, 84] == 6
+    assert clearMap[30, 45] == 30
+    assert clearMap[3, 4] == 4
+
+
+def test_sweep_open_map_edge():
+    rows, cols = 600, 900
+    clearMap = buildClearanceMap(np.zeros((rows, cols), dtype=np.uint8))
+    # a long step over the open edge stops in the map, one radius inside the edge.
+    posArr, blockArr = sweepMove(clearMap, [[450, 560], [20, 300], [880, 50]],
+                                 [[450, 640], [-40, 300], [950, 50]])
+    assert blockArr.all()
+    assert posArr.tolist() == [[450, rows-ROBOT_RADIUS], [ROBOT_RADIUS-1, 300],
+                               [cols-ROBOT_RADIUS, 50]]
+    # a robot planted on the edge can not step out of the map.
+    posArr, blockArr = sweepMove(clearMap, [[0, 599]], [[0, 614]])
+    assert blockArr[0] and posArr.tolist() == [[0, 599]]
+    # the steps in the open area and along the edge are free.
+    posArr, blockArr = sweepMove(clearMap, [[450, 100], [100, 590]], [[450, 80], [130, 590]])
+    assert not blockArr.any() and posArr.tolist() == [[450, 80], [130, 590]]
@@ -0,0 +1,68 @@
+# Tests of the reinforcement learning environments: the single environment reset /
+# step at the map edge and the vectorized environment episodes against it.
+import os
+
+import numpy as np
+
+import cqbSimuGlobal as gv
+from cqbSimuMapMgr import buildMapMatrix
+from cqbSimuCollision import buildClearanceMap, ROBOT_RADIUS
+from cqbSimuEnv import CQBEnv, VecCQBEnv, ACTION_NAMES, STAY_ACTION, getObsSize
+
+SCENE = {
+    'robotPos': [450, 300],
+    'enemy': [[0, [500, 200]], [1, [350, 250]]],
+    'params': {'moveSpeed': 10, 'camAngle': 20}
+}
+
+
+def test_env_reset_step_map_edge():
+    rows, cols = 300, 450
+    scene = {'robotPos': [50, 280], 'enemy': [], 'params': {'moveSpeed': 10}}
+    env = CQBEnv(np.zeros((rows, cols), dtype=np.uint8), scene, maxSteps=5)
+    obs, info = env.reset()
+    assert obs.shape == (getObsSize(0), ) and obs.dtype == np.float32
+    assert info == {'steps': 0, 'detNum': 0, 'visited': 1}
+    downAct = ACTION_NAMES.index('down')
+    posList = []
+    for _ in range(5):
+        obs, reward, terminated, truncated, info = env.step(downAct)
+        posList.append(env.getMapMgr().getRobot().getCrtPos()[:])
+    # the robot stops one radius inside the map edge, the blocked moves cost the bump.
+    assert posList[0] == [50, 290]
+    assert posList[-1] == [50, rows-ROBOT_RADIUS]
+    assert reward < -0.05 and not terminated and truncated
+    assert info['steps'] == 5 and info['visited'] == 1
+    # a start out of the map is clipped in it.
+    scene['robotPos'] = [460, 320]
+    env = CQBEnv(np.zeros((rows, cols), dtype=np.uint8), scene)
+    env.reset()
+    for action in (ACTION_NAMES.index('right'), downAct, STAY_ACTION):
+        env.step(action)
+        x, y = env.getMapMgr().getRobot().getCrtPos()
+        assert 0 <= x < cols and 0 <= y < rows
+
+
+def test_env_vec_env_episodes():
+    mapMatrix = buildMapMatrix(os.path.join(gv.gBluePrintDir, 'BluePrintImge2.png'))
+    clearMap = buildClearanceMap(mapMatrix)
+    env = CQBEnv(mapMatrix, SCENE, clearMap=clearMap, maxSteps=60, seed=5)
+    vecEnv = VecCQBEnv(mapMatrix, SCENE, envNum=3, clearMap=clearMap, maxSteps=60, seed=5)
+    obs, _ = env.reset()
+    obsArr, _ = vecEnv.reset()
+    assert np.allclose(obs, obsArr[0])
+    rand = np.random.default_rng(2)
+    doneNum = 0
+    for _ in range(200):
+        actionArr = rand.integers(len(ACTION_NAMES), size=3)
+        obs, reward, terminated, truncated, info = env.step(actionArr[0])
+        obsArr, rewardArr, termArr, truncArr, vecInfo = vecEnv.step(actionArr)
+        assert np.allclose(obs, vecInfo['finalObs'][0])
+        assert np.isclose(reward, rewardArr[0])
+        assert (terminated, truncated) == (termArr[0], truncArr[0])
+        assert info['detNum'] == vecInfo['detNum'][0] and info['visited'] == vecInfo['visited'][0]
+        if terminated or truncated:
+            obs, _ = env.reset()
+            assert np.allclose(obs, obsArr[0])
+            doneNum += 1
+    assert doneNum >= 3
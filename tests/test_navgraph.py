@@ -0,0 +1,71 @@
+# Tests of the navigation graph route query against the grid route planner.
+import math
+import os
+import random
+
+import numpy as np
+import pytest
+
+import cqbSimuGlobal as gv
+from cqbSimuMapMgr import buildMapMatrix
+from cqbSimuCollision import buildClearanceMap, checkSegmentFree, ROBOT_RADIUS
+from cqbSimuPlanner import RoutePlanner
+import cqbSimuNavGraph
+from cqbSimuNavGraph import NavGraph, getNavGraph, NAV_PREFIX
+
+
+@pytest.fixture(scope='module')
+def navGraph():
+    mapMatrix = buildMapMatrix(os.path.join(gv.gBluePrintDir, 'BluePrintImge2.png'))
+    planner = RoutePlanner(buildClearanceMap(mapMatrix))
+    return mapMatrix, NavGraph.build(planner)
+
+
+def _routeLength(startPos, legPts):
+    pts = [startPos] + legPts
+    return sum(math.hypot(p2[0]-p1[0], p2[1]-p1[1]) for p1, p2 in zip(pts, pts[1:]))
+
+
+def test_navgraph_routes(navGraph):
+    _, graph = navGraph
+    planner, clearMap = graph.planner, graph.clearMap
+    rowArr, colArr = np.nonzero(planner.freeGrid)
+    half = planner.cellSize // 2
+    rand = random.Random(1)
+    checkNum = 0
+    for _ in range(100):
+        i, j = rand.sample(range(rowArr.size), 2)
+        startPos = [int(colArr[i])*planner.cellSize + half, int(rowArr[i])*planner.cellSize + half]
+        endPos = [int(colArr[j])*planner.cellSize + half, int(rowArr[j])*planner.cellSize + half]
+        navPts = graph.planLeg(startPos, endPos)
+        gridPts = planner.planLeg(startPos, endPos)
+        if navPts is None: continue
+        # a route found on the graph is found on the grid and is collision free.
+        assert gridPts is not None
+        assert navPts[-1] == endPos
+        pts = [startPos] + navPts
+        assert checkSegmentFree(clearMap, pts[:-1], pts[1:], radius=ROBOT_RADIUS).all()
+        # the graph edges need the planner segment clearance, compare the lengths
+        # when the grid route has it too (the graph route can be shorter as the
+        # edges are checked on the pixels instead of the cells).
+        pts = [startPos] + gridPts
+        if checkSegmentFree(clearMap, pts[:-1], pts[1:], radius=planner.segRadius).all():
+            assert _routeLength(startPos, navPts) <= _routeLength(startPos, gridPts) * 1.2
+            checkNum += 1
+    assert checkNum > 50
+
+
+def test_navgraph_cache(navGraph, tmp_path):
+    mapMatrix, graph = navGraph
+    cacheDir = str(tmp_path / 'navgraph')
+    planner = RoutePlanner(graph.clearMap)
+    cqbSimuNavGraph.gGraphCache.clear()
+    cached = getNavGraph(mapMatrix, planner, cacheDir=cacheDir)
+    assert cached.planner is planner
+    assert [name.startswith(NAV_PREFIX) for name in os.listdir(cacheDir)] == [True]
+    loaded = NavGraph.load(os.path.join(cacheDir, os.listdir(cacheDir)[0]), planner)
+    assert np.array_equal(loaded.nodeArr, graph.nodeArr)
+    assert np.array_equal(loaded.edgeArr, graph.edgeArr)
+    # the same map in the other planner is rebound from the memory cache.
+    otherPlanner = RoutePlanner(graph.clearMap)
+    assert getNavGraph(mapMatrix, otherPlanner).planner is otherPlanner
@@ -0,0 +1,75 @@
+# Tests of the jump point search route planner against a plain Dijkstra search.
+import heapq
+import math
+import random
+
+import numpy as np
+
+from cqbSimuPlanner import RoutePlanner
+
+SQRT2 = math.sqrt(2)
+
+
+def _dijkstra(freeGrid, start, goal):
+    """ Return the 8-connected (no corner cutting) shortest path length between the
+        (row, col) cells, None if the goal is not reachable.
+    """
+    rows, cols = freeGrid.shape
+    def free(r, c): return 0 <= r < rows and 0 <= c < cols and freeGrid[r, c]
+    disDict = {start: 0.0}
+    heap = [(0.0, start)]
+    while heap:
+        dis, (r, c) = heapq.heappop(heap)
+        if (r, c) == goal: return dis
+        if dis > disDict[(r, c)]: continue
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                if not (dr or dc) or not free(r+dr, c+dc): continue
+                if dr and dc and not (free(r+dr, c) and free(r, c+dc)): continue
+                nextDis = dis + (SQRT2 if dr and dc else 1.0)
+                if nextDis < disDict.get((r+dr, c+dc), math.inf):
+                    disDict[(r+dr, c+dc)] = nextDis
+                    heapq.heappush(heap, (nextDis, (r+dr, c+dc)))
+    return None
+
+
+def _pathLength(planner, path):
+    """ Check every jump is a free straight or diagonal line and return the length."""
+    length = 0.0
+    for idx1, idx2 in zip(path, path[1:]):
+        (r1, c1), (r2, c2) = divmod(idx1, planner.width), divmod(idx2, planner.width)
+        dr, dc = r2 - r1, c2 - c1
+        assert dr == 0 or dc == 0 or abs(dr) == abs(dc)
+        num = max(abs(dr), abs(dc))
+        stepR, stepC = (dr > 0) - (dr < 0), (dc > 0) - (dc < 0)
+        for i in range(num):
+            r, c = r1 + i*stepR, c1 + i*stepC
+            assert planner.freeList[(r+stepR)*planner.width + c + stepC]
+            if stepR and stepC:
+                assert planner.freeList[(r+stepR)*planner.width + c]
+                assert planner.freeList[r*planner.width + c + stepC]
+        length += num * (SQRT2 if stepR and stepC else 1.0)
+    return length
+
+
+def test_jps_matches_dijkstra():
+    rand = random.Random(7)
+    for seed in range(12):
+        rng = np.random.default_rng(seed)
+        rows, cols = rand.randint(8, 30), rand.randint(8, 30)
+        freeGrid = rng.random((rows, cols)) > rand.choice((0.1, 0.25, 0.35))
+        # cell size 1 and radius 1: the plan grid is the free grid itself.
+        planner = RoutePlanner(freeGrid.astype(np.float32), cellSize=1, radius=1)
+        assert np.array_equal(planner.freeGrid, freeGrid)
+        freeCells = [(int(r), int(c)) for r, c in zip(*np.nonzero(freeGrid))]
+        for _ in range(30):
+            start, goal = rand.sample(freeCells, 2)
+            startIdx = (start[0]+1)*planner.width + start[1] + 1
+            goalIdx = (goal[0]+1)*planner.width + goal[1] + 1
+            path = planner.search(startIdx, goalIdx)
+            expect = _dijkstra(freeGrid, tuple(start), tuple(goal))
+            if expect is None:
+                assert path is None
+                continue
+            assert path[0] == startIdx and path[-1] == goalIdx
+            assert abs(_pathLength(planner, path) - expect) < 1e-6
@@ -0,0 +1,100 @@
+# Round trip and seek tests of the simulation record (*.rcd + *.idx) files.
+import random
+import pytest
+
+from cqbSimuRecorder import SimuRecorder, SimuPlayer, NONE_VAL, MAX_VAL, RCD_EXT, IDX_EXT
+
+
+def _randState(rand, tick):
+    """ Return a random tick state dict in the <MapMgr.getTickState()> format."""
+    def pt(): return None if rand.random() < 0.2 else (rand.randint(0, 900), rand.randint(0, 600))
+    def dis(pt): return None if pt is None else rand.randint(0, 1000)
+    lidarPt, camLPt, camRPt = pt(), pt(), pt()
+    return {
+        'tick': tick,
+        'pos': [rand.randint(0, 900), rand.randint(0, 600)],
+        'dir': (rand.randint(-100, 100), rand.randint(-100, 100)),
+        'dirDeg': rand.randint(0, 360),
+        'sonar': None if rand.random() < 0.3 else tuple(rand.randint(0, 900) for _ in range(4)),
+        'lidarDis': dis(lidarPt), 'lidarPt': lidarPt,
+        'camLDis': dis(camLPt), 'camLPt': camLPt,
+        'camRDis': dis(camRPt), 'camRPt': camRPt,
+        'tgtIdx': rand.randint(0, 20),
+        'detected': sorted(rand.sample(range(10), rand.randint(0, 4))),
+        'predicted': [(eID, [rand.randint(0, 900), rand.randint(0, 600)])
+                      for eID in rand.sample(range(10), rand.randint(0, 3))],
+        'squad': [[rand.randint(0, 900), rand.randint(0, 600), rand.randint(0, 20)]
+                  for _ in range(rand.randint(0, 3))],
+        'enemies': [(eID, [rand.randint(0, 900), rand.randint(0, 600)], rand.randint(0, 5))
+                    for eID in range(rand.randint(0, 4))]
+    }
+
+
+def _record(filePath, states, flushCnt=7):
+    recorder = SimuRecorder(filePath, flushCnt=flushCnt)
+    for state in states:
+        recorder.addTick(state['tick'], state)
+    recorder.close()
+    return recorder
+
+
+def test_record_roundtrip(tmp_path):
+    rand = random.Random(1)
+    states = [_randState(rand, tick) for tick in range(100)]
+    filePath = str(tmp_path / 'rec' / 'Record_01')
+    recorder = _record(filePath, states)
+    assert recorder.getTickNum() == 100
+    player = SimuPlayer(filePath + RCD_EXT)
+    assert player.getTickNum() == 100
+    for idx, state in enumerate(states):
+        assert player.getTick(idx) == state
+    player.close()
+
+
+def test_record_seek(tmp_path):
+    rand = random.Random(2)
+    states = [_randState(rand, tick) for tick in range(50)]
+    filePath = str(tmp_path / 'Record_02')
+    _record(filePath, states, flushCnt=256)
+    player = SimuPlayer(filePath)
+    order = list(range(50))
+    rand.shuffle(order)
+    for idx in order + [49, 0, 49]:
+        assert player.getTick(idx) == states[idx]
+    assert player.getTick(-1) is None
+    assert player.getTick(50) is None
+    player.close()
+
+
+def test_record_clamp(tmp_path):
+    rand = random.Random(3)
+    state = _randState(rand, 0)
+    state.update({'pos': [40000, -50000], 'sonar': (1, 70000, 2, 3), 'camRPt': (99999, 5),
+                  'camRDis': 12, 'predicted': [(2, [1, -40000])],
+                  'enemies': [(0, [-40000, 7], 1)]})
+    filePath = str(tmp_path / 'Record_03')
+    _record(filePath, [state])
+    player = SimuPlayer(filePath)
+    loaded = player.getTick(0)
+    assert loaded['pos'] == [MAX_VAL, NONE_VAL+1]
+    assert loaded['sonar'] == (1, MAX_VAL, 2, 3)
+    assert loaded['camRPt'] == (MAX_VAL, 5)
+    assert loaded['predicted'] == [(2, [1, NONE_VAL+1])]
+    assert loaded['enemies'] == [(0, [NONE_VAL+1, 7], 1)]
+    player.close()
+
+
+def test_empty_record(tmp_path):
+    filePath = str(tmp_path / 'Record_04')
+    _record(filePath, [])
+    player = SimuPlayer(filePath + IDX_EXT)
+    assert player.getTickNum() == 0
+    assert player.getTick(0) is None
+    player.close()
+
+
+def test_invalid_record(tmp_path):
+    (tmp_path / ('bad' + RCD_EXT)).write_bytes(b'NOPE' + b'\0' * 16)
+    (tmp_path / ('bad' + IDX_EXT)).write_bytes(b'')
+    with pytest.raises(ValueError):
+        SimuPlayer(str(tmp_path / 'bad'))
@@ -0,0 +1,96 @@
+# Round trip tests of the v2 binary scenario container (*.cqbs) and the v1 JSON.
+import numpy as np
+import pytest
+
+import cqbSimuScenario as scenario
+
+ROBOTS = [{'id': 0, 'pos': [450, 300], 'route': [[450, 300], [300, 200], [600, 250]]},
+          {'id': 1, 'pos': [100, 120], 'route': [[100, 120]]}]
+ENEMY = [[0, [874, 404]],
+         [1, [786, 440], {'motion': 'patrol', 'speed': 5, 'route': [[700, 440], [786, 500]]}]]
+PARAMS = {'camAngle': 15, 'moveSpeed': 10, 'traMaxSize': 100}
+
+
+def _buildScenario(tmp_path, bpBytes=b'\x89PNG fake blue print bytes'):
+    bpPath = tmp_path / 'floor.png'
+    bpPath.write_bytes(bpBytes)
+    data = {'bluePrint': str(bpPath), 'robot': ROBOTS[0], 'robots': ROBOTS,
+            'enemy': ENEMY, 'params': PARAMS}
+    # the columns number is not a multiple of 8 to check the bit-packed padding.
+    mapMatrix = (np.random.default_rng(1).random((37, 61)) < 0.3).astype(np.uint8)
+    return data, mapMatrix
+
+
+def test_save_load_roundtrip(tmp_path):
+    data, mapMatrix = _buildScenario(tmp_path)
+    filePath = str(tmp_path / 'test.cqbs')
+    assert scenario.saveScenario(filePath, data, mapMatrix)
+    bpDir = tmp_path / 'bp'
+    bpDir.mkdir()
+    loaded = scenario.loadScenario(filePath, bpDir=str(bpDir))
+    assert loaded['mapMatrix'].shape == mapMatrix.shape
+    assert np.array_equal(loaded['mapMatrix'], mapMatrix)
+    assert loaded['robot'] == ROBOTS[0]
+    assert loaded['robots'] == ROBOTS
+    assert loaded['enemy'] == ENEMY
+    assert loaded['params'] == PARAMS
+    assert scenario.getRobotList(loaded) == ROBOTS
+    # the embedded blue print is extracted in the blue print folder.
+    assert loaded['bluePrintBytes'] == (tmp_path / 'floor.png').read_bytes()
+    assert loaded['bluePrint'] == str(bpDir / 'floor.png')
+    assert (bpDir / 'floor.png').read_bytes() == loaded['bluePrintBytes']
+
+
+def test_partial_loads(tmp_path):
+    data, mapMatrix = _buildScenario(tmp_path)
+    filePath = str(tmp_path / 'test.cqbs')
+    scenario.saveScenario(filePath, data, mapMatrix)
+    meta = scenario.loadMeta(filePath)
+    assert meta['bluePrintName'] == 'floor.png'
+    assert meta['enemy'] == ENEMY
+    assert scenario.loadBluePrintBytes(filePath) == (tmp_path / 'floor.png').read_bytes()
+    grid = scenario.mapGrid(filePath)
+    assert grid.shape == (37, 8)
+    unpacked = np.unpackbits(np.asarray(grid), axis=1, count=mapMatrix.shape[1])
+    assert np.array_equal(unpacked, mapMatrix)
+    del grid
+
+
+def test_blue_print_name_clash(tmp_path):
+    data, mapMatrix = _buildScenario(tmp_path)
+    filePath = str(tmp_path / 'test.cqbs')
+    scenario.saveScenario(filePath, data, mapMatrix)
+    bpDir = tmp_path / 'bp'
+    bpDir.mkdir()
+    (bpDir / 'floor.png').write_bytes(b'an other blue print')
+    loaded = scenario.loadScenario(filePath, bpDir=str(bpDir))
+    # the existing different file is kept, the embedded one gets the hash in the name.
+    assert (bpDir / 'floor.png').read_bytes() == b'an other blue print'
+    assert loaded['bluePrint'] != str(bpDir / 'floor.png')
+    assert open(loaded['bluePrint'], 'rb').read() == loaded['bluePrintBytes']
+
+
+def test_no_blue_print_and_robot(tmp_path):
+    mapMatrix = np.zeros((8, 16), dtype=np.uint8)
+    mapMatrix[3, 5] = 1
+    filePath = str(tmp_path / 'empty.cqbs')
+    scenario.saveScenario(filePath, {'bluePrint': None, 'robot': None, 'enemy': [], 'params': {}}, mapMatrix)
+    loaded = scenario.loadScenario(filePath)
+    assert np.array_equal(loaded['mapMatrix'], mapMatrix)
+    assert loaded['bluePrint'] is None and loaded['bluePrintBytes'] == b''
+    assert scenario.getRobotList(loaded) == []
+
+
+def test_invalid_file(tmp_path):
+    filePath = tmp_path / 'bad.cqbs'
+    filePath.write_bytes(b'NOPE' + b'\0' * 100)
+    with pytest.raises(ValueError):
+        scenario.loadScenario(str(filePath))
+
+
+def test_json_roundtrip(tmp_path):
+    data, _ = _buildScenario(tmp_path)
+    filePath = str(tmp_path / 'test.json')
+    assert scenario.exportJson(filePath, data)
+    loaded = scenario.importJson(filePath)
+    assert loaded == data
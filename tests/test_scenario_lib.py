@@ -0,0 +1,105 @@
+# Tests of the indexed scenario library catalog (incremental scan and the
+# concurrent catalog saves).
+import io
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+import cqbSimuScenario as scenario
+from cqbSimuScenarioLib import ScenarioLibrary, CATALOG_NAME
+
+ROBOT = {'id': 0, 'pos': [100, 100], 'route': [[100, 100], [400, 100], [400, 500]]}
+ENEMY = [[0, [600, 300]], [1, [700, 200]]]
+
+
+def _pngBytes():
+    buf = io.BytesIO()
+    Image.new('RGB', (90, 60), (255, 255, 255)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _buildLib(tmp_path, thumbFlg=True):
+    sceDir = tmp_path / 'scenario'
+    bpDir = tmp_path / 'bp'
+    sceDir.mkdir()
+    bpDir.mkdir()
+    (bpDir / 'floor.png').write_bytes(_pngBytes())
+    data = {'bluePrint': str(bpDir / 'floor.png'), 'robot': ROBOT, 'robots': [ROBOT],
+            'enemy': ENEMY, 'params': {}}
+    scenario.saveScenario(str(sceDir / 'a.cqbs'), data, np.zeros((60, 90), dtype=np.uint8))
+    for name in ('b.json', 'c.json'):
+        scenario.exportJson(str(sceDir / name), data)
+    return ScenarioLibrary(str(sceDir), bpDir=str(bpDir), thumbFlg=thumbFlg), sceDir
+
+
+def test_scan_incremental(tmp_path):
+    lib, sceDir = _buildLib(tmp_path)
+    assert lib.scan() == 3
+    assert lib.scan() == 0
+    names = [name for name, _ in lib.listScenarios(sortKey='')]
+    assert sorted(names) == ['a.cqbs', 'b.json', 'c.json']
+    entry = lib.getEntry('a.cqbs')
+    assert entry['robotNum'] == 1 and entry['enemyNum'] == 2
+    assert entry['routeLen'] == 700.0
+    assert os.path.exists(lib.getThumbnailPath('a.cqbs'))
+    # the JSON scenarios share the blue print hash with the embedded one.
+    assert lib.getEntry('b.json')['bluePrintHash'] == entry['bluePrintHash']
+    assert len(lib.bpHashes) == 1
+    assert len(lib.filter(bluePrintHash=entry['bluePrintHash'], minEnemy=2)) == 3
+    # remove and break files.
+    os.remove(str(sceDir / 'c.json'))
+    (sceDir / 'b.json').write_text('{broken')
+    assert lib.scan() == 2
+    assert lib.getEntry('c.json') is None
+    assert 'error' in lib.getEntry('b.json')
+    assert [name for name, _ in lib.listScenarios()] == ['a.cqbs']
+    # the saved catalog is reloaded.
+    reloaded = ScenarioLibrary(str(sceDir), bpDir=str(tmp_path / 'bp'))
+    assert reloaded.entries == json.loads(json.dumps(lib.entries))
+    assert reloaded.scan() == 0
+
+
+def test_update_entry(tmp_path):
+    lib, sceDir = _buildLib(tmp_path, thumbFlg=False)
+    lib.scan()
+    filePath = str(sceDir / 'b.json')
+    data = scenario.importJson(filePath)
+    data['enemy'] = ENEMY[:1]
+    scenario.exportJson(filePath, data)
+    os.utime(filePath, (0, 0))     # make sure the mtime is changed.
+    assert lib.updateEntry(filePath)['enemyNum'] == 1
+    os.remove(filePath)
+    assert lib.updateEntry(filePath) is None
+    with open(os.path.join(str(sceDir), CATALOG_NAME)) as fh:
+        assert sorted(json.load(fh)['entries'].keys()) == ['a.cqbs', 'c.json']
+
+
+def test_concurrent_save(tmp_path):
+    lib, sceDir = _buildLib(tmp_path, thumbFlg=False)
+    errors = []
+
+    def run(fun):
+        try:
+            for i in range(50): fun(i)
+        except Exception as err:
+            errors.append(err)
+
+    # change the file mtime every time so both threads rebuild and save the catalog.
+    def update(i):
+        os.utime(str(sceDir / 'b.json'), (i, i))
+        lib.updateEntry(str(sceDir / 'b.json'))
+
+    def scan(i):
+        os.utime(str(sceDir / 'c.json'), (i, i))
+        lib.scan()
+
+    threads = [threading.Thread(target=run, args=(fun, )) for fun in (update, scan)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors
+    assert not os.path.exists(lib.catalogPath + '.tmp')
+    with open(lib.catalogPath) as fh:
+        assert len(json.load(fh)['entries']) == 3
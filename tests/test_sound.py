@@ -0,0 +1,37 @@
+# Arrival bearing tests of the wall aware sound model.
+import numpy as np
+
+from cqbSimuSound import SoundModel, RING_RAD
+
+
+def _wallModel():
+    """ Return the sound model of an open map with a wall between the robot and
+        the enemy (the sound goes around the wall's bottom end).
+    """
+    mapMatrix = np.zeros((400, 400), dtype=np.uint8)
+    mapMatrix[:300, 198:202] = 1
+    return SoundModel(mapMatrix)
+
+
+def test_bearing_around_wall():
+    model = _wallModel()
+    robotArr, srcArr = np.array([[150, 100]]), np.array([[250, 100]])
+    model.updateSources(srcArr)
+    bearArr, disArr = model.calSound(robotArr, srcArr)
+    assert disArr[0, 0] > 100 * 2
+    assert 90 < bearArr[0, 0] < 270     # the sound comes from below the robot.
+
+
+def test_bearing_all_ring_occluded():
+    model = _wallModel()
+    robotArr, srcArr = np.array([[150, 100]]), np.array([[250, 100]])
+    model.updateSources(srcArr)
+    # box the robot in after its field is built: the robot cell is still reached
+    # but no probe ring point can be seen.
+    robotCell = model._toCells(robotArr)[0]
+    for rad in (RING_RAD, RING_RAD/2):
+        ringCells = model._toCells(robotArr + model.ringVec * rad)
+        model.passFlat[ringCells[ringCells != robotCell]] = False
+    bearArr, disArr = model.calSound(robotArr, srcArr)
+    assert np.isfinite(disArr[0, 0])
+    assert bearArr[0, 0] == 90          # the straight line bearing, not ring point 0.
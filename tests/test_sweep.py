@@ -0,0 +1,48 @@
+# Tests of the parameter sweep: the run rows only depend on the seeds, not on the
+# worker pool mode.
+import math
+import os
+
+import cqbSimuGlobal as gv
+from cqbSimuMapMgr import buildMapMatrix
+from cqbSimuCollision import buildClearanceMap
+from cqbSimuSweep import ParamSweep, summarizeRows
+
+SCENE = {
+    'robotPos': [450, 300],
+    'route': [[450, 300], [300, 200], [600, 250]],
+    'enemy': [[0, [500, 200]],
+              [1, [350, 250], {'motion': 'wander', 'speed': 5, 'route': []}]],
+    'params': {'moveSpeed': 10, 'camAngle': 20}
+}
+GRID = {'obsAvoid': [False, True], 'noiseScale': [0.0, 1.0]}
+
+
+def _runSweep(mapMatrix, clearMap, useProcess):
+    sweep = ParamSweep(mapMatrix, clearMap, None, SCENE, paramGrid=GRID, repeatNum=2,
+                       workerNum=2, useProcess=useProcess, maxTicks=120, seed=3)
+    sweep.startSweep()
+    sweep.feeder.join()
+    assert sweep.getError() is None
+    return sweep.getRows()
+
+
+def _norm(row):
+    return {key: None if isinstance(val, float) and math.isnan(val) else val
+            for key, val in row.items()}
+
+
+def test_sweep_process_thread_rows():
+    mapMatrix = buildMapMatrix(os.path.join(gv.gBluePrintDir, 'BluePrintImge2.png'))
+    clearMap = buildClearanceMap(mapMatrix)
+    procRows = _runSweep(mapMatrix, clearMap, True)
+    threadRows = _runSweep(mapMatrix, clearMap, False)
+    assert len(procRows) == 8
+    assert [(row['combo'], row['repeat']) for row in procRows] == \
+        [(combo, repeat) for combo in range(4) for repeat in range(2)]
+    assert [_norm(row) for row in procRows] == [_norm(row) for row in threadRows]
+    # the wander enemy and the noise use the repeat seeds.
+    metrics = [{key: row[key] for key in ('ticks', 'pathLen', 'explored', 'falsePos')}
+               for row in procRows]
+    assert metrics[2] != metrics[3]
+    assert len(summarizeRows(procRows)) == 4
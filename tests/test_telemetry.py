@@ -0,0 +1,82 @@
+# Round trip tests of the chunked telemetry sink (*.csv and *.npz outputs).
+import random
+import pytest
+
+from cqbSimuTelemetry import TelemetrySink, loadTelemetry, NONE_VAL, BASE_COLUMNS
+
+ENEMY_IDS = [3, 7]
+
+
+def _randState(rand):
+    """ Return a random tick state dict in the <MapMgr.getTickState()> format."""
+    def pt(): return None if rand.random() < 0.2 else (rand.randint(0, 900), rand.randint(0, 600))
+    def dis(pt): return None if pt is None else rand.randint(0, 1000)
+    lidarPt, camLPt, camRPt = pt(), pt(), pt()
+    return {
+        'pos': [rand.randint(0, 900), rand.randint(0, 600)],
+        'dir': (rand.randint(-100, 100), rand.randint(-100, 100)),
+        'dirDeg': rand.randint(0, 360),
+        'sonar': None if rand.random() < 0.3 else tuple(rand.randint(0, 900) for _ in range(4)),
+        'lidarDis': dis(lidarPt), 'lidarPt': lidarPt,
+        'camLDis': dis(camLPt), 'camLPt': camLPt,
+        'camRDis': dis(camRPt), 'camRPt': camRPt,
+        'detected': sorted(rand.sample(ENEMY_IDS + [9], rand.randint(0, 3)))
+    }
+
+
+def _expectRow(tick, state, soundData):
+    """ Return the expected telemetry row dict of a tick."""
+    def val(v): return NONE_VAL if v is None else v
+    sonar = state['sonar'] or (NONE_VAL, )*4
+    row = {'tick': tick, 'posX': state['pos'][0], 'posY': state['pos'][1],
+           'dirX': state['dir'][0], 'dirY': state['dir'][1], 'dirDeg': state['dirDeg'],
+           'sonarF': sonar[0], 'sonarB': sonar[1], 'sonarL': sonar[2], 'sonarR': sonar[3],
+           'detNum': len(state['detected'])}
+    for key in ('lidar', 'camL', 'camR'):
+        pt = state[key + 'Pt'] or (NONE_VAL, NONE_VAL)
+        row[key + 'Dis'] = val(state[key + 'Dis'])
+        row[key + 'X'], row[key + 'Y'] = pt
+    for i, eID in enumerate(ENEMY_IDS):
+        row['sound_%s' %eID] = val(soundData[i]) if soundData else NONE_VAL
+        row['det_%s' %eID] = int(eID in state['detected'])
+    return row
+
+
+@pytest.mark.parametrize('ext', ['.csv', '.npz'])
+def test_telemetry_roundtrip(tmp_path, ext):
+    rand = random.Random(2)
+    filePath = str(tmp_path / 'sub' / ('telemetry' + ext))
+    # small chunks: several full chunks (more than the free pool) plus a partial one.
+    sink = TelemetrySink(filePath, enemyIDs=ENEMY_IDS, chunkSize=16)
+    rows = []
+    for tick in range(5, 5 + 101):
+        state = _randState(rand)
+        soundData = None if rand.random() < 0.3 else \
+            [None if rand.random() < 0.3 else rand.randint(-180, 180) for _ in ENEMY_IDS]
+        sink.addTick(tick, state, soundData=soundData)
+        rows.append(_expectRow(tick, state, soundData))
+    sink.close()
+    assert sink.getError() is None
+    assert sink.getTickNum() == 101
+    assert sink.chunkNum == 7
+    data = loadTelemetry(filePath)
+    assert list(data.keys()) == list(BASE_COLUMNS) + ['sound_3', 'sound_7', 'det_3', 'det_7']
+    for col, values in data.items():
+        assert values.tolist() == [row[col] for row in rows], col
+
+
+@pytest.mark.parametrize('ext', ['.csv', '.npz'])
+def test_telemetry_empty(tmp_path, ext):
+    sink = TelemetrySink(str(tmp_path / ('empty' + ext)))
+    sink.close()
+    data = loadTelemetry(sink.getFilePath())
+    assert list(data.keys()) == list(BASE_COLUMNS)
+    assert all(len(values) == 0 for values in data.values())
+
+
+def test_telemetry_default_ext(tmp_path):
+    sink = TelemetrySink(str(tmp_path / 'telemetry'))
+    sink.addTick(0, _randState(random.Random(3)))
+    sink.close()
+    assert sink.getFilePath().endswith('.npz')
+    assert loadTelemetry(sink.getFilePath())['tick'].tolist() == [0]
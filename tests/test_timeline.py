@@ -0,0 +1,126 @@
+# Round trip, seek and truncate tests of the keyframe plus delta timeline.
+import random
+
+from cqbSimuTimeline import SimuTimeline, encodeVarint, decodeVarint, zigzag, unzigzag
+from test_recorder import _randState
+
+
+def _runStates(rand, num, holdRatio=0.5):
+    """ Return the tick states where about <holdRatio> of the ticks repeat the
+        previous state (the paused simulation).
+    """
+    states = [_randState(rand, 0)]
+    for tick in range(1, num):
+        states.append(states[-1] if rand.random() < holdRatio else _randState(rand, tick))
+    return [dict(state, tick=tick) for tick, state in enumerate(states)]
+
+
+def _strip(state):
+    return {key: val for key, val in state.items() if key != 'tick'}
+
+
+def test_varint_zigzag():
+    for val in (0, 1, -1, 63, -64, 127, 128, 300, -300, 2**31, -2**40):
+        buf = bytearray()
+        encodeVarint(zigzag(val), buf)
+        decoded, pos = decodeVarint(buf, 0)
+        assert unzigzag(decoded) == val and pos == len(buf)
+
+
+def test_timeline_roundtrip():
+    states = _runStates(random.Random(1), 300)
+    timeline = SimuTimeline(keyInv=8)
+    for state in states:
+        timeline.addTick(state)
+    assert timeline.getTickNum() == 300
+    assert timeline.getEntryNum() < 300
+    for idx in random.Random(2).sample(range(300), 300):
+        assert timeline.getTick(idx) == _strip(states[idx])
+    assert list(timeline.iterTicks()) == [_strip(state) for state in states]
+    assert list(timeline.iterTicks(45, 130)) == [_strip(state) for state in states[45:130]]
+    assert timeline.getTick(300) is None
+
+
+def test_timeline_unchanged_ticks():
+    state = _randState(random.Random(3), 0)
+    timeline = SimuTimeline()
+    timeline.addTick(state)
+    memSize = timeline.getMemorySize()
+    for _ in range(1000):
+        timeline.addTick(state)
+    assert timeline.getTickNum() == 1001
+    assert timeline.getEntryNum() == 1
+    assert timeline.getMemorySize() == memSize
+
+
+def test_timeline_truncate():
+    states = _runStates(random.Random(4), 120)
+    for cut in (0, 1, 7, 8, 9, 63, 119, 120):
+        timeline = SimuTimeline(keyInv=8)
+        for state in states:
+            timeline.addTick(state, tick=state['tick'])
+        timeline.truncate(cut)
+        assert timeline.getTickNum() == cut
+        for state in states[cut:]:
+            timeline.addTick(state, tick=state['tick'])
+        assert list(timeline.iterTicks()) == [_strip(state) for state in states]
+
+
+def test_timeline_start_tick():
+    states = _runStates(random.Random(5), 20)
+    timeline = SimuTimeline(keyInv=4)
+    for state in states:
+        timeline.addTick(state, tick=state['tick'] + 100)
+    assert timeline.getStartTick() == 100
+    assert timeline.getTickNum() == 20
+    assert timeline.getTick(5) == _strip(states[5])
+    timeline.clear()
+    assert timeline.getTickNum() == 0 and timeline.getTick(0) is None
+
+
+def _buildMapMgr():
+    """ Return a headless map manager with the bundled blue print, a 2 robots squad
+        with routes and a patrol enemy.
+    """
+    import os
+    import cqbSimuGlobal as gv
+    from cqbSimuMapMgr import MapMgr
+    gv.gBluePrintFilePath = os.path.join(gv.gBluePrintDir, 'BluePrintImge2.png')
+    mapMgr = MapMgr()
+    mapMgr.initMapMatix()
+    mapMgr.initRobot([450, 300])
+    for pt in ((300, 200), (600, 250), (500, 450)):
+        mapMgr.robot.addWayPt(list(pt))
+    robotObj = mapMgr.addRobot([400, 300])
+    for pt in ((600, 250), (300, 200)):
+        robotObj.addWayPt(list(pt))
+    mapMgr.robot = mapMgr.robots[0]
+    mapMgr.addEnemy([500, 200], motionInfo={'motion': 'patrol', 'speed': 5, 'route': [[500, 400]]})
+    mapMgr.setLidarOn(True)
+    mapMgr.setCamOn(True)
+    mapMgr.setCollision(False)  # the routes cross the walls.
+    return mapMgr
+
+
+def test_timeline_seek_resume():
+    mapMgr = _buildMapMgr()
+    mapMgr.startMove(True)
+    for _ in range(60): mapMgr.periodic()
+    timeline = mapMgr.timeline
+    states = list(timeline.iterTicks())
+    assert len(states) == 60 and states[-1]['tgtIdx'] > states[5]['tgtIdx']
+    mapMgr.seekTimeline(5)
+    assert mapMgr.robot.moveTgtIdx == states[5]['tgtIdx']
+    assert [robotObj.crtPos for robotObj in mapMgr.robots[1:]] == [states[5]['squad'][0][:2]]
+    # the patrol enemy turned back before the tick 60, it is restored on its way out.
+    assert states[-1]['enemies'][0][2] != states[5]['enemies'][0][2]
+    enemyObj = mapMgr.getEnemy()[0]
+    assert (enemyObj.getID(), enemyObj.getCrtPos(), enemyObj.patrolIdx) == states[5]['enemies'][0]
+    # no tick is added while paused on the scrubbed tick.
+    for _ in range(5): mapMgr.periodic()
+    assert timeline.getTickNum() == 60
+    # resume: the ticks after the scrubbed one are replaced by the new branch.
+    mapMgr.startMove(True)
+    for _ in range(10): mapMgr.periodic()
+    assert timeline.getTickNum() == 16
+    assert _strip(timeline.getTick(15)) == _strip(states[15])